@@ -37,6 +37,8 @@ from .verifier import SPV
 from .blockchain import hash_header
 from .i18n import _
 from .logging import Logger
+from .history_index import HistoryIndex
+from .utxo_index import UtxoIndex, Coin
 
 if TYPE_CHECKING:
     from .network import Network
@@ -93,6 +95,12 @@ class AddressSynchronizer(Logger):
         self.threadlocal_cache = threading.local()
 
         self._get_addr_balance_cache = {}
+        # wallet history sorted by txpos. Access with self.lock.
+        # None until loaded, see load_history_index
+        self._history_index = None  # type: Optional[HistoryIndex]
+        # unspent outputs of the wallet. Access with self.transaction_lock.
+        # None until loaded, see load_utxo_index
+        self._utxo_index = None  # type: Optional[UtxoIndex]
 
         self.load_and_cleanup()
 
@@ -107,6 +115,8 @@ class AddressSynchronizer(Logger):
         self.check_history()
         self.load_unverified_transactions()
         self.remove_local_transactions_we_dont_have()
+        self.load_history_index()
+        self.load_utxo_index()
 
     def is_mine(self, address: Optional[str]) -> bool:
         if not address: return False
@@ -196,7 +206,7 @@ class AddressSynchronizer(Logger):
 
     def add_address(self, address):
         if not self.db.get_addr_history(address):
-            self.db.history[address] = []
+            self.db.set_addr_history(address, [])
             self.set_up_to_date(False)
         if self.synchronizer:
             self.synchronizer.add(address)
@@ -319,8 +329,15 @@ class AddressSynchronizer(Logger):
                     if next_tx is not None:
                         self.db.add_txi_addr(next_tx, addr, ser, v)
                         self._add_tx_to_local_history(next_tx)
+                        self._update_tx_indexes(next_tx, delta_changed=True)
             # add to local history
             self._add_tx_to_local_history(tx_hash)
+            self._update_tx_indexes(tx_hash, delta_changed=True)
+            if self._utxo_index is not None:
+                for txi in tx.inputs():
+                    if not txi.is_coinbase_input():
+                        self._utxo_index.remove(txi.prevout.to_str())
+                self._add_tx_outputs_to_utxo_index(tx_hash)
             # save
             self.db.add_transaction(tx_hash, tx)
             self.db.add_num_inputs_to_tx(tx_hash, len(tx.inputs()))
@@ -346,6 +363,10 @@ class AddressSynchronizer(Logger):
 
         with self.lock, self.transaction_lock:
             self.logger.info(f"removing tx from history {tx_hash}")
+            # is_mine coins spent by tx
+            spent_prevouts = [TxOutpoint.from_str(ser)
+                              for addr in self.db.get_txi_addresses(tx_hash)
+                              for ser, v in self.db.get_txi_addr(tx_hash, addr)]
             tx = self.db.remove_transaction(tx_hash)
             remove_from_spent_outpoints()
             self._remove_tx_from_local_history(tx_hash)
@@ -356,6 +377,11 @@ class AddressSynchronizer(Logger):
             self.db.remove_tx_fee(tx_hash)
             self.db.remove_verified_tx(tx_hash)
             self.unverified_tx.pop(tx_hash, None)
+            self._update_tx_indexes(tx_hash)
+            if self._utxo_index is not None:
+                self._utxo_index.remove_outputs_of_tx(tx_hash)
+                for prevout in spent_prevouts:
+                    self._add_tx_outputs_to_utxo_index(prevout.txid.hex(), out_idx=prevout.out_idx)
             if tx:
                 for idx, txo in enumerate(tx.outputs()):
                     scripthash = bitcoin.script_to_scripthash(txo.scriptpubkey.hex())
@@ -384,6 +410,7 @@ class AddressSynchronizer(Logger):
                     # make tx local
                     self.unverified_tx.pop(tx_hash, None)
                     self.db.remove_verified_tx(tx_hash)
+                    self._update_tx_indexes(tx_hash)
                     if self.verifier:
                         self.verifier.remove_spv_proof_for_tx(tx_hash)
             self.db.set_addr_history(addr, hist)
@@ -433,6 +460,76 @@ class AddressSynchronizer(Logger):
         with self.lock:
             with self.transaction_lock:
                 self.db.clear_history()
+                self._history_index = HistoryIndex()
+                self._utxo_index = UtxoIndex()
+
+    def _compute_tx_delta(self, tx_hash: str) -> int:
+        """Effect of tx on the addresses of the wallet."""
+        addrs = set(itertools.chain(self.db.get_txi_addresses(tx_hash), self.db.get_txo_addresses(tx_hash)))
+        return sum(self.get_tx_delta(tx_hash, addr) for addr in addrs if self.is_mine(addr))
+
+    def _update_tx_indexes(self, tx_hash: str, *, delta_changed: bool = False) -> None:
+        """Must be called when tx_hash is added to or removed from the history,
+        when its effect on the wallet changed, or when its height changed.
+        Coins are added to and removed from the utxo index by the caller."""
+        with self.lock, self.transaction_lock:
+            in_history = bool(self.db.get_txi_addresses(tx_hash) or self.db.get_txo_addresses(tx_hash))
+            if not in_history:
+                if self.db.get_tx_delta(tx_hash) is not None:
+                    self.db.remove_tx_delta(tx_hash)
+                if self._history_index is not None:
+                    self._history_index.remove(tx_hash)
+                return
+            if delta_changed:
+                self.db.set_tx_delta(tx_hash, self._compute_tx_delta(tx_hash))
+            if self._history_index is None:
+                return
+            if self._utxo_index is not None:
+                self._utxo_index.set_tx_height(tx_hash, self.get_tx_height(tx_hash).height)
+            if delta_changed or tx_hash not in self._history_index:
+                delta = self.db.get_tx_delta(tx_hash)
+                self._history_index.add(tx_hash, self.get_txpos(tx_hash), delta)
+            else:
+                self._history_index.set_position(tx_hash, self.get_txpos(tx_hash))
+
+    @profiler
+    def load_history_index(self):
+        with self.lock, self.transaction_lock:
+            deltas = self.db.get_tx_deltas()
+            txids = set(itertools.chain(self.db.list_txi(), self.db.list_txo()))
+            for tx_hash in set(deltas) - txids:
+                self.db.remove_tx_delta(tx_hash)
+            for tx_hash in txids - set(deltas):
+                deltas[tx_hash] = self._compute_tx_delta(tx_hash)
+                self.db.set_tx_delta(tx_hash, deltas[tx_hash])
+            index = HistoryIndex()
+            index.load((tx_hash, self.get_txpos(tx_hash), deltas[tx_hash]) for tx_hash in txids)
+            c, u, x = self.get_balance()
+            if index.balance() != c + u + x:
+                # deltas might be stale if the wallet file was used by another version
+                self.logger.info("history index out of date, rebuilding")
+                for tx_hash in txids:
+                    deltas[tx_hash] = self._compute_tx_delta(tx_hash)
+                    self.db.set_tx_delta(tx_hash, deltas[tx_hash])
+                index.load((tx_hash, self.get_txpos(tx_hash), deltas[tx_hash]) for tx_hash in txids)
+            self._history_index = index
+
+    def _add_tx_outputs_to_utxo_index(self, tx_hash: str, *, out_idx: int = None) -> None:
+        """Adds the unspent is_mine outputs of tx_hash (or only output out_idx)."""
+        height = self.get_tx_height(tx_hash).height
+        for addr in self.db.get_txo_addresses(tx_hash):
+            for n, v, is_cb in self.db.get_txo_addr(tx_hash, addr):
+                if out_idx is not None and n != out_idx:
+                    continue
+                if self.db.get_spent_outpoint(tx_hash, n) is None:
+                    self._utxo_index.add(f"{tx_hash}:{n}", Coin(addr, v, is_cb, height))
+
+    @profiler
+    def load_utxo_index(self):
+        with self.lock, self.transaction_lock:
+            self._utxo_index = UtxoIndex()
+            for tx_hash in self.db.list_txo():
+                self._add_tx_outputs_to_utxo_index(tx_hash)
 
     def get_txpos(self, tx_hash):
         """Returns (height, txpos) tuple, even if the tx is unverified."""
@@ -459,10 +556,37 @@ class AddressSynchronizer(Logger):
         return f
 
     @with_local_height_cached
-    def get_history(self, *, domain=None) -> Sequence[HistoryItem]:
-        # get domain
+    def get_history(self, *, domain=None, start: int = None, stop: int = None,
+                    from_height: int = None, to_height: int = None) -> Sequence[HistoryItem]:
+        """Returns the history, oldest first, with the balance after each tx.
+        start/stop select by position, from_height/to_height by block height
+        (inclusive), see HistoryIndex.get_range.
+        """
         if domain is None:
-            domain = self.get_addresses()
+            return self._get_history_from_index(start=start, stop=stop,
+                                                from_height=from_height, to_height=to_height)
+        h = self._get_history_for_domain(domain)
+        if from_height is not None:
+            h = [x for x in h if self.get_txpos(x.txid)[0] >= from_height]
+        if to_height is not None:
+            h = [x for x in h if self.get_txpos(x.txid)[0] <= to_height]
+        return h[start:stop]
+
+    def _get_history_from_index(self, **kwargs) -> Sequence[HistoryItem]:
+        with self.lock, self.transaction_lock:
+            c, u, x = self.get_balance()
+            # fixme: this may happen if history is incomplete
+            if self._history_index.balance() != c + u + x:
+                self.logger.warning("history not synchronized")
+                return []
+            return [HistoryItem(txid=tx_hash,
+                                tx_mined_status=self.get_tx_height(tx_hash),
+                                delta=delta,
+                                fee=self.get_tx_fee(tx_hash),
+                                balance=balance)
+                    for tx_hash, delta, balance in self._history_index.get_range(**kwargs)]
+
+    def _get_history_for_domain(self, domain) -> Sequence[HistoryItem]:
         domain = set(domain)
         # 1. Get the history of each address in the domain, maintain the
         #    delta of a tx as the sum of its deltas on domain addresses
@@ -482,7 +606,8 @@ class AddressSynchronizer(Logger):
             tx_mined_status = self.get_tx_height(tx_hash)
             fee = self.get_tx_fee(tx_hash)
             history.append((tx_hash, tx_mined_status, delta, fee))
-        history.sort(key = lambda x: self.get_txpos(x[0]), reverse=True)
+        # note: ties are broken by txid, as in HistoryIndex
+        history.sort(key = lambda x: (self.get_txpos(x[0]), x[0]), reverse=True)
         # 3. add balance
         c, u, x = self.get_balance(domain)
         balance = c + u + x
@@ -544,24 +669,30 @@ class AddressSynchronizer(Logger):
             if tx_height in (TX_HEIGHT_UNCONFIRMED, TX_HEIGHT_UNCONF_PARENT):
                 with self.lock:
                     self.db.remove_verified_tx(tx_hash)
+                    self._update_tx_indexes(tx_hash)
                 if self.verifier:
                     self.verifier.remove_spv_proof_for_tx(tx_hash)
         else:
             with self.lock:
                 # tx will be verified only if height > 0
                 self.unverified_tx[tx_hash] = tx_height
+                self._update_tx_indexes(tx_hash)
+            if self.verifier and tx_height > 0:
+                self.verifier.wake_up()
 
     def remove_unverified_tx(self, tx_hash, tx_height):
         with self.lock:
             new_height = self.unverified_tx.get(tx_hash)
             if new_height == tx_height:
                 self.unverified_tx.pop(tx_hash, None)
+                self._update_tx_indexes(tx_hash)
 
     def add_verified_tx(self, tx_hash: str, info: TxMinedInfo):
         # Remove from the unverified map and add to the verified map
         with self.lock:
             self.unverified_tx.pop(tx_hash, None)
             self.db.add_verified_tx(tx_hash, info)
+            self._update_tx_indexes(tx_hash)
         tx_mined_status = self.get_tx_height(tx_hash)
         util.trigger_callback('verified', self, tx_hash, tx_mined_status)
 
@@ -591,6 +722,7 @@ class AddressSynchronizer(Logger):
                         # into unverified_tx with the old height, and if we get
                         # a status update, that will overwrite it.
                         self.unverified_tx[tx_hash] = tx_height
+                        self._update_tx_indexes(tx_hash)
                         txs.add(tx_hash)
         return txs
 
@@ -607,6 +739,7 @@ class AddressSynchronizer(Logger):
             tx_was_added = self.add_transaction(tx)
             if tx_was_added:
                 self.future_tx[tx.txid()] = num_blocks
+                self._update_tx_indexes(tx.txid())
             return tx_was_added
 
     def get_tx_height(self, tx_hash: str) -> TxMinedInfo:
@@ -789,12 +922,24 @@ class AddressSynchronizer(Logger):
         return out
 
     def get_addr_utxo(self, address: str) -> Dict[TxOutpoint, PartialTxInput]:
-        out = self.get_addr_outputs(address)
-        for k, v in list(out.items()):
-            if v.spent_height is not None:
-                out.pop(k)
+        with self.transaction_lock:
+            coins = self._utxo_index.by_address(address)
+        out = {}
+        for prevout_str, coin in coins.items():
+            utxo = self._coin_to_txin(prevout_str, coin)
+            out[utxo.prevout] = utxo
         return out
 
+    @staticmethod
+    def _coin_to_txin(prevout_str: str, coin: Coin) -> PartialTxInput:
+        prevout = TxOutpoint.from_str(prevout_str)
+        utxo = PartialTxInput(prevout=prevout, is_coinbase_output=coin.is_coinbase)
+        utxo._trusted_address = coin.address
+        utxo._trusted_value_sats = coin.value
+        utxo.block_height = coin.height
+        utxo.spent_height = None
+        return utxo
+
     # return the total amount ever received by an address
     def get_addr_received(self, address):
         received, sent = self.get_addr_io(address)
@@ -842,24 +987,25 @@ class AddressSynchronizer(Logger):
                   mature_only: bool = False, confirmed_only: bool = False,
                   nonlocal_only: bool = False) -> Sequence[PartialTxInput]:
         coins = []
-        if domain is None:
-            domain = self.get_addresses()
-        domain = set(domain)
-        if excluded_addresses:
-            domain = set(domain) - set(excluded_addresses)
+        excluded_addresses = set(excluded_addresses or ())
+        with self.transaction_lock:
+            if domain is None:
+                # note: txo of addresses that were deleted from the wallet are still in the db
+                items = [(k, coin) for k, coin in self._utxo_index.items(confirmed_only=confirmed_only)
+                         if self.is_mine(coin.address) and coin.address not in excluded_addresses]
+            else:
+                items = [item for addr in set(domain) - excluded_addresses
+                         for item in self._utxo_index.by_address(addr).items()]
         mempool_height = self.get_local_height() + 1  # height of next block
-        for addr in domain:
-            utxos = self.get_addr_utxo(addr)
-            for utxo in utxos.values():
-                if confirmed_only and utxo.block_height <= 0:
-                    continue
-                if nonlocal_only and utxo.block_height == TX_HEIGHT_LOCAL:
-                    continue
-                if (mature_only and utxo.is_coinbase_output()
-                        and utxo.block_height + COINBASE_MATURITY > mempool_height):
-                    continue
-                coins.append(utxo)
+        for prevout_str, coin in items:
+            if confirmed_only and coin.height <= 0:
+                continue
+            if nonlocal_only and coin.height == TX_HEIGHT_LOCAL:
+                continue
+            if (mature_only and coin.is_coinbase
+                    and coin.height + COINBASE_MATURITY > mempool_height):
                 continue
+            coins.append(self._coin_to_txin(prevout_str, coin))
         return coins
 
     def get_balance(self, domain=None, *, excluded_addresses: Set[str] = None,
@@ -207,15 +207,11 @@ def int_to_hex(i: int, length: int=1) -> str:
     """
     if not isinstance(i, int):
         raise TypeError('{} instead of int'.format(i))
-    range_size = pow(256, length)
-    if i < -(range_size//2) or i >= range_size:
-        raise OverflowError('cannot convert int {} to hex ({} bytes)'.format(i, length))
-    if i < 0:
-        # two's complement
-        i = range_size + i
-    s = hex(i)[2:].rstrip('L')
-    s = "0"*(2*length - len(s)) + s
-    return rev_hex(s)
+    try:
+        # negative numbers are encoded as two's complement
+        return i.to_bytes(length, byteorder='little', signed=i < 0).hex()
+    except OverflowError:
+        raise OverflowError('cannot convert int {} to hex ({} bytes)'.format(i, length)) from None
 
 def script_num_to_hex(i: int) -> str:
     """See CScriptNum in Bitcoin Core.
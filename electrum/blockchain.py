@@ -21,9 +21,12 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import os
+import hashlib
+import json
+import mmap
 import threading
 import time
-from typing import Optional, Dict, Mapping, Sequence
+from typing import Optional, Dict, Mapping, Sequence, Tuple
 
 from . import util
 from .bitcoin import hash_encode, int_to_hex, rev_hex
@@ -101,11 +104,14 @@ def read_blockchains(config: 'SimpleConfig'):
         header_after_cp = best_chain.read_header(constants.net.max_checkpoint()+1)
         if not header_after_cp or not best_chain.can_connect(header_after_cp, check_height=False):
             _logger.info("[blockchain] deleting best chain. cannot connect header after last cp to last cp.")
+            best_chain.close_mmap()
             os.unlink(best_chain.path())
             best_chain.update_size()
+    _read_chainwork_cache(config)
     # forks
     fdir = os.path.join(util.get_headers_dir(config), 'forks')
     util.make_dir(fdir)
+    fork_index = _read_fork_index(config)
     # files are named as: fork2_{forkpoint}_{prev_hash}_{first_hash}
     l = filter(lambda x: x.startswith('fork2_') and '.' not in x, os.listdir(fdir))
     l = sorted(l, key=lambda x: int(x.split('_')[1]))  # sort by forkpoint
@@ -124,31 +130,85 @@ def read_blockchains(config: 'SimpleConfig'):
             delete_chain(filename, "deleting fork below max checkpoint")
             return
         # find parent (sorting by forkpoint guarantees it's already instantiated)
-        for parent in blockchains.values():
-            if parent.check_hash(forkpoint - 1, prev_hash):
-                break
-        else:
-            delete_chain(filename, "cannot find parent for chain")
-            return
+        entry = fork_index.get(filename)
+        parent = blockchains.get(entry['parent']) if entry else None
+        if parent is None or not parent.check_hash(forkpoint - 1, prev_hash):
+            entry = None
+            for parent in blockchains.values():
+                if parent.check_hash(forkpoint - 1, prev_hash):
+                    break
+            else:
+                delete_chain(filename, "cannot find parent for chain")
+                return
         b = Blockchain(config=config,
                        forkpoint=forkpoint,
                        parent=parent,
                        forkpoint_hash=first_hash,
                        prev_hash=prev_hash)
-        # consistency checks
-        h = b.read_header(b.forkpoint)
-        if first_hash != hash_header(h):
-            delete_chain(filename, "incorrect first hash for chain")
-            return
-        if not b.parent.can_connect(h, check_height=False):
-            delete_chain(filename, "cannot connect chain to parent")
-            return
+        # consistency checks, unless the file is as we left it
+        if not entry or entry['forkpoint'] != forkpoint or entry['tip'] != b.height():
+            h = b.read_header(b.forkpoint)
+            if first_hash != hash_header(h):
+                # reading mapped the file, which must be unmapped before it can be deleted
+                b.close_mmap()
+                delete_chain(filename, "incorrect first hash for chain")
+                return
+            if not b.parent.can_connect(h, check_height=False):
+                b.close_mmap()
+                delete_chain(filename, "cannot connect chain to parent")
+                return
         chain_id = b.get_id()
         assert first_hash == chain_id, (first_hash, chain_id)
         blockchains[chain_id] = b
 
     for filename in l:
         instantiate_chain(filename)
+    write_fork_index(config)
+
+
+def _get_fork_index_path(config: 'SimpleConfig') -> str:
+    return os.path.join(util.get_headers_dir(config), 'fork_index.json')
+
+
+def _read_fork_index(config: 'SimpleConfig') -> Dict[str, dict]:
+    """Returns the fork index written by write_fork_index,
+    or an empty one if it is missing or invalid.
+    """
+    try:
+        with open(_get_fork_index_path(config), 'r', encoding='utf-8') as f:
+            fork_index = json.loads(f.read())
+        for filename, entry in fork_index.items():
+            if not (isinstance(entry.get('parent'), str)
+                    and isinstance(entry.get('forkpoint'), int)
+                    and isinstance(entry.get('tip'), int)):
+                raise Exception(f'invalid entry for {filename}')
+        return fork_index
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        _logger.info(f"[blockchain] ignoring fork index: {repr(e)}")
+        return {}
+
+
+def write_fork_index(config: 'SimpleConfig') -> None:
+    """Records the parent, forkpoint and tip of each fork, keyed by filename,
+    so that read_blockchains does not need to search for the parent of forks
+    and re-check them at startup.
+    """
+    with blockchains_lock:
+        chains = [b for b in blockchains.values() if b.parent is not None]
+    fork_index = {os.path.basename(b.path()): {'parent': b.parent.get_id(),
+                                               'forkpoint': b.forkpoint,
+                                               'tip': b.height()}
+                  for b in chains}
+    path = _get_fork_index_path(config)
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(fork_index, indent=4, sort_keys=True))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        _logger.info(f"[blockchain] failed to write fork index: {repr(e)}")
 
 
 def get_best_chain() -> 'Blockchain':
@@ -158,6 +218,41 @@ def get_best_chain() -> 'Blockchain':
 _CHAINWORK_CACHE = {
     "0000000000000000000000000000000000000000000000000000000000000000": 0,  # virtual block at height -1
 }  # type: Dict[str, int]
+# The entries for chunk boundaries are also appended to a file, as records
+# of the block hash (32 bytes) and the chain work (32 bytes, big-endian).
+_CHAINWORK_RECORD_SIZE = 64
+_chainwork_file_lock = threading.Lock()
+
+
+def _get_chainwork_cache_path(config: 'SimpleConfig') -> str:
+    return os.path.join(util.get_headers_dir(config), 'chainwork')
+
+
+def _read_chainwork_cache(config: 'SimpleConfig') -> None:
+    path = _get_chainwork_cache_path(config)
+    with _chainwork_file_lock:
+        try:
+            with open(path, 'rb+') as f:
+                data = f.read()
+                num_records = len(data) // _CHAINWORK_RECORD_SIZE
+                if len(data) != num_records * _CHAINWORK_RECORD_SIZE:
+                    # partially written record, so that we append after the last full one
+                    f.truncate(num_records * _CHAINWORK_RECORD_SIZE)
+        except FileNotFoundError:
+            return
+    for i in range(num_records):
+        record = data[i * _CHAINWORK_RECORD_SIZE:(i + 1) * _CHAINWORK_RECORD_SIZE]
+        _CHAINWORK_CACHE[record[:32].hex()] = int.from_bytes(record[32:], byteorder='big')
+
+
+def _save_chainwork_cache_items(config: 'SimpleConfig', items: Sequence[Tuple[str, int]]) -> None:
+    data = b''.join(bfh(block_hash) + chainwork.to_bytes(32, byteorder='big')
+                    for block_hash, chainwork in items)
+    try:
+        with _chainwork_file_lock, open(_get_chainwork_cache_path(config), 'ab') as f:
+            f.write(data)
+    except OSError as e:
+        _logger.info(f"[blockchain] failed to save chainwork: {repr(e)}")
 
 
 def init_headers_file_for_best_chain():
@@ -193,6 +288,14 @@ class Blockchain(Logger):
         self._forkpoint_hash = forkpoint_hash  # blockhash at forkpoint. "first hash"
         self._prev_hash = prev_hash  # blockhash immediately before forkpoint
         self.lock = threading.RLock()
+        self._mmap = None  # type: Optional[mmap.mmap]  # of our headers file, opened lazily
+        # Index of block hashes, filled as they are looked up or written.
+        # It covers our own headers above the max checkpoint: entry i is for
+        # height index_base + i, and is only valid if _hash_known[i] is set.
+        # Hashes are stored in display byte order (i.e. hex is the block hash).
+        self._hashes = bytearray()
+        self._hash_known = bytearray()
+        self._height_by_hash = {}  # type: Dict[str, int]
         self.update_size()
 
     def with_lock(func):
@@ -281,6 +384,7 @@ class Blockchain(Logger):
         chain_id = self.get_id()
         with blockchains_lock:
             blockchains[chain_id] = self
+        write_fork_index(self.config)
         return self
 
     @with_lock
@@ -295,6 +399,88 @@ class Blockchain(Logger):
     def update_size(self) -> None:
         p = self.path()
         self._size = os.path.getsize(p)//HEADER_SIZE if os.path.exists(p) else 0
+        # the file might have been replaced or truncated
+        self.close_mmap()
+
+    @with_lock
+    def close_mmap(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    @with_lock
+    def _get_mmap(self) -> Optional[mmap.mmap]:
+        if self._mmap is None and self._size > 0:
+            filename = self.path()
+            self.assert_headers_file_available(filename)
+            with open(filename, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), self._size * HEADER_SIZE, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    @with_lock
+    def _read_raw_headers(self, delta: int, count: int) -> bytes:
+        """Returns `count` headers of our file, starting at `delta` headers after our forkpoint."""
+        assert 0 <= delta and delta + count <= self._size, (delta, count, self._size)
+        m = self._get_mmap()
+        if m is None:
+            return b''
+        return m[delta * HEADER_SIZE:(delta + count) * HEADER_SIZE]
+
+    def _index_base(self) -> int:
+        return max(self.forkpoint, constants.net.max_checkpoint() + 1)
+
+    @with_lock
+    def _clear_hash_index(self, from_height: int = None) -> None:
+        start = max(0, from_height - self._index_base()) if from_height is not None else 0
+        for i in range(start, len(self._hash_known)):
+            if self._hash_known[i]:
+                self._height_by_hash.pop(self._hashes[i * 32:(i + 1) * 32].hex(), None)
+        del self._hash_known[start:]
+        del self._hashes[start * 32:]
+
+    @with_lock
+    def _index_hash(self, height: int, header_hash: bytes) -> None:
+        i = height - self._index_base()
+        if i < 0:
+            return
+        if i >= len(self._hash_known):
+            missing = i + 1 - len(self._hash_known)
+            self._hash_known.extend(bytes(missing))
+            self._hashes.extend(bytes(32 * missing))
+        self._hash_known[i] = 1
+        self._hashes[i * 32:(i + 1) * 32] = header_hash
+        self._height_by_hash[header_hash.hex()] = height
+
+    @with_lock
+    def _get_hash_from_file(self, height: int) -> str:
+        if height < self.forkpoint:
+            return self.parent._get_hash_from_file(height)
+        i = height - self._index_base()
+        if 0 <= i < len(self._hash_known) and self._hash_known[i]:
+            return self._hashes[i * 32:(i + 1) * 32].hex()
+        if height > self.height():
+            raise MissingHeader(height)
+        raw = self._read_raw_headers(height - self.forkpoint, 1)
+        if raw == bytes(HEADER_SIZE):
+            raise MissingHeader(height)
+        header_hash = sha256d(raw)[::-1]
+        self._index_hash(height, header_hash)
+        return header_hash.hex()
+
+    def get_height_of_hash(self, header_hash: str) -> Optional[int]:
+        """Returns the height of the given block hash in this chain, if it
+        is in the hash index (see get_hash). Headers below the max
+        checkpoint are not indexed."""
+        chain = self
+        max_height = None  # heights above are in a child chain
+        while chain is not None:
+            with chain.lock:
+                height = chain._height_by_hash.get(header_hash)
+                if height is not None and height >= chain.forkpoint \
+                        and (max_height is None or height <= max_height):
+                    return height
+                max_height, chain = chain.forkpoint - 1, chain.parent
+        return None
 
     @classmethod
     def verify_header(cls, header: dict, prev_hash: str, target: int, expected_header_hash: str=None) -> None:
@@ -313,20 +499,45 @@ class Blockchain(Logger):
             raise Exception(f"insufficient proof of work: {block_hash_as_num} vs target {target}")
 
     def verify_chunk(self, index: int, data: bytes) -> None:
+        """Verifies a chunk of headers, as verify_header would for each of
+        them, working on the raw bytes instead of deserialized headers.
+        """
         num = len(data) // HEADER_SIZE
         start_height = index * 2016
-        prev_hash = self.get_hash(start_height - 1)
+        prev_hash = bfh(self.get_hash(start_height - 1))[::-1]  # in serialization order
         target = self.get_target(index-1)
+        check_pow = not constants.net.TESTNET
+        if check_pow:
+            # all headers in a chunk have the same target
+            bits = self.target_to_bits(target)
+            bits_bytes = bits.to_bytes(4, byteorder='little')
+        # we only compare with headers we have, and checkpoints
+        max_height_with_expected_hash = max(self.height(), constants.net.max_checkpoint())
+        view = memoryview(data)
+        sha256 = hashlib.sha256
         for i in range(num):
             height = start_height + i
-            try:
-                expected_header_hash = self.get_hash(height)
-            except MissingHeader:
-                expected_header_hash = None
-            raw_header = data[i*HEADER_SIZE : (i+1)*HEADER_SIZE]
-            header = deserialize_header(raw_header, index*2016 + i)
-            self.verify_header(header, prev_hash, target, expected_header_hash)
-            prev_hash = hash_header(header)
+            raw_header = view[i*HEADER_SIZE : (i+1)*HEADER_SIZE]
+            _hash = sha256(sha256(raw_header).digest()).digest()
+            if height <= max_height_with_expected_hash:
+                try:
+                    expected_header_hash = self.get_hash(height)
+                except MissingHeader:
+                    expected_header_hash = None
+                if expected_header_hash and bfh(expected_header_hash)[::-1] != _hash:
+                    raise Exception("hash mismatches with expected: {} vs {}"
+                                    .format(expected_header_hash, hash_encode(_hash)))
+            if raw_header[4:36] != prev_hash:
+                raise Exception("prev hash mismatch: %s vs %s"
+                                % (hash_encode(prev_hash), hash_encode(bytes(raw_header[4:36]))))
+            if check_pow:
+                if raw_header[72:76] != bits_bytes:
+                    raise Exception("bits mismatch: %s vs %s"
+                                    % (bits, int.from_bytes(raw_header[72:76], byteorder='little')))
+                block_hash_as_num = int.from_bytes(_hash, byteorder='little')
+                if block_hash_as_num > target:
+                    raise Exception(f"insufficient proof of work: {block_hash_as_num} vs target {target}")
+            prev_hash = _hash
 
     @with_lock
     def path(self):
@@ -378,6 +589,10 @@ class Blockchain(Logger):
                 for old_sibling in old_parent.get_direct_children():
                     if self.check_hash(old_sibling.forkpoint - 1, old_sibling._prev_hash):
                         old_sibling.parent = self
+            # forks were swapped. tips are not indexed on each header, as
+            # a fork whose tip is outdated is merely re-checked at startup
+            if cnt > 0:
+                write_fork_index(self.config)
 
     def _swap_with_parent(self) -> bool:
         """Check if this chain became stronger than its parent, and swap
@@ -399,14 +614,11 @@ class Blockchain(Logger):
         # parent's new name will be something new (not child's old name)
         self.assert_headers_file_available(self.path())
         child_old_name = self.path()
-        with open(self.path(), 'rb') as f:
-            my_data = f.read()
+        my_data = self._read_raw_headers(0, self.size())
         self.assert_headers_file_available(parent.path())
         assert forkpoint > parent.forkpoint, (f"forkpoint of parent chain ({parent.forkpoint}) "
                                               f"should be at lower height than children's ({forkpoint})")
-        with open(parent.path(), 'rb') as f:
-            f.seek((forkpoint - parent.forkpoint)*HEADER_SIZE)
-            parent_data = f.read(parent_branch_size*HEADER_SIZE)
+        parent_data = parent._read_raw_headers(forkpoint - parent.forkpoint, parent_branch_size)
         self.write(parent_data, 0)
         parent.write(my_data, (forkpoint - parent.forkpoint)*HEADER_SIZE)
         # swap parameters
@@ -418,6 +630,9 @@ class Blockchain(Logger):
         os.replace(child_old_name, parent.path())
         self.update_size()
         parent.update_size()
+        # the files were swapped, so were the indexed headers
+        self._clear_hash_index()
+        parent._clear_hash_index()
         # update pointers
         blockchains.pop(child_old_id, None)
         blockchains.pop(parent_old_id, None)
@@ -440,6 +655,10 @@ class Blockchain(Logger):
     def write(self, data: bytes, offset: int, truncate: bool=True) -> None:
         filename = self.path()
         self.assert_headers_file_available(filename)
+        # a mapped file cannot be truncated on some platforms
+        self.close_mmap()
+        first_height = self.forkpoint + offset // HEADER_SIZE
+        self._clear_hash_index(from_height=first_height)
         with open(filename, 'rb+') as f:
             if truncate and offset != self._size * HEADER_SIZE:
                 f.seek(offset)
@@ -449,6 +668,12 @@ class Blockchain(Logger):
             f.flush()
             os.fsync(f.fileno())
         self.update_size()
+        # index the headers we just wrote
+        index_base = self._index_base()
+        for i in range(max(0, index_base - first_height), len(data) // HEADER_SIZE):
+            raw = data[i * HEADER_SIZE:(i + 1) * HEADER_SIZE]
+            if raw != bytes(HEADER_SIZE):
+                self._index_hash(first_height + i, sha256d(raw)[::-1])
 
     @with_lock
     def save_header(self, header: dict) -> None:
@@ -469,13 +694,9 @@ class Blockchain(Logger):
         if height > self.height():
             return
         delta = height - self.forkpoint
-        name = self.path()
-        self.assert_headers_file_available(name)
-        with open(name, 'rb') as f:
-            f.seek(delta * HEADER_SIZE)
-            h = f.read(HEADER_SIZE)
-            if len(h) < HEADER_SIZE:
-                raise Exception('Expected to read a full header. This was only {} bytes'.format(len(h)))
+        h = self._read_raw_headers(delta, 1)
+        if len(h) < HEADER_SIZE:
+            raise Exception('Expected to read a full header. This was only {} bytes'.format(len(h)))
         if h == bytes([0])*HEADER_SIZE:
             return None
         return deserialize_header(h, height)
@@ -513,11 +734,10 @@ class Blockchain(Logger):
             index = height // 2016
             h, t = self.checkpoints[index]
             return h
+        elif height < 0:
+            raise MissingHeader(height)
         else:
-            header = self.read_header(height)
-            if header is None:
-                raise MissingHeader(height)
-            return hash_header(header)
+            return self._get_hash_from_file(height)
 
     def get_target(self, index: int) -> int:
         # compute target from chunk x, used in chunk x+1
@@ -588,12 +808,17 @@ class Blockchain(Logger):
             cached_height -= 2016
         assert cached_height >= -1, cached_height
         running_total = _CHAINWORK_CACHE[self.get_hash(cached_height)]
+        new_items = []
         while cached_height < last_retarget:
             cached_height += 2016
             work_in_single_header = self.chainwork_of_header_at_height(cached_height)
             work_in_chunk = 2016 * work_in_single_header
             running_total += work_in_chunk
-            _CHAINWORK_CACHE[self.get_hash(cached_height)] = running_total
+            block_hash = self.get_hash(cached_height)
+            _CHAINWORK_CACHE[block_hash] = running_total
+            new_items.append((block_hash, running_total))
+        if new_items:
+            _save_chainwork_cache_items(self.config, new_items)
         cached_height += 2016
         work_in_single_header = self.chainwork_of_header_at_height(cached_height)
         work_in_last_partial_chunk = (height % 2016 + 1) * work_in_single_header
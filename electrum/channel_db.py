@@ -26,6 +26,7 @@
 import time
 import random
 import os
+import struct
 from collections import defaultdict
 from typing import Sequence, List, Tuple, Optional, Dict, NamedTuple, TYPE_CHECKING, Set
 import binascii
@@ -43,6 +44,7 @@ from .lnutil import (LNPeerAddr, format_short_channel_id, ShortChannelID,
                      validate_features, IncompatibleOrInsaneFeatures)
 from .lnverifier import LNChannelVerifier, verify_sig_for_channel_update
 from .lnmsg import decode_msg
+from .lngraph import ChannelGraph
 
 if TYPE_CHECKING:
     from .network import Network
@@ -212,6 +214,139 @@ class CategorizedChannelUpdates(NamedTuple):
     good: List        # good updates
 
 
+class DBChangeKind(IntEnum):
+    CHANNEL = 0
+    POLICY  = 1
+    NODE    = 2
+    ADDRESS = 3
+
+
+# Snapshot of the decoded in-memory graph, so that startup does not have to decode
+# every gossip message stored in the database. The snapshot is tied to a database
+# by db_id, and to a point in its changelog by generation: changes logged after that
+# generation are replayed from the database on load.
+SNAPSHOT_MAGIC = b'GSNP'
+SNAPSHOT_VERSION = 1
+
+_snapshot_header = struct.Struct('<4sH16sQ')  # magic, version, db_id, generation
+_snapshot_count = struct.Struct('<I')
+_snapshot_channel = struct.Struct('<8s33s33sq')  # scid, node1_id, node2_id, capacity_sat (-1: None)
+_snapshot_policy = struct.Struct('<41sHQQIIBBI')  # key, ..., htlc_maximum_msat (2**64-1: None), ...
+_snapshot_node = struct.Struct('<33sIH')  # node_id, timestamp, len(features); then features, len(alias), alias
+_snapshot_address = struct.Struct('<33sHIH')  # node_id, port, timestamp, len(host); then host
+_snapshot_length = struct.Struct('<H')
+
+_NO_HTLC_MAXIMUM = 2**64 - 1
+
+
+class GraphSnapshot(NamedTuple):
+    db_id: bytes
+    generation: int
+    channels: List[ChannelInfo]
+    policies: List[Policy]
+    nodes: List[NodeInfo]
+    addresses: List[Tuple[bytes, str, int, int]]  # node_id, host, port, timestamp
+
+    def serialize(self) -> bytes:
+        parts = [_snapshot_header.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.db_id, self.generation)]
+        parts.append(_snapshot_count.pack(len(self.channels)))
+        for ci in self.channels:
+            capacity_sat = ci.capacity_sat if ci.capacity_sat is not None else -1
+            parts.append(_snapshot_channel.pack(ci.short_channel_id, ci.node1_id, ci.node2_id, capacity_sat))
+        parts.append(_snapshot_count.pack(len(self.policies)))
+        for p in self.policies:
+            htlc_maximum_msat = p.htlc_maximum_msat if p.htlc_maximum_msat is not None else _NO_HTLC_MAXIMUM
+            parts.append(_snapshot_policy.pack(
+                p.key, p.cltv_expiry_delta, p.htlc_minimum_msat, htlc_maximum_msat, p.fee_base_msat,
+                p.fee_proportional_millionths, p.channel_flags, p.message_flags, p.timestamp))
+        parts.append(_snapshot_count.pack(len(self.nodes)))
+        for n in self.nodes:
+            features = n.features.to_bytes((n.features.bit_length() + 7) // 8, 'big')
+            alias = n.alias.encode('utf8')
+            parts.append(_snapshot_node.pack(n.node_id, n.timestamp, len(features)))
+            parts.append(features)
+            parts.append(_snapshot_length.pack(len(alias)))
+            parts.append(alias)
+        parts.append(_snapshot_count.pack(len(self.addresses)))
+        for node_id, host, port, timestamp in self.addresses:
+            host = host.encode('utf8')
+            parts.append(_snapshot_address.pack(node_id, port, timestamp, len(host)))
+            parts.append(host)
+        return b''.join(parts)
+
+    @staticmethod
+    def deserialize(data: bytes) -> 'GraphSnapshot':
+        """Raises ValueError or struct.error if data is not a valid snapshot."""
+        data = memoryview(data)
+        magic, version, db_id, generation = _snapshot_header.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError('unknown snapshot format')
+        offset = _snapshot_header.size
+
+        def read_count():
+            nonlocal offset
+            count, = _snapshot_count.unpack_from(data, offset)
+            offset += _snapshot_count.size
+            return count
+
+        def read_bytes(n):
+            nonlocal offset
+            if offset + n > len(data):
+                raise ValueError('truncated snapshot')
+            b = bytes(data[offset:offset+n])
+            offset += n
+            return b
+
+        channels = []
+        for i in range(read_count()):
+            scid, node1_id, node2_id, capacity_sat = _snapshot_channel.unpack_from(data, offset)
+            offset += _snapshot_channel.size
+            channels.append(ChannelInfo(
+                short_channel_id=ShortChannelID(scid),
+                node1_id=node1_id,
+                node2_id=node2_id,
+                capacity_sat=capacity_sat if capacity_sat >= 0 else None))
+        policies = []
+        for i in range(read_count()):
+            (key, cltv_expiry_delta, htlc_minimum_msat, htlc_maximum_msat, fee_base_msat,
+             fee_proportional_millionths, channel_flags, message_flags, timestamp) = _snapshot_policy.unpack_from(data, offset)
+            offset += _snapshot_policy.size
+            policies.append(Policy(
+                key=key,
+                cltv_expiry_delta=cltv_expiry_delta,
+                htlc_minimum_msat=htlc_minimum_msat,
+                htlc_maximum_msat=htlc_maximum_msat if htlc_maximum_msat != _NO_HTLC_MAXIMUM else None,
+                fee_base_msat=fee_base_msat,
+                fee_proportional_millionths=fee_proportional_millionths,
+                channel_flags=channel_flags,
+                message_flags=message_flags,
+                timestamp=timestamp))
+        nodes = []
+        for i in range(read_count()):
+            node_id, timestamp, features_len = _snapshot_node.unpack_from(data, offset)
+            offset += _snapshot_node.size
+            features = int.from_bytes(read_bytes(features_len), 'big')
+            alias_len, = _snapshot_length.unpack_from(data, offset)
+            offset += _snapshot_length.size
+            alias = read_bytes(alias_len).decode('utf8')
+            nodes.append(NodeInfo(node_id=node_id, features=features, timestamp=timestamp, alias=alias))
+        addresses = []
+        for i in range(read_count()):
+            node_id, port, timestamp, host_len = _snapshot_address.unpack_from(data, offset)
+            offset += _snapshot_address.size
+            host = read_bytes(host_len).decode('utf8')
+            addresses.append((node_id, host, port, timestamp))
+        if offset != len(data):
+            raise ValueError('trailing data in snapshot')
+        return GraphSnapshot(
+            db_id=db_id,
+            generation=generation,
+            channels=channels,
+            policies=policies,
+            nodes=nodes,
+            addresses=addresses)
+
+
 create_channel_info = """
 CREATE TABLE IF NOT EXISTS channel_info (
 short_channel_id BLOB(8),
@@ -242,13 +377,32 @@ msg BLOB,
 PRIMARY KEY(node_id)
 )"""
 
+create_meta = """
+CREATE TABLE IF NOT EXISTS meta (
+key STRING(32),
+value BLOB,
+PRIMARY KEY(key)
+)"""
+
+# every write to the tables above is logged here, see GraphSnapshot
+create_changelog = """
+CREATE TABLE IF NOT EXISTS changelog (
+seq INTEGER PRIMARY KEY AUTOINCREMENT,
+kind INTEGER NOT NULL,
+key BLOB
+)"""
+
 
 class ChannelDB(SqlDB):
 
     NUM_MAX_RECENT_PEERS = 20
+    SNAPSHOT_INTERVAL = 600  # seconds
 
     def __init__(self, network: 'Network'):
         path = os.path.join(get_headers_dir(network.config), 'gossip_db')
+        self.snapshot_path = path + '.snapshot'
+        self._db_id = None  # type: Optional[bytes]  # set in create_database
+        self._snapshot_generation = None  # type: Optional[int]
         super().__init__(network.asyncio_loop, path, commit_interval=100)
         self.lock = threading.RLock()
         self.num_nodes = 0
@@ -263,7 +417,7 @@ class ChannelDB(SqlDB):
         self._nodes = {}  # type: Dict[bytes, NodeInfo]  # node_id -> NodeInfo
         # node_id -> (host, port, ts)
         self._addresses = defaultdict(set)  # type: Dict[bytes, Set[Tuple[str, int, int]]]
-        self._channels_for_node = defaultdict(set)  # type: Dict[bytes, Set[ShortChannelID]]
+        self.graph = ChannelGraph()  # routing view of _channels and _policies
         self._recent_peers = []  # type: List[bytes]  # list of node_ids
         self._chans_with_0_policies = set()  # type: Set[ShortChannelID]
         self._chans_with_1_policies = set()  # type: Set[ShortChannelID]
@@ -358,8 +512,7 @@ class ChannelDB(SqlDB):
         channel_info = channel_info._replace(capacity_sat=capacity_sat)
         with self.lock:
             self._channels[channel_info.short_channel_id] = channel_info
-            self._channels_for_node[channel_info.node1_id].add(channel_info.short_channel_id)
-            self._channels_for_node[channel_info.node2_id].add(channel_info.short_channel_id)
+            self._add_channel_to_graph(channel_info)
         self._update_num_policies_for_chan(channel_info.short_channel_id)
         if 'raw' in msg:
             self._db_save_channel(channel_info.short_channel_id, msg['raw'])
@@ -426,6 +579,7 @@ class ChannelDB(SqlDB):
         policy = Policy.from_msg(payload)
         with self.lock:
             self._policies[key] = policy
+            self.graph.set_policy(policy)
         self._update_num_policies_for_chan(short_channel_id)
         if 'raw' in payload:
             self._db_save_policy(policy.key, payload['raw'])
@@ -467,42 +621,70 @@ class ChannelDB(SqlDB):
         c.execute(create_address)
         c.execute(create_policy)
         c.execute(create_channel_info)
+        c.execute(create_meta)
+        c.execute(create_changelog)
+        c.execute("SELECT value FROM meta WHERE key='db_id'")
+        r = c.fetchone()
+        if r is None:
+            self._db_id = os.urandom(16)
+            c.execute("INSERT INTO meta (key, value) VALUES ('db_id', ?)", (self._db_id,))
+        else:
+            self._db_id = bytes(r[0])
+        c.execute("SELECT value FROM meta WHERE key='snapshot_generation'")
+        r = c.fetchone()
+        self._snapshot_generation = int(r[0]) if r is not None else None
         self.conn.commit()
 
+    def _db_log_change(self, kind: DBChangeKind, key: bytes):
+        c = self.conn.cursor()
+        c.execute("INSERT INTO changelog (kind, key) VALUES (?,?)", (int(kind), key))
+
+    def _db_get_generation(self) -> int:
+        c = self.conn.cursor()
+        c.execute("SELECT seq FROM sqlite_sequence WHERE name='changelog'")
+        r = c.fetchone()
+        return int(r[0]) if r is not None else 0
+
     @sql
     def _db_save_policy(self, key: bytes, msg: bytes):
         # 'msg' is a 'channel_update' message
         c = self.conn.cursor()
         c.execute("""REPLACE INTO policy (key, msg) VALUES (?,?)""", [key, msg])
+        self._db_log_change(DBChangeKind.POLICY, key)
 
     @sql
     def _db_delete_policy(self, node_id: bytes, short_channel_id: ShortChannelID):
         key = short_channel_id + node_id
         c = self.conn.cursor()
         c.execute("""DELETE FROM policy WHERE key=?""", (key,))
+        self._db_log_change(DBChangeKind.POLICY, key)
 
     @sql
     def _db_save_channel(self, short_channel_id: ShortChannelID, msg: bytes):
         # 'msg' is a 'channel_announcement' message
         c = self.conn.cursor()
         c.execute("REPLACE INTO channel_info (short_channel_id, msg) VALUES (?,?)", [short_channel_id, msg])
+        self._db_log_change(DBChangeKind.CHANNEL, short_channel_id)
 
     @sql
     def _db_delete_channel(self, short_channel_id: ShortChannelID):
         c = self.conn.cursor()
         c.execute("""DELETE FROM channel_info WHERE short_channel_id=?""", (short_channel_id,))
+        self._db_log_change(DBChangeKind.CHANNEL, short_channel_id)
 
     @sql
     def _db_save_node_info(self, node_id: bytes, msg: bytes):
         # 'msg' is a 'node_announcement' message
         c = self.conn.cursor()
         c.execute("REPLACE INTO node_info (node_id, msg) VALUES (?,?)", [node_id, msg])
+        self._db_log_change(DBChangeKind.NODE, node_id)
 
     @sql
     def _db_save_node_address(self, peer: LNPeerAddr, timestamp: int):
         c = self.conn.cursor()
         c.execute("REPLACE INTO address (node_id, host, port, timestamp) VALUES (?,?,?,?)",
                   (peer.pubkey, peer.host, peer.port, timestamp))
+        self._db_log_change(DBChangeKind.ADDRESS, peer.pubkey)
 
     @sql
     def _db_save_node_addresses(self, node_addresses: Sequence[LNPeerAddr]):
@@ -512,6 +694,7 @@ class ChannelDB(SqlDB):
             r = c.fetchall()
             if r == []:
                 c.execute("INSERT INTO address (node_id, host, port, timestamp) VALUES (?,?,?,?)", (addr.pubkey, addr.host, addr.port, 0))
+                self._db_log_change(DBChangeKind.ADDRESS, addr.pubkey)
 
     def verify_channel_update(self, payload):
         short_channel_id = payload['short_channel_id']
@@ -533,7 +716,7 @@ class ChannelDB(SqlDB):
                 continue
             node_id = node_info.node_id
             # Ignore node if it has no associated channel (DoS protection)
-            if node_id not in self._channels_for_node:
+            if not self.graph.has_channels(node_id):
                 #self.logger.info('ignoring orphan node_announcement')
                 continue
             node = self._nodes.get(node_id)
@@ -568,6 +751,7 @@ class ChannelDB(SqlDB):
                 node_id, scid = key
                 with self.lock:
                     self._policies.pop(key)
+                    self.graph.remove_policy(scid, node_id)
                 self._db_delete_policy(*key)
                 self._update_num_policies_for_chan(scid)
             self.update_counts()
@@ -592,10 +776,8 @@ class ChannelDB(SqlDB):
     def remove_channel(self, short_channel_id: ShortChannelID):
         # FIXME what about rm-ing policies?
         with self.lock:
-            channel_info = self._channels.pop(short_channel_id, None)
-            if channel_info:
-                self._channels_for_node[channel_info.node1_id].remove(channel_info.short_channel_id)
-                self._channels_for_node[channel_info.node2_id].remove(channel_info.short_channel_id)
+            self._channels.pop(short_channel_id, None)
+            self.graph.remove_channel(short_channel_id)
         self._update_num_policies_for_chan(short_channel_id)
         # delete from database
         self._db_delete_channel(short_channel_id)
@@ -606,6 +788,29 @@ class ChannelDB(SqlDB):
     @sql
     @profiler
     def load_data(self):
+        if not self._load_snapshot():
+            self._load_tables()
+        def newest_ts_for_node_id(node_id):
+            newest_ts = 0
+            for host, port, ts in self._addresses[node_id]:
+                newest_ts = max(newest_ts, ts)
+            return newest_ts
+        sorted_node_ids = sorted(self._addresses.keys(), key=newest_ts_for_node_id, reverse=True)
+        self._recent_peers = sorted_node_ids[:self.NUM_MAX_RECENT_PEERS]
+        with self.lock:
+            for channel_info in self._channels.values():
+                self._add_channel_to_graph(channel_info)
+        for short_channel_id in self._channels:
+            self._update_num_policies_for_chan(short_channel_id)
+        self.logger.info(f'load data {len(self._channels)} {len(self._policies)} {self.graph.num_nodes()}')
+        self.update_counts()
+        (nchans_with_0p, nchans_with_1p, nchans_with_2p) = self.get_num_channels_partitioned_by_policy_count()
+        self.logger.info(f'num_channels_partitioned_by_policy_count. '
+                         f'0p: {nchans_with_0p}, 1p: {nchans_with_1p}, 2p: {nchans_with_2p}')
+        self.data_loaded.set()
+        util.trigger_callback('gossip_db_loaded')
+
+    def _load_tables(self):
         # Note: this method takes several seconds... mostly due to lnmsg.decode_msg being slow.
         #       I believe lnmsg (and lightning.json) will need a rewrite anyway, so instead of tweaking
         #       load_data() here, that should be done. see #6006
@@ -614,13 +819,6 @@ class ChannelDB(SqlDB):
         for x in c:
             node_id, host, port, timestamp = x
             self._addresses[node_id].add((str(host), int(port), int(timestamp or 0)))
-        def newest_ts_for_node_id(node_id):
-            newest_ts = 0
-            for host, port, ts in self._addresses[node_id]:
-                newest_ts = max(newest_ts, ts)
-            return newest_ts
-        sorted_node_ids = sorted(self._addresses.keys(), key=newest_ts_for_node_id, reverse=True)
-        self._recent_peers = sorted_node_ids[:self.NUM_MAX_RECENT_PEERS]
         c.execute("""SELECT * FROM channel_info""")
         for short_channel_id, msg in c:
             try:
@@ -640,17 +838,127 @@ class ChannelDB(SqlDB):
         for key, msg in c:
             p = Policy.from_raw_msg(key, msg)
             self._policies[(p.start_node, p.short_channel_id)] = p
-        for channel_info in self._channels.values():
-            self._channels_for_node[channel_info.node1_id].add(channel_info.short_channel_id)
-            self._channels_for_node[channel_info.node2_id].add(channel_info.short_channel_id)
-            self._update_num_policies_for_chan(channel_info.short_channel_id)
-        self.logger.info(f'load data {len(self._channels)} {len(self._policies)} {len(self._channels_for_node)}')
-        self.update_counts()
-        (nchans_with_0p, nchans_with_1p, nchans_with_2p) = self.get_num_channels_partitioned_by_policy_count()
-        self.logger.info(f'num_channels_partitioned_by_policy_count. '
-                         f'0p: {nchans_with_0p}, 1p: {nchans_with_1p}, 2p: {nchans_with_2p}')
-        self.data_loaded.set()
-        util.trigger_callback('gossip_db_loaded')
+
+    def _load_snapshot(self) -> bool:
+        """Loads the graph from the snapshot, and replays the changes logged since.
+        Returns False if there is no usable snapshot.
+        """
+        if self._snapshot_generation is None or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = GraphSnapshot.deserialize(f.read())
+        except (OSError, ValueError, struct.error) as e:
+            self.logger.info(f'cannot read gossip snapshot: {e!r}')
+            return False
+        if snapshot.db_id != self._db_id or snapshot.generation != self._snapshot_generation:
+            self.logger.info('gossip snapshot does not match database')
+            return False
+        for ci in snapshot.channels:
+            self._channels[ci.short_channel_id] = ci
+        for p in snapshot.policies:
+            self._policies[(p.start_node, p.short_channel_id)] = p
+        for node_info in snapshot.nodes:
+            self._nodes[node_info.node_id] = node_info
+        for node_id, host, port, timestamp in snapshot.addresses:
+            self._addresses[node_id].add((host, port, timestamp))
+        c = self.conn.cursor()
+        c.execute("SELECT DISTINCT kind, key FROM changelog WHERE seq > ?", (snapshot.generation,))
+        changes = c.fetchall()
+        for kind, key in changes:
+            self._replay_change(DBChangeKind(kind), bytes(key))
+        self.logger.info(f'loaded gossip snapshot, generation {snapshot.generation}, replayed {len(changes)} changes')
+        return True
+
+    def _replay_change(self, kind: DBChangeKind, key: bytes):
+        # sets the in-memory entry for key to what is currently in the database
+        c = self.conn.cursor()
+        if kind == DBChangeKind.CHANNEL:
+            short_channel_id = ShortChannelID.normalize(key)
+            c.execute("SELECT msg FROM channel_info WHERE short_channel_id=?", (key,))
+            r = c.fetchone()
+            self._channels.pop(short_channel_id, None)
+            if r is not None:
+                try:
+                    self._channels[short_channel_id] = ChannelInfo.from_raw_msg(r[0])
+                except IncompatibleOrInsaneFeatures:
+                    pass
+        elif kind == DBChangeKind.POLICY:
+            c.execute("SELECT msg FROM policy WHERE key=?", (key,))
+            r = c.fetchone()
+            if r is not None:
+                p = Policy.from_raw_msg(key, r[0])
+                self._policies[(p.start_node, p.short_channel_id)] = p
+            else:
+                self._policies.pop((key[8:], ShortChannelID.normalize(key[0:8])), None)
+        elif kind == DBChangeKind.NODE:
+            c.execute("SELECT msg FROM node_info WHERE node_id=?", (key,))
+            r = c.fetchone()
+            self._nodes.pop(key, None)
+            if r is not None:
+                try:
+                    self._nodes[key] = NodeInfo.from_raw_msg(r[0])[0]
+                except IncompatibleOrInsaneFeatures:
+                    pass
+        elif kind == DBChangeKind.ADDRESS:
+            c.execute("SELECT host, port, timestamp FROM address WHERE node_id=?", (key,))
+            addresses = {(str(host), int(port), int(timestamp or 0)) for host, port, timestamp in c}
+            self._addresses.pop(key, None)
+            if addresses:
+                self._addresses[key] = addresses
+
+    @sql
+    @profiler
+    def save_snapshot(self):
+        self._save_snapshot()
+
+    def _save_snapshot(self):
+        if not self.data_loaded.is_set():
+            # an incomplete graph must not be saved
+            return
+        generation = self._db_get_generation()
+        if generation == self._snapshot_generation:
+            return
+        # changes made in memory while we are here are logged after generation,
+        # and will be replayed from the database
+        with self.lock:
+            snapshot = GraphSnapshot(
+                db_id=self._db_id,
+                generation=generation,
+                channels=list(self._channels.values()),
+                policies=list(self._policies.values()),
+                nodes=list(self._nodes.values()),
+                addresses=[(node_id, host, port, timestamp)
+                           for node_id, addresses in self._addresses.items()
+                           for host, port, timestamp in addresses])
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(snapshot.serialize())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # if we crash before committing this, the snapshot does not match and is ignored
+        c = self.conn.cursor()
+        c.execute("REPLACE INTO meta (key, value) VALUES ('snapshot_generation', ?)", (generation,))
+        c.execute("DELETE FROM changelog WHERE seq <= ?", (generation,))
+        self.conn.commit()
+        self._snapshot_generation = generation
+        self.logger.info(f'saved gossip snapshot, generation {generation}')
+
+    def close_database(self):
+        try:
+            self._save_snapshot()
+        except Exception as e:
+            self.logger.info(f'failed to save gossip snapshot: {e!r}')
+
+    def _add_channel_to_graph(self, channel_info: ChannelInfo) -> None:
+        # needs self.lock
+        self.graph.add_channel(channel_info)
+        # policies are kept when a channel is removed
+        for node_id in (channel_info.node1_id, channel_info.node2_id):
+            policy = self._policies.get((node_id, channel_info.short_channel_id))
+            if policy is not None:
+                self.graph.set_policy(policy)
 
     def _update_num_policies_for_chan(self, short_channel_id: ShortChannelID) -> None:
         channel_info = self.get_channel_info(short_channel_id)
@@ -727,14 +1035,33 @@ class ChannelDB(SqlDB):
         """Returns the set of short channel IDs where node_id is one of the channel participants."""
         if not self.data_loaded.is_set():
             raise Exception("channelDB data not loaded yet!")
-        relevant_channels = self._channels_for_node.get(node_id) or set()
-        relevant_channels = set(relevant_channels)  # copy
+        with self.lock:
+            relevant_channels = set(self.graph.get_channels_for_node(node_id))
         # add our own channels  # TODO maybe slow?
         for chan in (my_channels.values() or []):
             if node_id in (chan.node_id, chan.get_local_pubkey()):
                 relevant_channels.add(chan.short_channel_id)
         return relevant_channels
 
+    def get_neighbours(self, node_id: bytes, *,
+                       my_channels: Dict[ShortChannelID, 'Channel'] = None) -> List[Tuple[ShortChannelID, bytes]]:
+        """Returns (short_channel_id, other_node_id) for the channels where node_id is a participant."""
+        if not self.data_loaded.is_set():
+            raise Exception("channelDB data not loaded yet!")
+        with self.lock:
+            neighbours = self.graph.get_neighbours(node_id)
+        # add our own channels
+        if my_channels:
+            public_channels = set(short_channel_id for short_channel_id, other_node_id in neighbours)
+            for chan in my_channels.values():
+                if chan.short_channel_id in public_channels:
+                    continue
+                if node_id == chan.node_id:
+                    neighbours.append((chan.short_channel_id, chan.get_local_pubkey()))
+                elif node_id == chan.get_local_pubkey():
+                    neighbours.append((chan.short_channel_id, chan.node_id))
+        return neighbours
+
     def get_endnodes_for_chan(self, short_channel_id: ShortChannelID, *,
                               my_channels: Dict[ShortChannelID, 'Channel'] = None) -> Optional[Tuple[bytes, bytes]]:
         channel_info = self.get_channel_info(short_channel_id)
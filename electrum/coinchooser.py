@@ -22,9 +22,11 @@
 # ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import time
+import random
 from collections import defaultdict
 from math import floor, log10
-from typing import NamedTuple, List, Callable, Sequence, Union, Dict, Tuple
+from typing import NamedTuple, List, Callable, Sequence, Union, Dict, Tuple, Optional
 from decimal import Decimal
 
 from .bitcoin import sha256, COIN, is_address
@@ -312,6 +314,15 @@ class CoinChooserBase(Logger):
             total_weight = self._get_tx_weight(buckets, base_weight=base_weight)
             return total_input >= spent_amount + fee_estimator_w(total_weight)
 
+        # What the selected buckets need to add up to, in effective value,
+        # and what a change output would cost. Used by choosers that
+        # search for changeless solutions (see CoinChooserBnB).
+        # note: +2 wu for the segwit marker and flag, worst case
+        self.target_effective_value = spent_amount - input_value + fee_estimator_w(base_weight + 2)
+        change_addr = change_addrs[0] if change_addrs else (coins[0].address if coins else None)
+        change_weight = 4 * Transaction.estimated_output_size(change_addr) if change_addr else 4 * 34
+        self.cost_of_change = fee_estimator_w(change_weight) + dust_threshold
+
         def tx_from_buckets(buckets):
             return self._construct_tx_from_selected_buckets(buckets=buckets,
                                                             base_tx=base_tx,
@@ -473,8 +484,142 @@ class CoinChooserPrivacy(CoinChooserRandom):
         return penalty
 
 
+class CoinChooserBnB(CoinChooserPrivacy):
+    """Looks for a set of buckets that pays for the outputs without
+    needing change, using a depth-first branch-and-bound search over the
+    effective values of the buckets, largest first. Among the solutions
+    found within the search budget, the one wasting the least is chosen,
+    the waste being the excess that goes to fees.
+    If there is none, falls back to a knapsack approximation that aims
+    for an amount leaving a usable change output.
+
+    As in CoinChooserRandom, confirmed coins are tried first.
+    """
+
+    max_tries = 100_000          # search steps; results are deterministic within this budget
+    max_seconds = 1.0            # safety net for slow machines
+    knapsack_iterations = 1000
+    knapsack_max_steps = 200_000  # bounds iterations * number of buckets
+
+    def _bnb(self, buckets: List[Bucket], target: int, cost_of_change: int) -> Optional[List[Bucket]]:
+        bkts = sorted(buckets, key=lambda b: b.effective_value, reverse=True)
+        values = [b.effective_value for b in bkts]
+        available = sum(values)  # value of the buckets not decided yet
+        if available < target:
+            return None
+        upper = target + cost_of_change
+        best, best_waste = None, None
+        selection = []  # type: List[bool]  # include/omit decision for bkts[:len(selection)]
+        value = 0
+        deadline = time.monotonic() + self.max_seconds
+        for tries in range(self.max_tries):
+            if value + available < target or value > upper \
+                    or (best_waste is not None and value - target > best_waste):
+                backtrack = True
+            elif value >= target:
+                waste = value - target
+                if best_waste is None or waste < best_waste \
+                        or (waste == best_waste and sum(selection) < sum(best)):
+                    best, best_waste = list(selection), waste
+                backtrack = True
+            else:
+                backtrack = False
+            if backtrack:
+                # undo trailing omissions, then omit the last included bucket
+                while selection and not selection[-1]:
+                    selection.pop()
+                    available += values[len(selection)]
+                if not selection:
+                    break  # search space exhausted
+                selection[-1] = False
+                value -= values[len(selection) - 1]
+            else:
+                n = len(selection)
+                available -= values[n]
+                if selection and not selection[-1] and values[n] == values[n - 1]:
+                    # including it would give the same subsets as including the previous one
+                    selection.append(False)
+                else:
+                    selection.append(True)
+                    value += values[n]
+            if tries % 1000 == 0 and time.monotonic() > deadline:
+                break
+        if best is None:
+            return None
+        return [b for b, inc in zip(bkts, best) if inc]
+
+    def _knapsack(self, buckets: List[Bucket], target: int) -> Optional[List[Bucket]]:
+        """Approximates the smallest subset with at least target effective value,
+        as in Bitcoin Core's knapsack solver: random inclusion passes over the
+        buckets smaller than target, compared with the smallest larger bucket."""
+        smaller = sorted((b for b in buckets if b.effective_value < target),
+                         key=lambda b: b.effective_value, reverse=True)
+        larger = [b for b in buckets if b.effective_value >= target]
+        lowest_larger = min(larger, key=lambda b: b.effective_value) if larger else None
+        total = sum(b.effective_value for b in smaller)
+        if total < target:
+            return [lowest_larger] if lowest_larger else None
+        values = [b.effective_value for b in smaller]
+        best_included = [True] * len(smaller)
+        best_value = total
+        # deterministic, like self.p, but cheaper per random bit
+        rnd = random.Random(self.p.get_bytes(32))
+        iterations = max(1, min(self.knapsack_iterations, self.knapsack_max_steps // len(values)))
+        for _ in range(iterations):
+            if best_value == target:
+                break
+            included = [False] * len(values)
+            value = 0
+            reached = False
+            for npass in range(2):
+                if reached:
+                    break
+                for n, v in enumerate(values):
+                    # first pass: random inclusion; second pass: include the rest
+                    if (rnd.getrandbits(1) if npass == 0 else not included[n]):
+                        value += v
+                        included[n] = True
+                        if value >= target:
+                            reached = True
+                            if value < best_value:
+                                best_value = value
+                                best_included = list(included)
+                            value -= v
+                            included[n] = False
+        if lowest_larger and lowest_larger.effective_value <= best_value:
+            return [lowest_larger]
+        return [b for b, inc in zip(smaller, best_included) if inc]
+
+    def choose_buckets(self, buckets, sufficient_funds, penalty_func):
+        target = self.target_effective_value
+        cost_of_change = self.cost_of_change
+        conf_buckets = [bkt for bkt in buckets if bkt.min_height > 0]
+        unconf_buckets = [bkt for bkt in buckets if bkt.min_height == 0]
+        tiers = [conf_buckets, conf_buckets + unconf_buckets, buckets]
+
+        def is_valid(bkts):
+            return bkts is not None and sufficient_funds(bkts, bucket_value_sum=sum(b.value for b in bkts))
+
+        for bkts in tiers:
+            selection = self._bnb(bkts, target, cost_of_change)
+            if is_valid(selection):
+                self.logger.info(f"found changeless solution with {len(selection)} buckets")
+                return penalty_func(selection)
+        for bkts in tiers:
+            # aim for enough to leave change that is worth creating
+            selection = self._knapsack(bkts, target + cost_of_change)
+            if selection is None:
+                selection = self._knapsack(bkts, target)
+            if is_valid(selection):
+                return penalty_func(strip_unneeded(selection, sufficient_funds))
+        if not sufficient_funds(buckets, bucket_value_sum=sum(b.value for b in buckets)):
+            raise NotEnoughFunds()
+        return super().choose_buckets(buckets, sufficient_funds, penalty_func)
+
+
 COIN_CHOOSERS = {
     'Privacy': CoinChooserPrivacy,
+    'BranchAndBound': CoinChooserBnB,
 }
 
 def get_name(config):
@@ -211,6 +211,7 @@ class Commands:
             'version': ELECTRUM_VERSION,
             'default_wallet': self.config.get_wallet_path(),
             'fee_per_kb': self.config.fee_per_kb(),
+            'http_connections': self.network.http_session_pool.get_stats(),
         }
         return response
 
@@ -943,6 +944,14 @@ class Commands:
             wallet.remove_transaction(tx_hash)
         wallet.save_db()
 
+    @command('w')
+    async def convert_db_to_sqlite(self, wallet: Abstract_Wallet = None):
+        """Store the wallet history in a sqlite file next to the wallet file.
+        The sqlite file is not encrypted.
+        """
+        wallet.convert_db_to_sqlite()
+        return True
+
     @command('wn')
     async def get_tx_status(self, txid, wallet: Abstract_Wallet = None):
         """Returns some information regarding the tx. For now, only confirmations.
@@ -1055,7 +1064,7 @@ class Commands:
 
     @command('n')
     async def clear_ln_blacklist(self):
-        self.network.path_finder.blacklist.clear()
+        self.network.path_finder.mission_control.clear()
 
     @command('w')
     async def list_invoices(self, wallet: Abstract_Wallet = None):
@@ -23,10 +23,13 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import os
 import base64
 import hashlib
 import functools
-from typing import Union, Tuple, Optional
+import threading
+import concurrent.futures
+from typing import Union, Tuple, Optional, Sequence, List
 from ctypes import (
     byref, c_byte, c_int, c_uint, c_char_p, c_size_t, c_void_p, create_string_buffer,
     CFUNCTYPE, POINTER, cast
@@ -521,3 +524,38 @@ class ECPrivkey(ECPubkey):
 def construct_sig65(sig_string: bytes, recid: int, is_compressed: bool) -> bytes:
     comp = 4 if is_compressed else 0
     return bytes([27 + recid + comp]) + sig_string
+
+
+# Signing many hashes (e.g. the inputs of a large transaction) is spread
+# over a thread pool. libsecp256k1 is called through ctypes, which releases
+# the GIL for the duration of each call, so the threads do run in parallel.
+# Signatures are deterministic (RFC6979), so the result does not depend on
+# how the work is split.
+PARALLEL_SIGNING_MIN_JOBS = 32
+SIGNING_THREADS = min(8, os.cpu_count() or 1)
+_signing_executor = None  # type: Optional[concurrent.futures.Executor]
+_signing_executor_lock = threading.Lock()
+
+
+def _get_signing_executor() -> concurrent.futures.Executor:
+    global _signing_executor
+    with _signing_executor_lock:
+        if _signing_executor is None:
+            _signing_executor = concurrent.futures.ThreadPoolExecutor(max_workers=SIGNING_THREADS,
+                                                                      thread_name_prefix='ecdsa_signer')
+        return _signing_executor
+
+
+def sign_transaction_hashes(jobs: Sequence[Tuple[bytes, bytes]]) -> List[bytes]:
+    """Signs (privkey_bytes, hashed_preimage) pairs, as ECPrivkey.sign_transaction,
+    returning the DER signatures in the same order.
+    """
+    def sign_chunk(chunk):
+        return [ECPrivkey(privkey_bytes).sign_transaction(msg_hash) for privkey_bytes, msg_hash in chunk]
+
+    if len(jobs) < PARALLEL_SIGNING_MIN_JOBS or SIGNING_THREADS == 1:
+        return sign_chunk(jobs)
+    chunk_size = -(-len(jobs) // SIGNING_THREADS)
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    results = _get_signing_executor().map(sign_chunk, chunks)
+    return [sig for chunk_sigs in results for sig in chunk_sigs]
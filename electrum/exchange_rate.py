@@ -16,7 +16,7 @@ from . import util
 from .bitcoin import COIN
 from .i18n import _
 from .util import (ThreadJob, make_dir, log_exceptions,
-                   make_aiohttp_session, resource_path)
+                   resource_path)
 from .network import Network
 from .simple_config import SimpleConfig
 from .logging import Logger
@@ -48,9 +48,7 @@ class ExchangeBase(Logger):
     async def get_raw(self, site, get_string):
         # APIs must have https
         url = ''.join(['https://', site, get_string])
-        network = Network.get_instance()
-        proxy = network.proxy if network else None
-        async with make_aiohttp_session(proxy) as session:
+        async with Network.http_session() as session:
             async with session.get(url) as response:
                 response.raise_for_status()
                 return await response.text()
@@ -58,9 +56,7 @@ class ExchangeBase(Logger):
     async def get_json(self, site, get_string):
         # APIs must have https
         url = ''.join(['https://', site, get_string])
-        network = Network.get_instance()
-        proxy = network.proxy if network else None
-        async with make_aiohttp_session(proxy) as session:
+        async with Network.http_session() as session:
             async with session.get(url) as response:
                 response.raise_for_status()
                 # set content_type to None to disable checking MIME type
@@ -382,7 +382,7 @@ class InstallWizard(QDialog, MessageBoxMixin, BaseWizard):
                     self.show_warning(_('The file was removed'))
                 return
             self.show()
-            self.data = json.loads(storage.read())
+            self.data = json.loads(db.dump())
             self.run(action)
             for k, v in self.data.items():
                 db.put(k, v)
@@ -6,6 +6,7 @@ import asyncio
 import base64
 from distutils.version import StrictVersion
 
+import aiohttp
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QProgressBar,
                              QHBoxLayout, QPushButton, QDialog)
@@ -14,7 +15,6 @@ from electrum import version
 from electrum import constants
 from electrum import ecc
 from electrum.i18n import _
-from electrum.util import make_aiohttp_session
 from electrum.logging import Logger
 from electrum.network import Network
 
@@ -105,8 +105,8 @@ class UpdateCheckThread(QThread, Logger):
     async def get_update_info(self):
         # note: Use long timeout here as it is not critical that we get a response fast,
         #       and it's bad not to get an update notification just because we did not wait enough.
-        async with make_aiohttp_session(proxy=self.network.proxy, timeout=120) as session:
-            async with session.get(UpdateCheck.url) as result:
+        async with Network.http_session() as session:
+            async with session.get(UpdateCheck.url, timeout=aiohttp.ClientTimeout(total=120)) as result:
                 signed_version_dict = await result.json(content_type=None)
                 # example signed_version_dict:
                 # {
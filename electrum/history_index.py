@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#
+# Electrum - lightweight Bitcoin client
+# Copyright (C) 2020 The Electrum Developers
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import bisect
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+TxPos = Tuple[float, int]  # see AddressSynchronizer.get_txpos
+
+
+class HistoryIndex:
+    """Wallet transactions sorted by position in the chain, oldest first,
+    with the running balance of the wallet after each of them.
+
+    AddressSynchronizer keeps it up to date when transactions are added
+    or removed, and when their height changes. Running balances are
+    computed lazily from the lowest position that changed, which is
+    usually close to the end of the list.
+    Not thread-safe, the caller holds a lock.
+    """
+
+    def __init__(self):
+        self._keys = []      # type: List[Tuple[float, int, str]]  # sorted (height, txpos, txid)
+        self._pos = {}       # type: Dict[str, TxPos]
+        self._deltas = {}    # type: Dict[str, int]
+        self._balances = []  # type: List[int]  # valid for self._keys[:len(self._balances)]
+
+    def load(self, items: Iterable[Tuple[str, TxPos, int]]) -> None:
+        """Fill the index from (txid, txpos, delta) tuples."""
+        self.clear()
+        for txid, txpos, delta in items:
+            self._pos[txid] = txpos
+            self._deltas[txid] = delta
+            self._keys.append((*txpos, txid))
+        self._keys.sort()
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._pos.clear()
+        self._deltas.clear()
+        self._balances.clear()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, txid):
+        return txid in self._pos
+
+    def _invalidate_from(self, idx: int) -> None:
+        del self._balances[idx:]
+
+    def _remove_key(self, txid: str) -> None:
+        key = (*self._pos[txid], txid)
+        idx = bisect.bisect_left(self._keys, key)
+        assert self._keys[idx] == key
+        del self._keys[idx]
+        self._invalidate_from(idx)
+
+    def _insert_key(self, txid: str) -> None:
+        key = (*self._pos[txid], txid)
+        idx = bisect.bisect_left(self._keys, key)
+        self._keys.insert(idx, key)
+        self._invalidate_from(idx)
+
+    def add(self, txid: str, txpos: TxPos, delta: int) -> None:
+        """Add txid, or update its position and delta."""
+        if txid in self._pos:
+            if self._pos[txid] == txpos and self._deltas[txid] == delta:
+                return
+            self._remove_key(txid)
+        self._pos[txid] = txpos
+        self._deltas[txid] = delta
+        self._insert_key(txid)
+
+    def set_position(self, txid: str, txpos: TxPos) -> None:
+        if self._pos.get(txid, txpos) == txpos:
+            return
+        self._remove_key(txid)
+        self._pos[txid] = txpos
+        self._insert_key(txid)
+
+    def remove(self, txid: str) -> None:
+        if txid not in self._pos:
+            return
+        self._remove_key(txid)
+        del self._pos[txid]
+        del self._deltas[txid]
+
+    def _update_balances(self, stop: int) -> None:
+        balances = self._balances
+        balance = balances[-1] if balances else 0
+        for i in range(len(balances), stop):
+            balance += self._deltas[self._keys[i][2]]
+            balances.append(balance)
+
+    def balance(self) -> int:
+        """Sum of all deltas."""
+        self._update_balances(len(self._keys))
+        return self._balances[-1] if self._balances else 0
+
+    def get_range(self, *, start: Optional[int] = None, stop: Optional[int] = None,
+                  from_height: Optional[int] = None,
+                  to_height: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """Returns (txid, delta, balance) tuples, oldest first.
+
+        start and stop are positions in the history, as in a slice.
+        from_height and to_height (inclusive) select by block height,
+        using the same ordering as get_txpos: unconfirmed and local
+        transactions come after all mined ones.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self._keys))
+        if from_height is not None:
+            start = max(start, bisect.bisect_left(self._keys, (from_height,)))
+        if to_height is not None:
+            stop = min(stop, bisect.bisect_left(self._keys, (to_height + 1,)))
+        if start >= stop:
+            return []
+        self._update_balances(stop)
+        return [(txid, self._deltas[txid], self._balances[i])
+                for i, (_, _, txid) in enumerate(self._keys[start:stop], start)]
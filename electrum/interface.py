@@ -29,7 +29,8 @@ import sys
 import traceback
 import asyncio
 import socket
-from typing import Tuple, Union, List, TYPE_CHECKING, Optional, Set, NamedTuple, Any
+import time
+from typing import Tuple, Union, List, TYPE_CHECKING, Optional, Set, NamedTuple, Any, Dict
 from collections import defaultdict
 from ipaddress import IPv4Network, IPv6Network, ip_address, IPv6Address, IPv4Address
 import itertools
@@ -69,6 +70,25 @@ BUCKET_NAME_OF_ONION_SERVERS = 'onion'
 
 MAX_INCOMING_MSG_SIZE = 1_000_000  # in bytes
 
+# number of header chunks requested ahead of the one being verified, see request_chunks
+HEADER_CHUNKS_IN_FLIGHT = 4
+
+# Requests for these methods, made within batch_window seconds of each other,
+# are sent together as a JSON-RPC batch request. See NotificationSession.
+BATCHABLE_METHODS = {
+    'blockchain.scripthash.subscribe',
+    'blockchain.scripthash.get_history',
+    'blockchain.transaction.get',
+    'blockchain.transaction.get_merkle',
+}
+DEFAULT_BATCH_WINDOW = 0.01  # seconds; see Interface.get_batch_window
+MAX_BATCH_SIZE = 50
+# After a failed batch, requests are sent one by one for BATCH_RETRY_DELAY,
+# doubled with each consecutive failure. Batching stays off for the rest
+# of the session once MAX_BATCH_FAILURES batches failed in a row.
+BATCH_RETRY_DELAY = 60  # seconds
+MAX_BATCH_FAILURES = 3
+
 _KNOWN_NETWORK_PROTOCOLS = {'t', 's'}
 PREFERRED_NETWORK_PROTOCOL = 's'
 assert PREFERRED_NETWORK_PROTOCOL in _KNOWN_NETWORK_PROTOCOLS
@@ -134,6 +154,11 @@ class NotificationSession(RPCSession):
         self._msg_counter = itertools.count(start=1)
         self.interface = None  # type: Optional[Interface]
         self.cost_hard_limit = 0  # disable aiorpcx resource limits
+        self.batch_window = 0  # in seconds. 0 disables batching
+        self._batch_failures = 0  # consecutive batches the server rejected or did not answer
+        self._batches_disabled_until = 0  # in time.monotonic() seconds
+        self._batch = []  # type: List[Tuple[str, List, asyncio.Future]]
+        self._batch_timer = None  # type: Optional[asyncio.TimerHandle]
 
     async def handle_request(self, request):
         self.maybe_log(f"--> {request}")
@@ -153,9 +178,96 @@ class NotificationSession(RPCSession):
             self.interface.logger.info(f"error handling request {request}. exc: {repr(e)}")
             await self.close()
 
+    @property
+    def batches_supported(self) -> bool:
+        return (self._batch_failures < MAX_BATCH_FAILURES
+                and time.monotonic() >= self._batches_disabled_until)
+
     async def send_request(self, *args, timeout=None, **kwargs):
         # note: semaphores/timeouts/backpressure etc are handled by
         # aiorpcx. the timeout arg here in most cases should not be set
+        if (self.batch_window and self.batches_supported and not kwargs
+                and len(args) == 2 and args[0] in BATCHABLE_METHODS):
+            return await self._send_request_in_batch(*args, timeout=timeout)
+        return await self._send_single_request(*args, timeout=timeout, **kwargs)
+
+    async def _send_request_in_batch(self, method: str, params: List, *, timeout=None):
+        future = asyncio.get_event_loop().create_future()
+        self._batch.append((method, params, future))
+        if len(self._batch) >= MAX_BATCH_SIZE:
+            self._send_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = asyncio.get_event_loop().call_later(self.batch_window, self._send_batch)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError as e:
+            raise RequestTimedOut(f'request timed out: {method} {params} (in batch)') from e
+
+    def _send_batch(self) -> None:
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        requests, self._batch = self._batch, []
+        if requests:
+            asyncio.ensure_future(self._send_batch_and_set_results(requests))
+
+    async def _send_batch_and_set_results(self, requests: List[Tuple[str, List, asyncio.Future]]) -> None:
+        async def send_single_request(method, params, future):
+            try:
+                result = await self._send_single_request(method, params)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+        if len(requests) == 1 or not self.batches_supported:
+            for method, params, future in requests:
+                asyncio.ensure_future(send_single_request(method, params, future))
+            return
+        msg_id = next(self._msg_counter)
+        self.maybe_log(f"<-- batch of {len(requests)} requests (id: {msg_id})")
+        try:
+            async with self.send_batch() as batch:
+                for method, params, future in requests:
+                    batch.add_request(method, params)
+        except (TaskTimeout, Exception) as e:
+            # note: TaskTimeout is a subclass of CancelledError
+            self.maybe_log(f"--> {repr(e)} (id: {msg_id})")
+            if self.is_closing():
+                for method, params, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            # the server might not support batch requests,
+            # either rejecting them or not answering them
+            self._batch_failures += 1
+            self._batches_disabled_until = time.monotonic() + BATCH_RETRY_DELAY * 2 ** (self._batch_failures - 1)
+            if self.interface:
+                self.interface.logger.info(f"batch request failed ({self._batch_failures} in a row), "
+                                           f"sending requests one by one: {repr(e)}")
+            for method, params, future in requests:
+                asyncio.ensure_future(send_single_request(method, params, future))
+        except asyncio.CancelledError:
+            for method, params, future in requests:
+                future.cancel()
+            raise
+        else:
+            self._batch_failures = 0
+            self.maybe_log(f"--> batch of {len(batch.results)} responses (id: {msg_id})")
+            for (method, params, future), result in zip(requests, batch.results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def _send_single_request(self, *args, timeout=None, **kwargs):
         msg_id = next(self._msg_counter)
         self.maybe_log(f"<-- {args} {kwargs} (id: {msg_id})")
         try:
@@ -570,22 +682,17 @@ class Interface(Logger):
         res = await self.session.send_request('blockchain.block.header', [height], timeout=timeout)
         return blockchain.deserialize_header(bytes.fromhex(res), height)
 
-    async def request_chunk(self, height: int, tip=None, *, can_return_early=False):
-        if not is_non_negative_integer(height):
-            raise Exception(f"{repr(height)} is not a block height")
-        index = height // 2016
-        if can_return_early and index in self._requested_chunks:
-            return
-        self.logger.info(f"requesting chunk from height {height}")
+    @classmethod
+    def _chunk_size(cls, index: int, tip: Optional[int]) -> int:
         size = 2016
         if tip is not None:
             size = min(size, tip - index * 2016 + 1)
             size = max(size, 0)
-        try:
-            self._requested_chunks.add(index)
-            res = await self.session.send_request('blockchain.block.headers', [index * 2016, size])
-        finally:
-            self._requested_chunks.discard(index)
+        return size
+
+    async def _fetch_chunk(self, index: int, size: int) -> str:
+        """Returns the hex of the first size headers of chunk index, unverified."""
+        res = await self.session.send_request('blockchain.block.headers', [index * 2016, size])
         assert_dict_contains_field(res, field_name='count')
         assert_dict_contains_field(res, field_name='hex')
         assert_dict_contains_field(res, field_name='max')
@@ -596,10 +703,117 @@ class Interface(Logger):
             raise RequestCorrupted('inconsistent chunk hex and count')
         if res['count'] != size:
             raise RequestCorrupted(f"expected {size} headers but only got {res['count']}")
-        conn = self.blockchain.connect_chunk(index, res['hex'])
+        return res['hex']
+
+    async def request_chunk(self, height: int, tip=None, *, can_return_early=False):
+        if not is_non_negative_integer(height):
+            raise Exception(f"{repr(height)} is not a block height")
+        index = height // 2016
+        if can_return_early and index in self._requested_chunks:
+            return
+        self.logger.info(f"requesting chunk from height {height}")
+        size = self._chunk_size(index, tip)
+        try:
+            self._requested_chunks.add(index)
+            hexdata = await self._fetch_chunk(index, size)
+        finally:
+            self._requested_chunks.discard(index)
+        conn = self.blockchain.connect_chunk(index, hexdata)
         if not conn:
             return conn, 0
-        return conn, res['count']
+        return conn, size
+
+    def _get_interfaces_for_chunks(self, tip: int) -> List['Interface']:
+        """Interfaces we can download headers up to tip from, starting with us."""
+        with self.network.interfaces_lock:
+            interfaces = list(self.network.interfaces.values())
+        return [self] + [iface for iface in interfaces
+                         if iface is not self and iface.tip >= tip
+                         and iface.session and not iface.session.is_closing()]
+
+    async def request_chunks(self, height: int, tip: int) -> Tuple[bool, int]:
+        """Like request_chunk, for all the chunks from height up to tip.
+
+        Keeps up to HEADER_CHUNKS_IN_FLIGHT requests in flight, spread over
+        the interfaces that have the headers, and connects the chunks in
+        order as they arrive. Chunks from other servers are only used if
+        their last header is the one our server has, otherwise they are
+        requested again from our server. We stop at the first chunk that
+        does not connect, dropping the ones requested after it.
+        Returns whether any chunk connected, and the number of headers
+        connected from the start of the first chunk.
+        """
+        if not is_non_negative_integer(height):
+            raise Exception(f"{repr(height)} is not a block height")
+        first_index = index = next_index = height // 2016
+        last_index = tip // 2016
+        interfaces = self._get_interfaces_for_chunks(tip)
+        self.logger.info(f"requesting chunks from height {height} to {tip}, "
+                         f"from {len(interfaces)} interfaces")
+
+        async def fetch(iface: 'Interface', index: int) -> Optional[str]:
+            size = self._chunk_size(index, tip)
+            if iface is self:
+                return await self._fetch_chunk(index, size)
+            # the other server might be on another chain: only use its chunk
+            # if our server has the same last header, to which the chunk links
+            last_header = asyncio.ensure_future(
+                self.session.send_request('blockchain.block.header', [index * 2016 + size - 1]))
+            try:
+                try:
+                    hexdata = await iface._fetch_chunk(index, size)
+                except Exception as e:
+                    self.logger.info(f"failed to get chunk {index} from {iface.server}: {repr(e)}")
+                    return None
+                if hexdata[-HEADER_SIZE * 2:] != await last_header:
+                    self.logger.info(f"chunk {index} from {iface.server} is not on our chain")
+                    return None
+                return hexdata
+            finally:
+                last_header.cancel()
+
+        pending = {}  # type: Dict[int, Tuple[Interface, asyncio.Future]]
+        num_headers = 0
+        try:
+            while index <= last_index:
+                while next_index <= last_index and len(pending) < HEADER_CHUNKS_IN_FLIGHT:
+                    iface = interfaces[(next_index - first_index) % len(interfaces)]
+                    pending[next_index] = iface, asyncio.ensure_future(fetch(iface, next_index))
+                    self._requested_chunks.add(next_index)
+                    next_index += 1
+                iface, fut = pending.pop(index)
+                hexdata = await fut
+                if hexdata is None:
+                    hexdata = await fetch(self, index)
+                conn = self.blockchain.connect_chunk(index, hexdata)
+                self._requested_chunks.discard(index)
+                if not conn:
+                    break
+                num_headers += self._chunk_size(index, tip)
+                index += 1
+        finally:
+            for iface, fut in pending.values():
+                if fut.done() and not fut.cancelled():
+                    fut.exception()  # retrieved, so that it does not get logged
+                fut.cancel()
+            for i in range(index, next_index):
+                self._requested_chunks.discard(i)
+        return num_headers > 0, num_headers
+
+    def get_batch_window(self) -> float:
+        """Returns the number of seconds during which requests are
+        coalesced into a batch request, 0 if they should not be.
+        It can be set for all servers with the 'rpc_batch_window' config
+        key, and per server with 'rpc_batch_window_per_server'.
+        """
+        config = self.network.config
+        batch_window = config.get('rpc_batch_window', DEFAULT_BATCH_WINDOW)
+        per_server = config.get('rpc_batch_window_per_server', {})
+        batch_window = per_server.get(str(self.server), batch_window)
+        try:
+            return max(0.0, float(batch_window))
+        except (TypeError, ValueError):
+            return DEFAULT_BATCH_WINDOW
 
     def is_main_server(self) -> bool:
         return self.network.default_server == self.server
@@ -611,6 +825,7 @@ class Interface(Logger):
             self.session = session  # type: NotificationSession
             self.session.interface = self
             self.session.set_default_timeout(self.network.get_network_timeout_seconds(NetworkTimeout.Generic))
+            self.session.batch_window = self.get_batch_window()
             try:
                 ver = await session.send_request('server.version', [self.client_name(), version.PROTOCOL_VERSION])
             except aiorpcx.jsonrpc.RPCError as e:
@@ -705,7 +920,7 @@ class Interface(Logger):
         while last is None or height <= next_height:
             prev_last, prev_height = last, height
             if next_height > height + 10:
-                could_connect, num_headers = await self.request_chunk(height, next_height)
+                could_connect, num_headers = await self.request_chunks(height, next_height)
                 if not could_connect:
                     if height <= constants.net.max_checkpoint():
                         raise GracefulDisconnect('server chain conflicts with checkpoints or genesis')
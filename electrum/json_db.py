@@ -25,12 +25,25 @@
 import threading
 import copy
 import json
+from typing import Dict, List, Optional, Tuple
 
 from . import util
 from .logging import Logger
 
 JsonDBJsonEncoder = util.MyEncoder
 
+# Journal records are appended to the file after the (indented) json dump,
+# one per line. A record is a json list of operations, so each one starts
+# with '[', which never happens at the start of a line inside the dump.
+JOURNAL_RECORD_SEPARATOR = '\n['
+
+
+def split_journal(s: str) -> Tuple[str, List[str]]:
+    """Split file contents into the base json dump and the journal records."""
+    base, *records = s.split(JOURNAL_RECORD_SEPARATOR)
+    return base, ['[' + r for r in records]
+
+
 def modifier(func):
     def wrapper(self, *args, **kwargs):
         with self.lock:
@@ -48,14 +61,19 @@ def locked(func):
 class StoredObject:
 
     db = None
+    _db_path = None
 
     def __setattr__(self, key, value):
-        if self.db:
-            self.db.set_modified(True)
         object.__setattr__(self, key, value)
+        if self.db:
+            if self._db_path is not None:
+                self.db.add_pending_change(self._db_path)
+            else:
+                self.db.set_modified(True)
 
-    def set_db(self, db):
-        self.db = db
+    def set_db(self, db, path=None):
+        object.__setattr__(self, 'db', db)
+        object.__setattr__(self, '_db_path', path)
 
     def to_json(self):
         d = dict(vars(self))
@@ -75,8 +93,10 @@ class StoredDict(dict):
         self.lock = self.db.lock if self.db else threading.RLock()
         self.path = path
         # recursively convert dicts to StoredDict
+        # note: the initial contents are not pending changes;
+        #       whoever assigns this dict records its path.
         for k, v in list(data.items()):
-            self.__setitem__(k, v)
+            self._set_item(k, v)
 
     def convert_key(self, key):
         """Convert int keys to str keys, as only those are allowed in json."""
@@ -85,6 +105,16 @@ class StoredDict(dict):
         #             suddenly the keys are str...
         return str(int(key)) if isinstance(key, int) else key
 
+    def _set_parent(self, db, path):
+        # recursively set db and path
+        self.db = db
+        self.path = path
+        for k, v in dict.items(self):
+            if isinstance(v, (StoredDict, StoredList)):
+                v._set_parent(db, path + [k])
+            elif isinstance(v, StoredObject):
+                v.set_db(db, path + [k])
+
     @locked
     def __setitem__(self, key, v):
         key = self.convert_key(key)
@@ -92,12 +122,14 @@ class StoredDict(dict):
         # early return to prevent unnecessary disk writes
         if not is_new and self[key] == v:
             return
-        # recursively set db and path
+        self._set_item(key, v)
+        if self.db:
+            self.db.add_pending_change(self.path + [key])
+
+    def _set_item(self, key, v):
+        key = self.convert_key(key)
         if isinstance(v, StoredDict):
-            v.db = self.db
-            v.path = self.path + [key]
-            for k, vv in v.items():
-                v[k] = vv
+            v._set_parent(self.db, self.path + [key])
         # recursively convert dict to StoredDict.
         # _convert_dict is called breadth-first
         elif isinstance(v, dict):
@@ -108,27 +140,31 @@ class StoredDict(dict):
         if isinstance(v, dict) or isinstance(v, str):
             if self.db:
                 v = self.db._convert_value(self.path, key, v)
+        # lists are tracked so that in-place changes get recorded
+        elif isinstance(v, list):
+            v = StoredList(v, self.db, self.path + [key])
         # set parent of StoredObject
         if isinstance(v, StoredObject):
-            v.set_db(self.db)
+            v.set_db(self.db, self.path + [key])
         # set item
         dict.__setitem__(self, key, v)
-        if self.db:
-            self.db.set_modified(True)
 
     @locked
     def __delitem__(self, key):
         key = self.convert_key(key)
         dict.__delitem__(self, key)
         if self.db:
-            self.db.set_modified(True)
+            self.db.add_pending_change(self.path + [key])
+
+    # Reads do not take the lock: a single dict lookup is atomic under
+    # the GIL, and so is every individual write. Only writers serialize
+    # on self.lock. Readers that iterate should take a snapshot first
+    # (dict.copy() and list(d.keys()) are atomic as well).
 
-    @locked
     def __getitem__(self, key):
         key = self.convert_key(key)
         return dict.__getitem__(self, key)
 
-    @locked
     def __contains__(self, key):
         key = self.convert_key(key)
         return dict.__contains__(self, key)
@@ -141,14 +177,98 @@ class StoredDict(dict):
         else:
             r = dict.pop(self, key, v)
         if self.db:
-            self.db.set_modified(True)
+            self.db.add_pending_change(self.path + [key])
         return r
 
-    @locked
     def get(self, key, default=None):
         key = self.convert_key(key)
         return dict.get(self, key, default)
 
+    @locked
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    @locked
+    def update(self, *args, **kwargs):
+        for k, v in dict(*args, **kwargs).items():
+            self[k] = v
+
+    @locked
+    def clear(self):
+        dict.clear(self)
+        if self.db:
+            if self.path:
+                self.db.add_pending_change(self.path)
+            else:
+                self.db.set_modified(True)
+
+
+class StoredList(list):
+
+    def __init__(self, data, db, path):
+        list.__init__(self, data)
+        self.db = db
+        self.lock = self.db.lock if self.db else threading.RLock()
+        self.path = path
+
+    def _set_parent(self, db, path):
+        self.db = db
+        self.path = path
+
+    def _changed(self):
+        # lists are journaled as a whole
+        if self.db:
+            self.db.add_pending_change(self.path)
+
+    @locked
+    def append(self, item):
+        list.append(self, item)
+        self._changed()
+
+    @locked
+    def extend(self, items):
+        list.extend(self, items)
+        self._changed()
+
+    @locked
+    def __iadd__(self, items):
+        list.extend(self, items)
+        self._changed()
+        return self
+
+    @locked
+    def insert(self, index, item):
+        list.insert(self, index, item)
+        self._changed()
+
+    @locked
+    def remove(self, item):
+        list.remove(self, item)
+        self._changed()
+
+    @locked
+    def pop(self, index=-1):
+        r = list.pop(self, index)
+        self._changed()
+        return r
+
+    @locked
+    def clear(self):
+        list.clear(self)
+        self._changed()
+
+    @locked
+    def __setitem__(self, index, item):
+        list.__setitem__(self, index, item)
+        self._changed()
+
+    @locked
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self._changed()
+
 
 
 
@@ -159,14 +279,117 @@ class JsonDB(Logger):
         self.lock = threading.RLock()
         self.data = data
         self._modified = False
+        # paths (tuples of keys) that changed since the last write
+        self._pending_changes = {}  # type: Dict[Tuple[str, ...], None]
+        # set if something changed that is not in _pending_changes
+        self._needs_full_write = True
+        self._consolidation_thread = None  # type: Optional[threading.Thread]
 
     def set_modified(self, b):
+        # note: changes that were not recorded with add_pending_change
+        #       can only be saved by rewriting the whole file.
         with self.lock:
             self._modified = b
+            self._needs_full_write = b
+            if not b:
+                self._pending_changes.clear()
 
     def modified(self):
         return self._modified
 
+    def add_pending_change(self, path):
+        with self.lock:
+            self._modified = True
+            self._pending_changes[tuple(path)] = None
+
+    @locked
+    def get_pending_changes(self) -> list:
+        """Returns the journal record for the pending changes.
+
+        It is a list of operations: [path, value] sets the value at path,
+        [path] deletes it.
+        """
+        ops = []
+        for path in self._pending_changes:
+            # a change below a changed parent is contained in the parent
+            if any(path[:i] in self._pending_changes for i in range(1, len(path))):
+                continue
+            d = self.data
+            for key in path[:-1]:
+                d = d.get(key) if isinstance(d, dict) else None
+            if not isinstance(d, dict):
+                continue
+            if path[-1] in d:
+                ops.append([list(path), d[path[-1]]])
+            else:
+                ops.append([list(path)])
+        return ops
+
+    def apply_journal(self, records: List[str]) -> None:
+        """Replay journal records on top of self.data (which must not yet
+        be a StoredDict). A truncated last record, left behind by an
+        interrupted append, is dropped."""
+        for i, record in enumerate(records):
+            try:
+                ops = json.loads(record)
+            except Exception:
+                if i == len(records) - 1:
+                    self.logger.warning('dropping truncated journal record')
+                    self._needs_full_write = True
+                    break
+                raise util.WalletFileException("Cannot read wallet file. (journal corrupted)")
+            try:
+                for op in ops:
+                    path = op[0]
+                    d = self.data
+                    for key in path[:-1]:
+                        d = d[key]
+                    if len(op) > 1:
+                        d[path[-1]] = op[1]
+                    else:
+                        d.pop(path[-1], None)
+            except (KeyError, IndexError, TypeError) as e:
+                raise util.WalletFileException("Cannot read wallet file. (journal corrupted)") from e
+
+    def write_journal_or_dump(self, storage) -> None:
+        """Append the pending changes to storage, or rewrite it entirely
+        if they cannot be expressed as a journal record."""
+        if (self._needs_full_write
+                or not storage.file_exists()
+                or not isinstance(self.data, StoredDict)):
+            storage.write(self.dump())
+            return
+        ops = self.get_pending_changes()
+        if ops:
+            storage.append(json.dumps(ops, cls=JsonDBJsonEncoder))
+        if storage.needs_consolidation():
+            self._consolidate_in_background(storage)
+
+    def _consolidate_in_background(self, storage) -> None:
+        if self._consolidation_thread and self._consolidation_thread.is_alive():
+            return
+        self._consolidation_thread = threading.Thread(
+            target=self._consolidate, args=(storage,), name='JsonDBConsolidation')
+        self._consolidation_thread.start()
+
+    def _consolidate(self, storage) -> None:
+        # Take the storage lock before releasing ours: records appended
+        # after the dump must go to the new file, not the one being replaced.
+        with self.lock:
+            s = self.dump()
+            storage.lock.acquire()
+        try:
+            storage.write(s)
+        except Exception:
+            self.logger.exception('journal consolidation failed')
+        finally:
+            storage.lock.release()
+
+    def wait_for_consolidation(self) -> None:
+        t = self._consolidation_thread
+        if t:
+            t.join()
+
     @locked
     def get(self, key, default=None):
         v = self.data.get(key)
@@ -182,6 +405,8 @@ class JsonDB(Logger):
         except:
             self.logger.info(f"json error: cannot save {repr(key)} ({repr(value)})")
             return False
+        if not isinstance(self.data, StoredDict):
+            self._needs_full_write = True
         if value is not None:
             if self.data.get(key) != value:
                 self.data[key] = copy.deepcopy(value)
@@ -980,7 +980,7 @@ class Channel(AbstractChannel):
         if self.lnworker:
             sent = self.hm.sent_in_ctn(new_ctn)
             for htlc in sent:
-                self.lnworker.payment_sent(self, htlc.payment_hash)
+                self.lnworker.payment_sent(self, htlc.payment_hash, htlc.htlc_id)
             failed = self.hm.failed_in_ctn(new_ctn)
             for htlc in failed:
                 error_bytes, failure_message = self._receive_fail_reasons.pop(htlc.htlc_id)
@@ -988,7 +988,7 @@ class Channel(AbstractChannel):
                 if self.lnworker.get_payment_info(htlc.payment_hash) is None:
                     self.save_fail_htlc_reason(htlc.htlc_id, error_bytes, failure_message)
                 else:
-                    self.lnworker.payment_failed(self, htlc.payment_hash, error_bytes, failure_message)
+                    self.lnworker.payment_failed(self, htlc.payment_hash, htlc.htlc_id, error_bytes, failure_message)
 
     def save_fail_htlc_reason(self, htlc_id, error_bytes, failure_message):
         error_hex = error_bytes.hex() if error_bytes else None
@@ -1029,7 +1029,7 @@ class Channel(AbstractChannel):
         info = self.lnworker.get_payment_info(payment_hash)
         if info is not None and info.status != PR_PAID:
             if is_sent:
-                self.lnworker.payment_sent(self, payment_hash)
+                self.lnworker.payment_sent(self, payment_hash, htlc.htlc_id)
             else:
                 self.lnworker.payment_received(self, payment_hash)
 
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+#
+# Electrum - lightweight Bitcoin client
+# Copyright (C) 2020 The Electrum developers
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from array import array
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from .lnutil import ShortChannelID
+
+if TYPE_CHECKING:
+    from .channel_db import ChannelInfo, Policy
+
+
+# flags in ChannelGraph.policy_flags
+POLICY_PRESENT  = 1 << 0
+POLICY_DISABLED = 1 << 1
+
+NO_CAPACITY = -1
+NO_HTLC_MAXIMUM = 2**64 - 1
+
+
+class ChannelGraph:
+    """Compact representation of the public channel graph, for path finding.
+
+    Node ids are interned to indices. Channels are stored in slots; the policy
+    of a channel in one direction is stored at index 2*slot + direction, where
+    direction 0 is the policy of node1 and direction 1 the policy of node2
+    (so the policy in the other direction is at index ^ 1).
+    Adjacency is kept in CSR form, see get_adjacency, rebuilt when the
+    topology has changed since it was last used.
+
+    Not thread-safe: ChannelDB modifies it under its lock.
+    """
+
+    def __init__(self):
+        # nodes
+        self._node_index = {}  # type: Dict[bytes, int]
+        self.node_ids = []  # type: List[bytes]
+        self.node_degree = array('i')
+        # channels
+        self._slot_index = {}  # type: Dict[ShortChannelID, int]
+        self.short_channel_ids = []  # type: List[Optional[ShortChannelID]]
+        self.node1 = array('i')
+        self.node2 = array('i')
+        self.capacity_sat = array('q')
+        self._free_slots = []  # type: List[int]
+        # policies
+        self.fee_base_msat = array('I')
+        self.fee_proportional_millionths = array('I')
+        self.cltv_expiry_delta = array('H')
+        self.htlc_minimum_msat = array('Q')
+        self.htlc_maximum_msat = array('Q')
+        self.policy_flags = array('B')
+        # adjacency
+        self._adjacency = array('i', [0]), array('i'), array('i')
+        self._adj_dirty = False
+
+    def num_channels(self) -> int:
+        return len(self._slot_index)
+
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    def intern_node(self, node_id: bytes) -> int:
+        idx = self._node_index.get(node_id)
+        if idx is None:
+            idx = len(self.node_ids)
+            self._node_index[node_id] = idx
+            self.node_ids.append(node_id)
+            self.node_degree.append(0)
+        return idx
+
+    def get_node_index(self, node_id: bytes) -> Optional[int]:
+        return self._node_index.get(node_id)
+
+    def has_channels(self, node_id: bytes) -> bool:
+        idx = self._node_index.get(node_id)
+        return idx is not None and self.node_degree[idx] > 0
+
+    def get_slot(self, short_channel_id: bytes) -> Optional[int]:
+        return self._slot_index.get(short_channel_id)
+
+    def add_channel(self, channel_info: 'ChannelInfo') -> None:
+        short_channel_id = channel_info.short_channel_id
+        capacity_sat = channel_info.capacity_sat if channel_info.capacity_sat is not None else NO_CAPACITY
+        slot = self._slot_index.get(short_channel_id)
+        if slot is not None:
+            # already known, e.g. verified later: keep policies
+            self.capacity_sat[slot] = capacity_sat
+            return
+        node1 = self.intern_node(channel_info.node1_id)
+        node2 = self.intern_node(channel_info.node2_id)
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self.short_channel_ids[slot] = short_channel_id
+            self.node1[slot] = node1
+            self.node2[slot] = node2
+            self.capacity_sat[slot] = capacity_sat
+        else:
+            slot = len(self.short_channel_ids)
+            self.short_channel_ids.append(short_channel_id)
+            self.node1.append(node1)
+            self.node2.append(node2)
+            self.capacity_sat.append(capacity_sat)
+            for arr in (self.fee_base_msat, self.fee_proportional_millionths, self.cltv_expiry_delta,
+                        self.htlc_minimum_msat, self.htlc_maximum_msat, self.policy_flags):
+                arr.extend((0, 0))
+        self.policy_flags[2*slot] = 0
+        self.policy_flags[2*slot+1] = 0
+        self._slot_index[short_channel_id] = slot
+        self.node_degree[node1] += 1
+        self.node_degree[node2] += 1
+        self._adj_dirty = True
+
+    def remove_channel(self, short_channel_id: bytes) -> None:
+        slot = self._slot_index.pop(short_channel_id, None)
+        if slot is None:
+            return
+        self.node_degree[self.node1[slot]] -= 1
+        self.node_degree[self.node2[slot]] -= 1
+        self.short_channel_ids[slot] = None
+        self.node1[slot] = -1
+        self.node2[slot] = -1
+        self.policy_flags[2*slot] = 0
+        self.policy_flags[2*slot+1] = 0
+        self._free_slots.append(slot)
+        self._adj_dirty = True
+
+    def get_policy_index(self, short_channel_id: bytes, start_node: bytes) -> Optional[int]:
+        """Index of the policy of start_node in the policy arrays,
+        or None if the channel is not in the graph.
+        Note that the policy itself might not be present.
+        """
+        slot = self._slot_index.get(short_channel_id)
+        if slot is None:
+            return None
+        node_idx = self._node_index.get(start_node, -1)
+        if node_idx == self.node1[slot]:
+            return 2 * slot
+        if node_idx == self.node2[slot]:
+            return 2 * slot + 1
+        return None
+
+    def set_policy(self, policy: 'Policy') -> None:
+        i = self.get_policy_index(policy.short_channel_id, policy.start_node)
+        if i is None:
+            return
+        self.fee_base_msat[i] = policy.fee_base_msat
+        self.fee_proportional_millionths[i] = policy.fee_proportional_millionths
+        self.cltv_expiry_delta[i] = policy.cltv_expiry_delta
+        self.htlc_minimum_msat[i] = policy.htlc_minimum_msat
+        self.htlc_maximum_msat[i] = policy.htlc_maximum_msat if policy.htlc_maximum_msat is not None else NO_HTLC_MAXIMUM
+        self.policy_flags[i] = POLICY_PRESENT | (POLICY_DISABLED if policy.is_disabled() else 0)
+
+    def remove_policy(self, short_channel_id: bytes, start_node: bytes) -> None:
+        i = self.get_policy_index(short_channel_id, start_node)
+        if i is not None:
+            self.policy_flags[i] = 0
+
+    def get_adjacency(self) -> Tuple[array, array, array]:
+        """Returns (offsets, neighbours, policies). For the k-th channel of node i,
+        with k in range(offsets[i], offsets[i+1]), neighbours[k] is the other node
+        and policies[k] the index of the policy of the other node, i.e. towards node i.
+        The channel slot is policies[k] >> 1.
+        """
+        if self._adj_dirty:
+            num_nodes = len(self.node_ids)
+            offsets = array('i', bytes(4 * (num_nodes + 1)))
+            total = 0
+            for idx, degree in enumerate(self.node_degree):
+                offsets[idx] = total
+                total += degree
+            offsets[num_nodes] = total
+            neighbours = array('i', bytes(4 * total))
+            policies = array('i', bytes(4 * total))
+            fill = offsets[:num_nodes]
+            for slot, short_channel_id in enumerate(self.short_channel_ids):
+                if short_channel_id is None:
+                    continue
+                node1, node2 = self.node1[slot], self.node2[slot]
+                k = fill[node1]
+                neighbours[k] = node2
+                policies[k] = 2 * slot + 1
+                fill[node1] = k + 1
+                k = fill[node2]
+                neighbours[k] = node1
+                policies[k] = 2 * slot
+                fill[node2] = k + 1
+            # replaced, not modified in place, so that readers of the old ones are not affected
+            self._adjacency = offsets, neighbours, policies
+            self._adj_dirty = False
+        return self._adjacency
+
+    def get_channel_slots_for_node(self, node_idx: int) -> List[int]:
+        offsets, neighbours, policies = self.get_adjacency()
+        return [i >> 1 for i in policies[offsets[node_idx]:offsets[node_idx+1]]]
+
+    def get_channels_for_node(self, node_id: bytes) -> List[ShortChannelID]:
+        idx = self._node_index.get(node_id)
+        if idx is None:
+            return []
+        return [self.short_channel_ids[slot] for slot in self.get_channel_slots_for_node(idx)]
+
+    def get_neighbours(self, node_id: bytes) -> List[Tuple[ShortChannelID, bytes]]:
+        """Returns (short_channel_id, other_node_id) for the channels of node_id."""
+        idx = self._node_index.get(node_id)
+        if idx is None:
+            return []
+        node1, node2, node_ids, short_channel_ids = self.node1, self.node2, self.node_ids, self.short_channel_ids
+        return [(short_channel_ids[slot], node_ids[node2[slot] if node1[slot] == idx else node1[slot]])
+                for slot in self.get_channel_slots_for_node(idx)]
@@ -261,10 +261,12 @@ def new_onion_packet(payment_path_pubkeys: Sequence[bytes], session_key: bytes,
 
 
 def calc_hops_data_for_payment(route: 'LNPaymentRoute', amount_msat: int,
-                               final_cltv: int, *, payment_secret: bytes = None) \
+                               final_cltv: int, *, payment_secret: bytes = None,
+                               total_msat: int = None) \
         -> Tuple[List[OnionHopsDataSingle], int, int]:
     """Returns the hops_data to be used for constructing an onion packet,
     and the amount_msat and cltv to be used on our immediate channel.
+    total_msat is the amount of the whole payment, if amount_msat is only a part of it.
     """
     if len(route) > NUM_MAX_EDGES_IN_PAYMENT_PATH:
         raise PaymentFailure(f"too long route ({len(route)} edges)")
@@ -277,7 +279,8 @@ def calc_hops_data_for_payment(route: 'LNPaymentRoute', amount_msat: int,
         "outgoing_cltv_value": {"outgoing_cltv_value": cltv},
     }
     if payment_secret is not None:
-        hop_payload["payment_data"] = {"payment_secret": payment_secret, "total_msat": amt}
+        hop_payload["payment_data"] = {"payment_secret": payment_secret,
+                                       "total_msat": total_msat if total_msat is not None else amt}
     hops_data = [OnionHopsDataSingle(is_tlv_payload=route[-1].has_feature_varonion(),
                                      payload=hop_payload)]
     # payloads, backwards from last hop (but excluding the first edge):
@@ -498,6 +501,7 @@ class OnionFailureCode(IntEnum):
     CHANNEL_DISABLED =                        UPDATE | 20
     EXPIRY_TOO_FAR =                          21
     INVALID_ONION_PAYLOAD =                   PERM | 22
+    MPP_TIMEOUT =                             23
 
 
 # don't use these elsewhere, the names are ambiguous without context
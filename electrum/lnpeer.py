@@ -1082,7 +1082,8 @@ class Peer(Logger):
         self.send_message("commitment_signed", channel_id=chan.channel_id, signature=sig_64, num_htlcs=len(htlc_sigs), htlc_signature=b"".join(htlc_sigs))
 
     def pay(self, *, route: 'LNPaymentRoute', chan: Channel, amount_msat: int,
-            payment_hash: bytes, min_final_cltv_expiry: int, payment_secret: bytes = None) -> UpdateAddHtlc:
+            payment_hash: bytes, min_final_cltv_expiry: int, payment_secret: bytes = None,
+            total_msat: int = None) -> UpdateAddHtlc:
         assert amount_msat > 0, "amount_msat is not greater zero"
         assert len(route) > 0
         if not chan.can_send_update_add_htlc():
@@ -1093,7 +1094,8 @@ class Peer(Logger):
         # create onion packet
         final_cltv = local_height + min_final_cltv_expiry
         hops_data, amount_msat, cltv = calc_hops_data_for_payment(route, amount_msat, final_cltv,
-                                                                  payment_secret=payment_secret)
+                                                                  payment_secret=payment_secret,
+                                                                  total_msat=total_msat)
         assert final_cltv <= cltv, (final_cltv, cltv)
         secret_key = os.urandom(32)
         onion = new_onion_packet([x.node_id for x in route], secret_key, hops_data, associated_data=payment_hash)
@@ -1279,9 +1281,13 @@ class Peer(Logger):
             if payment_secret_from_onion != derive_payment_secret_from_payment_preimage(preimage):
                 reason = OnionRoutingFailureMessage(code=OnionFailureCode.INCORRECT_OR_UNKNOWN_PAYMENT_DETAILS, data=b'')
                 return None, reason
+        try:
+            total_msat = processed_onion.hop_data.payload["payment_data"]["total_msat"]
+        except:
+            total_msat = htlc.amount_msat  # not a multi-part payment
         expected_received_msat = int(info.amount * 1000) if info.amount is not None else None
         if expected_received_msat is not None and \
-                not (expected_received_msat <= htlc.amount_msat <= 2 * expected_received_msat):
+                not (expected_received_msat <= total_msat <= 2 * expected_received_msat):
             reason = OnionRoutingFailureMessage(code=OnionFailureCode.INCORRECT_OR_UNKNOWN_PAYMENT_DETAILS, data=b'')
             return None, reason
         # Check that our blockchain tip is sufficiently recent so that we have an approx idea of the height.
@@ -1309,14 +1315,18 @@ class Peer(Logger):
         except:
             reason = OnionRoutingFailureMessage(code=OnionFailureCode.INVALID_ONION_PAYLOAD, data=b'\x00\x00\x00')
             return None, reason
-        try:
-            amount_from_onion = processed_onion.hop_data.payload["payment_data"]["total_msat"]
-        except:
-            pass  # fall back to "amt_to_forward"
         if amount_from_onion > htlc.amount_msat:
             reason = OnionRoutingFailureMessage(code=OnionFailureCode.FINAL_INCORRECT_HTLC_AMOUNT,
                                                 data=htlc.amount_msat.to_bytes(8, byteorder="big"))
             return None, reason
+        if total_msat > htlc.amount_msat:
+            # part of a multi-part payment: settle once all parts have arrived
+            failure_code = self.lnworker.add_received_htlc_part(chan, htlc, total_msat)
+            if failure_code is not None:
+                reason = OnionRoutingFailureMessage(code=failure_code, data=b'')
+                return None, reason
+            if not self.lnworker.is_received_mpp_complete(htlc.payment_hash):
+                return None, None
         # all good
         return preimage, None
 
@@ -1324,6 +1334,7 @@ class Peer(Logger):
         self.logger.info(f"_fulfill_htlc. chan {chan.short_channel_id}. htlc_id {htlc_id}")
         assert chan.can_send_ctx_updates(), f"cannot send updates: {chan.short_channel_id}"
         chan.settle_htlc(preimage, htlc_id)
+        self.lnworker.remove_received_htlc_parts(chan.channel_id, htlc_id)
         self.send_message("update_fulfill_htlc",
                           channel_id=chan.channel_id,
                           id=htlc_id,
@@ -1333,6 +1344,7 @@ class Peer(Logger):
         self.logger.info(f"fail_htlc. chan {chan.short_channel_id}. htlc_id {htlc_id}.")
         assert chan.can_send_ctx_updates(), f"cannot send updates: {chan.short_channel_id}"
         chan.fail_htlc(htlc_id)
+        self.lnworker.remove_received_htlc_parts(chan.channel_id, htlc_id)
         self.send_message(
             "update_fail_htlc",
             channel_id=chan.channel_id,
@@ -1344,6 +1356,7 @@ class Peer(Logger):
         self.logger.info(f"fail_malformed_htlc. chan {chan.short_channel_id}. htlc_id {htlc_id}.")
         assert chan.can_send_ctx_updates(), f"cannot send updates: {chan.short_channel_id}"
         chan.fail_htlc(htlc_id)
+        self.lnworker.remove_received_htlc_parts(chan.channel_id, htlc_id)
         if not (reason.code & OnionFailureCodeMetaFlag.BADONION and len(reason.data) == 32):
             raise Exception(f"unexpected reason when sending 'update_fail_malformed_htlc': {reason!r}")
         self.send_message(
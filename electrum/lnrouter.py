@@ -23,7 +23,7 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import queue
+import heapq
 from collections import defaultdict
 from typing import Sequence, List, Tuple, Optional, Dict, NamedTuple, TYPE_CHECKING, Set
 import time
@@ -34,6 +34,8 @@ from .logging import Logger
 from .lnutil import (NUM_MAX_EDGES_IN_PAYMENT_PATH, ShortChannelID, LnFeatures,
                      NBLOCK_CLTV_EXPIRY_TOO_FAR_INTO_FUTURE)
 from .channel_db import ChannelDB, Policy, NodeInfo
+from .lngraph import POLICY_PRESENT, POLICY_DISABLED, NO_CAPACITY, NO_HTLC_MAXIMUM
+from .mission_control import MissionControl, decay
 
 if TYPE_CHECKING:
     from .lnchannel import Channel
@@ -136,23 +138,94 @@ def is_fee_sane(fee_msat: int, *, payment_amount_msat: int) -> bool:
 
 
 BLACKLIST_DURATION = 3600
+EDGE_BASE_COST = 500  # one more edge ~ paying 500 msat more fees
+# a failed attempt ~ paying 100 sat + 0.1 % more fees
+ATTEMPT_COST_MSAT = 100_000
+ATTEMPT_COST_PROPORTIONAL_MILLIONTHS = 1000
+
+# multi-part payments
+MPP_NUM_CANDIDATE_PATHS = 5
+MPP_MAX_PARTS = 8
+MPP_MIN_PART_MSAT = 1_000_000
+MPP_TARGET_PROBABILITY = 0.9
+
+
+def liquidity_probability(amount_msat: int, min_msat: float, max_msat: Optional[float]) -> float:
+    """Probability that amount_msat can be sent through a channel whose
+    liquidity is uniformly distributed between min_msat and max_msat.
+    """
+    if amount_msat <= min_msat or max_msat is None:
+        return 1.
+    if amount_msat >= max_msat:
+        return 0.
+    return (max_msat - amount_msat) / (max_msat - min_msat)
+
+
+def failure_probability(age: int) -> float:
+    """Probability that a channel that failed age seconds ago works again."""
+    return 1. - decay(age)
+
+
+def probability_penalty(amount_msat: int, probability: float) -> float:
+    """Expected cost of the attempts that fail before one succeeds."""
+    attempt_cost = ATTEMPT_COST_MSAT + amount_msat * ATTEMPT_COST_PROPORTIONAL_MILLIONTHS // 1_000_000
+    return attempt_cost * (1 / probability - 1)
+
 
 class LNPathFinder(Logger):
 
-    def __init__(self, channel_db: ChannelDB):
+    def __init__(self, channel_db: ChannelDB, mission_control: MissionControl = None):
         Logger.__init__(self)
         self.channel_db = channel_db
-        self.blacklist = dict() # short_chan_id -> timestamp
+        # note: without a db, what we learn is forgotten on restart
+        self.mission_control = mission_control if mission_control is not None else MissionControl()
 
     def add_to_blacklist(self, short_channel_id: ShortChannelID):
         self.logger.info(f'blacklisting channel {short_channel_id}')
-        now = int(time.time())
-        self.blacklist[short_channel_id] = now
+        self.mission_control.report_failure(short_channel_id)
 
     def is_blacklisted(self, short_channel_id: ShortChannelID) -> bool:
         now = int(time.time())
-        t = self.blacklist.get(short_channel_id, 0)
-        return now - t < BLACKLIST_DURATION
+        t = self.mission_control.get_failure_time(short_channel_id)
+        return t is not None and now - t < BLACKLIST_DURATION
+
+    def update_liquidity_hints(self, route: LNPaymentRoute, amount_msat: int, *,
+                               failing_edge_index: int = None, is_liquidity_failure: bool = False) -> None:
+        """Learn from an attempt to send amount_msat over route.
+        The edges before failing_edge_index forwarded their amount (all of them,
+        if it is None), and if is_liquidity_failure, the failing edge could not.
+        The first edge is ours: we know its liquidity.
+        """
+        if failing_edge_index is None:
+            failing_edge_index = len(route)
+        amounts = [amount_msat]  # forwarded through each edge, last one first
+        for edge in reversed(route[1:]):
+            amounts.append(amounts[-1] + edge.fee_for_edge(amounts[-1]))
+        amounts.reverse()
+        for i in range(1, min(failing_edge_index + 1, len(route))):
+            short_channel_id, start_node = route[i].short_channel_id, route[i-1].node_id
+            if i < failing_edge_index:
+                self.mission_control.report_success(short_channel_id, start_node, amounts[i])
+            elif is_liquidity_failure:
+                self.logger.info(f'channel {short_channel_id} could not forward {amounts[i]} msat')
+                self.mission_control.report_liquidity_failure(short_channel_id, start_node, amounts[i])
+
+    def _get_liquidity_hint(self, short_channel_id: bytes, start_node: bytes, capacity_sat: Optional[int], *,
+                            now: int) -> Optional[Tuple[float, Optional[float], float]]:
+        """What mission control learned about a channel in the direction from start_node:
+        (min_msat, max_msat, probability), where max_msat is None if unknown and
+        probability is that of the channel working, given its past failures.
+        Returns None if nothing was learned.
+        """
+        bounds = self.mission_control.get_liquidity_bounds(short_channel_id, start_node, now=now)
+        failure_time = self.mission_control.get_failure_time(short_channel_id)
+        if bounds is None and failure_time is None:
+            return None
+        min_msat, max_msat = bounds or (0, None)
+        if capacity_sat is not None and (max_msat is None or max_msat > 1000 * capacity_sat + 1):
+            max_msat = 1000 * capacity_sat + 1
+        probability = failure_probability(now - failure_time) if failure_time is not None else 1.
+        return min_msat, max_msat, probability
 
     def _edge_cost(self, short_channel_id: bytes, start_node: bytes, end_node: bytes,
                    payment_amt_msat: int, ignore_costs=False, is_mine=False, *,
@@ -160,30 +233,55 @@ class LNPathFinder(Logger):
         """Heuristic cost (distance metric) of going through a channel.
         Returns (heuristic_cost, fee_for_edge_msat).
         """
-        channel_info = self.channel_db.get_channel_info(short_channel_id, my_channels=my_channels)
-        if channel_info is None:
-            return float('inf'), 0
-        channel_policy = self.channel_db.get_policy_for_node(short_channel_id, start_node, my_channels=my_channels)
-        if channel_policy is None:
-            return float('inf'), 0
-        # channels that did not publish both policies often return temporary channel failure
-        if self.channel_db.get_policy_for_node(short_channel_id, end_node, my_channels=my_channels) is None \
-                and not is_mine:
-            return float('inf'), 0
-        if channel_policy.is_disabled():
-            return float('inf'), 0
-        if payment_amt_msat < channel_policy.htlc_minimum_msat:
+        graph = self.channel_db.graph
+        i = graph.get_policy_index(short_channel_id, start_node)
+        if i is not None and graph.policy_flags[i] & POLICY_PRESENT:
+            # publicly announced channel, read the policy from the graph arrays
+            # channels that did not publish both policies often return temporary channel failure
+            if not graph.policy_flags[i ^ 1] & POLICY_PRESENT and not is_mine:
+                return float('inf'), 0
+            if graph.policy_flags[i] & POLICY_DISABLED:
+                return float('inf'), 0
+            capacity_sat = graph.capacity_sat[i >> 1]
+            capacity_sat = capacity_sat if capacity_sat != NO_CAPACITY else None
+            htlc_minimum_msat = graph.htlc_minimum_msat[i]
+            htlc_maximum_msat = graph.htlc_maximum_msat[i]
+            htlc_maximum_msat = htlc_maximum_msat if htlc_maximum_msat != NO_HTLC_MAXIMUM else None
+            fee_base_msat = graph.fee_base_msat[i]
+            fee_proportional_millionths = graph.fee_proportional_millionths[i]
+            cltv_expiry_delta = graph.cltv_expiry_delta[i]
+        else:
+            # private channel, or one of our own channels
+            channel_info = self.channel_db.get_channel_info(short_channel_id, my_channels=my_channels)
+            if channel_info is None:
+                return float('inf'), 0
+            channel_policy = self.channel_db.get_policy_for_node(short_channel_id, start_node, my_channels=my_channels)
+            if channel_policy is None:
+                return float('inf'), 0
+            if self.channel_db.get_policy_for_node(short_channel_id, end_node, my_channels=my_channels) is None \
+                    and not is_mine:
+                return float('inf'), 0
+            if channel_policy.is_disabled():
+                return float('inf'), 0
+            capacity_sat = channel_info.capacity_sat
+            htlc_minimum_msat = channel_policy.htlc_minimum_msat
+            htlc_maximum_msat = channel_policy.htlc_maximum_msat
+            fee_base_msat = channel_policy.fee_base_msat
+            fee_proportional_millionths = channel_policy.fee_proportional_millionths
+            cltv_expiry_delta = channel_policy.cltv_expiry_delta
+        if payment_amt_msat < htlc_minimum_msat:
             return float('inf'), 0  # payment amount too little
-        if channel_info.capacity_sat is not None and \
-                payment_amt_msat // 1000 > channel_info.capacity_sat:
+        if capacity_sat is not None and \
+                payment_amt_msat // 1000 > capacity_sat:
             return float('inf'), 0  # payment amount too large
-        if channel_policy.htlc_maximum_msat is not None and \
-                payment_amt_msat > channel_policy.htlc_maximum_msat:
+        if htlc_maximum_msat is not None and \
+                payment_amt_msat > htlc_maximum_msat:
             return float('inf'), 0  # payment amount too large
-        node_info = self.channel_db.get_node_info_for_node_id(node_id=end_node)
-        route_edge = RouteEdge.from_channel_policy(channel_policy, short_channel_id, end_node,
-                                                   node_info=node_info)
-        if not route_edge.is_sane_to_use(payment_amt_msat):
+        # same checks as RouteEdge.is_sane_to_use
+        if cltv_expiry_delta > 14 * 144:
+            return float('inf'), 0  # thanks but no thanks
+        fee_msat = fee_for_edge_msat(payment_amt_msat, fee_base_msat, fee_proportional_millionths)
+        if not is_fee_sane(fee_msat, payment_amount_msat=payment_amt_msat):
             return float('inf'), 0  # thanks but no thanks
 
         # Distance metric notes:  # TODO constants are ad-hoc
@@ -192,11 +290,19 @@ class LNPathFinder(Logger):
         # - The larger the payment amount, and the longer the CLTV,
         #   the more irritating it is if the HTLC gets stuck.
         # - Paying lower fees is better. :)
-        base_cost = 500  # one more edge ~ paying 500 msat more fees
+        # - Channels that failed, or could not forward similar amounts,
+        #   cost the attempts expected to fail on them.
+        base_cost = EDGE_BASE_COST
+        hint = self._get_liquidity_hint(short_channel_id, start_node, capacity_sat, now=int(time.time()))
+        if hint is not None:
+            min_msat, max_msat, probability = hint
+            probability *= liquidity_probability(payment_amt_msat, min_msat, max_msat)
+            if probability == 0:
+                return float('inf'), 0
+            base_cost += probability_penalty(payment_amt_msat, probability)
         if ignore_costs:
             return base_cost, 0
-        fee_msat = route_edge.fee_for_edge(payment_amt_msat)
-        cltv_cost = route_edge.cltv_expiry_delta * payment_amt_msat * 15 / 1_000_000_000
+        cltv_cost = cltv_expiry_delta * payment_amt_msat * 15 / 1_000_000_000
         overall_cost = base_cost + fee_msat + cltv_cost
         return overall_cost, fee_msat
 
@@ -204,66 +310,177 @@ class LNPathFinder(Logger):
                       invoice_amount_msat: int, *,
                       my_channels: Dict[ShortChannelID, 'Channel'] = None
                       ) -> Dict[bytes, PathEdge]:
+        if my_channels is None:
+            my_channels = {}
+        prev_node, node_ids, idx_a, idx_b = self._run_dijkstra(
+            nodeA, nodeB, invoice_amount_msat, my_channels=my_channels,
+            ignored_channels=set(), ignored_nodes=set())
+        return {node_ids[start]: PathEdge(node_id=node_ids[end], short_channel_id=short_channel_id)
+                for start, (short_channel_id, end) in prev_node.items()}
+
+    def _run_dijkstra(self, nodeA: bytes, nodeB: bytes,
+                      invoice_amount_msat: int, *,
+                      my_channels: Dict[ShortChannelID, 'Channel'],
+                      ignored_channels: Set[bytes],
+                      ignored_nodes: Set[bytes],
+                      ) -> Tuple[Dict[int, Tuple[ShortChannelID, int]], List[bytes], int, int]:
+        """Dijkstra on the node indices of the channel graph.
+        Returns prev_node, that maps a node index to (short_channel_id, next node index)
+        on the way to nodeB, the node ids by index, and the indices of nodeA and nodeB.
+        The path avoids ignored_channels, and goes through none of ignored_nodes.
+        """
         # note: we don't lock self.channel_db, so while the path finding runs,
         #       the underlying graph could potentially change... (not good but maybe ~OK?)
+        if not self.channel_db.data_loaded.is_set():
+            raise Exception("channelDB data not loaded yet!")
+        graph = self.channel_db.graph
+        with self.channel_db.lock:
+            offsets, adj_nodes, adj_policies = graph.get_adjacency()
+            node_ids = list(graph.node_ids)
+        num_graph_nodes = len(offsets) - 1
+        node_index = {}  # type: Dict[bytes, int]  # for nodes that are not in the graph
+
+        def get_index(node_id: bytes) -> int:
+            idx = graph.get_node_index(node_id)
+            if idx is None or idx >= num_graph_nodes:
+                idx = node_index.get(node_id)
+                if idx is None:
+                    idx = node_index[node_id] = len(node_ids)
+                    node_ids.append(node_id)
+            return idx
+
+        # channels we must not use, and our own channels, which are handled separately
+        now = int(time.time())
+        failures = self.mission_control.get_failures()
+        skipped_channels = set(my_channels) | ignored_channels
+        skipped_channels.update(short_channel_id for short_channel_id, t in failures.items()
+                                if now - t < BLACKLIST_DURATION)
+        skipped_slots = set(graph.get_slot(short_channel_id) for short_channel_id in skipped_channels)
+        # what mission control learned, by policy index
+        hinted_edges = set(self.mission_control.get_liquidity_hint_keys())
+        for short_channel_id in failures:
+            slot = graph.get_slot(short_channel_id)
+            if slot is not None and slot not in skipped_slots:
+                hinted_edges.add((short_channel_id, node_ids[graph.node1[slot]]))
+                hinted_edges.add((short_channel_id, node_ids[graph.node2[slot]]))
+        liquidity_hints = {}  # type: Dict[int, Tuple[float, Optional[float], float]]
+        for short_channel_id, start_node in hinted_edges:
+            i = graph.get_policy_index(short_channel_id, start_node)
+            if i is None:
+                continue
+            capacity = graph.capacity_sat[i >> 1]
+            hint = self._get_liquidity_hint(short_channel_id, start_node,
+                                            capacity if capacity != NO_CAPACITY else None, now=now)
+            if hint is not None:
+                liquidity_hints[i] = hint
+        my_edges = defaultdict(list)  # type: Dict[int, List[Tuple[ShortChannelID, int]]]  # end -> (scid, start)
+        for short_channel_id, chan in my_channels.items():
+            if self.is_blacklisted(short_channel_id) or short_channel_id in ignored_channels:
+                continue
+            local_idx, remote_idx = get_index(chan.get_local_pubkey()), get_index(chan.node_id)
+            my_edges[remote_idx].append((short_channel_id, local_idx))
+            my_edges[local_idx].append((short_channel_id, remote_idx))
+
+        short_channel_ids, capacity_sat = graph.short_channel_ids, graph.capacity_sat
+        policy_flags = graph.policy_flags
+        fee_base_msat, fee_proportional_millionths = graph.fee_base_msat, graph.fee_proportional_millionths
+        cltv_expiry_delta = graph.cltv_expiry_delta
+        htlc_minimum_msat, htlc_maximum_msat = graph.htlc_minimum_msat, graph.htlc_maximum_msat
 
         # run Dijkstra
         # The search is run in the REVERSE direction, from nodeB to nodeA,
         # to properly calculate compound routing fees.
-        distance_from_start = defaultdict(lambda: float('inf'))
-        distance_from_start[nodeB] = 0
-        prev_node = {}  # type: Dict[bytes, PathEdge]
-        nodes_to_explore = queue.PriorityQueue()
-        nodes_to_explore.put((0, invoice_amount_msat, nodeB))  # order of fields (in tuple) matters!
-
+        idx_a, idx_b = get_index(nodeA), get_index(nodeB)
+        ignored_idx = [get_index(node_id) for node_id in ignored_nodes]
+        distance_from_start = [float('inf')] * len(node_ids)
+        distance_from_start[idx_b] = 0
+        # a distance below any path cost keeps ignored nodes out of the search, at no cost per edge
+        for idx in ignored_idx:
+            distance_from_start[idx] = -1
+        prev_node = {}  # type: Dict[int, Tuple[ShortChannelID, int]]
+        nodes_to_explore = [(0, invoice_amount_msat, idx_b)]  # order of fields (in tuple) matters!
 
         # main loop of search
-        while nodes_to_explore.qsize() > 0:
-            dist_to_edge_endnode, amount_msat, edge_endnode = nodes_to_explore.get()
-            if edge_endnode == nodeA:
+        while nodes_to_explore:
+            dist_to_edge_endnode, amount_msat, edge_endnode = heapq.heappop(nodes_to_explore)
+            if edge_endnode == idx_a:
                 break
             if dist_to_edge_endnode != distance_from_start[edge_endnode]:
-                # queue.PriorityQueue does not implement decrease_priority,
+                # heapq does not implement decrease_priority,
                 # so instead of decreasing priorities, we add items again into the queue.
                 # so there are duplicates in the queue, that we discard now:
                 continue
-            for edge_channel_id in self.channel_db.get_channels_for_node(edge_endnode, my_channels=my_channels):
-                assert isinstance(edge_channel_id, bytes)
-                if self.is_blacklisted(edge_channel_id):
-                    continue
-                channel_info = self.channel_db.get_channel_info(edge_channel_id, my_channels=my_channels)
-                edge_startnode = channel_info.node2_id if channel_info.node1_id == edge_endnode else channel_info.node1_id
-                is_mine = edge_channel_id in my_channels
-                if is_mine:
-                    if edge_startnode == nodeA:  # payment outgoing, on our channel
-                        if not my_channels[edge_channel_id].can_pay(amount_msat, check_frozen=True):
-                            continue
-                    else:  # payment incoming, on our channel. (funny business, cycle weirdness)
-                        assert edge_endnode == nodeA, (bh2u(edge_startnode), bh2u(edge_endnode))
-                        if not my_channels[edge_channel_id].can_receive(amount_msat, check_frozen=True):
+            # public channels, with the checks and costs of _edge_cost inlined
+            if edge_endnode < num_graph_nodes:
+                lo, hi = offsets[edge_endnode], offsets[edge_endnode+1]
+                max_distance = dist_to_edge_endnode + EDGE_BASE_COST
+                for edge_startnode, i in zip(adj_nodes[lo:hi], adj_policies[lo:hi]):
+                    if distance_from_start[edge_startnode] <= max_distance:
+                        continue  # no edge costs less
+                    # channels that did not publish both policies often return temporary channel failure
+                    if policy_flags[i] != POLICY_PRESENT or not policy_flags[i ^ 1]:
+                        continue
+                    slot = i >> 1
+                    if slot in skipped_slots:
+                        continue
+                    if amount_msat < htlc_minimum_msat[i] or amount_msat > htlc_maximum_msat[i]:
+                        continue
+                    if capacity_sat[slot] != NO_CAPACITY and amount_msat // 1000 > capacity_sat[slot]:
+                        continue
+                    cltv = cltv_expiry_delta[i]
+                    if cltv > 14 * 144:
+                        continue
+                    fee_msat = fee_base_msat[i] + amount_msat * fee_proportional_millionths[i] // 1_000_000
+                    if fee_msat > 5_000 and 100 * fee_msat > amount_msat:
+                        continue  # see is_fee_sane
+                    if edge_startnode == idx_a:
+                        edge_cost, fee_msat = EDGE_BASE_COST, 0
+                    else:
+                        edge_cost = EDGE_BASE_COST + fee_msat + cltv * amount_msat * 15 / 1_000_000_000
+                    hint = liquidity_hints.get(i)
+                    if hint is not None:
+                        min_msat, max_msat, probability = hint
+                        probability *= liquidity_probability(amount_msat, min_msat, max_msat)
+                        if probability == 0:
                             continue
+                        edge_cost += probability_penalty(amount_msat, probability)
+                    alt_dist_to_neighbour = dist_to_edge_endnode + edge_cost
+                    if alt_dist_to_neighbour < distance_from_start[edge_startnode]:
+                        distance_from_start[edge_startnode] = alt_dist_to_neighbour
+                        prev_node[edge_startnode] = (short_channel_ids[slot], edge_endnode)
+                        heapq.heappush(nodes_to_explore, (alt_dist_to_neighbour, amount_msat + fee_msat, edge_startnode))
+            # our own channels
+            for edge_channel_id, edge_startnode in my_edges.get(edge_endnode, ()):
+                if edge_startnode == idx_a:  # payment outgoing, on our channel
+                    if not my_channels[edge_channel_id].can_pay(amount_msat, check_frozen=True):
+                        continue
+                else:  # payment incoming, on our channel. (funny business, cycle weirdness)
+                    assert edge_endnode == idx_a, (bh2u(node_ids[edge_startnode]), bh2u(node_ids[edge_endnode]))
+                    if not my_channels[edge_channel_id].can_receive(amount_msat, check_frozen=True):
+                        continue
                 edge_cost, fee_for_edge_msat = self._edge_cost(
                     edge_channel_id,
-                    start_node=edge_startnode,
-                    end_node=edge_endnode,
+                    start_node=node_ids[edge_startnode],
+                    end_node=node_ids[edge_endnode],
                     payment_amt_msat=amount_msat,
-                    ignore_costs=(edge_startnode == nodeA),
-                    is_mine=is_mine,
+                    ignore_costs=(edge_startnode == idx_a),
+                    is_mine=True,
                     my_channels=my_channels)
-                alt_dist_to_neighbour = distance_from_start[edge_endnode] + edge_cost
+                alt_dist_to_neighbour = dist_to_edge_endnode + edge_cost
                 if alt_dist_to_neighbour < distance_from_start[edge_startnode]:
                     distance_from_start[edge_startnode] = alt_dist_to_neighbour
-                    prev_node[edge_startnode] = PathEdge(node_id=edge_endnode,
-                                                         short_channel_id=ShortChannelID(edge_channel_id))
+                    prev_node[edge_startnode] = (ShortChannelID(edge_channel_id), edge_endnode)
                     amount_to_forward_msat = amount_msat + fee_for_edge_msat
-                    nodes_to_explore.put((alt_dist_to_neighbour, amount_to_forward_msat, edge_startnode))
+                    heapq.heappush(nodes_to_explore, (alt_dist_to_neighbour, amount_to_forward_msat, edge_startnode))
 
-        return prev_node
+        return prev_node, node_ids, idx_a, idx_b
 
     @profiler
     def find_path_for_payment(self, nodeA: bytes, nodeB: bytes,
                               invoice_amount_msat: int, *,
-                              my_channels: Dict[ShortChannelID, 'Channel'] = None) \
+                              my_channels: Dict[ShortChannelID, 'Channel'] = None,
+                              ignored_channels: Set[bytes] = None,
+                              ignored_nodes: Set[bytes] = None) \
             -> Optional[LNPaymentPath]:
         """Return a path from nodeA to nodeB."""
         assert type(nodeA) is bytes
@@ -272,21 +489,207 @@ class LNPathFinder(Logger):
         if my_channels is None:
             my_channels = {}
 
-        prev_node = self.get_distances(nodeA, nodeB, invoice_amount_msat, my_channels=my_channels)
+        prev_node, node_ids, idx_a, idx_b = self._run_dijkstra(
+            nodeA, nodeB, invoice_amount_msat, my_channels=my_channels,
+            ignored_channels=ignored_channels or set(),
+            ignored_nodes=ignored_nodes or set())
 
-        if nodeA not in prev_node:
+        if idx_a not in prev_node:
             return None  # no path found
 
         # backtrack from search_end (nodeA) to search_start (nodeB)
         # FIXME paths cannot be longer than 20 edges (onion packet)...
-        edge_startnode = nodeA
+        edge_startnode = idx_a
         path = []
-        while edge_startnode != nodeB:
-            edge = prev_node[edge_startnode]
-            path += [edge]
-            edge_startnode = edge.node_id
+        while edge_startnode != idx_b:
+            short_channel_id, edge_startnode = prev_node[edge_startnode]
+            path.append(PathEdge(node_id=node_ids[edge_startnode], short_channel_id=short_channel_id))
         return path
 
+    def get_path_cost(self, nodeA: bytes, path: LNPaymentPath, invoice_amount_msat: int, *,
+                      my_channels: Dict[ShortChannelID, 'Channel']) -> float:
+        """Cost of a path from nodeA, as measured by the path finding."""
+        cost = 0
+        amount_msat = invoice_amount_msat
+        start_nodes = [nodeA] + [edge.node_id for edge in path[:-1]]
+        for start_node, edge in reversed(list(zip(start_nodes, path))):
+            edge_cost, fee_msat = self._edge_cost(
+                edge.short_channel_id,
+                start_node=start_node,
+                end_node=edge.node_id,
+                payment_amt_msat=amount_msat,
+                ignore_costs=(start_node == nodeA),
+                is_mine=edge.short_channel_id in my_channels,
+                my_channels=my_channels)
+            cost += edge_cost
+            amount_msat += fee_msat
+        return cost
+
+    def find_k_shortest_paths(self, nodeA: bytes, nodeB: bytes,
+                              invoice_amount_msat: int, k: int, *,
+                              my_channels: Dict[ShortChannelID, 'Channel'] = None) -> List[LNPaymentPath]:
+        """Return up to k paths from nodeA to nodeB, cheapest first (Yen's algorithm).
+
+        Each path after the first deviates from one of the previous paths at a
+        spur node: it shares its root up to there, and continues with the
+        cheapest path from the spur node that takes neither an edge taken there
+        by a path with the same root, nor a node of the root.
+        """
+        if my_channels is None:
+            my_channels = {}
+        path = self.find_path_for_payment(nodeA, nodeB, invoice_amount_msat, my_channels=my_channels)
+        if not path:
+            return []
+        paths = [path]
+        seen = {tuple((edge.short_channel_id, edge.node_id) for edge in path)}
+        candidates = []  # heap of (cost, counter, path)
+        while len(paths) < k:
+            last_path = paths[-1]
+            for i in range(len(last_path)):
+                root = last_path[:i]
+                spur_node = root[-1].node_id if root else nodeA
+                ignored_channels = set(p[i].short_channel_id for p in paths if len(p) > i and p[:i] == root)
+                ignored_nodes = set([nodeA] + [edge.node_id for edge in root[:-1]]) - {spur_node}
+                # note: the first edge from the spur node is costed as if the spur node paid;
+                #       candidates are compared on their actual cost below
+                spur_path = self.find_path_for_payment(
+                    spur_node, nodeB, invoice_amount_msat,
+                    my_channels=my_channels if spur_node == nodeA else {},
+                    ignored_channels=ignored_channels,
+                    ignored_nodes=ignored_nodes)
+                if not spur_path:
+                    continue
+                candidate = list(root) + spur_path
+                key = tuple((edge.short_channel_id, edge.node_id) for edge in candidate)
+                if key in seen:
+                    continue
+                seen.add(key)
+                cost = self.get_path_cost(nodeA, candidate, invoice_amount_msat, my_channels=my_channels)
+                heapq.heappush(candidates, (cost, len(seen), candidate))
+            if not candidates:
+                break
+            cost, _, path = heapq.heappop(candidates)
+            if cost == float('inf'):
+                break
+            paths.append(path)
+        return paths
+
+    def get_success_probability(self, nodeA: bytes, path: LNPaymentPath, amount_msat: int, *,
+                                my_channels: Dict[ShortChannelID, 'Channel'],
+                                in_flight_msat: Dict[bytes, int] = None) -> float:
+        """Probability that amount_msat can be sent along path, while the amounts
+        in in_flight_msat (short_channel_id -> msat) are sent through the same channels.
+
+        The liquidity of a public channel is assumed to be uniformly distributed
+        between zero and its capacity, or between the bounds learned by mission
+        control. We know the liquidity of our own channels.
+        """
+        if in_flight_msat is None:
+            in_flight_msat = {}
+        now = int(time.time())
+        probability = 1.0
+        start_node = nodeA
+        for edge in path:
+            short_channel_id = edge.short_channel_id
+            used_msat = in_flight_msat.get(short_channel_id, 0)
+            chan = my_channels.get(short_channel_id)
+            if chan is not None:
+                if not chan.can_pay(used_msat + amount_msat, check_frozen=True):
+                    return 0.
+            else:
+                policy = self.channel_db.get_policy_for_node(short_channel_id, start_node, my_channels=my_channels)
+                if policy is not None and policy.htlc_maximum_msat is not None \
+                        and amount_msat > policy.htlc_maximum_msat:
+                    return 0.
+                channel_info = self.channel_db.get_channel_info(short_channel_id, my_channels=my_channels)
+                capacity_sat = channel_info.capacity_sat if channel_info is not None else None
+                hint = self._get_liquidity_hint(short_channel_id, start_node, capacity_sat, now=now)
+                if hint is not None:
+                    min_msat, max_msat, edge_probability = hint
+                elif capacity_sat is not None:
+                    min_msat, max_msat, edge_probability = 0, 1000 * capacity_sat + 1, 1.
+                else:
+                    min_msat, max_msat, edge_probability = 0, None, 1.
+                # given that used_msat can be sent
+                used_probability = liquidity_probability(used_msat, min_msat, max_msat)
+                if used_probability == 0:
+                    return 0.
+                edge_probability *= liquidity_probability(used_msat + amount_msat, min_msat, max_msat) / used_probability
+                if edge_probability == 0:
+                    return 0.
+                probability *= edge_probability
+            start_node = edge.node_id
+        return probability
+
+    @profiler
+    def split_payment(self, nodeA: bytes, targets: Sequence[bytes], amount_msat: int, *,
+                      my_channels: Dict[ShortChannelID, 'Channel'] = None,
+                      max_parts: int = MPP_MAX_PARTS) -> List[Tuple[LNPaymentPath, int]]:
+        """Split a payment from nodeA over several paths, each to one of targets
+        (e.g. the payee, and the border nodes of its routing hints).
+        Returns a list of (path, amount_msat), or [] if no split is likely to succeed.
+
+        The cheapest path to a target for the whole amount is used as is, if it
+        reaches MPP_TARGET_PROBABILITY. Otherwise, candidate paths are those,
+        and the k shortest paths for the smallest part. The payment
+        is cut in parts of equal size, each given to the candidate that is most
+        likely to carry it on top of the parts already given; parts given to the
+        same candidate are merged. The number of parts is the smallest one that
+        reaches MPP_TARGET_PROBABILITY, or else the one with the best probability.
+        """
+        if my_channels is None:
+            my_channels = {}
+        max_parts = max(1, min(max_parts, amount_msat // MPP_MIN_PART_MSAT))
+        # k shortest paths take many searches, so do not look for them if one path will do
+        candidates = []  # type: List[LNPaymentPath]
+        for nodeB in targets:
+            path = self.find_path_for_payment(nodeA, nodeB, amount_msat, my_channels=my_channels)
+            if path and path not in candidates:
+                candidates.append(path)
+        if candidates:
+            probability, j = max((self.get_success_probability(nodeA, path, amount_msat, my_channels=my_channels), -j)
+                                 for j, path in enumerate(candidates))
+            if probability >= MPP_TARGET_PROBABILITY:
+                self.logger.info(f'payment of {amount_msat} msat not split, '
+                                 f'probability of success {probability:.3f}')
+                return [(candidates[-j], amount_msat)]
+        for nodeB in targets:
+            # paths found for a part might not carry more than that
+            paths = self.find_k_shortest_paths(nodeA, nodeB, amount_msat // max_parts,
+                                               MPP_NUM_CANDIDATE_PATHS, my_channels=my_channels)
+            for path in paths:
+                if path not in candidates:
+                    candidates.append(path)
+        if not candidates:
+            return []
+        best_split, best_probability = [], 0.
+        for num_parts in range(1, max_parts + 1):
+            part_msat, remainder_msat = divmod(amount_msat, num_parts)
+            in_flight_msat = defaultdict(int)
+            split = defaultdict(int)  # type: Dict[int, int]  # candidate index -> amount_msat
+            probability = 1.
+            for i in range(num_parts):
+                amount = part_msat + (remainder_msat if i == 0 else 0)
+                part_probability, j = max(
+                    (self.get_success_probability(nodeA, path, amount, my_channels=my_channels,
+                                                  in_flight_msat=in_flight_msat), -j)
+                    for j, path in enumerate(candidates))
+                j = -j  # prefer cheaper paths on ties
+                probability *= part_probability
+                if probability == 0:
+                    break
+                split[j] += amount
+                for edge in candidates[j]:
+                    in_flight_msat[edge.short_channel_id] += amount
+            if probability > best_probability:
+                best_split = [(candidates[j], amount) for j, amount in split.items()]
+                best_probability = probability
+            if best_probability >= MPP_TARGET_PROBABILITY:
+                break
+        self.logger.info(f'split payment of {amount_msat} msat in {len(best_split)} parts, '
+                         f'probability of success {best_probability:.3f}')
+        return best_split
+
     def create_route_from_path(self, path: Optional[LNPaymentPath], from_node_id: bytes, *,
                                my_channels: Dict[ShortChannelID, 'Channel'] = None) -> LNPaymentRoute:
         assert isinstance(from_node_id, bytes)
@@ -7,7 +7,7 @@ import os
 from decimal import Decimal
 import random
 import time
-from typing import Optional, Sequence, Tuple, List, Dict, TYPE_CHECKING, NamedTuple, Union, Mapping, Any
+from typing import Optional, Sequence, Tuple, List, Dict, TYPE_CHECKING, NamedTuple, Union, Mapping, Any, Set
 import threading
 import socket
 import aiohttp
@@ -35,7 +35,7 @@ from .transaction import Transaction
 from .crypto import sha256
 from .bip32 import BIP32Node
 from .util import bh2u, bfh, InvoiceError, resolve_dns_srv, is_ip_address, log_exceptions
-from .util import ignore_exceptions, make_aiohttp_session, SilentTaskGroup
+from .util import ignore_exceptions, SilentTaskGroup
 from .util import timestamp_to_datetime, random_shuffled_copy
 from .util import MyEncoder, is_private_netaddress
 from .logging import Logger
@@ -83,6 +83,9 @@ SAVED_PR_STATUS = [PR_PAID, PR_UNPAID, PR_INFLIGHT] # status that are persisted
 
 NUM_PEERS_TARGET = 4
 
+PAYMENT_DEADLINE = 120  # seconds during which failed parts of a payment are routed again
+MPP_RECEIVE_TIMEOUT = 60  # seconds we wait for the other parts of a multi-part payment
+
 
 FALLBACK_NODE_LIST_TESTNET = (
     LNPeerAddr(host='203.132.95.10', port=9735, pubkey=bfh('038863cf8ab91046230f561cd5b386cbff8309fa02e3f0c3ed161a3aeb64a643b9')),
@@ -445,10 +448,14 @@ class LNGossip(LNWorker):
 
     async def maintain_db(self):
         await self.channel_db.load_data()
+        last_snapshot_time = time.monotonic()
         while True:
             if len(self.unknown_ids) == 0:
                 self.channel_db.prune_old_policies(self.max_age)
                 self.channel_db.prune_orphaned_channels()
+            if time.monotonic() - last_snapshot_time >= self.channel_db.SNAPSHOT_INTERVAL:
+                await self.channel_db.save_snapshot()
+                last_snapshot_time = time.monotonic()
             await asyncio.sleep(120)
 
     async def add_new_ids(self, ids):
@@ -492,6 +499,7 @@ class LNWallet(LNWorker):
         self.lnwatcher = None
         self.features |= LnFeatures.OPTION_DATA_LOSS_PROTECT_REQ
         self.features |= LnFeatures.OPTION_STATIC_REMOTEKEY_REQ
+        self.features |= LnFeatures.BASIC_MPP_OPT
         self.payments = self.db.get_dict('lightning_payments')     # RHASH -> amount, direction, is_paid  # FIXME amt should be msat
         self.preimages = self.db.get_dict('lightning_preimages')   # RHASH -> preimage
         self.sweep_address = wallet.get_new_sweep_address_for_channel()  # TODO possible address-reuse
@@ -507,7 +515,10 @@ class LNWallet(LNWorker):
         for channel_id, c in random_shuffled_copy(channels.items()):
             self._channels[bfh(channel_id)] = Channel(c, sweep_address=self.sweep_address, lnworker=self)
 
-        self.pending_payments = defaultdict(asyncio.Future)  # type: Dict[bytes, asyncio.Future[BarePaymentAttemptLog]]
+        self.pending_htlcs = defaultdict(asyncio.Future)  # type: Dict[Tuple[bytes, int], asyncio.Future[BarePaymentAttemptLog]]  # (channel_id, htlc_id) of sent htlcs
+        self.received_htlc_parts = defaultdict(dict)  # type: Dict[bytes, Dict[Tuple[bytes, int], Tuple[int, int]]]  # RHASH -> (channel_id, htlc_id) -> (amount_msat, total_msat)
+        self.received_mpp_complete = set()  # type: Set[bytes]  # RHASH of multi-part payments whose parts add up
+        self.received_mpp_failed = set()  # type: Set[bytes]  # RHASH of multi-part payments whose parts are all failed
 
     @property
     def channels(self) -> Mapping[bytes, Channel]:
@@ -544,7 +555,7 @@ class LNWallet(LNWorker):
                 continue
             # try to sync with the remote watchtower
             try:
-                async with make_aiohttp_session(proxy=self.network.proxy) as session:
+                async with self.network.http_session() as session:
                     watchtower = JsonRPCClient(session, watchtower_url)
                     watchtower.add_method('get_ctn')
                     watchtower.add_method('add_sweep_tx')
@@ -741,6 +752,9 @@ class LNWallet(LNWorker):
                 if chan.node_id == node_id}
 
     def channel_state_changed(self, chan):
+        if chan.is_closed():
+            # htlcs of closed channels are resolved on-chain
+            self.remove_received_htlc_parts(chan.channel_id)
         self.save_channel(chan)
         util.trigger_callback('channel', self.wallet, chan)
 
@@ -877,27 +891,31 @@ class LNWallet(LNWorker):
         self.logs[key] = log = []
         success = False
         reason = ''
-        for i in range(attempts):
-            try:
-                # note: path-finding runs in a separate thread so that we don't block the asyncio loop
-                # graph updates might occur during the computation
-                self.set_invoice_status(key, PR_ROUTING)
-                util.trigger_callback('invoice_status', key)
-                route = await run_in_thread(partial(self._create_route_from_invoice, lnaddr, full_path=full_path))
-                self.set_invoice_status(key, PR_INFLIGHT)
-                util.trigger_callback('invoice_status', key)
-                payment_attempt_log = await self._pay_to_route(route, lnaddr)
-            except Exception as e:
-                log.append(PaymentAttemptLog(success=False, exception=e))
-                self.set_invoice_status(key, PR_UNPAID)
-                reason = str(e)
-                break
-            log.append(payment_attempt_log)
-            success = payment_attempt_log.success
-            if success:
-                break
+        if full_path is None and self._can_pay_multipart(lnaddr):
+            success, reason = await self._pay_multipart(lnaddr, log, attempts=attempts)
         else:
-            reason = _('Failed after {} attempts').format(attempts)
+            for i in range(attempts):
+                try:
+                    # note: path-finding runs in a separate thread so that we don't block the asyncio loop
+                    # graph updates might occur during the computation
+                    self.set_invoice_status(key, PR_ROUTING)
+                    util.trigger_callback('invoice_status', key)
+                    route = await run_in_thread(partial(self._create_route_from_invoice, lnaddr, full_path=full_path))
+                    self.set_invoice_status(key, PR_INFLIGHT)
+                    util.trigger_callback('invoice_status', key)
+                    payment_attempt_log = await self._pay_to_route(route, lnaddr)
+                except Exception as e:
+                    log.append(PaymentAttemptLog(success=False, exception=e))
+                    self.set_invoice_status(key, PR_UNPAID)
+                    reason = str(e)
+                    break
+                log.append(payment_attempt_log)
+                success = payment_attempt_log.success
+                if success:
+                    break
+            else:
+                self.set_invoice_status(key, PR_UNPAID)
+                reason = _('Failed after {} attempts').format(attempts)
         util.trigger_callback('invoice_status', key)
         if success:
             util.trigger_callback('payment_succeeded', self.wallet, key)
@@ -905,28 +923,102 @@ class LNWallet(LNWorker):
             util.trigger_callback('payment_failed', self.wallet, key, reason)
         return success, log
 
-    async def _pay_to_route(self, route: LNPaymentRoute, lnaddr: LnAddr) -> PaymentAttemptLog:
+    @staticmethod
+    def _can_pay_multipart(lnaddr: LnAddr) -> bool:
+        invoice_features = LnFeatures(lnaddr.get_tag('9') or 0)
+        return lnaddr.payment_secret is not None \
+               and bool(invoice_features & (LnFeatures.BASIC_MPP_OPT | LnFeatures.BASIC_MPP_REQ))
+
+    async def _pay_multipart(self, lnaddr: LnAddr, log: List[PaymentAttemptLog], *,
+                             attempts: int) -> Tuple[bool, str]:
+        """Pays an invoice in parts, sent concurrently over several routes.
+        The amount of failed parts is routed again, as long as there are
+        attempts left and PAYMENT_DEADLINE has not passed.
+        Parts in flight are always awaited.
+        """
+        key = lnaddr.paymenthash.hex()
+        total_msat = lnaddr.get_amount_msat()
+        deadline = time.monotonic() + PAYMENT_DEADLINE
+        remaining_msat = total_msat
+        in_flight = {}  # type: Dict[asyncio.Future, int]  # -> amount_msat
+        num_attempts = 0
+        success = False
+        reason = ''
+        while True:
+            if remaining_msat and not success and num_attempts < attempts and time.monotonic() < deadline:
+                num_attempts += 1
+                self.set_invoice_status(key, PR_ROUTING)
+                util.trigger_callback('invoice_status', key)
+                try:
+                    # note: path-finding runs in a separate thread so that we don't block the asyncio loop
+                    routes = await run_in_thread(partial(self._create_routes_for_multipart, lnaddr, remaining_msat))
+                except Exception as e:
+                    log.append(PaymentAttemptLog(success=False, exception=e))
+                    reason = str(e)
+                    num_attempts = attempts  # no point in trying again
+                else:
+                    self.set_invoice_status(key, PR_INFLIGHT)
+                    util.trigger_callback('invoice_status', key)
+                    for route, amount_msat in routes:
+                        fut = asyncio.ensure_future(self._pay_to_route(
+                            route, lnaddr, amount_msat=amount_msat, total_msat=total_msat))
+                        in_flight[fut] = amount_msat
+                        remaining_msat -= amount_msat
+            if not in_flight:
+                break
+            done, pending = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                amount_msat = in_flight.pop(fut)
+                try:
+                    payment_attempt_log = fut.result()
+                except Exception as e:
+                    payment_attempt_log = PaymentAttemptLog(success=False, exception=e)
+                    reason = str(e)
+                log.append(payment_attempt_log)
+                if payment_attempt_log.success:
+                    # the recipient only settles once it has all the parts
+                    success = True
+                else:
+                    remaining_msat += amount_msat
+        if not success:
+            self.set_invoice_status(key, PR_UNPAID)
+            reason = reason or _('Failed after {} attempts').format(num_attempts)
+        return success, reason
+
+    async def _pay_to_route(self, route: LNPaymentRoute, lnaddr: LnAddr, *,
+                            amount_msat: int = None, total_msat: int = None) -> PaymentAttemptLog:
         short_channel_id = route[0].short_channel_id
         chan = self.get_channel_by_short_id(short_channel_id)
         peer = self._peers.get(route[0].node_id)
         if not peer:
             raise Exception('Dropped peer')
         await peer.initialized
+        amount_msat = amount_msat or lnaddr.get_amount_msat()
         htlc = peer.pay(route=route,
                         chan=chan,
-                        amount_msat=lnaddr.get_amount_msat(),
+                        amount_msat=amount_msat,
                         payment_hash=lnaddr.paymenthash,
                         min_final_cltv_expiry=lnaddr.get_min_final_cltv_expiry(),
-                        payment_secret=lnaddr.payment_secret)
+                        payment_secret=lnaddr.payment_secret,
+                        total_msat=total_msat)
         util.trigger_callback('htlc_added', chan, htlc, SENT)
-        payment_attempt = await self.await_payment(lnaddr.paymenthash)
+        payment_attempt = await self.await_payment(chan, htlc.htlc_id)
         if payment_attempt.success:
             failure_log = None
+            self.network.path_finder.update_liquidity_hints(route, amount_msat)
         else:
             if payment_attempt.error_bytes:
                 # TODO "decode_onion_error" might raise, catch and maybe blacklist/penalise someone?
                 failure_msg, sender_idx = chan.decode_onion_error(payment_attempt.error_bytes, route, htlc.htlc_id)
+                # the channel after the reporter node failed, the ones before forwarded the htlc
+                is_liquidity_failure = failure_msg.code == OnionFailureCode.TEMPORARY_CHANNEL_FAILURE
+                self.network.path_finder.update_liquidity_hints(
+                    route, amount_msat, failing_edge_index=sender_idx + 1,
+                    is_liquidity_failure=is_liquidity_failure)
                 is_blacklisted = self.handle_error_code_from_failed_htlc(failure_msg, sender_idx, route, peer)
+                # the liquidity hint avoids the channel for this amount only,
+                # blacklisting it would avoid it for any amount
+                is_blacklisted = is_blacklisted and not is_liquidity_failure
                 if is_blacklisted:
                     # blacklist channel after reporter node
                     # TODO this should depend on the error (even more granularity)
@@ -1071,30 +1163,8 @@ class LNWallet(LNWorker):
                                                                         my_channels=scid_to_my_channels)
             except NoChannelPolicy:
                 continue
-            # we need to shift the node pubkey by one towards the destination:
-            private_route_nodes = [edge[0] for edge in private_route][1:] + [invoice_pubkey]
-            private_route_rest = [edge[1:] for edge in private_route]
-            prev_node_id = border_node_pubkey
-            for node_pubkey, edge_rest in zip(private_route_nodes, private_route_rest):
-                short_channel_id, fee_base_msat, fee_proportional_millionths, cltv_expiry_delta = edge_rest
-                short_channel_id = ShortChannelID(short_channel_id)
-                # if we have a routing policy for this edge in the db, that takes precedence,
-                # as it is likely from a previous failure
-                channel_policy = self.channel_db.get_policy_for_node(short_channel_id=short_channel_id,
-                                                                     node_id=prev_node_id,
-                                                                     my_channels=scid_to_my_channels)
-                if channel_policy:
-                    fee_base_msat = channel_policy.fee_base_msat
-                    fee_proportional_millionths = channel_policy.fee_proportional_millionths
-                    cltv_expiry_delta = channel_policy.cltv_expiry_delta
-                node_info = self.channel_db.get_node_info_for_node_id(node_id=node_pubkey)
-                route.append(RouteEdge(node_id=node_pubkey,
-                                       short_channel_id=short_channel_id,
-                                       fee_base_msat=fee_base_msat,
-                                       fee_proportional_millionths=fee_proportional_millionths,
-                                       cltv_expiry_delta=cltv_expiry_delta,
-                                       node_features=node_info.features if node_info else 0))
-                prev_node_id = node_pubkey
+            self._extend_route_with_private_route(route, private_route, invoice_pubkey,
+                                                  my_channels=scid_to_my_channels)
             # test sanity
             if not is_route_sane_to_use(route, amount_msat, decoded_invoice.get_min_final_cltv_expiry()):
                 self.logger.info(f"rejecting insane route {route}")
@@ -1123,6 +1193,73 @@ class LNWallet(LNWorker):
         route[-1].node_features |= invoice_features
         return route
 
+    def _extend_route_with_private_route(self, route: LNPaymentRoute, private_route, invoice_pubkey: bytes, *,
+                                         my_channels: Dict[ShortChannelID, Channel]) -> None:
+        """Appends the edges of a routing hint ('r' field) to a route that ends at its border node."""
+        # we need to shift the node pubkey by one towards the destination:
+        private_route_nodes = [edge[0] for edge in private_route][1:] + [invoice_pubkey]
+        private_route_rest = [edge[1:] for edge in private_route]
+        prev_node_id = private_route[0][0]
+        for node_pubkey, edge_rest in zip(private_route_nodes, private_route_rest):
+            short_channel_id, fee_base_msat, fee_proportional_millionths, cltv_expiry_delta = edge_rest
+            short_channel_id = ShortChannelID(short_channel_id)
+            # if we have a routing policy for this edge in the db, that takes precedence,
+            # as it is likely from a previous failure
+            channel_policy = self.channel_db.get_policy_for_node(short_channel_id=short_channel_id,
+                                                                 node_id=prev_node_id,
+                                                                 my_channels=my_channels)
+            if channel_policy:
+                fee_base_msat = channel_policy.fee_base_msat
+                fee_proportional_millionths = channel_policy.fee_proportional_millionths
+                cltv_expiry_delta = channel_policy.cltv_expiry_delta
+            node_info = self.channel_db.get_node_info_for_node_id(node_id=node_pubkey)
+            route.append(RouteEdge(node_id=node_pubkey,
+                                   short_channel_id=short_channel_id,
+                                   fee_base_msat=fee_base_msat,
+                                   fee_proportional_millionths=fee_proportional_millionths,
+                                   cltv_expiry_delta=cltv_expiry_delta,
+                                   node_features=node_info.features if node_info else 0))
+            prev_node_id = node_pubkey
+
+    @profiler
+    def _create_routes_for_multipart(self, decoded_invoice: 'LnAddr',
+                                     amount_msat: int) -> List[Tuple[LNPaymentRoute, int]]:
+        """Returns routes for the parts of a payment of amount_msat, as (route, amount_msat).
+        Parts go either to the invoice pubkey, or to the border node of a routing hint.
+        """
+        invoice_pubkey = decoded_invoice.pubkey.serialize()
+        invoice_features = decoded_invoice.get_tag('9') or 0
+        min_final_cltv_expiry = decoded_invoice.get_min_final_cltv_expiry()
+        # border node -> private route
+        private_routes = {}  # type: Dict[bytes, Sequence]
+        for tag in decoded_invoice.tags:
+            if tag[0] == 'r' and 0 < len(tag[1]) <= NUM_MAX_EDGES_IN_PAYMENT_PATH:
+                private_routes.setdefault(tag[1][0][0], tag[1])
+        scid_to_my_channels = {chan.short_channel_id: chan for chan in self.channels.values()
+                               if chan.short_channel_id is not None}
+        path_finder = self.network.path_finder
+        parts = path_finder.split_payment(self.node_keypair.pubkey, list(private_routes) + [invoice_pubkey],
+                                          amount_msat, my_channels=scid_to_my_channels)
+        if not parts:
+            raise NoPathFound()
+        routes = []
+        for path, part_msat in parts:
+            route = path_finder.create_route_from_path(path, self.node_keypair.pubkey,
+                                                       my_channels=scid_to_my_channels)
+            private_route = private_routes.get(route[-1].node_id)
+            if private_route:
+                self._extend_route_with_private_route(route, private_route, invoice_pubkey,
+                                                      my_channels=scid_to_my_channels)
+            if not is_route_sane_to_use(route, part_msat, min_final_cltv_expiry):
+                self.logger.info(f"rejecting insane route {route}")
+                raise NoPathFound()
+            if route[-1].node_id != invoice_pubkey:
+                raise LNPathInconsistent("last node_id != invoice pubkey")
+            # add features from invoice
+            route[-1].node_features |= invoice_features
+            routes.append((route, part_msat))
+        return routes
+
     def add_request(self, amount_sat, message, expiry) -> str:
         coro = self._add_request_coro(amount_sat, message, expiry)
         fut = asyncio.run_coroutine_threadsafe(coro, self.network.asyncio_loop)
@@ -1213,9 +1350,10 @@ class LNWallet(LNWorker):
         if status in SAVED_PR_STATUS:
             self.set_payment_status(bfh(key), status)
 
-    async def await_payment(self, payment_hash: bytes) -> BarePaymentAttemptLog:
-        payment_attempt = await self.pending_payments[payment_hash]
-        self.pending_payments.pop(payment_hash)
+    async def await_payment(self, chan: Channel, htlc_id: int) -> BarePaymentAttemptLog:
+        key = chan.channel_id, htlc_id
+        payment_attempt = await self.pending_htlcs[key]
+        self.pending_htlcs.pop(key)
         return payment_attempt
 
     def set_payment_status(self, payment_hash: bytes, status):
@@ -1226,10 +1364,11 @@ class LNWallet(LNWorker):
         info = info._replace(status=status)
         self.save_payment_info(info)
 
-    def payment_failed(self, chan, payment_hash: bytes, error_bytes: bytes, failure_message):
-        self.set_payment_status(payment_hash, PR_UNPAID)
-        f = self.pending_payments.get(payment_hash)
+    def payment_failed(self, chan, payment_hash: bytes, htlc_id: int, error_bytes: bytes, failure_message):
+        f = self.pending_htlcs.get((chan.channel_id, htlc_id))
         if f and not f.cancelled():
+            # the payment is still in flight: other parts, or another attempt, might
+            # follow. _pay decides its status.
             payment_attempt = BarePaymentAttemptLog(
                 success=False,
                 error_bytes=error_bytes,
@@ -1237,15 +1376,16 @@ class LNWallet(LNWorker):
             f.set_result(payment_attempt)
         else:
             chan.logger.info('received unexpected payment_failed, probably from previous session')
+            self.set_payment_status(payment_hash, PR_UNPAID)
             key = payment_hash.hex()
             util.trigger_callback('invoice_status', key)
             util.trigger_callback('payment_failed', self.wallet, key, '')
         util.trigger_callback('ln_payment_failed', payment_hash, chan.channel_id)
 
-    def payment_sent(self, chan, payment_hash: bytes):
+    def payment_sent(self, chan, payment_hash: bytes, htlc_id: int):
         self.set_payment_status(payment_hash, PR_PAID)
         preimage = self.get_preimage(payment_hash)
-        f = self.pending_payments.get(payment_hash)
+        f = self.pending_htlcs.get((chan.channel_id, htlc_id))
         if f and not f.cancelled():
             payment_attempt = BarePaymentAttemptLog(
                 success=True,
@@ -1258,6 +1398,47 @@ class LNWallet(LNWorker):
             util.trigger_callback('payment_succeeded', self.wallet, key)
         util.trigger_callback('ln_payment_completed', payment_hash, chan.channel_id)
 
+    def add_received_htlc_part(self, chan: Channel, htlc: UpdateAddHtlc, total_msat: int) -> Optional[OnionFailureCode]:
+        """Adds a received htlc that is part of a multi-part payment.
+        Returns the code to fail it with if it must be failed: the parts do
+        not agree on total_msat, or it has waited too long for the others.
+        Parts are kept until settled or failed, see remove_received_htlc_parts.
+        """
+        payment_hash = htlc.payment_hash
+        parts = self.received_htlc_parts[payment_hash]
+        if any(part_total_msat != total_msat for amount_msat, part_total_msat in parts.values()):
+            # the whole set must be failed, unless it was already settled
+            if not self.is_received_mpp_complete(payment_hash):
+                self.received_mpp_failed.add(payment_hash)
+            return OnionFailureCode.INCORRECT_OR_UNKNOWN_PAYMENT_DETAILS
+        parts[(chan.channel_id, htlc.htlc_id)] = htlc.amount_msat, total_msat
+        if payment_hash in self.received_mpp_failed:
+            return OnionFailureCode.INCORRECT_OR_UNKNOWN_PAYMENT_DETAILS
+        if sum(amount_msat for amount_msat, part_total_msat in parts.values()) >= total_msat:
+            self.received_mpp_complete.add(payment_hash)
+        if self.is_received_mpp_complete(payment_hash):
+            return None
+        if time.time() - htlc.timestamp > MPP_RECEIVE_TIMEOUT:
+            return OnionFailureCode.MPP_TIMEOUT
+        return None
+
+    def is_received_mpp_complete(self, payment_hash: bytes) -> bool:
+        return (payment_hash in self.received_mpp_complete
+                # the preimage is out already, e.g. we settled the other parts before a restart
+                or self.get_payment_status(payment_hash) == PR_PAID)
+
+    def remove_received_htlc_parts(self, channel_id: bytes, htlc_id: int = None) -> None:
+        """Forgets the received parts in a channel, or only htlc_id,
+        once they are settled or failed."""
+        for payment_hash, parts in list(self.received_htlc_parts.items()):
+            for key in list(parts):
+                if key[0] == channel_id and htlc_id in (None, key[1]):
+                    parts.pop(key)
+            if not parts:
+                self.received_htlc_parts.pop(payment_hash)
+                self.received_mpp_complete.discard(payment_hash)
+                self.received_mpp_failed.discard(payment_hash)
+
     def payment_received(self, chan, payment_hash: bytes):
         self.set_payment_status(payment_hash, PR_PAID)
         util.trigger_callback('request_status', payment_hash.hex(), PR_PAID)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+#
+# Electrum - lightweight Bitcoin client
+# Copyright (C) 2020 The Electrum developers
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple, List, TYPE_CHECKING
+
+from .sql_db import SqlDB, sql
+from .util import get_headers_dir, log_exceptions
+from .logging import Logger
+
+if TYPE_CHECKING:
+    from .network import Network
+
+
+# liquidity moves as payments go through a channel, so what we learned decays
+LIQUIDITY_HALF_LIFE = 3600  # seconds
+MAX_AGE = 10 * LIQUIDITY_HALF_LIFE  # older outcomes are forgotten
+
+
+create_liquidity_hint = """
+CREATE TABLE IF NOT EXISTS liquidity_hint (
+short_channel_id BLOB(8),
+start_node BLOB(33),
+min_msat INTEGER NOT NULL,
+max_msat INTEGER,
+timestamp INTEGER NOT NULL,
+PRIMARY KEY(short_channel_id, start_node)
+)"""
+
+create_failure = """
+CREATE TABLE IF NOT EXISTS failure (
+short_channel_id BLOB(8),
+timestamp INTEGER NOT NULL,
+PRIMARY KEY(short_channel_id)
+)"""
+
+
+def decay(age: int) -> float:
+    return 0.5 ** (max(0, age) / LIQUIDITY_HALF_LIFE)
+
+
+class LiquidityHint(NamedTuple):
+    """Liquidity of a channel in one direction, as learned at timestamp:
+    min_msat could be sent, max_msat (if not None) could not."""
+    min_msat: int
+    max_msat: Optional[int]
+    timestamp: int
+
+    def get_bounds(self, now: int) -> Tuple[float, Optional[float]]:
+        """The bounds at time now: the lower one decays towards zero,
+        and the upper one grows, until we know nothing anymore."""
+        d = decay(now - self.timestamp)
+        return self.min_msat * d, self.max_msat / d if self.max_msat is not None else None
+
+
+class MissionControl(Logger):
+    """What payment attempts taught us about the channels of the network:
+    bounds on their liquidity, and when they last failed for other reasons.
+    Persisted in db, if given.
+    """
+
+    def __init__(self, db: 'MissionControlDB' = None):
+        Logger.__init__(self)
+        self.db = db
+        self.lock = threading.RLock()
+        # note: modify/iterate needs self.lock
+        self._liquidity_hints = {}  # type: Dict[Tuple[bytes, bytes], LiquidityHint]  # (scid, start_node) -> hint
+        self._failures = {}  # type: Dict[bytes, int]  # short_channel_id -> timestamp
+
+    @log_exceptions
+    async def load_data(self):
+        if self.db is None:
+            return
+        liquidity_hints, failures = await self.db.load_data(int(time.time()))
+        with self.lock:
+            # what was learned while loading is more recent
+            for key, hint in liquidity_hints.items():
+                self._liquidity_hints.setdefault(key, hint)
+            for short_channel_id, timestamp in failures.items():
+                self._failures.setdefault(short_channel_id, timestamp)
+        self.logger.info(f'loaded {len(liquidity_hints)} liquidity hints, {len(failures)} failures')
+
+    def _set_liquidity_hint(self, short_channel_id: bytes, start_node: bytes,
+                            min_msat: float, max_msat: Optional[float], now: int) -> None:
+        hint = LiquidityHint(min_msat=int(min_msat),
+                             max_msat=int(max_msat) if max_msat is not None else None,
+                             timestamp=now)
+        with self.lock:
+            self._liquidity_hints[(bytes(short_channel_id), start_node)] = hint
+        if self.db:
+            self.db.save_liquidity_hint(bytes(short_channel_id), start_node, hint)
+
+    def report_success(self, short_channel_id: bytes, start_node: bytes, amount_msat: int, *,
+                       now: int = None) -> None:
+        """amount_msat could be sent from start_node through the channel."""
+        now = int(time.time()) if now is None else now
+        min_msat, max_msat = self.get_liquidity_bounds(short_channel_id, start_node, now=now) or (0, None)
+        min_msat = max(min_msat, amount_msat)
+        if max_msat is not None and max_msat <= min_msat:
+            max_msat = None  # the liquidity has changed
+        self._set_liquidity_hint(short_channel_id, start_node, min_msat, max_msat, now)
+
+    def report_liquidity_failure(self, short_channel_id: bytes, start_node: bytes, amount_msat: int, *,
+                                 now: int = None) -> None:
+        """amount_msat could not be sent from start_node through the channel."""
+        now = int(time.time()) if now is None else now
+        min_msat, max_msat = self.get_liquidity_bounds(short_channel_id, start_node, now=now) or (0, None)
+        max_msat = min(max_msat, amount_msat) if max_msat is not None else amount_msat
+        max_msat = max(1, max_msat)
+        if min_msat >= max_msat:
+            min_msat = 0  # the liquidity has changed
+        self._set_liquidity_hint(short_channel_id, start_node, min_msat, max_msat, now)
+
+    def report_failure(self, short_channel_id: bytes, *, now: int = None) -> None:
+        """The channel failed for a reason other than its liquidity."""
+        now = int(time.time()) if now is None else now
+        with self.lock:
+            self._failures[bytes(short_channel_id)] = now
+        if self.db:
+            self.db.save_failure(bytes(short_channel_id), now)
+
+    def get_liquidity_bounds(self, short_channel_id: bytes, start_node: bytes, *,
+                             now: int) -> Optional[Tuple[float, Optional[float]]]:
+        """Returns (min_msat, max_msat) at time now, or None if nothing was learned.
+        max_msat is None if unknown."""
+        with self.lock:
+            hint = self._liquidity_hints.get((bytes(short_channel_id), start_node))
+        if hint is None or now - hint.timestamp > MAX_AGE:
+            return None
+        return hint.get_bounds(now)
+
+    def get_liquidity_hint_keys(self) -> List[Tuple[bytes, bytes]]:
+        """(short_channel_id, start_node) of the channels we have learned about."""
+        with self.lock:
+            return list(self._liquidity_hints)
+
+    def get_failure_time(self, short_channel_id: bytes) -> Optional[int]:
+        with self.lock:
+            return self._failures.get(bytes(short_channel_id))
+
+    def get_failures(self) -> Dict[bytes, int]:
+        with self.lock:
+            return dict(self._failures)
+
+    def clear(self) -> None:
+        with self.lock:
+            self._liquidity_hints.clear()
+            self._failures.clear()
+        if self.db:
+            self.db.clear()
+
+
+class MissionControlDB(SqlDB):
+
+    def __init__(self, network: 'Network'):
+        path = os.path.join(get_headers_dir(network.config), 'mission_control_db')
+        super().__init__(network.asyncio_loop, path, commit_interval=10)
+
+    def create_database(self):
+        c = self.conn.cursor()
+        c.execute(create_liquidity_hint)
+        c.execute(create_failure)
+        self.conn.commit()
+
+    @sql
+    def load_data(self, now: int) -> Tuple[Dict[Tuple[bytes, bytes], LiquidityHint], Dict[bytes, int]]:
+        c = self.conn.cursor()
+        c.execute("DELETE FROM liquidity_hint WHERE timestamp < ?", (now - MAX_AGE,))
+        c.execute("DELETE FROM failure WHERE timestamp < ?", (now - MAX_AGE,))
+        self.conn.commit()
+        c.execute("SELECT short_channel_id, start_node, min_msat, max_msat, timestamp FROM liquidity_hint")
+        liquidity_hints = {(bytes(short_channel_id), bytes(start_node)): LiquidityHint(min_msat, max_msat, timestamp)
+                           for short_channel_id, start_node, min_msat, max_msat, timestamp in c}
+        c.execute("SELECT short_channel_id, timestamp FROM failure")
+        failures = {bytes(short_channel_id): timestamp for short_channel_id, timestamp in c}
+        return liquidity_hints, failures
+
+    @sql
+    def save_liquidity_hint(self, short_channel_id: bytes, start_node: bytes, hint: LiquidityHint):
+        c = self.conn.cursor()
+        c.execute("REPLACE INTO liquidity_hint (short_channel_id, start_node, min_msat, max_msat, timestamp) "
+                  "VALUES (?,?,?,?,?)", (short_channel_id, start_node, hint.min_msat, hint.max_msat, hint.timestamp))
+
+    @sql
+    def save_failure(self, short_channel_id: bytes, timestamp: int):
+        c = self.conn.cursor()
+        c.execute("REPLACE INTO failure (short_channel_id, timestamp) VALUES (?,?)", (short_channel_id, timestamp))
+
+    @sql
+    def clear(self):
+        c = self.conn.cursor()
+        c.execute("DELETE FROM liquidity_hint")
+        c.execute("DELETE FROM failure")
+        self.conn.commit()
@@ -36,15 +36,18 @@ from typing import NamedTuple, Optional, Sequence, List, Dict, Tuple, TYPE_CHECK
 import traceback
 import concurrent
 from concurrent import futures
+from contextlib import asynccontextmanager
 
 import aiorpcx
 from aiorpcx import TaskGroup
+import aiohttp
 from aiohttp import ClientResponse
 
 from . import util
 from .util import (log_exceptions, ignore_exceptions,
-                   bfh, SilentTaskGroup, make_aiohttp_session, send_exception_to_crash_reporter,
-                   is_hash256_str, is_non_negative_integer, MyEncoder, NetworkRetryManager)
+                   bfh, SilentTaskGroup, make_aiohttp_session, HttpSessionPool,
+                   send_exception_to_crash_reporter, is_hash256_str, is_non_negative_integer,
+                   MyEncoder, NetworkRetryManager)
 
 from .bitcoin import COIN
 from . import constants
@@ -322,6 +325,8 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
         self.auto_connect = self.config.get('auto_connect', True)
         self._connecting = set()
         self.proxy = None
+        # shared by the http requests made through the network, see http_session
+        self.http_session_pool = HttpSessionPool()
         self._maybe_set_oneserver()
 
         # Dump network messages (all interfaces).  Set at runtime from the console.
@@ -347,8 +352,11 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
             from . import lnworker
             from . import lnrouter
             from . import channel_db
+            from . import mission_control
             self.channel_db = channel_db.ChannelDB(self)
-            self.path_finder = lnrouter.LNPathFinder(self.channel_db)
+            self.mission_control = mission_control.MissionControl(mission_control.MissionControlDB(self))
+            asyncio.run_coroutine_threadsafe(self.mission_control.load_data(), self.asyncio_loop)
+            self.path_finder = lnrouter.LNPathFinder(self.channel_db, self.mission_control)
             self.lngossip = lnworker.LNGossip()
             self.lngossip.start_network(self)
 
@@ -576,6 +584,8 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
         self.proxy = proxy
         dns_hacks.configure_dns_depending_on_proxy(bool(proxy))
         self.logger.info(f'setting proxy {proxy}')
+        # connections made through the old proxy config must not be reused
+        asyncio.run_coroutine_threadsafe(self.http_session_pool.close_other_sessions(proxy), self.asyncio_loop)
         util.trigger_callback('proxy_set', self.proxy)
 
     @log_exceptions
@@ -1169,7 +1179,12 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
         self.interface = None
         self.interfaces = {}
         self._connecting.clear()
-        if not full_shutdown:
+        if full_shutdown:
+            # record the tips of forks, so that they need not be re-checked at startup
+            blockchain.write_fork_index(self.config)
+            self.logger.info(f"http connections: {self.http_session_pool.get_stats()}")
+            await self.http_session_pool.close()
+        else:
             util.trigger_callback('network_updated')
 
     def stop(self):
@@ -1223,6 +1238,22 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
                     raise
             await asyncio.sleep(0.1)
 
+    @classmethod
+    @asynccontextmanager
+    async def http_session(cls):
+        """Yields an aiohttp session using the current proxy.
+        When called on the network's event loop, the session is shared and
+        keeps its connections alive between requests, so it must not be
+        closed by the caller. Otherwise a new session is made.
+        """
+        network = cls.get_instance()
+        proxy = network.proxy if network else None
+        if network and asyncio.get_event_loop() is network.asyncio_loop:
+            yield network.http_session_pool.get_session(proxy)
+        else:
+            async with make_aiohttp_session(proxy) as session:
+                yield session
+
     @classmethod
     async def _send_http_on_proxy(cls, method: str, url: str, params: str = None,
                                   body: bytes = None, json: dict = None, headers=None,
@@ -1234,19 +1265,21 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
             headers = {}
         if on_finish is None:
             on_finish = default_on_finish
-        network = cls.get_instance()
-        proxy = network.proxy if network else None
-        async with make_aiohttp_session(proxy, timeout=timeout) as session:
+        if timeout is None:
+            timeout = aiohttp.ClientTimeout(total=45)
+        elif isinstance(timeout, (int, float)):
+            timeout = aiohttp.ClientTimeout(total=timeout)
+        async with cls.http_session() as session:
             if method == 'get':
-                async with session.get(url, params=params, headers=headers) as resp:
+                async with session.get(url, params=params, headers=headers, timeout=timeout) as resp:
                     return await on_finish(resp)
             elif method == 'post':
                 assert body is not None or json is not None, 'body or json must be supplied if method is post'
                 if body is not None:
-                    async with session.post(url, data=body, headers=headers) as resp:
+                    async with session.post(url, data=body, headers=headers, timeout=timeout) as resp:
                         return await on_finish(resp)
                 elif json is not None:
-                    async with session.post(url, json=json, headers=headers) as resp:
+                    async with session.post(url, json=json, headers=headers, timeout=timeout) as resp:
                         return await on_finish(resp)
             else:
                 assert False
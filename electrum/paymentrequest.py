@@ -40,7 +40,7 @@ except ImportError:
     sys.exit("Error: could not find paymentrequest_pb2.py. Create it with 'protoc --proto_path=electrum/ --python_out=electrum/ electrum/paymentrequest.proto'")
 
 from . import bitcoin, ecc, util, transaction, x509, rsakey
-from .util import bh2u, bfh, make_aiohttp_session
+from .util import bh2u, bfh
 from .invoices import OnchainInvoice
 from .crypto import sha256
 from .bitcoin import address_to_script
@@ -76,9 +76,8 @@ async def get_payment_request(url: str) -> 'PaymentRequest':
     if u.scheme in ('http', 'https'):
         resp_content = None
         try:
-            proxy = Network.get_instance().proxy
-            async with make_aiohttp_session(proxy, headers=REQUEST_HEADERS) as session:
-                async with session.get(url) as response:
+            async with Network.http_session() as session:
+                async with session.get(url, headers=REQUEST_HEADERS) as response:
                     resp_content = await response.read()
                     response.raise_for_status()
                     # Guard against `bitcoin:`-URIs with invalid payment request URLs
@@ -289,9 +288,8 @@ class PaymentRequest:
         payurl = urllib.parse.urlparse(pay_det.payment_url)
         resp_content = None
         try:
-            proxy = Network.get_instance().proxy
-            async with make_aiohttp_session(proxy, headers=ACK_HEADERS) as session:
-                async with session.post(payurl.geturl(), data=pm) as response:
+            async with Network.http_session() as session:
+                async with session.post(payurl.geturl(), data=pm, headers=ACK_HEADERS) as response:
                     resp_content = await response.read()
                     response.raise_for_status()
                     try:
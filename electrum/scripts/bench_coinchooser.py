@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# Compares coin choosers on a synthetic wallet: latency of bucket selection
+# (bucketizing the coins is shared and excluded), number of inputs, whether
+# a change output was created, total fee, and the fee paid above what the
+# feerate requires (the excess that a changeless solution wastes).
+# usage: bench_coinchooser.py [num_coins] [num_payments]
+
+import os
+import sys
+import time
+import random
+
+from electrum.bitcoin import hash_to_segwit_addr
+from electrum.coinchooser import CoinChooserPrivacy, CoinChooserBnB
+from electrum.transaction import PartialTxInput, PartialTxOutput, TxOutpoint
+
+
+FEERATE = 10  # sat/vbyte
+DUST_THRESHOLD = 546
+
+try:
+    num_coins = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    num_payments = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+except ValueError:
+    print("usage: bench_coinchooser.py [num_coins] [num_payments]")
+    sys.exit(1)
+
+rnd = random.Random(0)
+
+
+def make_address():
+    return hash_to_segwit_addr(bytes(rnd.getrandbits(8) for i in range(20)), witver=0)
+
+
+addrs = [make_address() for i in range(num_coins // 2)]
+coins = []
+for i in range(num_coins):
+    txin = PartialTxInput(prevout=TxOutpoint(txid=os.urandom(32), out_idx=rnd.randrange(4)))
+    txin._trusted_address = addrs[i % len(addrs)]
+    txin._trusted_value_sats = int(rnd.lognormvariate(12, 2)) + DUST_THRESHOLD
+    txin.script_type = 'address'
+    txin.block_height = rnd.randrange(-1, 600000)
+    coins.append(txin)
+payments = [(make_address(), int(rnd.lognormvariate(14, 1.5))) for i in range(num_payments)]
+change_addrs = [make_address()]
+
+
+def fee_estimator_vb(size):
+    return int(FEERATE * size)
+
+
+def timed(klass):
+    class Timed(klass):
+        def choose_buckets(self, *args, **kwargs):
+            t0 = time.perf_counter()
+            result = super().choose_buckets(*args, **kwargs)
+            self.latency = time.perf_counter() - t0
+            return result
+    Timed.__name__ = klass.__name__
+    return Timed
+
+
+def run(klass):
+    latencies, num_inputs, num_change, fees, excess = [], 0, 0, 0, 0
+    for address, amount in payments:
+        coin_chooser = klass(enable_output_value_rounding=False)
+        outputs = [PartialTxOutput.from_address_and_value(address, amount)]
+        tx = coin_chooser.make_tx(coins=coins, inputs=[], outputs=outputs, change_addrs=change_addrs,
+                                  fee_estimator_vb=fee_estimator_vb, dust_threshold=DUST_THRESHOLD)
+        latencies.append(coin_chooser.latency)
+        num_inputs += len(tx.inputs())
+        num_change += len(tx.outputs()) > 1
+        fees += tx.get_fee()
+        excess += tx.get_fee() - fee_estimator_vb(tx.estimated_size())
+    latencies.sort()
+    print("%-20s median %7.1f ms  max %7.1f ms  inputs/tx %5.1f  with change %3d/%d  fees %8d sat  excess %6d sat"
+          % (klass.__name__, 1000 * latencies[len(latencies) // 2], 1000 * latencies[-1],
+             num_inputs / len(payments), num_change, len(payments), fees, excess))
+
+
+print("%d coins, %d payments, %d sat/vbyte" % (num_coins, num_payments, FEERATE))
+for klass in (CoinChooserPrivacy, CoinChooserBnB):
+    run(timed(klass))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# Measures WalletDB read throughput from several threads, with and without
+# a concurrent writer (standing in for the synchronizer adding transactions).
+# usage: bench_db_reads.py [num_readers] [seconds]
+
+import os
+import sys
+import time
+import random
+import threading
+
+from electrum.wallet_db import WalletDB
+
+
+NUM_TXS = 20000
+
+try:
+    num_readers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+except ValueError:
+    print("usage: bench_db_reads.py [num_readers] [seconds]")
+    sys.exit(1)
+
+db = WalletDB('', manual_upgrades=False)
+txids = [os.urandom(32).hex() for i in range(NUM_TXS)]
+addrs = ['addr%d' % i for i in range(100)]
+for i, txid in enumerate(txids):
+    db.add_txo_addr(txid, addrs[i % len(addrs)], 0, 1000 + i, False)
+
+
+def reader(stop, counts, idx, locked):
+    n = 0
+    rnd = random.Random(idx)
+    while not stop.is_set():
+        txid = rnd.choice(txids)
+        if locked:
+            with db.lock:
+                for addr in db.get_txo_addresses(txid):
+                    db.get_txo_addr(txid, addr)
+        else:
+            for addr in db.get_txo_addresses(txid):
+                db.get_txo_addr(txid, addr)
+        n += 1
+    counts[idx] = n
+
+
+def writer(stop, counts):
+    n = 0
+    while not stop.is_set():
+        txid = os.urandom(32).hex()
+        # hold the lock the way add_transaction does, across several writes
+        with db.lock:
+            for i in range(10):
+                db.add_txo_addr(txid, random.choice(addrs), i, 1000, False)
+            db.remove_txo(txid)
+        n += 1
+    counts['writer'] = n
+
+
+def run(with_writer, locked):
+    stop = threading.Event()
+    counts = {}
+    threads = [threading.Thread(target=reader, args=(stop, counts, i, locked))
+               for i in range(num_readers)]
+    if with_writer:
+        threads.append(threading.Thread(target=writer, args=(stop, counts)))
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    reads = sum(v for k, v in counts.items() if k != 'writer')
+    return reads / duration, counts.get('writer', 0) / duration
+
+
+for with_writer in (False, True):
+    for locked in (True, False):
+        reads, writes = run(with_writer, locked)
+        print("writer=%-5s reads_take_lock=%-5s  %10.0f reads/s  %8.0f writes/s"
+              % (with_writer, locked, reads, writes))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# Measures memory use and build time of the routing graph on a synthetic
+# mainnet-sized network, for the named tuple dicts and sets that ChannelDB
+# keeps, and for the array-backed ChannelGraph.
+# usage: bench_lngraph.py [num_channels]
+
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+from electrum.channel_db import ChannelInfo, Policy
+from electrum.lngraph import ChannelGraph
+from electrum.lnutil import ShortChannelID
+
+
+try:
+    num_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 80_000
+except ValueError:
+    print("usage: bench_lngraph.py [num_channels]")
+    sys.exit(1)
+
+num_nodes = num_channels // 5
+
+
+def make_network():
+    rnd = random.Random(0)
+    node_ids = [b'\x02' + rnd.getrandbits(256).to_bytes(32, 'big') for i in range(num_nodes)]
+    channels = []
+    policies = []
+    for i in range(num_channels):
+        # a few well connected nodes, like on mainnet
+        n1, n2 = sorted(rnd.sample(node_ids[:1 + int(num_nodes * rnd.random() ** 2)] + node_ids[:2], 2))
+        short_channel_id = ShortChannelID.from_components(500_000 + i // 1000, i % 1000, 0)
+        channels.append(ChannelInfo(short_channel_id=short_channel_id, node1_id=n1, node2_id=n2,
+                                    capacity_sat=rnd.randrange(10**5, 10**7)))
+        for direction, start_node in enumerate((n1, n2)):
+            policies.append(Policy(
+                key=short_channel_id + start_node,
+                cltv_expiry_delta=rnd.choice((40, 144)),
+                htlc_minimum_msat=1000,
+                htlc_maximum_msat=rnd.choice((None, 10**10)),
+                fee_base_msat=rnd.randrange(0, 2000),
+                fee_proportional_millionths=rnd.randrange(0, 1000),
+                channel_flags=direction,
+                message_flags=1,
+                timestamp=1600000000 + i))
+    return channels, policies
+
+
+def build_dicts(channels, policies):
+    _channels = {}
+    _policies = {}
+    _channels_for_node = defaultdict(set)
+    for ci in channels:
+        _channels[ci.short_channel_id] = ci
+        _channels_for_node[ci.node1_id].add(ci.short_channel_id)
+        _channels_for_node[ci.node2_id].add(ci.short_channel_id)
+    for p in policies:
+        _policies[(p.start_node, p.short_channel_id)] = p
+    return _channels, _policies, _channels_for_node
+
+
+def build_graph(channels, policies):
+    graph = ChannelGraph()
+    for ci in channels:
+        graph.add_channel(ci)
+    for p in policies:
+        graph.set_policy(p)
+    graph.get_neighbours(channels[0].node1_id)  # builds the adjacency
+    return graph
+
+
+def measure(build, *args):
+    gc.collect()
+    t0 = time.perf_counter()
+    result = build(*args)
+    dt = time.perf_counter() - t0
+    # tracing slows down the build, so it is done again for the size
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = build(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, dt
+
+
+channels, policies = make_network()
+# named tuples are shared with the dicts, so measure them on their own
+_, records_size, _ = measure(make_network)
+_, dicts_size, dicts_time = measure(build_dicts, channels, policies)
+graph, graph_size, graph_time = measure(build_graph, channels, policies)
+
+print(f"{num_channels} channels, {graph.num_nodes()} nodes")
+print(f"named tuples:                {records_size / 1e6:6.1f} MB")
+print(f"dicts and sets:              {dicts_size / 1e6:6.1f} MB, built in {dicts_time:.2f} s")
+print(f"ChannelGraph:                {graph_size / 1e6:6.1f} MB, built in {graph_time:.2f} s")
+
+t0 = time.perf_counter()
+for node_id in graph.node_ids:
+    graph.get_neighbours(node_id)
+print(f"neighbours of every node:    {time.perf_counter() - t0:.2f} s")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+# Measures LNPathFinder.find_path_for_payment on a synthetic mainnet-sized
+# graph, against the former search that used queue.PriorityQueue and looked
+# up every edge through ChannelDB, building a RouteEdge per relaxation.
+# usage: bench_lnrouter.py [num_channels] [num_payments]
+
+import queue
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from electrum.channel_db import ChannelDB, ChannelInfo, Policy
+from electrum.lngraph import ChannelGraph
+from electrum.lnrouter import LNPathFinder, PathEdge, RouteEdge
+from electrum.lnutil import ShortChannelID
+from electrum.logging import Logger
+
+
+try:
+    num_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 80_000
+    num_payments = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+except ValueError:
+    print("usage: bench_lnrouter.py [num_channels] [num_payments]")
+    sys.exit(1)
+
+num_nodes = num_channels // 5
+AMOUNT_MSAT = 100_000_000
+
+
+class BenchChannelDB(ChannelDB):
+    """Only what the path finder needs, without database."""
+
+    def __init__(self):
+        Logger.__init__(self)
+        self.lock = threading.RLock()
+        self._channels = {}
+        self._policies = {}
+        self._nodes = {}
+        self._channel_updates_for_private_channels = {}
+        self.graph = ChannelGraph()
+        self.data_loaded = threading.Event()
+        self.data_loaded.set()
+
+
+def make_channel_db():
+    rnd = random.Random(0)
+    cdb = BenchChannelDB()
+    node_ids = [b'\x02' + rnd.getrandbits(256).to_bytes(32, 'big') for i in range(num_nodes)]
+    for i in range(num_channels):
+        # a few well connected nodes, like on mainnet
+        n1, n2 = sorted(rnd.sample(node_ids[:1 + int(num_nodes * rnd.random() ** 2)] + node_ids[:2], 2))
+        short_channel_id = ShortChannelID.from_components(500_000 + i // 1000, i % 1000, 0)
+        cdb._channels[short_channel_id] = ChannelInfo(short_channel_id=short_channel_id, node1_id=n1, node2_id=n2,
+                                                      capacity_sat=rnd.randrange(10**5, 10**7))
+        for direction, start_node in enumerate((n1, n2)):
+            cdb._policies[(start_node, short_channel_id)] = Policy(
+                key=short_channel_id + start_node,
+                cltv_expiry_delta=rnd.choice((40, 144)),
+                htlc_minimum_msat=1000,
+                htlc_maximum_msat=rnd.choice((None, 10**10)),
+                fee_base_msat=rnd.randrange(0, 2000),
+                fee_proportional_millionths=rnd.randrange(0, 1000),
+                channel_flags=direction | (2 if rnd.random() < 0.05 else 0),
+                message_flags=1,
+                timestamp=1600000000 + i)
+    for channel_info in cdb._channels.values():
+        cdb._add_channel_to_graph(channel_info)
+    return cdb, node_ids
+
+
+def edge_cost_with_lookups(cdb, short_channel_id, start_node, end_node, payment_amt_msat, ignore_costs):
+    channel_info = cdb.get_channel_info(short_channel_id)
+    if channel_info is None:
+        return float('inf'), 0
+    channel_policy = cdb.get_policy_for_node(short_channel_id, start_node)
+    if channel_policy is None:
+        return float('inf'), 0
+    if cdb.get_policy_for_node(short_channel_id, end_node) is None:
+        return float('inf'), 0
+    if channel_policy.is_disabled():
+        return float('inf'), 0
+    if payment_amt_msat < channel_policy.htlc_minimum_msat:
+        return float('inf'), 0
+    if channel_info.capacity_sat is not None and payment_amt_msat // 1000 > channel_info.capacity_sat:
+        return float('inf'), 0
+    if channel_policy.htlc_maximum_msat is not None and payment_amt_msat > channel_policy.htlc_maximum_msat:
+        return float('inf'), 0
+    node_info = cdb.get_node_info_for_node_id(node_id=end_node)
+    route_edge = RouteEdge.from_channel_policy(channel_policy, short_channel_id, end_node, node_info=node_info)
+    if not route_edge.is_sane_to_use(payment_amt_msat):
+        return float('inf'), 0
+    base_cost = 500
+    if ignore_costs:
+        return base_cost, 0
+    fee_msat = route_edge.fee_for_edge(payment_amt_msat)
+    cltv_cost = route_edge.cltv_expiry_delta * payment_amt_msat * 15 / 1_000_000_000
+    return base_cost + fee_msat + cltv_cost, fee_msat
+
+
+def find_path_priority_queue(path_finder, nodeA, nodeB, invoice_amount_msat):
+    cdb = path_finder.channel_db
+    distance_from_start = defaultdict(lambda: float('inf'))
+    distance_from_start[nodeB] = 0
+    prev_node = {}
+    nodes_to_explore = queue.PriorityQueue()
+    nodes_to_explore.put((0, invoice_amount_msat, nodeB))
+    while nodes_to_explore.qsize() > 0:
+        dist_to_edge_endnode, amount_msat, edge_endnode = nodes_to_explore.get()
+        if edge_endnode == nodeA:
+            break
+        if dist_to_edge_endnode != distance_from_start[edge_endnode]:
+            continue
+        for edge_channel_id in cdb.get_channels_for_node(edge_endnode, my_channels={}):
+            if path_finder.is_blacklisted(edge_channel_id):
+                continue
+            channel_info = cdb.get_channel_info(edge_channel_id)
+            edge_startnode = channel_info.node2_id if channel_info.node1_id == edge_endnode else channel_info.node1_id
+            edge_cost, fee_for_edge_msat = edge_cost_with_lookups(
+                cdb, edge_channel_id, edge_startnode, edge_endnode, amount_msat, edge_startnode == nodeA)
+            alt_dist_to_neighbour = distance_from_start[edge_endnode] + edge_cost
+            if alt_dist_to_neighbour < distance_from_start[edge_startnode]:
+                distance_from_start[edge_startnode] = alt_dist_to_neighbour
+                prev_node[edge_startnode] = PathEdge(node_id=edge_endnode, short_channel_id=edge_channel_id)
+                nodes_to_explore.put((alt_dist_to_neighbour, amount_msat + fee_for_edge_msat, edge_startnode))
+    if nodeA not in prev_node:
+        return None
+    path = []
+    edge_startnode = nodeA
+    while edge_startnode != nodeB:
+        edge = prev_node[edge_startnode]
+        path.append(edge)
+        edge_startnode = edge.node_id
+    return path
+
+
+def bench(find_path, pairs):
+    paths = []
+    t0 = time.perf_counter()
+    for nodeA, nodeB in pairs:
+        paths.append(find_path(nodeA, nodeB))
+    return (time.perf_counter() - t0) / len(pairs), paths
+
+
+cdb, node_ids = make_channel_db()
+path_finder = LNPathFinder(cdb)
+rnd = random.Random(1)
+pairs = [tuple(rnd.sample(node_ids, 2)) for i in range(num_payments)]
+
+old_time, old_paths = bench(lambda a, b: find_path_priority_queue(path_finder, a, b, AMOUNT_MSAT), pairs)
+new_time, new_paths = bench(lambda a, b: path_finder.find_path_for_payment(a, b, AMOUNT_MSAT), pairs)
+
+print(f"{num_channels} channels, {cdb.graph.num_nodes()} nodes, {num_payments} payments")
+print(f"PriorityQueue and ChannelDB lookups: {1000 * old_time:8.1f} ms per path")
+print(f"heapq on the graph arrays:           {1000 * new_time:8.1f} ms per path")
+print(f"found {sum(p is not None for p in new_paths)} paths, "
+      f"{sum(len(p or []) == len(q or []) for p, q in zip(new_paths, old_paths))} of the same length")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+# Simulates large payments on a synthetic network, where the liquidity of
+# each channel is unknown to the sender, and compares paying over a single
+# path, retried with what failed attempts taught mission control, with
+# splitting the payment over several paths (LNPathFinder.split_payment) and
+# routing failed parts again. Each is then repeated with what was learned,
+# as after a restart with a persisted mission control store.
+# Reports success rate, HTLCs sent per payment, and time to success when
+# every hop adds a fixed latency.
+# usage: bench_mpp.py [num_channels] [num_payments] [amount_sat]
+
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from electrum.channel_db import ChannelDB, ChannelInfo, Policy
+from electrum.lngraph import ChannelGraph
+from electrum.lnrouter import LNPathFinder
+from electrum.lnutil import ShortChannelID
+from electrum.logging import Logger
+
+
+try:
+    num_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    num_payments = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    amount_sat = int(sys.argv[3]) if len(sys.argv) > 3 else 2_000_000
+except ValueError:
+    print("usage: bench_mpp.py [num_channels] [num_payments] [amount_sat]")
+    sys.exit(1)
+
+num_nodes = num_channels // 5
+HOP_LATENCY = 0.05  # seconds, each way
+MAX_ATTEMPTS = 20  # payment attempts, or rounds of parts
+
+
+class BenchChannelDB(ChannelDB):
+    """Only what the path finder needs, without database."""
+
+    def __init__(self):
+        Logger.__init__(self)
+        self.lock = threading.RLock()
+        self._channels = {}
+        self._policies = {}
+        self._nodes = {}
+        self._channel_updates_for_private_channels = {}
+        self.graph = ChannelGraph()
+        self.data_loaded = threading.Event()
+        self.data_loaded.set()
+
+
+def make_network():
+    rnd = random.Random(0)
+    cdb = BenchChannelDB()
+    liquidity = {}  # (short_channel_id, start_node) -> msat
+    node_ids = [b'\x02' + rnd.getrandbits(256).to_bytes(32, 'big') for i in range(num_nodes)]
+    for i in range(num_channels):
+        # a few well connected nodes, like on mainnet
+        n1, n2 = sorted(rnd.sample(node_ids[:1 + int(num_nodes * rnd.random() ** 2)] + node_ids[:2], 2))
+        short_channel_id = ShortChannelID.from_components(500_000 + i // 1000, i % 1000, 0)
+        capacity_sat = rnd.randrange(10**5, 10**7)
+        cdb._channels[short_channel_id] = ChannelInfo(short_channel_id=short_channel_id, node1_id=n1, node2_id=n2,
+                                                      capacity_sat=capacity_sat)
+        balance_msat = rnd.randrange(0, 1000 * capacity_sat)
+        liquidity[(short_channel_id, n1)] = balance_msat
+        liquidity[(short_channel_id, n2)] = 1000 * capacity_sat - balance_msat
+        for direction, start_node in enumerate((n1, n2)):
+            cdb._policies[(start_node, short_channel_id)] = Policy(
+                key=short_channel_id + start_node,
+                cltv_expiry_delta=rnd.choice((40, 144)),
+                htlc_minimum_msat=1000,
+                htlc_maximum_msat=None,
+                fee_base_msat=rnd.randrange(0, 2000),
+                fee_proportional_millionths=rnd.randrange(0, 1000),
+                channel_flags=direction,
+                message_flags=1,
+                timestamp=1600000000 + i)
+    for channel_info in cdb._channels.values():
+        cdb._add_channel_to_graph(channel_info)
+    return cdb, node_ids, liquidity
+
+
+def send_htlc(path_finder, liquidity, reserved, nodeA, path, amount_msat):
+    """Returns (success, seconds). A successful htlc is held by the
+    recipient until the payment completes, so its amount stays reserved."""
+    mission_control = path_finder.mission_control
+    start_node = nodeA
+    for i, edge in enumerate(path):
+        key = (edge.short_channel_id, start_node)
+        if liquidity[key] - reserved[key] < amount_msat:
+            mission_control.report_liquidity_failure(edge.short_channel_id, start_node, amount_msat)
+            return False, 2 * HOP_LATENCY * (i + 1)
+        mission_control.report_success(edge.short_channel_id, start_node, amount_msat)
+        start_node = edge.node_id
+    start_node = nodeA
+    for edge in path:
+        reserved[(edge.short_channel_id, start_node)] += amount_msat
+        start_node = edge.node_id
+    return True, 2 * HOP_LATENCY * len(path)
+
+
+def pay_single_path(path_finder, liquidity, nodeA, nodeB, amount_msat):
+    reserved = defaultdict(int)
+    seconds = 0
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        path = path_finder.find_path_for_payment(nodeA, nodeB, amount_msat)
+        if not path:
+            return False, attempt - 1, seconds
+        success, dt = send_htlc(path_finder, liquidity, reserved, nodeA, path, amount_msat)
+        seconds += dt
+        if success:
+            return True, attempt, seconds
+    return False, MAX_ATTEMPTS, seconds
+
+
+def pay_multipart(path_finder, liquidity, nodeA, nodeB, amount_msat):
+    reserved = defaultdict(int)
+    seconds = 0
+    num_htlcs = 0
+    remaining_msat = amount_msat
+    for attempt in range(MAX_ATTEMPTS):
+        parts = path_finder.split_payment(nodeA, [nodeB], remaining_msat)
+        if not parts:
+            break
+        # parts are sent concurrently, the round lasts as long as the slowest one
+        round_seconds = 0
+        for path, part_msat in parts:
+            success, dt = send_htlc(path_finder, liquidity, reserved, nodeA, path, part_msat)
+            round_seconds = max(round_seconds, dt)
+            if success:
+                remaining_msat -= part_msat
+        num_htlcs += len(parts)
+        seconds += round_seconds
+        if not remaining_msat:
+            return True, num_htlcs, seconds
+    return False, num_htlcs, seconds
+
+
+def bench(pay, pairs, *, forget):
+    path_finder.mission_control.clear()
+    if not forget:
+        for nodeA, nodeB in pairs:
+            pay(path_finder, liquidity, nodeA, nodeB, 1000 * amount_sat)
+    results = []
+    t0 = time.perf_counter()
+    for nodeA, nodeB in pairs:
+        if forget:
+            path_finder.mission_control.clear()
+        results.append(pay(path_finder, liquidity, nodeA, nodeB, 1000 * amount_sat))
+    cpu_time = (time.perf_counter() - t0) / len(pairs)
+    successes = [r for r in results if r[0]]
+    num_htlcs = sum(r[1] for r in results) / len(results)
+    seconds = sum(r[2] for r in successes) / len(successes) if successes else float('nan')
+    return len(successes), num_htlcs, seconds, cpu_time
+
+
+cdb, node_ids, liquidity = make_network()
+path_finder = LNPathFinder(cdb)
+path_finder.logger.disabled = True
+rnd = random.Random(1)
+# well connected senders, as they would be with a few channels to hubs
+pairs = [(rnd.choice(node_ids[:num_nodes // 20]), rnd.choice(node_ids)) for i in range(num_payments)]
+
+print(f"{num_channels} channels, {cdb.graph.num_nodes()} nodes, {num_payments} payments of {amount_sat} sat")
+for name, pay in (("single path:", pay_single_path), ("multi-part: ", pay_multipart)):
+    # the same payments again, after all of them taught mission control
+    for forget in (True, False):
+        num_successes, num_htlcs, seconds, cpu_time = bench(pay, pairs, forget=forget)
+        name += "" if forget else " repeated"
+        print(f"{name:22} {num_successes:3d} succeeded, {num_htlcs:5.1f} htlcs per payment, "
+              f"{seconds:5.2f} s to success, {cpu_time:5.2f} s path finding per payment")
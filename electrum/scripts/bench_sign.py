@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+# Measures signing of transactions with many inputs, as built when
+# consolidating coins or batching payouts, for legacy and segwit inputs,
+# with one signing thread and with the default number of threads.
+# usage: bench_sign.py [num_inputs]
+
+import sys
+import time
+
+from electrum import ecc
+from electrum.bitcoin import pubkey_to_address
+from electrum.crypto import sha256d
+from electrum.transaction import (PartialTransaction, PartialTxInput, PartialTxOutput, TxOutpoint,
+                                  SighashCache)
+from electrum.util import bfh
+
+
+try:
+    num_inputs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+except ValueError:
+    print("usage: bench_sign.py [num_inputs]")
+    sys.exit(1)
+
+privkey = ecc.ECPrivkey(b'\x01' * 32)
+pubkey = privkey.get_public_key_bytes(compressed=True)
+keypairs = {pubkey.hex(): (b'\x01' * 32, True)}
+
+
+def make_tx(script_type):
+    inputs = []
+    for i in range(num_inputs):
+        txin = PartialTxInput(prevout=TxOutpoint(txid=i.to_bytes(32, 'big'), out_idx=0))
+        txin.script_type = script_type
+        txin.pubkeys = [pubkey]
+        txin.num_sig = 1
+        txin._trusted_value_sats = 10_000
+        inputs.append(txin)
+    address = pubkey_to_address('p2wpkh', pubkey.hex())
+    outputs = [PartialTxOutput.from_address_and_value(address, 1000) for i in range(num_inputs // 10 + 1)]
+    return PartialTransaction.from_io(inputs, outputs)
+
+
+default_threads = ecc.SIGNING_THREADS
+for script_type in ('p2pkh', 'p2wpkh'):
+    tx = make_tx(script_type)
+    # what hardware wallet plugins do, one preimage at a time
+    t0 = time.perf_counter()
+    for i in range(num_inputs):
+        sha256d(bfh(tx.serialize_preimage(i)))
+    t_preimage = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    sighash_cache = SighashCache(tx)
+    for i in range(num_inputs):
+        sighash_cache.sighash(i)
+    t_cached = time.perf_counter() - t0
+    print("%-7s %d inputs: sighashes %8.1f ms, with SighashCache %8.1f ms"
+          % (script_type, num_inputs, 1000 * t_preimage, 1000 * t_cached))
+    signed = None
+    for threads in sorted({1, default_threads}):
+        ecc.SIGNING_THREADS = threads
+        ecc._signing_executor = None
+        tx = make_tx(script_type)
+        t0 = time.perf_counter()
+        tx.sign(keypairs)
+        t_sign = time.perf_counter() - t0
+        assert tx.is_complete()
+        assert signed is None or tx.serialize() == signed
+        signed = tx.serialize()
+        print("%-7s %d inputs: sign with %d thread(s) %8.1f ms" % (script_type, num_inputs, threads, 1000 * t_sign))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# Measures transaction parsing and serialization throughput: a block's worth
+# of small transactions, one large segwit transaction, and a PSBT with many
+# inputs.
+# usage: bench_tx_parse.py [num_txs] [num_inputs]
+
+import sys
+import time
+import random
+
+from electrum.bitcoin import var_int
+from electrum.transaction import Transaction, PartialTransaction
+
+
+try:
+    num_txs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_inputs = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+except ValueError:
+    print("usage: bench_tx_parse.py [num_txs] [num_inputs]")
+    sys.exit(1)
+
+rnd = random.Random(0)
+
+
+def rand_hex(n):
+    return bytes(rnd.getrandbits(8) for i in range(n)).hex()
+
+
+def make_tx(n_in, n_out, segwit):
+    txins = ''.join(rand_hex(32) + '00000000' + ('00' if segwit else '6a' + '47' + rand_hex(71) + '21' + rand_hex(33))
+                    + 'fdffffff' for i in range(n_in))
+    txouts = ''.join('1027000000000000' + '160014' + rand_hex(20) for i in range(n_out))
+    witness = ''.join('02' + '47' + rand_hex(71) + '21' + rand_hex(33) for i in range(n_in)) if segwit else ''
+    return ('02000000' + ('0001' if segwit else '') + var_int(n_in) + txins + var_int(n_out) + txouts
+            + witness + '00000000')
+
+
+def bench(name, func, count, repeat=5):
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    dt = min(times)
+    print("%-40s %8.1f ms  %10.0f /s" % (name, 1000 * dt, count / dt))
+
+
+block = [make_tx(rnd.randint(1, 3), 2, segwit=bool(i % 4)) for i in range(num_txs)]
+big_tx = make_tx(num_inputs, num_inputs, segwit=True)
+unsigned_tx = make_tx(num_inputs, num_inputs, segwit=False)
+psbt = PartialTransaction.from_tx(Transaction(Transaction(unsigned_tx).serialize_to_network(include_sigs=False)))
+raw_psbt = psbt.serialize_as_bytes()
+
+
+def parse_block():
+    for raw in block:
+        Transaction(raw).txid()
+
+
+def parse_big_tx():
+    Transaction(big_tx).inputs()
+
+
+def roundtrip_big_tx():
+    tx = Transaction(big_tx)
+    tx.deserialize()
+    assert tx.serialize_to_network() == big_tx
+
+
+def parse_psbt():
+    PartialTransaction.from_raw_psbt(raw_psbt)
+
+
+bench("%d txs, deserialize + txid" % num_txs, parse_block, num_txs)
+bench("%d-input tx, deserialize" % num_inputs, parse_big_tx, num_inputs)
+bench("%d-input tx, deserialize + serialize" % num_inputs, roundtrip_big_tx, num_inputs)
+bench("%d-input psbt, parse" % num_inputs, parse_psbt, num_inputs)
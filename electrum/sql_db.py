@@ -56,9 +56,14 @@ class SqlDB(Logger):
                 if i == 0:
                     self.conn.commit()
         # write
+        self.close_database()
         self.conn.commit()
         self.conn.close()
         self.logger.info("SQL thread terminated")
 
     def create_database(self):
         raise NotImplementedError()
+
+    def close_database(self):
+        """Called in the SQL thread, before the connection is closed."""
+        pass
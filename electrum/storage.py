@@ -34,9 +34,14 @@ from . import ecc
 from .util import profiler, InvalidPassword, WalletFileException, bfh, standardize_path
 
 from .wallet_db import WalletDB
+from .json_db import JOURNAL_RECORD_SEPARATOR
 from .logging import Logger
 
 
+# the journal is consolidated once it outgrows both this and the base dump
+JOURNAL_CONSOLIDATION_MIN_SIZE = 1 << 16
+
+
 def get_derivation_used_for_hw_device_encryption():
     return ("m"
             "/4541509'"      # ascii 'ELE'  as decimal ("BIP43 purpose")
@@ -72,6 +77,7 @@ class WalletStorage(Logger):
         else:
             self.raw = ''
             self._encryption_version = StorageEncryptionVersion.PLAINTEXT
+        self._init_journal_size()
 
     def read(self):
         return self.decrypted if self.is_encrypted() else self.raw
@@ -115,8 +121,34 @@ class WalletStorage(Logger):
             os.replace(temp_path, self.path)
             os.chmod(self.path, mode)
             self._file_exists = True
+            self._base_size = len(s)
+            self._journal_size = 0
             self.logger.info(f"saved {self.path}")
 
+    def append(self, data: str) -> None:
+        """Append a journal record to the wallet file.
+
+        With encryption, each record is encrypted separately and written
+        on its own line after the encrypted base dump.
+        """
+        with self.lock:
+            assert self.file_exists()
+            s = '\n' + self.encrypt_before_writing(data)
+            with open(self.path, "a", encoding='utf-8') as f:
+                f.write(s)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_size += len(s)
+
+    def _init_journal_size(self):
+        sep = '\n' if self.is_encrypted() else JOURNAL_RECORD_SEPARATOR
+        pos = self.raw.find(sep)
+        self._base_size = len(self.raw) if pos < 0 else pos
+        self._journal_size = len(self.raw) - self._base_size
+
+    def needs_consolidation(self) -> bool:
+        return self._journal_size > max(self._base_size, JOURNAL_CONSOLIDATION_MIN_SIZE)
+
     def file_exists(self) -> bool:
         return self._file_exists
 
@@ -155,7 +187,8 @@ class WalletStorage(Logger):
 
     def _init_encryption_version(self):
         try:
-            magic = base64.b64decode(self.raw)[0:4]
+            # note: journal records follow the encrypted dump on separate lines
+            magic = base64.b64decode(self.raw.split('\n', 1)[0])[0:4]
             if magic == b'BIE1':
                 return StorageEncryptionVersion.USER_PASSWORD
             elif magic == b'BIE2':
@@ -186,8 +219,22 @@ class WalletStorage(Logger):
         ec_key = self.get_eckey_from_password(password)
         if self.raw:
             enc_magic = self._get_encryption_magic()
-            s = zlib.decompress(ec_key.decrypt_message(self.raw, enc_magic))
+            base, *records = self.raw.split('\n')
+            s = zlib.decompress(ec_key.decrypt_message(base, enc_magic))
             s = s.decode('utf8')
+            for i, record in enumerate(records):
+                try:
+                    r = zlib.decompress(ec_key.decrypt_message(record, enc_magic))
+                except Exception:
+                    # a truncated last record is left behind by an interrupted append.
+                    # It is passed on as an empty record, which WalletDB.load_data drops,
+                    # so that the next write rewrites the file without it.
+                    if i == len(records) - 1:
+                        self.logger.warning('dropping truncated journal record')
+                        s += JOURNAL_RECORD_SEPARATOR
+                        break
+                    raise WalletFileException('Cannot read wallet file. (journal corrupted)')
+                s += '\n' + r.decode('utf8')
         else:
             s = ''
         self.pubkey = ec_key.get_public_key_hex()
@@ -28,11 +28,12 @@ from typing import Dict, List, TYPE_CHECKING, Tuple
 from collections import defaultdict
 import logging
 
-from aiorpcx import TaskGroup, run_in_thread, RPCError
+from aiorpcx import run_in_thread, RPCError
 
 from . import util
 from .transaction import Transaction, PartialTransaction
-from .util import bh2u, make_aiohttp_session, NetworkJobOnDefaultServer, random_shuffled_copy
+from .util import (bh2u, NetworkJobOnDefaultServer, random_shuffled_copy,
+                   register_callback, unregister_callback)
 from .bitcoin import address_to_scripthash, is_address
 from .network import UntrustedServerReturnedError
 from .logging import Logger
@@ -43,6 +44,13 @@ if TYPE_CHECKING:
     from .address_synchronizer import AddressSynchronizer
 
 
+# number of worker tasks for each kind of request
+# (subscriptions, address statuses, transactions)
+NUM_SUBSCRIPTION_WORKERS = 50
+NUM_STATUS_WORKERS = 50
+NUM_TX_WORKERS = 50
+
+
 class SynchronizerFailure(Exception): pass
 
 
@@ -73,12 +81,16 @@ class SynchronizerBase(NetworkJobOnDefaultServer):
         # Queues
         self.add_queue = asyncio.Queue()
         self.status_queue = asyncio.Queue()
+        # set when a request is added or done, see Synchronizer.main
+        self._wakeup = asyncio.Event()
 
     async def _start_tasks(self):
         try:
             async with self.taskgroup as group:
-                await group.spawn(self.send_subscriptions())
-                await group.spawn(self.handle_status())
+                for i in range(NUM_SUBSCRIPTION_WORKERS):
+                    await group.spawn(self.send_subscriptions())
+                for i in range(NUM_STATUS_WORKERS):
+                    await group.spawn(self.handle_status())
                 await group.spawn(self.main())
         finally:
             # we are being cancelled now
@@ -96,6 +108,7 @@ class SynchronizerBase(NetworkJobOnDefaultServer):
         if addr in self.requested_addrs: return
         self.requested_addrs.add(addr)
         await self.add_queue.put(addr)
+        self._wakeup.set()
 
     async def _on_address_status(self, addr, status):
         """Handle the change of the status of an address."""
@@ -114,17 +127,19 @@ class SynchronizerBase(NetworkJobOnDefaultServer):
                 raise
             self._requests_answered += 1
             self.requested_addrs.remove(addr)
+            self._wakeup.set()
 
         while True:
             addr = await self.add_queue.get()
-            await self.taskgroup.spawn(subscribe_to_address, addr)
+            await subscribe_to_address(addr)
 
     async def handle_status(self):
         while True:
             h, status = await self.status_queue.get()
             addr = self.scripthash_to_address[h]
-            await self.taskgroup.spawn(self._on_address_status, addr, status)
+            await self._on_address_status(addr, status)
             self._processed_some_notifications = True
+            self._wakeup.set()
 
     def num_requests_sent_and_answered(self) -> Tuple[int, int]:
         return self._requests_sent, self._requests_answered
@@ -144,11 +159,26 @@ class Synchronizer(SynchronizerBase):
     def __init__(self, wallet: 'AddressSynchronizer'):
         self.wallet = wallet
         SynchronizerBase.__init__(self, wallet.network)
+        # new blocks can make addresses old, see wallet.synchronize
+        register_callback(self._on_blockchain_updated, ['blockchain_updated'])
 
     def _reset(self):
         super()._reset()
         self.requested_tx = {}
         self.requested_histories = set()
+        self._tx_queue = asyncio.Queue()  # of (txid, allow_server_not_finding_tx), each in requested_tx
+
+    async def _start_tasks(self):
+        for i in range(NUM_TX_WORKERS):
+            await self.taskgroup.spawn(self._get_transactions())
+        await super()._start_tasks()
+
+    async def stop(self):
+        unregister_callback(self._on_blockchain_updated)
+        await super().stop()
+
+    def _on_blockchain_updated(self, event):
+        self._wakeup.set()
 
     def diagnostic_name(self):
         return self.wallet.diagnostic_name()
@@ -203,10 +233,14 @@ class Synchronizer(SynchronizerBase):
             transaction_hashes.append(tx_hash)
             self.requested_tx[tx_hash] = tx_height
 
-        if not transaction_hashes: return
-        async with TaskGroup() as group:
-            for tx_hash in transaction_hashes:
-                await group.spawn(self._get_transaction(tx_hash, allow_server_not_finding_tx=allow_server_not_finding_tx))
+        for tx_hash in transaction_hashes:
+            self._tx_queue.put_nowait((tx_hash, allow_server_not_finding_tx))
+
+    async def _get_transactions(self):
+        while True:
+            tx_hash, allow_server_not_finding_tx = await self._tx_queue.get()
+            await self._get_transaction(tx_hash, allow_server_not_finding_tx=allow_server_not_finding_tx)
+            self._wakeup.set()
 
     async def _get_transaction(self, tx_hash, *, allow_server_not_finding_tx=False):
         self._requests_sent += 1
@@ -242,9 +276,13 @@ class Synchronizer(SynchronizerBase):
         # add addresses to bootstrap
         for addr in random_shuffled_copy(self.wallet.get_addresses()):
             await self._add_address(addr)
-        # main loop
+        # main loop, woken up when a request is added or done, or on new blocks
+        self._wakeup.set()
         while True:
+            await self._wakeup.wait()
+            # let events that come in bursts (e.g. when restoring) be handled at once
             await asyncio.sleep(0.1)
+            self._wakeup.clear()
             await run_in_thread(self.wallet.synchronize)
             up_to_date = self.is_up_to_date()
             if (up_to_date != self.wallet.is_up_to_date()
@@ -290,7 +328,7 @@ class Notifier(SynchronizerBase):
         data = {'address': addr, 'status': status}
         for url in self.watched_addresses[addr]:
             try:
-                async with make_aiohttp_session(proxy=self.network.proxy, headers=headers) as session:
+                async with self.network.http_session() as session:
                     async with session.post(url, json=data, headers=headers) as resp:
                         await resp.text()
             except Exception as e:
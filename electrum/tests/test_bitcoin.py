@@ -1,5 +1,6 @@
 import base64
 import sys
+from unittest import mock
 
 from electrum.bitcoin import (public_key_to_p2pkh, address_from_private_key,
                               is_address, is_private_key,
@@ -218,6 +219,13 @@ class Test_bitcoin(ElectrumTestCase):
         sig2 = eckey2.sign_transaction(bfh('642a2e66332f507c92bda910158dfe46fc10afbf72218764899d3af99a043fac'))
         self.assertEqual('30440220618513f4cfc87dde798ce5febae7634c23e7b9254a1eabf486be820f6a7c2c4702204fef459393a2b931f949e63ced06888f35e286e446dc46feb24b5b5f81c6ed52', sig2.hex())
 
+    def test_sign_transaction_hashes(self):
+        jobs = [(sha256d(bytes([i])), sha256d(bytes([i, i]))) for i in range(100)]
+        expected = [ecc.ECPrivkey(privkey).sign_transaction(msg_hash) for privkey, msg_hash in jobs]
+        self.assertEqual(expected[:10], ecc.sign_transaction_hashes(jobs[:10]))
+        with mock.patch.object(ecc, 'SIGNING_THREADS', 3):
+            self.assertEqual(expected, ecc.sign_transaction_hashes(jobs))
+
     @needs_test_with_all_aes_implementations
     def test_aes_homomorphic(self):
         """Make sure AES is homomorphic."""
@@ -1,6 +1,8 @@
+import json
 import shutil
 import tempfile
 import os
+from unittest import mock
 
 from electrum import constants, blockchain
 from electrum.simple_config import SimpleConfig
@@ -384,6 +386,168 @@ class TestBlockchain(ElectrumTestCase):
         self.assertEqual([chain_u], self.get_chains_that_contain_header_helper(self.HEADERS['O']))
         self.assertEqual([chain_z, chain_l], self.get_chains_that_contain_header_helper(self.HEADERS['I']))
 
+    def test_hash_index(self):
+        blockchain.blockchains[constants.net.GENESIS] = chain_u = Blockchain(
+            config=self.config, forkpoint=0, parent=None,
+            forkpoint_hash=constants.net.GENESIS, prev_hash=None)
+        open(chain_u.path(), 'w+').close()
+        for name in 'ABCDEFOP':
+            self._append_header(chain_u, self.HEADERS[name])
+        chain_l = chain_u.fork(self.HEADERS['G'])
+        self._append_header(chain_l, self.HEADERS['H'])
+
+        self.assertEqual(hash_header(self.HEADERS['P']), chain_u.get_hash(7))
+        self.assertEqual(hash_header(self.HEADERS['H']), chain_l.get_hash(7))
+        self.assertEqual(hash_header(self.HEADERS['F']), chain_l.get_hash(5))
+        self.assertEqual(7, chain_l.get_height_of_hash(hash_header(self.HEADERS['H'])))
+        self.assertEqual(5, chain_l.get_height_of_hash(hash_header(self.HEADERS['F'])))
+        # the parent's headers after our forkpoint are not part of our chain
+        self.assertIsNone(chain_l.get_height_of_hash(hash_header(self.HEADERS['P'])))
+        self.assertIsNone(chain_u.get_height_of_hash(hash_header(self.HEADERS['H'])))
+
+        # a new instance reads the same file, through a fresh index
+        chain_u2 = Blockchain(config=self.config, forkpoint=0, parent=None,
+                              forkpoint_hash=constants.net.GENESIS, prev_hash=None)
+        self.assertIsNone(chain_u2.get_height_of_hash(hash_header(self.HEADERS['P'])))
+        self.assertEqual([hash_header(self.HEADERS[name]) for name in 'ABCDEFOP'],
+                         [chain_u2.get_hash(height) for height in range(8)])
+        self.assertEqual(7, chain_u2.get_height_of_hash(hash_header(self.HEADERS['P'])))
+        self.assertEqual(self.HEADERS['O'], chain_u2.read_header(6))
+
+        # overwriting headers drops them from the index
+        chain_u2.write(bfh(blockchain.serialize_header(self.HEADERS['G'])), 6 * 80)
+        self.assertEqual(6, chain_u2.height())
+        self.assertEqual(hash_header(self.HEADERS['G']), chain_u2.get_hash(6))
+        self.assertIsNone(chain_u2.get_height_of_hash(hash_header(self.HEADERS['O'])))
+        with self.assertRaises(blockchain.MissingHeader):
+            chain_u2.get_hash(7)
+
+
+    def test_verify_chunk(self):
+        blockchain.blockchains[constants.net.GENESIS] = chain_u = Blockchain(
+            config=self.config, forkpoint=0, parent=None,
+            forkpoint_hash=constants.net.GENESIS, prev_hash=None)
+        open(chain_u.path(), 'w+').close()
+        for name in 'ABCDEFO':
+            self._append_header(chain_u, self.HEADERS[name])
+
+        def chunk(names):
+            return bfh(''.join(blockchain.serialize_header(self.HEADERS[name]) for name in names))
+
+        chain_u.verify_chunk(0, chunk('ABCDEFOPQ'))
+        # headers after our tip are only checked for linkage
+        chain_u.verify_chunk(0, chunk('ABCDEFOPQRSTU'))
+        # linkage
+        with self.assertRaises(Exception):
+            chain_u.verify_chunk(0, chunk('ABCDEFPOQ'))
+        with self.assertRaises(Exception):
+            chain_u.verify_chunk(0, chunk('BCDEFO'))
+        # conflicts with a header we already have
+        with self.assertRaises(Exception):
+            chain_u.verify_chunk(0, chunk('ABCDEFGHI'))
+
+
+    def _make_forks(self):
+        blockchain.blockchains[constants.net.GENESIS] = chain_u = Blockchain(
+            config=self.config, forkpoint=0, parent=None,
+            forkpoint_hash=constants.net.GENESIS, prev_hash=None)
+        open(chain_u.path(), 'w+').close()
+        for name in 'ABCDEFOPQRSTU':
+            self._append_header(chain_u, self.HEADERS[name])
+        chain_l = chain_u.fork(self.HEADERS['G'])
+        for name in 'HIJK':
+            self._append_header(chain_l, self.HEADERS[name])
+        chain_z = chain_l.fork(self.HEADERS['M'])
+        self._append_header(chain_z, self.HEADERS['N'])
+        return chain_u, chain_l, chain_z
+
+    def _chain_structure(self):
+        return {chain_id: (chain.forkpoint, chain.height(), chain.parent.get_id() if chain.parent else None)
+                for chain_id, chain in blockchain.blockchains.items()}
+
+    def test_fork_index(self):
+        chain_u, chain_l, chain_z = self._make_forks()
+        structure = self._chain_structure()
+        self.assertEqual(chain_l, chain_z.parent)
+        with open(os.path.join(self.data_dir, 'fork_index.json')) as f:
+            fork_index = json.load(f)
+        # the index is written when forks are created, not on each header
+        self.assertEqual({os.path.basename(chain_l.path()): {'parent': constants.net.GENESIS, 'forkpoint': 6, 'tip': 10},
+                          os.path.basename(chain_z.path()): {'parent': chain_l.get_id(), 'forkpoint': 9, 'tip': 9}},
+                         fork_index)
+        blockchain.blockchains = {}
+        blockchain.read_blockchains(self.config)
+        self.assertEqual(structure, self._chain_structure())
+
+        with open(os.path.join(self.data_dir, 'fork_index.json')) as f:
+            fork_index = json.load(f)
+        self.assertEqual({os.path.basename(chain_l.path()): {'parent': constants.net.GENESIS, 'forkpoint': 6, 'tip': 10},
+                          os.path.basename(chain_z.path()): {'parent': chain_l.get_id(), 'forkpoint': 9, 'tip': 10}},
+                         fork_index)
+        blockchain.blockchains = {}
+        blockchain.read_blockchains(self.config)
+        self.assertEqual(structure, self._chain_structure())
+
+        # forks that do not match the index are checked as before
+        fork_index[os.path.basename(chain_z.path())]['tip'] = 12
+        fork_index[os.path.basename(chain_l.path())]['parent'] = chain_z.get_id()
+        with open(os.path.join(self.data_dir, 'fork_index.json'), 'w') as f:
+            json.dump(fork_index, f)
+        blockchain.blockchains = {}
+        blockchain.read_blockchains(self.config)
+        self.assertEqual(structure, self._chain_structure())
+
+        # so are all forks if the index is unreadable
+        with open(os.path.join(self.data_dir, 'fork_index.json'), 'w') as f:
+            f.write('{"fork2_')
+        blockchain.blockchains = {}
+        blockchain.read_blockchains(self.config)
+        self.assertEqual(structure, self._chain_structure())
+
+    def test_fork_index_is_written_when_forks_change(self):
+        chain_u, chain_l, chain_z = self._make_forks()
+        with mock.patch.object(blockchain, 'write_fork_index') as write_fork_index:
+            # chain_z becomes stronger than chain_l and they are swapped
+            self._append_header(chain_z, self.HEADERS['X'])
+            write_fork_index.assert_called_once_with(self.config)
+            write_fork_index.reset_mock()
+            self._append_header(chain_z, self.HEADERS['Y'])
+            write_fork_index.assert_not_called()
+
+    def test_fork_with_incorrect_first_header_is_deleted(self):
+        chain_u, chain_l, chain_z = self._make_forks()
+        path = chain_z.path()
+        chain_z.close_mmap()
+        with open(path, 'r+b') as f:
+            f.write(bytes(4))
+        os.unlink(os.path.join(self.data_dir, 'fork_index.json'))
+        blockchain.blockchains = {}
+        with mock.patch.object(Blockchain, 'read_header', autospec=True,
+                               side_effect=Blockchain.read_header) as read_header:
+            blockchain.read_blockchains(self.config)
+        self.assertFalse(os.path.exists(path))
+        self.assertNotIn(chain_z.get_id(), blockchain.blockchains)
+        # the file was unmapped before it was deleted
+        readers = [call[0][0] for call in read_header.call_args_list if call[0][0].path() == path]
+        self.assertTrue(readers)
+        self.assertTrue(all(b._mmap is None for b in readers))
+
+    def test_chainwork_cache_file(self):
+        items = [(bh2u(bytes([i]) * 32), i * 2 ** 200) for i in range(1, 4)]
+        blockchain._save_chainwork_cache_items(self.config, items[:2])
+        blockchain._save_chainwork_cache_items(self.config, items[2:])
+        path = os.path.join(self.data_dir, 'chainwork')
+        self.assertEqual(3 * 64, os.path.getsize(path))
+        # a partially written record is dropped
+        with open(path, 'ab') as f:
+            f.write(bytes(40))
+        for block_hash, chainwork in items:
+            blockchain._CHAINWORK_CACHE.pop(block_hash, None)
+        blockchain._read_chainwork_cache(self.config)
+        self.assertEqual(3 * 64, os.path.getsize(path))
+        for block_hash, chainwork in items:
+            self.assertEqual(chainwork, blockchain._CHAINWORK_CACHE.pop(block_hash))
+
 
 class TestVerifyHeader(ElectrumTestCase):
 
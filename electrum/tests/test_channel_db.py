@@ -0,0 +1,233 @@
+import asyncio
+import os
+import sqlite3
+import time
+from unittest import mock
+
+from electrum import constants, util
+from electrum.channel_db import ChannelDB, GraphSnapshot
+from electrum.lnmsg import encode_msg, decode_msg
+from electrum.lnutil import LNPeerAddr
+from electrum.simple_config import SimpleConfig
+from electrum.util import create_and_start_event_loop
+
+from . import TestCaseForTestnet
+
+
+def node_id(i: int) -> bytes:
+    return b'\x02' + bytes([i]) * 32
+
+
+def scid(i: int) -> bytes:
+    return i.to_bytes(8, 'big')
+
+
+def channel_announcement(short_channel_id: bytes, node1_id: bytes, node2_id: bytes) -> dict:
+    raw = encode_msg(
+        'channel_announcement',
+        node_signature_1=bytes(64),
+        node_signature_2=bytes(64),
+        bitcoin_signature_1=bytes(64),
+        bitcoin_signature_2=bytes(64),
+        len=0,
+        features=b'',
+        chain_hash=constants.net.rev_genesis_bytes(),
+        short_channel_id=short_channel_id,
+        node_id_1=node1_id,
+        node_id_2=node2_id,
+        bitcoin_key_1=node1_id,
+        bitcoin_key_2=node2_id)
+    payload = decode_msg(raw)[1]
+    payload['raw'] = raw
+    return payload
+
+
+def channel_update(short_channel_id: bytes, direction: int, fee_base_msat: int, *,
+                   htlc_maximum_msat: int = None, timestamp: int = None) -> dict:
+    kwargs = {}
+    if htlc_maximum_msat is not None:
+        kwargs['htlc_maximum_msat'] = htlc_maximum_msat
+    raw = encode_msg(
+        'channel_update',
+        signature=bytes(64),
+        chain_hash=constants.net.rev_genesis_bytes(),
+        short_channel_id=short_channel_id,
+        timestamp=timestamp or int(time.time()),
+        message_flags=b'\x01' if htlc_maximum_msat is not None else b'\x00',
+        channel_flags=bytes([direction]),
+        cltv_expiry_delta=144,
+        htlc_minimum_msat=1000,
+        fee_base_msat=fee_base_msat,
+        fee_proportional_millionths=1,
+        **kwargs)
+    payload = decode_msg(raw)[1]
+    payload['raw'] = raw
+    return payload
+
+
+def node_announcement(node_id: bytes, alias: str) -> dict:
+    raw = encode_msg(
+        'node_announcement',
+        signature=bytes(64),
+        flen=0,
+        features=b'',
+        timestamp=int(time.time()),
+        node_id=node_id,
+        rgb_color=b'\x00\x00\x00',
+        alias=alias.encode('utf8').ljust(32, b'\x00'),
+        addrlen=7,
+        addresses=b'\x01\x7f\x00\x00\x01\x26\x07')  # 127.0.0.1:9735
+    payload = decode_msg(raw)[1]
+    payload['raw'] = raw
+    return payload
+
+
+class TestChannelDBSnapshot(TestCaseForTestnet):
+
+    def setUp(self):
+        super().setUp()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        self.channel_db = None
+        # callbacks are triggered from the sql thread, where there is no event loop
+        patcher = mock.patch.object(util.callback_mgr, 'asyncio_loop', asyncio.get_event_loop())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        if self.channel_db:
+            self._close(self.channel_db)
+        super().tearDown()
+
+    def _open(self) -> ChannelDB:
+        asyncio_loop, self._stop_loop, self._loop_thread = create_and_start_event_loop()
+        class fake_network:
+            config = self.config
+            interface = None
+        fake_network.asyncio_loop = asyncio_loop
+        self.channel_db = ChannelDB(fake_network())
+        self._wait(self.channel_db.load_data())
+        return self.channel_db
+
+    def _close(self, channel_db: ChannelDB):
+        # requests still queued when the event loop stops are not processed
+        fut = asyncio.Future()
+        channel_db.db_requests.put((fut, lambda self: None, (), {}))
+        self._wait(fut)
+        channel_db.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+        channel_db.sql_thread.join(timeout=5)
+        self.channel_db = None
+
+    def _wait(self, fut):
+        # sql methods run in the sql thread, in order
+        for i in range(500):
+            if fut.done():
+                return fut.result()
+            time.sleep(0.01)
+        self.fail('timed out')
+
+    def _graph(self, channel_db: ChannelDB) -> dict:
+        return {
+            'channels': dict(channel_db._channels),
+            'policies': dict(channel_db._policies),
+            'nodes': dict(channel_db._nodes),
+            'addresses': dict(channel_db._addresses),
+            'channels_for_node': {node_id: set(channel_db.get_channels_for_node(node_id, my_channels={}))
+                                  for node_id in channel_db.graph.node_ids
+                                  if channel_db.graph.has_channels(node_id)},
+            'policy_counts': channel_db.get_num_channels_partitioned_by_policy_count(),
+        }
+
+    def _populate(self, cdb: ChannelDB):
+        cdb.add_channel_announcement([
+            channel_announcement(scid(1), node_id(1), node_id(2)),
+            channel_announcement(scid(2), node_id(2), node_id(3)),
+            channel_announcement(scid(3), node_id(1), node_id(3)),
+        ])
+        cdb.add_channel_updates([
+            channel_update(scid(1), 0, 1000),
+            channel_update(scid(1), 1, 1000, htlc_maximum_msat=10**9),
+            channel_update(scid(2), 0, 2000, timestamp=int(time.time()) - 100),
+            channel_update(scid(2), 1, 2000, timestamp=int(time.time()) - 7200),
+            channel_update(scid(3), 1, 3000),
+        ])
+        cdb.add_node_announcement([node_announcement(node_id(1), 'alice'), node_announcement(node_id(2), 'bob')])
+        cdb.add_recent_peer(LNPeerAddr('127.0.0.2', 9735, node_id(3)))
+
+    def test_snapshot_roundtrip(self):
+        cdb = self._open()
+        self._populate(cdb)
+        snapshot = GraphSnapshot(
+            db_id=cdb._db_id,
+            generation=42,
+            channels=list(cdb._channels.values()),
+            policies=list(cdb._policies.values()),
+            nodes=list(cdb._nodes.values()),
+            addresses=[(node_id, host, port, ts)
+                       for node_id, addrs in cdb._addresses.items()
+                       for host, port, ts in addrs])
+        data = snapshot.serialize()
+        self.assertEqual(snapshot, GraphSnapshot.deserialize(data))
+        with self.assertRaises(ValueError):
+            GraphSnapshot.deserialize(data + b'\x00')
+        with self.assertRaises(Exception):
+            GraphSnapshot.deserialize(data[:-1])
+
+    def test_load_snapshot_and_replay_changes(self):
+        cdb = self._open()
+        self._populate(cdb)
+        self._wait(cdb.save_snapshot())
+        self.assertTrue(os.path.exists(cdb.snapshot_path))
+        # changes after the snapshot
+        cdb.add_channel_announcement(channel_announcement(scid(4), node_id(3), node_id(4)))
+        cdb.add_channel_updates([
+            channel_update(scid(4), 0, 4000),
+            channel_update(scid(2), 0, 2500),
+        ])
+        cdb.add_node_announcement(node_announcement(node_id(3), 'carol'))
+        cdb.remove_channel(scid(3))
+        cdb.prune_old_policies(3600)
+        cdb.add_recent_peer(LNPeerAddr('127.0.0.3', 9735, node_id(4)))
+        expected = self._graph(cdb)
+        # do not save a snapshot on shutdown, as if we crashed
+        cdb.data_loaded.clear()
+        self._wait(cdb.save_snapshot())
+        self._close(cdb)
+
+        cdb = self._open()
+        self.assertEqual(expected, self._graph(cdb))
+        self._close(cdb)
+
+        # a full load gives the same graph
+        os.remove(cdb.snapshot_path)
+        cdb = self._open()
+        self.assertEqual(expected, self._graph(cdb))
+
+    def test_snapshot_saved_on_shutdown(self):
+        cdb = self._open()
+        self._populate(cdb)
+        expected = self._graph(cdb)
+        self._close(cdb)
+        self.assertTrue(os.path.exists(cdb.snapshot_path))
+
+        cdb = self._open()
+        self.assertEqual(expected, self._graph(cdb))
+        # the changelog was trimmed
+        conn = sqlite3.connect(cdb.path)
+        self.assertEqual([], conn.execute("SELECT * FROM changelog").fetchall())
+        conn.close()
+
+    def test_mismatching_snapshot_is_ignored(self):
+        cdb = self._open()
+        self._populate(cdb)
+        expected = self._graph(cdb)
+        self._close(cdb)
+        # e.g. the database was replaced, while the snapshot was not
+        with open(cdb.snapshot_path, 'rb') as f:
+            snapshot = GraphSnapshot.deserialize(f.read())
+        snapshot = snapshot._replace(db_id=bytes(16), channels=[])
+        with open(cdb.snapshot_path, 'wb') as f:
+            f.write(snapshot.serialize())
+
+        cdb = self._open()
+        self.assertEqual(expected, self._graph(cdb))
@@ -1,4 +1,4 @@
-from electrum.coinchooser import CoinChooserPrivacy
+from electrum.coinchooser import CoinChooserPrivacy, CoinChooserBnB, Bucket, PRNG
 from electrum.util import NotEnoughFunds
 
 from . import ElectrumTestCase
@@ -18,3 +18,57 @@ class TestCoinChooser(ElectrumTestCase):
             coin_chooser.bucket_candidates_any([], sufficient_funds)
         with self.assertRaises(NotEnoughFunds):
             coin_chooser.bucket_candidates_prefer_confirmed([], sufficient_funds)
+
+
+def _bucket(value, *, min_height=100):
+    return Bucket(desc='addr%d' % value, weight=272, value=value, effective_value=value,
+                  coins=[], min_height=min_height, witness=True)
+
+
+class TestCoinChooserBnB(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.coin_chooser = CoinChooserBnB(enable_output_value_rounding=False)
+        self.coin_chooser.p = PRNG(b'test')
+
+    def _choose(self, buckets, target, cost_of_change=0):
+        self.coin_chooser.target_effective_value = target
+        self.coin_chooser.cost_of_change = cost_of_change
+        def sufficient_funds(bkts, *, bucket_value_sum):
+            return bucket_value_sum >= target
+        return self.coin_chooser.choose_buckets(buckets, sufficient_funds, lambda bkts: bkts)
+
+    def test_bnb_exact_match(self):
+        buckets = [_bucket(v) for v in (100_000, 70_000, 50_000, 30_000, 20_000, 5_000)]
+        selection = self.coin_chooser._bnb(buckets, 75_000, 0)
+        self.assertEqual([70_000, 5_000], [b.value for b in selection])
+        self.assertEqual(75_000, sum(b.value for b in self._choose(buckets, 75_000)))
+
+    def test_bnb_least_waste_within_cost_of_change(self):
+        buckets = [_bucket(v) for v in (60_000, 41_000, 40_500, 20_000)]
+        selection = self.coin_chooser._bnb(buckets, 81_000, 1_000)
+        self.assertEqual([41_000, 40_500], [b.value for b in selection])
+        self.assertIsNone(self.coin_chooser._bnb(buckets, 81_000, 100))
+
+    def test_bnb_fewer_buckets_on_equal_waste(self):
+        buckets = [_bucket(v) for v in (50_000, 30_000, 20_000)]
+        selection = self.coin_chooser._bnb(buckets, 50_000, 0)
+        self.assertEqual([50_000], [b.value for b in selection])
+
+    def test_knapsack_fallback(self):
+        # no subset lands within [target, target + cost_of_change]
+        buckets = [_bucket(v) for v in (100_000, 30_000, 30_000, 30_000)]
+        self.assertIsNone(self.coin_chooser._bnb(buckets, 75_000, 1_000))
+        selection = self._choose(buckets, 75_000, 1_000)
+        self.assertEqual(90_000, sum(b.value for b in selection))
+
+    def test_prefers_confirmed(self):
+        buckets = [_bucket(75_000, min_height=0), _bucket(50_000), _bucket(25_000)]
+        selection = self._choose(buckets, 75_000)
+        self.assertEqual([50_000, 25_000], [b.value for b in selection])
+
+    def test_not_enough_funds(self):
+        buckets = [_bucket(v) for v in (30_000, 20_000)]
+        with self.assertRaises(NotEnoughFunds):
+            self._choose(buckets, 75_000)
@@ -2,7 +2,7 @@ import unittest
 from unittest import mock
 from decimal import Decimal
 
-from electrum.util import create_and_start_event_loop
+from electrum.util import create_and_start_event_loop, HttpSessionPool
 from electrum.commands import Commands, eval_bool
 from electrum import storage, wallet
 from electrum.wallet import restore_wallet_from_text
@@ -57,6 +57,17 @@ class TestCommands(ElectrumTestCase):
         self.assertTrue(eval_bool("true"))
         self.assertTrue(eval_bool("1"))
 
+    def test_getinfo(self):
+        network = mock.Mock()
+        network.get_interfaces.return_value = []
+        network.http_session_pool = HttpSessionPool()
+        network.http_session_pool.num_new_connections = 1
+        network.http_session_pool.num_reused_connections = 3
+        cmds = Commands(config=self.config, network=network)
+        info = cmds._run('getinfo', ())
+        self.assertEqual({'new_connections': 1, 'reused_connections': 3, 'reuse_ratio': 0.75},
+                         info['http_connections'])
+
     def test_convert_xkey(self):
         cmds = Commands(config=self.config)
         xpubs = {
@@ -0,0 +1,83 @@
+from electrum.channel_db import ChannelInfo, Policy
+from electrum.lngraph import ChannelGraph, POLICY_PRESENT, POLICY_DISABLED, NO_HTLC_MAXIMUM
+from electrum.lnutil import ShortChannelID
+
+from . import ElectrumTestCase
+
+
+def node_id(i: int) -> bytes:
+    return b'\x02' + bytes([i]) * 32
+
+
+def scid(i: int) -> ShortChannelID:
+    return ShortChannelID(i.to_bytes(8, 'big'))
+
+
+def channel_info(i: int, node1: int, node2: int, capacity_sat: int = None) -> ChannelInfo:
+    return ChannelInfo(short_channel_id=scid(i), node1_id=node_id(node1), node2_id=node_id(node2),
+                       capacity_sat=capacity_sat)
+
+
+def policy(i: int, start_node: int, *, fee_base_msat=1000, channel_flags=0, htlc_maximum_msat=None) -> Policy:
+    return Policy(key=scid(i) + node_id(start_node), cltv_expiry_delta=144, htlc_minimum_msat=1,
+                  htlc_maximum_msat=htlc_maximum_msat, fee_base_msat=fee_base_msat,
+                  fee_proportional_millionths=10, channel_flags=channel_flags, message_flags=0, timestamp=0)
+
+
+class TestChannelGraph(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.graph = ChannelGraph()
+        self.graph.add_channel(channel_info(1, 1, 2))
+        self.graph.add_channel(channel_info(2, 2, 3, capacity_sat=10_000))
+        self.graph.add_channel(channel_info(3, 1, 3))
+
+    def test_adjacency(self):
+        g = self.graph
+        self.assertEqual(3, g.num_channels())
+        self.assertEqual(3, g.num_nodes())
+        self.assertEqual({scid(1), scid(3)}, set(g.get_channels_for_node(node_id(1))))
+        self.assertEqual({(scid(1), node_id(1)), (scid(2), node_id(3))}, set(g.get_neighbours(node_id(2))))
+        self.assertEqual([], g.get_neighbours(node_id(4)))
+        # topology changes are seen
+        g.add_channel(channel_info(4, 3, 4))
+        self.assertEqual([(scid(4), node_id(3))], g.get_neighbours(node_id(4)))
+        g.remove_channel(scid(1))
+        self.assertEqual([(scid(3), node_id(3))], g.get_neighbours(node_id(1)))
+        self.assertEqual(3, g.num_channels())
+        self.assertTrue(g.has_channels(node_id(1)))
+        g.remove_channel(scid(3))
+        self.assertFalse(g.has_channels(node_id(1)))
+        self.assertEqual([], g.get_neighbours(node_id(1)))
+
+    def test_policies(self):
+        g = self.graph
+        i = g.get_policy_index(scid(2), node_id(3))
+        self.assertEqual(i ^ 1, g.get_policy_index(scid(2), node_id(2)))
+        self.assertIsNone(g.get_policy_index(scid(2), node_id(1)))
+        self.assertIsNone(g.get_policy_index(scid(5), node_id(1)))
+        self.assertEqual(0, g.policy_flags[i])
+        g.set_policy(policy(2, 3, fee_base_msat=42, channel_flags=0b11, htlc_maximum_msat=10**9))
+        self.assertEqual(POLICY_PRESENT | POLICY_DISABLED, g.policy_flags[i])
+        self.assertEqual(0, g.policy_flags[i ^ 1])
+        self.assertEqual(42, g.fee_base_msat[i])
+        self.assertEqual(10**9, g.htlc_maximum_msat[i])
+        self.assertEqual(10_000, g.capacity_sat[i >> 1])
+        g.set_policy(policy(2, 2))
+        self.assertEqual(POLICY_PRESENT, g.policy_flags[i ^ 1])
+        self.assertEqual(NO_HTLC_MAXIMUM, g.htlc_maximum_msat[i ^ 1])
+        g.remove_policy(scid(2), node_id(3))
+        self.assertEqual(0, g.policy_flags[i])
+
+    def test_slots_are_reused(self):
+        g = self.graph
+        g.set_policy(policy(1, 1))
+        slot = g.get_slot(scid(1))
+        g.remove_channel(scid(1))
+        self.assertIsNone(g.get_slot(scid(1)))
+        g.add_channel(channel_info(4, 2, 3))
+        self.assertEqual(slot, g.get_slot(scid(4)))
+        # policies of the former channel are gone
+        self.assertEqual(0, g.policy_flags[2 * slot])
+        self.assertEqual({scid(2), scid(4)}, set(g.get_channels_for_node(node_id(3))) - {scid(3)})
@@ -1,5 +1,6 @@
 import asyncio
 import tempfile
+import time
 from decimal import Decimal
 import os
 from contextlib import contextmanager
@@ -9,28 +10,30 @@ import concurrent
 from concurrent import futures
 import unittest
 from typing import Iterable, NamedTuple
+from unittest import mock
 
 from aiorpcx import TaskGroup
 
 from electrum import constants
 from electrum.network import Network
-from electrum.ecc import ECPrivkey
+from electrum.ecc import ECPrivkey, ECPubkey
 from electrum import simple_config, lnutil
-from electrum.lnaddr import lnencode, LnAddr, lndecode
+from electrum.lnaddr import lnencode, LnAddr, lndecode, SerializableKey
 from electrum.bitcoin import COIN, sha256
 from electrum.util import bh2u, create_and_start_event_loop, NetworkRetryManager
 from electrum.lnpeer import Peer
 from electrum.lnutil import LNPeerAddr, Keypair, privkey_to_pubkey
 from electrum.lnutil import LightningPeerConnectionClosed, RemoteMisbehaving
-from electrum.lnutil import PaymentFailure, LnFeatures, HTLCOwner
+from electrum.lnutil import PaymentFailure, LnFeatures, HTLCOwner, derive_payment_secret_from_payment_preimage
+from electrum.lnutil import BarePaymentAttemptLog, ShortChannelID, UpdateAddHtlc
 from electrum.lnchannel import ChannelState, PeerState, Channel
-from electrum.lnrouter import LNPathFinder, PathEdge, LNPathInconsistent
+from electrum.lnrouter import LNPathFinder, PathEdge, LNPathInconsistent, RouteEdge
 from electrum.channel_db import ChannelDB
 from electrum.lnworker import LNWallet, NoPathFound
 from electrum.lnmsg import encode_msg, decode_msg
 from electrum.logging import console_stderr_handler, Logger
-from electrum.lnworker import PaymentInfo, RECEIVED, PR_UNPAID
-from electrum.lnonion import OnionFailureCode
+from electrum.lnworker import PaymentInfo, RECEIVED, SENT, PR_UNPAID, PR_INFLIGHT
+from electrum.lnonion import OnionFailureCode, OnionRoutingFailureMessage
 
 from .test_lnchannel import create_test_channels
 from .test_bitcoin import needs_test_with_all_chacha20_implementations
@@ -118,7 +121,10 @@ class MockLNWallet(Logger, NetworkRetryManager[LNPeerAddr]):
         self.wallet = MockWallet()
         self.features = LnFeatures(0)
         self.features |= LnFeatures.OPTION_DATA_LOSS_PROTECT_OPT
-        self.pending_payments = defaultdict(asyncio.Future)
+        self.pending_htlcs = defaultdict(asyncio.Future)
+        self.received_htlc_parts = defaultdict(dict)
+        self.received_mpp_complete = set()
+        self.received_mpp_failed = set()
         for chan in chans:
             chan.lnworker = self
         self._peers = {}  # bytes -> Peer
@@ -164,12 +170,19 @@ class MockLNWallet(Logger, NetworkRetryManager[LNPeerAddr]):
     payment_received = LNWallet.payment_received
     payment_sent = LNWallet.payment_sent
     payment_failed = LNWallet.payment_failed
+    add_received_htlc_part = LNWallet.add_received_htlc_part
+    is_received_mpp_complete = LNWallet.is_received_mpp_complete
+    remove_received_htlc_parts = LNWallet.remove_received_htlc_parts
     save_preimage = LNWallet.save_preimage
     get_preimage = LNWallet.get_preimage
     _create_route_from_invoice = LNWallet._create_route_from_invoice
     _check_invoice = staticmethod(LNWallet._check_invoice)
     _pay_to_route = LNWallet._pay_to_route
     _pay = LNWallet._pay
+    _can_pay_multipart = staticmethod(LNWallet._can_pay_multipart)
+    _pay_multipart = LNWallet._pay_multipart
+    _create_routes_for_multipart = LNWallet._create_routes_for_multipart
+    _extend_route_with_private_route = LNWallet._extend_route_with_private_route
     force_close_channel = LNWallet.force_close_channel
     try_force_closing = LNWallet.try_force_closing
     get_first_timestamp = lambda self: 0
@@ -511,6 +524,117 @@ class TestPeer(ElectrumTestCase):
         with self.assertRaises(PaymentDone):
             run(f())
 
+    def test_failed_part_leaves_payment_in_flight(self):
+        alice_channel, bob_channel = create_test_channels()
+        p1, p2, w1, w2, _q1, _q2 = self.prepare_peers(alice_channel, bob_channel)
+        RHASH = os.urandom(32)
+        w1.save_payment_info(PaymentInfo(RHASH, 1000, SENT, PR_INFLIGHT))
+        async def f():
+            fut = w1.pending_htlcs[(alice_channel.channel_id, 0)]
+            w1.payment_failed(alice_channel, RHASH, 0, b'', None)
+            self.assertFalse(fut.result().success)
+            # the payer decides, other parts might still succeed
+            self.assertEqual(PR_INFLIGHT, w1.get_payment_status(RHASH))
+            # unless nobody is waiting for the htlc
+            w1.payment_failed(alice_channel, RHASH, 1, b'', None)
+            self.assertEqual(PR_UNPAID, w1.get_payment_status(RHASH))
+        run(f())
+
+    def test_liquidity_failure_does_not_blacklist(self):
+        alice_channel, bob_channel = create_test_channels()
+        p1, p2, w1, w2, _q1, _q2 = self.prepare_peers(alice_channel, bob_channel)
+        p1.initialized.set_result(True)
+        scid = ShortChannelID.from_components(1, 2, 3)
+        route = [RouteEdge(node_id=p1.pubkey, short_channel_id=alice_channel.short_channel_id, fee_base_msat=0,
+                           fee_proportional_millionths=0, cltv_expiry_delta=0, node_features=0),
+                 RouteEdge(node_id=b'\x02' + bytes(32), short_channel_id=scid, fee_base_msat=0,
+                           fee_proportional_millionths=0, cltv_expiry_delta=0, node_features=0)]
+        lnaddr = LnAddr(paymenthash=os.urandom(32), amount=Decimal(100_000) / COIN,
+                        tags=[('c', lnutil.MIN_FINAL_CLTV_EXPIRY_FOR_INVOICE)])
+        path_finder = w1.network.path_finder
+        async def pay_and_fail(code):
+            failure_msg = OnionRoutingFailureMessage(code=code, data=b'')
+            attempt = BarePaymentAttemptLog(success=False, error_bytes=b'error')
+            # as for an unchanged channel update
+            with mock.patch.object(p1, 'pay', return_value=mock.Mock(htlc_id=0)), \
+                    mock.patch.object(w1, 'await_payment', mock.AsyncMock(return_value=attempt)), \
+                    mock.patch.object(alice_channel, 'decode_onion_error', return_value=(failure_msg, 0)), \
+                    mock.patch.object(w1, 'handle_error_code_from_failed_htlc', return_value=True):
+                return await w1._pay_to_route(route, lnaddr)
+        log = run(pay_and_fail(OnionFailureCode.TEMPORARY_CHANNEL_FAILURE))
+        # the channel is only avoided for the amount it could not forward
+        self.assertFalse(log.failure_details.is_blacklisted)
+        self.assertFalse(path_finder.is_blacklisted(scid))
+        self.assertEqual((0, 100_000_000), path_finder.mission_control.get_liquidity_bounds(
+            scid, p1.pubkey, now=int(time.time())))
+        log = run(pay_and_fail(OnionFailureCode.TEMPORARY_NODE_FAILURE))
+        self.assertTrue(log.failure_details.is_blacklisted)
+        self.assertTrue(path_finder.is_blacklisted(scid))
+
+    def test_received_htlc_parts(self):
+        alice_channel, bob_channel = create_test_channels()
+        p1, p2, w1, w2, _q1, _q2 = self.prepare_peers(alice_channel, bob_channel)
+        RHASH = os.urandom(32)
+        def part(htlc_id, amount_msat):
+            return UpdateAddHtlc(amount_msat=amount_msat, payment_hash=RHASH, cltv_expiry=0,
+                                 timestamp=int(time.time()), htlc_id=htlc_id)
+        with self.subTest(msg="parts are kept until settled or failed"):
+            self.assertIsNone(w2.add_received_htlc_part(bob_channel, part(0, 400), 1000))
+            self.assertIsNone(w2.add_received_htlc_part(bob_channel, part(1, 600), 1000))
+            self.assertTrue(w2.is_received_mpp_complete(RHASH))
+            w2.remove_received_htlc_parts(bob_channel.channel_id, 0)
+            self.assertEqual({(bob_channel.channel_id, 1): (600, 1000)}, w2.received_htlc_parts[RHASH])
+            w2.remove_received_htlc_parts(bob_channel.channel_id)
+            self.assertEqual({}, w2.received_htlc_parts)
+            self.assertFalse(w2.is_received_mpp_complete(RHASH))
+        with self.subTest(msg="the whole set is failed if the parts disagree on total_msat"):
+            self.assertIsNone(w2.add_received_htlc_part(bob_channel, part(2, 400), 1000))
+            self.assertEqual(OnionFailureCode.INCORRECT_OR_UNKNOWN_PAYMENT_DETAILS,
+                             w2.add_received_htlc_part(bob_channel, part(3, 600), 2000))
+            self.assertEqual(OnionFailureCode.INCORRECT_OR_UNKNOWN_PAYMENT_DETAILS,
+                             w2.add_received_htlc_part(bob_channel, part(2, 400), 1000))
+            self.assertEqual(OnionFailureCode.INCORRECT_OR_UNKNOWN_PAYMENT_DETAILS,
+                             w2.add_received_htlc_part(bob_channel, part(4, 600), 1000))
+            w2.remove_received_htlc_parts(bob_channel.channel_id)
+            self.assertEqual(set(), w2.received_mpp_failed)
+
+    def test_payment_multipart(self):
+        graph = self.prepare_chans_and_peers_in_square()
+        peers = graph.all_peers()
+        amount_sat = 8 * COIN  # more than either channel of alice can send
+        async def pay():
+            payment_preimage = os.urandom(32)
+            RHASH = sha256(payment_preimage)
+            graph.w_d.save_preimage(RHASH, payment_preimage)
+            graph.w_d.save_payment_info(PaymentInfo(RHASH, amount_sat, RECEIVED, PR_UNPAID))
+            lnaddr = LnAddr(
+                paymenthash=RHASH,
+                amount=Decimal(amount_sat) / COIN,
+                tags=[('c', lnutil.MIN_FINAL_CLTV_EXPIRY_FOR_INVOICE),
+                      ('9', LnFeatures.PAYMENT_SECRET_OPT | LnFeatures.BASIC_MPP_OPT)
+                     ] + await graph.w_d._calc_routing_hints_for_invoice(amount_sat),
+                payment_secret=derive_payment_secret_from_payment_preimage(payment_preimage))
+            lnaddr.pubkey = SerializableKey(ECPubkey(graph.w_d.node_keypair.pubkey))  # as set by lndecode
+            log = []
+            result, reason = await graph.w_a._pay_multipart(lnaddr, log, attempts=1)
+            self.assertTrue(result, reason)
+            self.assertTrue(all(payment_attempt_log.success for payment_attempt_log in log))
+            self.assertEqual({graph.chan_ab.short_channel_id, graph.chan_ac.short_channel_id},
+                             {payment_attempt_log.route[0].short_channel_id for payment_attempt_log in log})
+            # the receiver forgets the parts once settled
+            self.assertEqual({}, graph.w_d.received_htlc_parts)
+            self.assertEqual(set(), graph.w_d.received_mpp_complete)
+            raise PaymentDone()
+        async def f():
+            async with TaskGroup() as group:
+                for peer in peers:
+                    await group.spawn(peer._message_loop())
+                    await group.spawn(peer.htlc_switch())
+                await asyncio.sleep(0.2)
+                await group.spawn(pay())
+        with self.assertRaises(PaymentDone):
+            run(f())
+
     @needs_test_with_all_chacha20_implementations
     def test_payment_multihop_with_preselected_path(self):
         graph = self.prepare_chans_and_peers_in_square()
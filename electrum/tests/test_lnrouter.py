@@ -2,6 +2,7 @@ import unittest
 import tempfile
 import shutil
 import asyncio
+from unittest import mock
 
 from electrum.util import bh2u, bfh, create_and_start_event_loop
 from electrum.lnonion import (OnionHopsDataSingle, new_onion_packet,
@@ -11,6 +12,7 @@ from electrum import bitcoin, lnrouter
 from electrum.constants import BitcoinTestnet
 from electrum.simple_config import SimpleConfig
 from electrum.lnrouter import PathEdge
+from electrum.lnutil import ShortChannelID
 
 from . import TestCaseForTestnet
 from .test_bitcoin import needs_test_with_all_chacha20_implementations
@@ -91,6 +93,55 @@ class Test_LNRouter(TestCaseForTestnet):
         route = path_finder.create_route_from_path(path, start_node)
         self.assertEqual(b'\x02bbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb', route[0].node_id)
         self.assertEqual(bfh('0000000000000003'),                 route[0].short_channel_id)
+        # k shortest paths
+        paths = path_finder.find_k_shortest_paths(b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee', 100000, 3)
+        self.assertEqual([[bfh('0000000000000003'), bfh('0000000000000002')],
+                          [bfh('0000000000000003'), bfh('0000000000000001'), bfh('0000000000000004'), bfh('0000000000000005')]],
+                         [[edge.short_channel_id for edge in path] for path in paths])
+        # splitting payments, over channels of known capacity
+        for short_channel_id, node_id_1, node_id_2 in ((bfh('0000000000000002'), b'\x02bbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb', b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee'),
+                                                       (bfh('0000000000000005'), b'\x02dddddddddddddddddddddddddddddddd', b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee')):
+            cdb.add_verified_channel_info({'node_id_1': node_id_1, 'node_id_2': node_id_2,
+                                           'bitcoin_key_1': node_id_1, 'bitcoin_key_2': node_id_2,
+                                           'short_channel_id': short_channel_id,
+                                           'chain_hash': BitcoinTestnet.rev_genesis_bytes(),
+                                           'len': 0, 'features': b''}, capacity_sat=1500)
+        self.assertAlmostEqual(500_001 / 1_500_001, path_finder.get_success_probability(
+            b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', paths[0], 1_000_000, my_channels={}))
+        self.assertEqual(0, path_finder.get_success_probability(
+            b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', paths[0], 1_000_000, my_channels={},
+            in_flight_msat={bfh('0000000000000002'): 1_000_000}))
+        split = path_finder.split_payment(b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', [b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee'], 2_000_000)
+        self.assertEqual([(paths[0], 1_000_000), (paths[1], 1_000_000)], split)
+        self.assertEqual([], path_finder.split_payment(b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', [b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee'], 4_000_000))
+        # payments likely to go through on the cheapest path are not split
+        with mock.patch.object(path_finder, 'find_k_shortest_paths') as find_k_shortest_paths:
+            split = path_finder.split_payment(b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', [b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee'], 100_000)
+        self.assertEqual([(paths[0], 100_000)], split)
+        find_k_shortest_paths.assert_not_called()
+        # channels that could not forward an amount are avoided for it, but not for less
+        route = path_finder.create_route_from_path(paths[0], start_node)
+        path_finder.update_liquidity_hints(route, 100000, failing_edge_index=1, is_liquidity_failure=True)
+        path = path_finder.find_path_for_payment(b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee', 100000)
+        self.assertEqual(paths[1], path)
+        path = path_finder.find_path_for_payment(b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee', 250)
+        self.assertEqual(paths[0], path)
+        self.assertAlmostEqual(0.5, path_finder.get_success_probability(
+            b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', paths[0], 50000, my_channels={}))
+        path_finder.mission_control.clear()
+        # blacklisted channels are avoided
+        path_finder.add_to_blacklist(ShortChannelID(bfh('0000000000000002')))
+        path = path_finder.find_path_for_payment(b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee', 100000)
+        self.assertEqual([PathEdge(node_id=b'\x02bbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb', short_channel_id=bfh('0000000000000003')),
+                          PathEdge(node_id=b'\x02cccccccccccccccccccccccccccccccc', short_channel_id=bfh('0000000000000001')),
+                          PathEdge(node_id=b'\x02dddddddddddddddddddddddddddddddd', short_channel_id=bfh('0000000000000004')),
+                          PathEdge(node_id=b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee', short_channel_id=bfh('0000000000000005')),
+                         ], path)
+        prev_node = path_finder.get_distances(b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee', 100000)
+        self.assertEqual(path[0], prev_node[b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa'])
+        # and so are disabled channels
+        cdb.add_channel_update({'short_channel_id': bfh('0000000000000005'), 'message_flags': b'\x00', 'channel_flags': b'\x02', 'cltv_expiry_delta': 10, 'htlc_minimum_msat': 250, 'fee_base_msat': 100, 'fee_proportional_millionths': 999, 'chain_hash': BitcoinTestnet.rev_genesis_bytes(), 'timestamp': 100})
+        self.assertIsNone(path_finder.find_path_for_payment(b'\x02aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa', b'\x02eeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee', 100000))
 
         # need to duplicate tear_down here, as we also need to wait for the sql thread to stop
         self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import time
+from unittest import mock
+
+from electrum.mission_control import MissionControl, MissionControlDB, LIQUIDITY_HALF_LIFE, MAX_AGE
+from electrum.simple_config import SimpleConfig
+from electrum.util import create_and_start_event_loop
+
+from . import TestCaseForTestnet
+
+
+def node_id(i: int) -> bytes:
+    return b'\x02' + bytes([i]) * 32
+
+
+def scid(i: int) -> bytes:
+    return i.to_bytes(8, 'big')
+
+
+class TestMissionControl(TestCaseForTestnet):
+
+    def test_liquidity_bounds(self):
+        mc = MissionControl()
+        now = int(time.time())
+        self.assertIsNone(mc.get_liquidity_bounds(scid(1), node_id(1), now=now))
+        mc.report_success(scid(1), node_id(1), 1000, now=now)
+        mc.report_liquidity_failure(scid(1), node_id(1), 5000, now=now)
+        self.assertEqual((1000, 5000), mc.get_liquidity_bounds(scid(1), node_id(1), now=now))
+        # the other direction is another channel
+        self.assertIsNone(mc.get_liquidity_bounds(scid(1), node_id(2), now=now))
+        # bounds only get tighter
+        mc.report_success(scid(1), node_id(1), 500, now=now)
+        mc.report_liquidity_failure(scid(1), node_id(1), 8000, now=now)
+        self.assertEqual((1000, 5000), mc.get_liquidity_bounds(scid(1), node_id(1), now=now))
+        # unless the liquidity has changed
+        mc.report_success(scid(1), node_id(1), 6000, now=now)
+        self.assertEqual((6000, None), mc.get_liquidity_bounds(scid(1), node_id(1), now=now))
+        mc.report_liquidity_failure(scid(1), node_id(1), 4000, now=now)
+        self.assertEqual((0, 4000), mc.get_liquidity_bounds(scid(1), node_id(1), now=now))
+
+    def test_decay(self):
+        mc = MissionControl()
+        now = int(time.time())
+        mc.report_success(scid(1), node_id(1), 1000, now=now)
+        mc.report_liquidity_failure(scid(1), node_id(1), 5000, now=now)
+        later = now + LIQUIDITY_HALF_LIFE
+        self.assertEqual((500, 10000), mc.get_liquidity_bounds(scid(1), node_id(1), now=later))
+        # new outcomes are combined with the decayed bounds
+        mc.report_success(scid(1), node_id(1), 800, now=later)
+        self.assertEqual((800, 10000), mc.get_liquidity_bounds(scid(1), node_id(1), now=later))
+        self.assertIsNone(mc.get_liquidity_bounds(scid(1), node_id(1), now=later + MAX_AGE + 1))
+
+
+class TestMissionControlDB(TestCaseForTestnet):
+
+    def setUp(self):
+        super().setUp()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        self.mission_control = None
+
+    def tearDown(self):
+        if self.mission_control:
+            self._close(self.mission_control)
+        super().tearDown()
+
+    def _open(self) -> MissionControl:
+        asyncio_loop, self._stop_loop, self._loop_thread = create_and_start_event_loop()
+        class fake_network:
+            config = self.config
+        fake_network.asyncio_loop = asyncio_loop
+        self.mission_control = MissionControl(MissionControlDB(fake_network()))
+        fut = asyncio.run_coroutine_threadsafe(self.mission_control.load_data(), asyncio_loop)
+        for i in range(500):
+            if fut.done():
+                break
+            # futures set in the sql thread do not wake up the event loop
+            asyncio_loop.call_soon_threadsafe(lambda: None)
+            time.sleep(0.01)
+        fut.result(timeout=0)
+        return self.mission_control
+
+    def _close(self, mission_control: MissionControl):
+        db = mission_control.db
+        # requests still queued when the event loop stops are not processed
+        fut = asyncio.Future()
+        db.db_requests.put((fut, lambda self: None, (), {}))
+        self._wait(fut)
+        db.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+        db.sql_thread.join(timeout=5)
+        self.mission_control = None
+
+    def _wait(self, fut):
+        # sql methods run in the sql thread, in order
+        for i in range(500):
+            if fut.done():
+                return fut.result()
+            time.sleep(0.01)
+        self.fail('timed out')
+
+    def test_load_error_is_logged(self):
+        mc = self._open()
+        fut = asyncio.Future()
+        fut.set_exception(Exception('corrupted'))
+        with mock.patch.object(mc.db, 'load_data', return_value=fut), \
+                self.assertLogs(mc.logger, level='ERROR') as logs:
+            with self.assertRaises(Exception):
+                asyncio.run_coroutine_threadsafe(mc.load_data(), mc.db.asyncio_loop).result(timeout=5)
+        self.assertIn('corrupted', logs.output[0])
+
+    def test_persisted_across_restarts(self):
+        now = int(time.time())
+        mc = self._open()
+        self.assertTrue(os.path.exists(mc.db.path))
+        mc.report_success(scid(1), node_id(1), 1000, now=now)
+        mc.report_liquidity_failure(scid(1), node_id(1), 5000, now=now)
+        mc.report_failure(scid(2), now=now)
+        # forgotten
+        mc.report_liquidity_failure(scid(3), node_id(3), 5000, now=now - MAX_AGE - 1)
+        self._close(mc)
+
+        mc = self._open()
+        self.assertEqual((1000, 5000), mc.get_liquidity_bounds(scid(1), node_id(1), now=now))
+        self.assertEqual(now, mc.get_failure_time(scid(2)))
+        self.assertEqual([(scid(1), node_id(1))], mc.get_liquidity_hint_keys())
+        mc.clear()
+        self._close(mc)
+
+        mc = self._open()
+        self.assertEqual([], mc.get_liquidity_hint_keys())
+        self.assertEqual({}, mc.get_failures())
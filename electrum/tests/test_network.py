@@ -1,13 +1,20 @@
 import asyncio
+import contextlib
+import json
 import tempfile
+import threading
 import unittest
 
+import aiorpcx
+from aiorpcx import RPCSession, RPCError, JSONRPC
+
 from electrum import constants
 from electrum.simple_config import SimpleConfig
 from electrum import blockchain
-from electrum.interface import Interface, ServerAddr
-from electrum.crypto import sha256
-from electrum.util import bh2u
+from electrum import interface
+from electrum.interface import Interface, ServerAddr, NotificationSession, _RSClient
+from electrum.crypto import sha256, sha256d
+from electrum.util import bh2u, bfh
 
 from . import ElectrumTestCase
 
@@ -18,6 +25,11 @@ class MockTaskGroup:
 class MockNetwork:
     taskgroup = MockTaskGroup()
     asyncio_loop = asyncio.get_event_loop()
+    debug = False
+
+    def __init__(self):
+        self.interfaces = {}
+        self.interfaces_lock = threading.Lock()
 
 class MockInterface(Interface):
     def __init__(self, config):
@@ -117,6 +129,286 @@ class TestNetwork(ElectrumTestCase):
         self.assertEqual(self.interface.q.qsize(), 0)
 
 
+
+# genesis of regtest
+REGTEST_GENESIS_HEADER = bfh("0100000000000000000000000000000000000000000000000000000000000000000000003ba3edfd7a7b12b27ac72c3e67768f617fc81bc3888a51323a9fb8aa4b1e5e4adae5494dffff7f2002000000")
+
+
+def make_regtest_headers(num: int, *, fork_height: int = None, headers: list = None) -> list:
+    """Headers following regtest genesis, linked but not mined.
+    With headers, the returned chain shares headers[:fork_height].
+    """
+    if headers is None:
+        headers = [REGTEST_GENESIS_HEADER]
+    headers = headers[:fork_height]
+    while len(headers) < num:
+        height = len(headers)
+        merkle_root = sha256((b'fork' if fork_height else b'') + height.to_bytes(4, 'little'))
+        headers.append(bytes(4) + sha256d(headers[-1]) + merkle_root
+                       + (1600000000 + height).to_bytes(4, 'little') + bytes.fromhex('ffff7f20') + bytes(4))
+    return headers
+
+
+class StandinServerSession(RPCSession):
+
+    def __init__(self, *args, server: 'StandinServer', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.server = server
+
+    async def handle_request(self, request):
+        if request.method == 'server.version':
+            return ['standin', '1.4']
+        if request.method == 'blockchain.block.headers':
+            return await self.server.get_headers(*request.args)
+        if request.method == 'blockchain.block.header':
+            height, = request.args
+            self.server.header_requests.append(height)
+            return self.server.headers[height].hex()
+        if request.method == 'blockchain.transaction.get':
+            tx_hash, = request.args
+            await asyncio.sleep(self.server.latency)
+            if tx_hash not in self.server.transactions:
+                raise RPCError(2, 'No such mempool or blockchain transaction.')
+            return self.server.transactions[tx_hash]
+        raise RPCError(JSONRPC.METHOD_NOT_FOUND, f'unknown method {request.method}')
+
+    async def _process_messages(self, recv_message):
+        async def recv_and_record_message():
+            while True:
+                message = await recv_message()
+                payload = json.loads(message)
+                if isinstance(payload, list):
+                    self.server.batch_sizes.append(len(payload))
+                    if self.server.ignore_batches:
+                        continue
+                return message
+        await super()._process_messages(recv_and_record_message)
+
+
+class StandinServer:
+    """Local stand-in for an Electrum server, serving the given headers
+    after some latency.
+    """
+
+    def __init__(self, headers: list, *, latency: float = 0.0, transactions: dict = None,
+                 ignore_batches: bool = False):
+        self.headers = headers
+        self.latency = latency
+        self.transactions = transactions or {}
+        self.ignore_batches = ignore_batches  # like a server that does not support batch requests
+        self.batch_sizes = []
+        self.requests = []
+        self.header_requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._server = None
+
+    async def get_headers(self, start_height: int, count: int) -> dict:
+        self.requests.append(start_height)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        headers = self.headers[start_height:start_height + count]
+        return {'hex': b''.join(headers).hex(), 'count': len(headers), 'max': 2016}
+
+    async def start(self) -> int:
+        self._server = await aiorpcx.serve_rs(lambda transport: StandinServerSession(transport, server=self),
+                                              '127.0.0.1', 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+
+class ChunkDownloadInterface(Interface):
+    def __init__(self, network, config, server_addr):
+        super().__init__(network=network, server=server_addr, proxy=None)
+        self.blockchain = blockchain.Blockchain(config=config, forkpoint=0, parent=None,
+                                                forkpoint_hash=constants.net.GENESIS, prev_hash=None)
+
+
+class TestHeaderChunkDownload(ElectrumTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        constants.set_regtest()
+        cls.headers = make_regtest_headers(4 * 2016 + 100)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        constants.set_mainnet()
+
+    def setUp(self):
+        super().setUp()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        blockchain.blockchains = {}
+        self.network = MockNetwork()
+        self.network.config = self.config
+        self.loop = asyncio.get_event_loop()
+
+    async def _sync(self, servers, *, height=0, tip=None):
+        """Syncs from the first server, with the others as helpers."""
+        if tip is None:
+            tip = len(self.headers) - 1
+        interfaces = []
+        async with contextlib.AsyncExitStack() as stack:
+            for server in servers:
+                port = await server.start()
+                stack.push_async_callback(server.stop)
+                addr = ServerAddr('127.0.0.1', port, protocol='t')
+                iface = ChunkDownloadInterface(self.network, self.config, addr)
+                iface.session = await stack.enter_async_context(
+                    _RSClient(session_factory=NotificationSession, host='127.0.0.1', port=port))
+                iface.session.interface = iface
+                iface.tip = len(server.headers) - 1
+                interfaces.append(iface)
+                self.network.interfaces[addr] = iface
+            iface = interfaces[0]
+            open(iface.blockchain.path(), 'w+').close()
+            result = await iface.request_chunks(height, tip)
+            return iface, result
+
+    def test_pipelined(self):
+        server = StandinServer(self.headers, latency=0.05)
+        iface, result = self.loop.run_until_complete(self._sync([server]))
+        self.assertEqual((True, len(self.headers)), result)
+        self.assertEqual(len(self.headers) - 1, iface.blockchain.height())
+        self.assertEqual(sha256d(self.headers[-1])[::-1].hex(), iface.blockchain.get_hash(len(self.headers) - 1))
+        self.assertEqual([0, 2016, 4032, 6048, 8064], server.requests)
+        self.assertEqual(interface.HEADER_CHUNKS_IN_FLIGHT, server.max_in_flight)
+        self.assertEqual(set(), iface._requested_chunks)
+
+    def test_several_servers(self):
+        servers = [StandinServer(self.headers, latency=0.01) for i in range(3)]
+        iface, result = self.loop.run_until_complete(self._sync(servers))
+        self.assertEqual((True, len(self.headers)), result)
+        self.assertEqual(len(self.headers) - 1, iface.blockchain.height())
+        self.assertEqual([[0, 6048], [2016, 8064], [4032]], [server.requests for server in servers])
+
+    def test_helper_on_other_chain(self):
+        other_headers = make_regtest_headers(len(self.headers), fork_height=5000, headers=self.headers)
+        servers = [StandinServer(self.headers), StandinServer(other_headers)]
+        iface, result = self.loop.run_until_complete(self._sync(servers))
+        self.assertEqual((True, len(self.headers)), result)
+        self.assertEqual(sha256d(self.headers[-1])[::-1].hex(), iface.blockchain.get_hash(len(self.headers) - 1))
+        # our server was asked for the last header of chunks 1 and 3, and
+        # chunk 3, which is on the other chain, was requested again from it
+        self.assertEqual([0, 4032, 6048, 8064], sorted(servers[0].requests))
+        self.assertEqual([2016 + 2015, 6048 + 2015], servers[0].header_requests)
+        self.assertEqual([2016, 6048], servers[1].requests)
+
+    def test_reorg(self):
+        # our server follows another chain after some point (e.g. there was a reorg)
+        headers = self.headers[:2 * 2016] + make_regtest_headers(len(self.headers), fork_height=4500,
+                                                                 headers=self.headers)[2 * 2016:]
+        headers[2 * 2016] = bytes(4) + bytes(32) + headers[2 * 2016][36:]  # does not link to chunk 1
+        server = StandinServer(headers, latency=0.01)
+        iface, result = self.loop.run_until_complete(self._sync([server]))
+        # we stopped at the chunk that does not connect, chunks requested after it are dropped
+        self.assertEqual((True, 2 * 2016), result)
+        self.assertEqual(2 * 2016 - 1, iface.blockchain.height())
+        self.assertEqual(set(), iface._requested_chunks)
+
+
+class TestRequestBatching(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.get_event_loop()
+        self.transactions = {bh2u(sha256(str(i))): bh2u(sha256(str(-i))) for i in range(30)}
+
+    async def _get_transactions(self, server, tx_hashes, *, batch_window=0.01):
+        port = await server.start()
+        try:
+            async with _RSClient(session_factory=NotificationSession, host='127.0.0.1', port=port) as session:
+                session.set_default_timeout(0.5)
+                session.batch_window = batch_window
+                results = await asyncio.gather(
+                    *[session.send_request('blockchain.transaction.get', [tx_hash]) for tx_hash in tx_hashes],
+                    return_exceptions=True)
+                return session, results
+        finally:
+            await server.stop()
+
+    def test_batched(self):
+        server = StandinServer([], latency=0.01, transactions=self.transactions)
+        tx_hashes = list(self.transactions) + ['00' * 32]
+        session, results = self.loop.run_until_complete(self._get_transactions(server, tx_hashes))
+        self.assertEqual([31], server.batch_sizes)
+        self.assertEqual(list(self.transactions.values()), results[:30])
+        # an error only fails its own request
+        self.assertIsInstance(results[30], RPCError)
+        self.assertTrue(session.batches_supported)
+
+    def test_max_batch_size(self):
+        transactions = {bh2u(sha256(str(i))): bh2u(sha256(str(-i))) for i in range(interface.MAX_BATCH_SIZE + 10)}
+        server = StandinServer([], transactions=transactions)
+        session, results = self.loop.run_until_complete(self._get_transactions(server, list(transactions)))
+        self.assertEqual([interface.MAX_BATCH_SIZE, 10], server.batch_sizes)
+        self.assertEqual(list(transactions.values()), results)
+
+    def test_batching_disabled(self):
+        server = StandinServer([], transactions=self.transactions)
+        session, results = self.loop.run_until_complete(
+            self._get_transactions(server, list(self.transactions), batch_window=0))
+        self.assertEqual([], server.batch_sizes)
+        self.assertEqual(list(self.transactions.values()), results)
+
+    def test_batches_not_supported(self):
+        server = StandinServer([], transactions=self.transactions, ignore_batches=True)
+        session, results = self.loop.run_until_complete(self._get_transactions(server, list(self.transactions)))
+        # the batch timed out, the requests were sent again one by one
+        self.assertEqual([30], server.batch_sizes)
+        self.assertEqual(list(self.transactions.values()), results)
+        self.assertFalse(session.batches_supported)
+
+    def test_batching_enabled_again(self):
+        server = StandinServer([], transactions=self.transactions, ignore_batches=True)
+
+        async def get_transactions(session):
+            return await asyncio.gather(
+                *[session.send_request('blockchain.transaction.get', [tx_hash]) for tx_hash in self.transactions])
+
+        async def run():
+            port = await server.start()
+            try:
+                async with _RSClient(session_factory=NotificationSession, host='127.0.0.1', port=port) as session:
+                    session.set_default_timeout(0.5)
+                    session.batch_window = 0.01
+                    for i in range(interface.MAX_BATCH_FAILURES):
+                        self.assertTrue(session.batches_supported)
+                        self.assertEqual(list(self.transactions.values()), await get_transactions(session))
+                        self.assertFalse(session.batches_supported)
+                        # the delay is over
+                        session._batches_disabled_until = 0
+                    # too many failures in a row
+                    self.assertFalse(session.batches_supported)
+                    session._batch_failures = 0
+                    server.ignore_batches = False
+                    self.assertEqual(list(self.transactions.values()), await get_transactions(session))
+                    self.assertTrue(session.batches_supported)
+            finally:
+                await server.stop()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual([30] * (interface.MAX_BATCH_FAILURES + 1), server.batch_sizes)
+
+    def test_get_batch_window(self):
+        config = SimpleConfig({'electrum_path': self.electrum_path})
+        iface = MockInterface(config)
+        self.assertEqual(interface.DEFAULT_BATCH_WINDOW, iface.get_batch_window())
+        config.set_key('rpc_batch_window', 0.05)
+        self.assertEqual(0.05, iface.get_batch_window())
+        config.set_key('rpc_batch_window_per_server', {str(iface.server): 0})
+        self.assertEqual(0, iface.get_batch_window())
+
+
 if __name__=="__main__":
     constants.set_regtest()
     unittest.main()
@@ -0,0 +1,150 @@
+import asyncio
+from unittest import mock
+
+from electrum import synchronizer
+from electrum.bitcoin import address_to_scripthash, hash160_to_p2pkh
+from electrum.crypto import sha256
+from electrum.synchronizer import Synchronizer, history_status
+from electrum.transaction import Transaction
+
+from . import ElectrumTestCase
+
+
+RAW_TX = '01000000012a5c9a94fcde98f5581cd00162c60a13936ceb75389ea65bf38633b424eb4031000000006c493046022100a82bbc57a0136751e5433f41cf000b3f1a99c6744775e76ec764fb78c54ee100022100f9e80b7de89de861dc6fb0c1429d5da72c2b6b2ee2406bc9bfb1beedd729d985012102e61d176da16edd1d258a200ad9759ef63adf8e14cd97f53227bae35cdb84d2f6ffffffff0140420f00000000001976a914230ac37834073a42146f11ef8414ae929feaafc388ac00000000'
+TXID = Transaction(RAW_TX).txid()
+
+
+class MockSession:
+
+    def __init__(self):
+        self.subscriptions = {}  # scripthash -> queue
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def subscribe(self, method, params, queue):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+        finally:
+            self.in_flight -= 1
+        h, = params
+        self.subscriptions[h] = queue
+        await queue.put([h, None])
+
+    def unsubscribe(self, queue):
+        pass
+
+
+class MockInterface:
+
+    def __init__(self):
+        self.session = MockSession()
+        self.histories = {}  # scripthash -> history
+        self.num_tx_requests = 0
+
+    async def get_history_for_scripthash(self, h):
+        return [{'tx_hash': tx_hash, 'height': height} for tx_hash, height in self.histories[h]]
+
+    async def get_transaction(self, tx_hash):
+        self.num_tx_requests += 1
+        assert tx_hash == TXID
+        return RAW_TX
+
+
+class MockDB:
+
+    def __init__(self):
+        self.histories = {}
+        self.transactions = {}
+
+    def get_history(self):
+        return list(self.histories)
+
+    def get_addr_history(self, addr):
+        return self.histories.get(addr, [])
+
+    def get_transaction(self, tx_hash):
+        return self.transactions.get(tx_hash)
+
+
+class MockWallet:
+
+    def __init__(self, network, addresses):
+        self.network = network
+        self.db = MockDB()
+        self.addresses = addresses
+        self.up_to_date = False
+        self.num_synchronize_calls = 0
+
+    def diagnostic_name(self):
+        return 'mock_wallet'
+
+    def get_addresses(self):
+        return list(self.addresses)
+
+    def synchronize(self):
+        self.num_synchronize_calls += 1
+
+    def is_up_to_date(self):
+        return self.up_to_date
+
+    def set_up_to_date(self, up_to_date):
+        self.up_to_date = up_to_date
+
+    def receive_history_callback(self, addr, hist, tx_fees):
+        self.db.histories[addr] = hist
+
+    def receive_tx_callback(self, tx_hash, tx, tx_height):
+        self.db.transactions[tx_hash] = tx
+
+
+class MockNetwork:
+
+    def __init__(self):
+        self.asyncio_loop = asyncio.get_event_loop()
+        self.interface = None
+
+
+class TestSynchronizer(ElectrumTestCase):
+
+    async def _wait_until(self, condition):
+        for i in range(1000):
+            if condition():
+                return
+            await asyncio.sleep(0.005)
+        self.fail('timed out')
+
+    @mock.patch.object(synchronizer, 'NUM_SUBSCRIPTION_WORKERS', 7)
+    def test_event_driven(self):
+        addresses = [hash160_to_p2pkh(sha256(str(i))[:20]) for i in range(100)]
+        network = MockNetwork()
+        interface = MockInterface()
+        wallet = MockWallet(network, addresses)
+
+        async def run():
+            sync = Synchronizer(wallet)
+            sync.interface = interface
+            task = asyncio.ensure_future(sync._start_tasks())
+            try:
+                await self._wait_until(wallet.is_up_to_date)
+                self.assertEqual(100, len(interface.session.subscriptions))
+                self.assertEqual(7, interface.session.max_in_flight)
+                # nothing happens while there is nothing to do
+                num_synchronize_calls = wallet.num_synchronize_calls
+                await asyncio.sleep(0.5)
+                self.assertEqual(num_synchronize_calls, wallet.num_synchronize_calls)
+                # a status notification
+                h = address_to_scripthash(addresses[42])
+                interface.histories[h] = [(TXID, 100)]
+                await interface.session.subscriptions[h].put([h, history_status([(TXID, 100)])])
+                await self._wait_until(lambda: wallet.num_synchronize_calls > num_synchronize_calls)
+                self.assertEqual([(TXID, 100)], wallet.db.get_addr_history(addresses[42]))
+                self.assertIn(TXID, wallet.db.transactions)
+                self.assertEqual(1, interface.num_tx_requests)
+                self.assertTrue(sync.is_up_to_date())
+            finally:
+                await sync.stop()
+                task.cancel()
+
+        asyncio.get_event_loop().run_until_complete(run())
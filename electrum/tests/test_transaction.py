@@ -1,7 +1,9 @@
 from typing import NamedTuple, Union
 
-from electrum import transaction, bitcoin
-from electrum.transaction import convert_raw_tx_to_hex, tx_from_any, Transaction, PartialTransaction
+from electrum import transaction, bitcoin, ecc
+from electrum.transaction import (convert_raw_tx_to_hex, tx_from_any, Transaction, PartialTransaction,
+                                  PartialTxInput, PartialTxOutput, TxOutpoint, SighashCache)
+from electrum.crypto import sha256d
 from electrum.util import bh2u, bfh
 
 from . import ElectrumTestCase
@@ -70,6 +72,21 @@ class TestBCDataStream(ElectrumTestCase):
         self.assertEqual(b'\x01\x00', s.read_bytes(2))
         self.assertFalse(s.can_read_more())
 
+    def test_skip_and_get_bytes(self):
+        buf = bytearray(b'foobar')
+        s = transaction.BCDataStream()
+        s.write(buf)
+        buf[0:3] = b'baz'  # the stream keeps its own copy of mutable buffers
+        s.skip_bytes(3)
+        with self.assertRaises(transaction.SerializationError):
+            s.skip_bytes(4)
+        self.assertEqual(b'ba', s.read_bytes(2))
+        self.assertEqual(b'fooba', s.get_bytes(0, 5))
+        s.write(b'qux')  # grows the buffer while a view of it exists
+        s.skip_bytes(1)
+        self.assertEqual(b'qux', s.read_bytes(3))
+        self.assertFalse(s.can_read_more())
+
 
 class TestTransaction(ElectrumTestCase):
 
@@ -81,6 +98,34 @@ class TestTransaction(ElectrumTestCase):
         tx.update_signatures(signed_blob_signatures)
         self.assertEqual(tx.serialize(), signed_blob)
 
+    def test_sighash_cache(self):
+        pubkeys = [ecc.ECPrivkey(bytes([i + 1]) * 32).get_public_key_bytes(compressed=True) for i in range(4)]
+        inputs = []
+        for i, (pubkey, script_type) in enumerate(zip(pubkeys, ['p2pkh', 'p2wpkh', 'p2pkh', 'p2wpkh-p2sh'])):
+            txin = PartialTxInput(prevout=TxOutpoint(txid=bytes([i]) * 32, out_idx=i), nsequence=0xfffffffd)
+            txin.script_type = script_type
+            txin.pubkeys = [pubkey]
+            txin.num_sig = 1
+            txin._trusted_value_sats = 100_000 * (i + 1)
+            inputs.append(txin)
+        outputs = [PartialTxOutput.from_address_and_value('14gcRovpkCoGkCNBivQBvw7eso7eiNAbxG', 150_000),
+                   PartialTxOutput.from_address_and_value('bc1q3g5tmkmlvxryhh843v4dz026avatc0zzr6h3af', 50_000)]
+        tx = PartialTransaction.from_io(inputs, outputs, locktime=600_000)
+        cache = SighashCache(tx)
+        for i, txin in enumerate(tx.inputs()):
+            if tx.is_segwit_input(txin):
+                continue
+            # legacy preimage: all inputs, only the signed one with a script
+            expected = (bitcoin.int_to_hex(tx.version, 4) + bitcoin.var_int(len(inputs))
+                        + ''.join(tx.serialize_input(x, tx.get_preimage_script(x) if k == i else '')
+                                  for k, x in enumerate(tx.inputs()))
+                        + bitcoin.var_int(len(outputs)) + ''.join(o.serialize_to_network().hex() for o in tx.outputs())
+                        + bitcoin.int_to_hex(tx.locktime, 4) + '01000000')
+            self.assertEqual(expected, tx.serialize_preimage(i))
+        for i in reversed(range(len(inputs))):  # out of order, to exercise the midstates
+            self.assertEqual(sha256d(bfh(tx.serialize_preimage(i))), cache.sighash(i))
+            self.assertEqual(sha256d(cache.preimage(i)), cache.sighash(i))
+
     def test_tx_setting_locktime_invalidates_ser_cache(self):
         tx = tx_from_any("cHNidP8BAJICAAAAAdAEtnw/IOVkr4oexG2xYnm+Vevsn3J7nbZsGpiBWS8MAQAAAAD9////A2Q5AwAAAAAAF6kUF6jKG6BuNVhq1RilflIDCitepw6H/NEEAAAAAAAXqRQx9SsFxDAaaOWbLB2ely1ZoZ61DYeIbQoAAAAAABYAFItCjFDsC28Z1R3tFaoi//pcInvnI3AZAAABAR+weRIAAAAAABYAFEK0I6qyqoA/lXCEgysQNZvqokaQIgYC9tgRn6/8hlDLEvEg3lKD1HmNim0gGRYwt4x3aJURIq4MqAq7DwEAAAAUAAAAAAAAIgICXYdVjyDIufLQ3yeDA4M8016luFER2SWaGPk6UF8CbuQMqAq7DwEAAAAXAAAAAA==")
         self.assertEqual("2774c819a05e44861a0555401d2741e6c03079cc4d892c69b910c0f52f407859", tx.txid())
@@ -137,6 +182,13 @@ class TestTransaction(ElectrumTestCase):
         self.assertEqual(tx.estimated_weight(), 561)
         self.assertEqual(tx.estimated_size(), 141)
 
+    def test_tx_signed_segwit_roundtrip(self):
+        tx = transaction.Transaction(signed_segwit_blob)
+        self.assertEqual([bfh('30440220789c7d47f876638c58d98733c30ae9821c8fa82b470285dcdf6db5994210bf9f02204163418bbc44af701212ad42d884cc613f3d3d831d2d0cc886f767cca6e0235e01'),
+                          bfh('03083a6dc250816d771faa60737bfe78b23ad619f6b458e0a1f1688e3a0605e79c')],
+                         tx.inputs()[0].witness_elements())
+        self.assertEqual(signed_segwit_blob, tx.serialize_to_network())
+
     def test_version_field(self):
         tx = transaction.Transaction(v2_blob)
         self.assertEqual(tx.txid(), "b97f9180173ab141b61b9f944d841e60feec691d6daab4d4d932b24dd36606fe")
@@ -1,8 +1,11 @@
+import asyncio
 from decimal import Decimal
 
+from aiohttp import web
+
 from electrum.util import (format_satoshis, format_fee_satoshis, parse_URI,
                            is_hash256_str, chunks, is_ip_address, list_enabled_bits,
-                           format_satoshis_plain, is_private_netaddress)
+                           format_satoshis_plain, is_private_netaddress, HttpSessionPool)
 
 from . import ElectrumTestCase
 
@@ -161,3 +164,75 @@ class TestUtil(ElectrumTestCase):
         self.assertFalse(is_private_netaddress("[2a00:1450:400e:80d::200e]"))
         self.assertFalse(is_private_netaddress("8.8.8.8"))
         self.assertFalse(is_private_netaddress("example.com"))
+
+
+class TestHttpSessionPool(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.get_event_loop()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _handle(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        return web.Response(text='ok')
+
+    async def _run(self, pool, coro):
+        app = web.Application()
+        app.router.add_get('/', self._handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            return await coro(f'http://127.0.0.1:{port}/')
+        finally:
+            await pool.close()
+            await runner.cleanup()
+
+    def test_connections_are_reused(self):
+        pool = HttpSessionPool()
+
+        async def requests(url):
+            for i in range(5):
+                async with pool.get_session(None).get(url) as resp:
+                    self.assertEqual('ok', await resp.text())
+        self.loop.run_until_complete(self._run(pool, requests))
+        self.assertEqual({'new_connections': 1, 'reused_connections': 4, 'reuse_ratio': 0.8},
+                         pool.get_stats())
+
+    def test_limit_per_host(self):
+        pool = HttpSessionPool(limit_per_host=3)
+
+        async def requests(url):
+            async def request():
+                async with pool.get_session(None).get(url) as resp:
+                    return await resp.text()
+            return await asyncio.gather(*[request() for i in range(12)])
+        results = self.loop.run_until_complete(self._run(pool, requests))
+        self.assertEqual(['ok'] * 12, results)
+        self.assertEqual(3, self.max_in_flight)
+        self.assertEqual(3, pool.num_new_connections)
+
+    def test_close_other_sessions(self):
+        pool = HttpSessionPool()
+        proxy = {'mode': 'socks5', 'host': '127.0.0.1', 'port': '9050'}
+
+        async def run():
+            direct = pool.get_session(None)
+            proxied = pool.get_session(dict(proxy))
+            self.assertIs(proxied, pool.get_session(dict(proxy)))
+            await pool.close_other_sessions(proxy)
+            self.assertTrue(direct.closed)
+            self.assertFalse(proxied.closed)
+            self.assertIsNot(direct, pool.get_session(None))
+            await pool.close()
+            self.assertTrue(proxied.closed)
+        self.loop.run_until_complete(run())
@@ -0,0 +1,138 @@
+import asyncio
+from collections import Counter
+
+from electrum import verifier
+from electrum.bitcoin import hash_decode, hash_encode
+from electrum.crypto import sha256, sha256d
+from electrum.simple_config import SimpleConfig
+from electrum.util import bh2u
+from electrum.verifier import SPV
+
+from . import ElectrumTestCase
+
+
+def txid(i: int) -> str:
+    return bh2u(sha256(str(i)))
+
+
+class MockBlockchain:
+
+    def __init__(self, headers):
+        self.headers = headers
+        self.read_header_calls = Counter()
+
+    def height(self):
+        return max(self.headers)
+
+    def read_header(self, height):
+        self.read_header_calls[height] += 1
+        return self.headers.get(height)
+
+    def check_hash(self, height, header_hash):
+        return height in self.headers and verifier.hash_header(self.headers[height]) == header_hash
+
+    def get_height_of_last_common_block_with_chain(self, other_chain):
+        return self.height()
+
+
+class MockNetwork:
+
+    def __init__(self, config, blocks):
+        self.config = config
+        self.asyncio_loop = asyncio.get_event_loop()
+        self.interface = None
+        self.bhi_lock = asyncio.Lock()
+        self.blocks = blocks  # height -> txids
+        headers = {}
+        for height, txids in blocks.items():
+            merkle_root = hash_encode(sha256d(hash_decode(txids[0]) + hash_decode(txids[1])))
+            headers[height] = {'version': 1, 'prev_block_hash': '00' * 32, 'merkle_root': merkle_root,
+                               'timestamp': height, 'bits': 0x207fffff, 'nonce': 0, 'block_height': height}
+        self._blockchain = MockBlockchain(headers)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.num_requests = 0
+
+    def blockchain(self):
+        return self._blockchain
+
+    async def get_merkle_for_transaction(self, tx_hash, tx_height):
+        self.num_requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+        finally:
+            self.in_flight -= 1
+        txids = self.blocks[tx_height]
+        pos = txids.index(tx_hash)
+        return {'block_height': tx_height, 'pos': pos, 'merkle': [txids[1 - pos]]}
+
+
+class MockWallet:
+
+    def __init__(self):
+        self.unverified_tx = {}
+        self.verified_tx = {}
+
+    def diagnostic_name(self):
+        return 'mock_wallet'
+
+    def get_unverified_txs(self):
+        return dict(self.unverified_tx)
+
+    def add_verified_tx(self, tx_hash, info):
+        self.unverified_tx.pop(tx_hash, None)
+        self.verified_tx[tx_hash] = info
+
+
+class TestSPV(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        self.loop = asyncio.get_event_loop()
+
+    async def _wait_until(self, condition):
+        for i in range(1000):
+            if condition():
+                return
+            await asyncio.sleep(0.005)
+        self.fail('timed out')
+
+    def test_batched_verification(self):
+        blocks = {height: [txid(2 * height), txid(2 * height + 1)] for height in range(100, 150)}
+        blocks[150] = [txid(1), txid(0)]
+        network = MockNetwork(self.config, blocks)
+        wallet = MockWallet()
+        for height in range(100, 150):
+            wallet.unverified_tx[blocks[height][0]] = height
+            wallet.unverified_tx[blocks[height][1]] = height
+        # not mined yet, as far as the wallet knows
+        wallet.unverified_tx[txid(0)] = 0
+
+        async def run():
+            spv = SPV(network, wallet)
+            task = asyncio.ensure_future(spv._start_tasks())
+            try:
+                await self._wait_until(lambda: len(wallet.verified_tx) == 100)
+                self.assertTrue(spv.is_up_to_date())
+                self.assertEqual(100, network.num_requests)
+                self.assertEqual(verifier.MAX_CONCURRENT_MERKLE_REQUESTS, network.max_in_flight)
+                # when it gets mined, the synchronizer wakes the verifier up
+                wallet.unverified_tx[txid(0)] = 150
+                spv.wake_up()
+                await self._wait_until(lambda: len(wallet.verified_tx) == 101)
+            finally:
+                await spv.stop()
+                task.cancel()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(101, network.num_requests)
+        self.assertEqual({}, wallet.unverified_tx)
+        self.assertEqual(150, wallet.verified_tx[txid(0)].height)
+        self.assertEqual(1, wallet.verified_tx[txid(0)].txpos)
+        self.assertEqual(verifier.hash_header(network.blockchain().headers[150]),
+                         wallet.verified_tx[txid(0)].header_hash)
+        # the header of a block is read once for all its transactions
+        self.assertEqual({height: 1 for height in range(100, 151)}, dict(network.blockchain().read_header_calls))
@@ -5,15 +5,17 @@ import os
 import json
 from decimal import Decimal
 import time
+import threading
 
 from io import StringIO
-from electrum.storage import WalletStorage
+from electrum.storage import WalletStorage, StorageEncryptionVersion
 from electrum.wallet_db import FINAL_SEED_VERSION
 from electrum.wallet import (Abstract_Wallet, Standard_Wallet, create_new_wallet,
-                             restore_wallet_from_text, Imported_Wallet)
+                             restore_wallet_from_text, Imported_Wallet, Wallet)
 from electrum.exchange_rate import ExchangeBase, FxThread
-from electrum.util import TxMinedInfo
+from electrum.util import TxMinedInfo, LRUCache
 from electrum.bitcoin import COIN
+from electrum.transaction import tx_from_any, TxOutpoint
 from electrum.wallet_db import WalletDB
 from electrum.simple_config import SimpleConfig
 
@@ -83,6 +85,266 @@ class TestWalletStorage(WalletTestCase):
         for key, value in some_dict.items():
             self.assertEqual(d[key], value)
 
+    def _write_db_with_journal(self, password=None):
+        storage = WalletStorage(self.wallet_path)
+        if password:
+            storage.set_password(password, enc_version=StorageEncryptionVersion.USER_PASSWORD)
+        db = WalletDB('', manual_upgrades=False)
+        db.put('a', 'b')
+        db.write(storage)
+        size = os.path.getsize(self.wallet_path)
+        db.put('a', 'c')
+        db.get_dict('labels')['x'] = 'label'
+        db.write(storage)
+        db.get_dict('labels').pop('x')
+        db.get_dict('addresses')['receiving'] = []
+        db.get_dict('addresses')['receiving'].append('addr1')
+        db.write(storage)
+        return db, size
+
+    def _read_db(self, password=None):
+        storage = WalletStorage(self.wallet_path)
+        if password:
+            storage.decrypt(password)
+        return WalletDB(storage.read(), manual_upgrades=False)
+
+    def test_write_appends_journal_records(self):
+        db, size = self._write_db_with_journal()
+        with open(self.wallet_path, "r") as f:
+            contents = f.read()
+        self.assertEqual('b', json.loads(contents[:size])['a'])
+        self.assertEqual(2, contents[size:].count('\n['))
+        db2 = self._read_db()
+        self.assertEqual(db.dump(), db2.dump())
+        self.assertEqual('c', db2.get('a'))
+        self.assertEqual({}, db2.get('labels'))
+        self.assertEqual(['addr1'], db2.get('addresses')['receiving'])
+
+    def test_write_appends_encrypted_journal_records(self):
+        db, size = self._write_db_with_journal(password='secret')
+        with open(self.wallet_path, "r") as f:
+            self.assertEqual(2, f.read().count('\n'))
+        db2 = self._read_db(password='secret')
+        self.assertEqual(db.dump(), db2.dump())
+
+    def test_truncated_journal_record_is_dropped(self):
+        db, size = self._write_db_with_journal()
+        with open(self.wallet_path, "r+") as f:
+            f.truncate(os.path.getsize(self.wallet_path) - 3)
+        # the last record is lost, the ones before it are kept
+        db2 = self._read_db()
+        self.assertEqual('c', db2.get('a'))
+        self.assertEqual({'x': 'label'}, db2.get('labels'))
+        self.assertIsNone(db2.get('addresses'))
+
+    def test_truncated_encrypted_journal_record_is_dropped(self):
+        db, size = self._write_db_with_journal(password='secret')
+        with open(self.wallet_path, "r+") as f:
+            f.truncate(os.path.getsize(self.wallet_path) - 3)
+        db2 = self._read_db(password='secret')
+        self.assertEqual('c', db2.get('a'))
+        self.assertIsNone(db2.get('addresses'))
+        # the next write must not append after the truncated record
+        storage = WalletStorage(self.wallet_path)
+        storage.decrypt('secret')
+        db2.put('a', 'd')
+        db2.write(storage)
+        db3 = self._read_db(password='secret')
+        self.assertEqual('d', db3.get('a'))
+        self.assertEqual({'x': 'label'}, db3.get('labels'))
+
+    def test_prevouts_by_scripthash_are_journaled(self):
+        db, size = self._write_db_with_journal()
+        storage = WalletStorage(self.wallet_path)
+        db._load_transactions()
+        for n in range(3):
+            db.add_prevout_by_scripthash('cc' * 32, prevout=TxOutpoint.from_str('aa' * 32 + f':{n}'), value=n)
+            db.write(storage)
+        db.remove_prevout_by_scripthash('cc' * 32, prevout=TxOutpoint.from_str('aa' * 32 + ':1'), value=1)
+        db.write(storage)
+        with open(self.wallet_path, "r") as f:
+            self.assertEqual(6, f.read()[size:].count('\n['))
+        self.assertEqual({(TxOutpoint.from_str('aa' * 32 + ':0'), 0), (TxOutpoint.from_str('aa' * 32 + ':2'), 2)},
+                         self._read_db().get_prevouts_by_scripthash('cc' * 32))
+
+    def test_journal_consolidation(self):
+        db, size = self._write_db_with_journal()
+        storage = WalletStorage(self.wallet_path)
+        storage.needs_consolidation = lambda: True
+        db.put('a', 'd')
+        db.write(storage)
+        db.wait_for_consolidation()
+        with open(self.wallet_path, "r") as f:
+            self.assertEqual(db.dump(), f.read())
+        self.assertEqual('d', self._read_db().get('a'))
+
+    def test_reads_do_not_wait_for_writer(self):
+        db = WalletDB('', manual_upgrades=False)
+        db.add_txo_addr('txid', 'addr', 0, 1000, False)
+        results = []
+        def reader():
+            results.append(db.get_txo_addresses('txid'))
+            results.append(db.get_txo_addr('txid', 'addr'))
+            results.append('txid' in db.txo)
+        with db.lock:  # held by this thread, as a writer would
+            t = threading.Thread(target=reader)
+            t.start()
+            t.join(5)
+            self.assertFalse(t.is_alive())
+        self.assertEqual([['addr'], [(0, 1000, False)], True], results)
+
+
+class TestWalletSqlDB(WalletTestCase):
+
+    raw_tx = '01000000012a5c9a94fcde98f5581cd00162c60a13936ceb75389ea65bf38633b424eb4031000000006c493046022100a82bbc57a0136751e5433f41cf000b3f1a99c6744775e76ec764fb78c54ee100022100f9e80b7de89de861dc6fb0c1429d5da72c2b6b2ee2406bc9bfb1beedd729d985012102e61d176da16edd1d258a200ad9759ef63adf8e14cd97f53227bae35cdb84d2f6ffffffff0140420f00000000001976a914230ac37834073a42146f11ef8414ae929feaafc388ac00000000'
+
+    def _populate(self, db):
+        tx = tx_from_any(self.raw_tx)
+        txid = tx.txid()
+        db.add_transaction(txid, tx)
+        db.add_txi_addr(txid, 'addr1', 'aa' * 32 + ':0', 2000)
+        db.add_txo_addr(txid, 'addr2', 0, 1000000, False)
+        db.set_spent_outpoint('aa' * 32, 0, txid)
+        db.set_addr_history('addr2', [(txid, 100)])
+        db.add_verified_tx(txid, TxMinedInfo(height=100, timestamp=1234, txpos=1, header_hash='bb' * 32))
+        db.add_prevout_by_scripthash('cc' * 32, prevout=TxOutpoint.from_str(txid + ':0'), value=1000000)
+        return txid
+
+    def _check(self, db, txid):
+        self.assertEqual(txid, db.get_transaction(txid).txid())
+        self.assertEqual([txid], db.list_transactions())
+        self.assertEqual(['addr1'], db.get_txi_addresses(txid))
+        self.assertEqual([('aa' * 32 + ':0', 2000)], list(db.get_txi_addr(txid, 'addr1')))
+        self.assertEqual([(0, 1000000, False)], list(db.get_txo_addr(txid, 'addr2')))
+        self.assertEqual(txid, db.get_spent_outpoint('aa' * 32, 0))
+        self.assertEqual([('aa' * 32, '0')], list(db.list_spent_outpoints()))
+        self.assertEqual([[txid, 100]], [list(x) for x in db.get_addr_history('addr2')])
+        self.assertTrue(db.is_addr_in_history('addr2'))
+        self.assertEqual(100, db.get_verified_tx(txid).height)
+        self.assertEqual('bb' * 32, db.get_verified_tx(txid).header_hash)
+        self.assertEqual({(TxOutpoint.from_str(txid + ':0'), 1000000)},
+                         db.get_prevouts_by_scripthash('cc' * 32))
+        self.assertEqual(1, db.get_num_ismine_inputs_of_tx(txid))
+
+    def test_attach_migrates_json_tables(self):
+        storage = WalletStorage(self.wallet_path)
+        db = WalletDB('', manual_upgrades=False)
+        txid = self._populate(db)
+        db.attach_sql_db(self.wallet_path + '.sqlite')
+        self.assertTrue(db.uses_sql_engine())
+        self.assertIsNone(db.get('txi'))
+        self.assertEqual({}, db.txi)
+        self.assertEqual({}, db.transactions)
+        self._check(db, txid)
+        db.write(storage)
+        db.close_sql_db()
+        # tables are not in the wallet file anymore
+        with open(self.wallet_path, "r") as f:
+            self.assertNotIn(txid, f.read())
+        db2 = WalletDB(WalletStorage(self.wallet_path).read(), manual_upgrades=False)
+        self.assertEqual('sqlite', db2.get('db_engine'))
+        db2.attach_sql_db(self.wallet_path + '.sqlite')
+        self._check(db2, txid)
+        db2.close_sql_db()
+
+    def test_sql_engine_writes(self):
+        db = WalletDB('', manual_upgrades=False)
+        db.attach_sql_db(self.wallet_path + '.sqlite')
+        txid = self._populate(db)
+        self._check(db, txid)
+        db.remove_spent_outpoint('aa' * 32, 0)
+        db.remove_prevout_by_scripthash('cc' * 32, prevout=TxOutpoint.from_str(txid + ':0'), value=1000000)
+        db.remove_verified_tx(txid)
+        db.remove_txi(txid)
+        self.assertIsNone(db.get_spent_outpoint('aa' * 32, 0))
+        self.assertEqual(set(), db.get_prevouts_by_scripthash('cc' * 32))
+        self.assertIsNone(db.get_verified_tx(txid))
+        self.assertEqual([], db.get_txi_addresses(txid))
+        db.clear_history()
+        self.assertEqual([], db.list_transactions())
+        self.assertEqual([], db.get_history())
+        db.close_sql_db()
+
+    def test_convert_wallet(self):
+        text = 'bc1q2ccr34wzep58d4239tl3x3734ttle92a8srmuw bc1qnp78h78vp92pwdwq5xvh8eprlga5q8gu66960c'
+        d = restore_wallet_from_text(text, path=self.wallet_path, config=self.config)
+        wallet = d['wallet']  # type: Imported_Wallet
+        wallet.convert_db_to_sqlite()
+        self.assertTrue(os.path.exists(self.wallet_path + '.sqlite'))
+        self.assertEqual(2, len(wallet.db.get_history()))
+        wallet.stop()
+        storage = WalletStorage(self.wallet_path)
+        wallet2 = Wallet(WalletDB(storage.read(), manual_upgrades=False), storage, config=self.config)
+        self.assertTrue(wallet2.db.uses_sql_engine())
+        self.assertEqual(2, len(wallet2.db.get_history()))
+        wallet2.stop()
+
+    def test_stop_waits_for_consolidation(self):
+        text = 'bc1q2ccr34wzep58d4239tl3x3734ttle92a8srmuw'
+        wallet = restore_wallet_from_text(text, path=self.wallet_path, config=self.config)['wallet']
+        wallet.storage.needs_consolidation = lambda: True
+        consolidate = wallet.db._consolidate
+        def slow_consolidate(storage):
+            time.sleep(0.2)
+            consolidate(storage)
+        wallet.db._consolidate = slow_consolidate
+        wallet.set_label('bc1q2ccr34wzep58d4239tl3x3734ttle92a8srmuw', 'label')
+        wallet.stop()
+        self.assertFalse(wallet.db._consolidation_thread.is_alive())
+        with open(self.wallet_path, "r") as f:
+            self.assertEqual(wallet.db.dump(), f.read())
+
+
+class TestWalletDBTransactions(WalletTestCase):
+
+    raw_tx = TestWalletSqlDB.raw_tx
+
+    def test_transactions_are_deserialized_on_demand(self):
+        txid = tx_from_any(self.raw_tx).txid()
+        db = WalletDB('', manual_upgrades=False)
+        db.add_txo_addr(txid, 'addr', 0, 1000000, False)
+        db.transactions[txid] = self.raw_tx
+        self.assertNotIn(txid, db._tx_cache)
+        tx = db.get_transaction(txid)
+        self.assertEqual(txid, tx.txid())
+        self.assertIs(tx, db.get_transaction(txid))
+        self.assertEqual(self.raw_tx, db.transactions[txid])
+        self.assertIs(tx, db.remove_transaction(txid))
+        self.assertIsNone(db.get_transaction(txid))
+        self.assertNotIn(txid, db._tx_cache)
+
+    def test_unreferenced_tx_cleanup_runs_once(self):
+        storage = WalletStorage(self.wallet_path)
+        db = WalletDB('', manual_upgrades=False)
+        self.assertEqual(FINAL_SEED_VERSION, db.get('tx_cleanup_version'))
+        db.put('tx_cleanup_version', None)
+        db.put('transactions', {'ab' * 32: self.raw_tx})
+        db.write(storage)
+        db2 = WalletDB(WalletStorage(self.wallet_path).read(), manual_upgrades=False)
+        self.assertEqual([], db2.list_transactions())
+        self.assertEqual(FINAL_SEED_VERSION, db2.get('tx_cleanup_version'))
+        # not cleaned up anymore once tx_cleanup_version is set
+        db2.transactions['ab' * 32] = self.raw_tx
+        db2.write(storage)
+        db3 = WalletDB(WalletStorage(self.wallet_path).read(), manual_upgrades=False)
+        self.assertEqual(['ab' * 32], db3.list_transactions())
+
+
+class TestLRUCache(ElectrumTestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(1, cache.get('a'))
+        cache['c'] = 3
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.pop('c'))
+        self.assertNotIn('c', cache)
+
+
 class FakeExchange(ExchangeBase):
     def __init__(self, rate):
         super().__init__(lambda self: None, lambda self: None)
@@ -103,7 +365,8 @@ class FakeWallet:
         super().__init__()
         self.fiat_value = fiat_value
         self.db = WalletDB("{}", manual_upgrades=True)
-        self.db.transactions = self.db.verified_tx = {'abc':'Tx'}
+        self.db.transactions = {'abc': TestWalletSqlDB.raw_tx}
+        self.db.verified_tx = {'abc':'Tx'}
 
     def get_tx_height(self, txid):
         # because we use a current timestamp, and history is empty,
@@ -10,7 +10,7 @@ from electrum import Transaction
 from electrum import SimpleConfig
 from electrum.address_synchronizer import TX_HEIGHT_UNCONFIRMED, TX_HEIGHT_UNCONF_PARENT
 from electrum.wallet import sweep, Multisig_Wallet, Standard_Wallet, Imported_Wallet, restore_wallet_from_text, Abstract_Wallet
-from electrum.util import bfh, bh2u
+from electrum.util import bfh, bh2u, TxMinedInfo
 from electrum.transaction import TxOutput, Transaction, PartialTransaction, PartialTxOutput, PartialTxInput, tx_from_any
 from electrum.mnemonic import seed_type
 
@@ -2322,13 +2322,7 @@ class TestWalletHistory_EvilGapLimit(TestCaseForTestnet):
         w = WalletIntegrityHelper.create_standard_wallet(ks, gap_limit=20, config=self.config)
         return w
 
-    @mock.patch.object(wallet.Abstract_Wallet, 'save_db')
-    def test_restoring_wallet_txorder1(self, mock_save_db):
-        w = self.create_wallet()
-        w.db.put('stored_height', 1316917 + 100)
-        for txid in self.transactions:
-            tx = Transaction(self.transactions[txid])
-            w.add_transaction(tx)
+    def _restore_history(self, w):
         # txn A is an external incoming txn paying to addr (3) and (15)
         # txn B is an external incoming txn paying to addr (4) and (25)
         # txn C is an internal transfer txn from addr (25) -- to -- (1) and (25)
@@ -2353,8 +2347,49 @@ class TestWalletHistory_EvilGapLimit(TestCaseForTestnet):
                                     ('268fce617aaaa4847835c2212b984d7b7741fdab65de22813288341819bc5656', 1316917)],
                                    {})
         w.synchronize()
+
+    @mock.patch.object(wallet.Abstract_Wallet, 'save_db')
+    def test_restoring_wallet_txorder1(self, mock_save_db):
+        w = self.create_wallet()
+        w.db.put('stored_height', 1316917 + 100)
+        for txid in self.transactions:
+            tx = Transaction(self.transactions[txid])
+            w.add_transaction(tx)
+        self._restore_history(w)
         self.assertEqual(9999788, sum(w.get_balance()))
 
+    @mock.patch.object(wallet.Abstract_Wallet, 'save_db')
+    def test_history_index(self, mock_save_db):
+        w = self.create_wallet()
+        w.db.put('stored_height', 1316917 + 100)
+        for txid in self.transactions:
+            tx = Transaction(self.transactions[txid])
+            w.add_transaction(tx)
+        self._restore_history(w)
+        hist = w.get_history()
+        self.assertEqual(hist, w.get_history(domain=w.get_addresses()))
+        self.assertEqual(['511a35e240f4c8855de4c548dad932d03611a37e94e9203fdb6fc79911fe1dd4',
+                          '268fce617aaaa4847835c2212b984d7b7741fdab65de22813288341819bc5656',
+                          'fde0b68938709c4979827caa576e9455ded148537fdb798fd05680da64dc1b4f'],
+                         [item.txid for item in hist])
+        self.assertEqual(9999788, hist[-1].balance)
+        self.assertEqual(hist[1:], w.get_history(start=1))
+        self.assertEqual(hist[:1], w.get_history(to_height=1316916))
+        self.assertEqual(hist[1:], w.get_history(from_height=1316917))
+        # txpos within the block decides the order
+        with mock.patch('electrum.util.trigger_callback'):
+            w.add_verified_tx('268fce617aaaa4847835c2212b984d7b7741fdab65de22813288341819bc5656',
+                              TxMinedInfo(height=1316917, timestamp=1, txpos=2, header_hash='00' * 32))
+            w.add_verified_tx('fde0b68938709c4979827caa576e9455ded148537fdb798fd05680da64dc1b4f',
+                              TxMinedInfo(height=1316917, timestamp=1, txpos=1, header_hash='00' * 32))
+        hist = w.get_history()
+        self.assertEqual(hist, w.get_history(domain=w.get_addresses()))
+        self.assertEqual('fde0b68938709c4979827caa576e9455ded148537fdb798fd05680da64dc1b4f', hist[1].txid)
+        # deltas are persisted in the db
+        self.assertEqual({item.txid: item.delta for item in hist}, w.db.get_tx_deltas())
+        w.remove_transaction('268fce617aaaa4847835c2212b984d7b7741fdab65de22813288341819bc5656')
+        self.assertEqual(2, len(w.db.get_tx_deltas()))
+
 
 class TestWalletHistory_DoubleSpend(TestCaseForTestnet):
     transactions = {
@@ -2404,3 +2439,32 @@ class TestWalletHistory_DoubleSpend(TestCaseForTestnet):
         txC = Transaction(self.transactions["2c9aa33d9c8ec649f9bfb84af027a5414b760be5231fe9eca4a95b9eb3f8a017"])
         w.add_transaction(txC)
         self.assertEqual(999890, sum(w.get_balance()))
+
+    def _get_utxos_without_index(self, w):
+        return {utxo.prevout.to_str(): utxo.value_sats()
+                for addr in w.get_addresses()
+                for utxo in w.get_addr_outputs(addr).values()
+                if utxo.spent_height is None}
+
+    @mock.patch.object(wallet.Abstract_Wallet, 'save_db')
+    def test_utxo_index(self, mock_save_db):
+        w = restore_wallet_from_text("small rapid pattern language comic denial donate extend tide fever burden barrel",
+                                     path='if_this_exists_mocking_failed_648151893',
+                                     gap_limit=5,
+                                     config=self.config)['wallet']  # type: Abstract_Wallet
+        txA = Transaction(self.transactions["a3849040f82705151ba12a4389310b58a17b78025d81116a3338595bdefa1625"])
+        txB = Transaction(self.transactions["0e2182ead6660790290371516cb0b80afa8baebd30dad42b5e58a24ceea17f1c"])
+        txC = Transaction(self.transactions["2c9aa33d9c8ec649f9bfb84af027a5414b760be5231fe9eca4a95b9eb3f8a017"])
+        for step in (lambda: w.add_transaction(txA),
+                     lambda: w.add_transaction(txB),
+                     lambda: w.remove_transaction(txB.txid()),
+                     lambda: w.add_transaction(txC)):
+            step()
+            utxos = {utxo.prevout.to_str(): utxo.value_sats() for utxo in w.get_utxos()}
+            self.assertEqual(self._get_utxos_without_index(w), utxos)
+        self.assertEqual(999890, sum(utxo.value_sats() for utxo in w.get_utxos()))
+        self.assertEqual([], w.get_utxos(confirmed_only=True))
+        # coins are moved between the confirmation status indexes
+        with mock.patch('electrum.util.trigger_callback'):
+            w.add_verified_tx(txC.txid(), TxMinedInfo(height=100, timestamp=1, txpos=1, header_hash='00' * 32))
+        self.assertEqual([txC.txid()], [utxo.prevout.txid.hex() for utxo in w.get_utxos(confirmed_only=True)])
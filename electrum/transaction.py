@@ -28,6 +28,7 @@
 # Note: The deserialization code originally comes from ABE.
 
 import struct
+import hashlib
 import io
 import base64
 from typing import (Sequence, Union, NamedTuple, Tuple, Optional, Iterable,
@@ -45,7 +46,7 @@ from .bitcoin import (TYPE_ADDRESS, TYPE_SCRIPT, hash_160,
                       var_int, TOTAL_COIN_SUPPLY_LIMIT_IN_BTC, COIN,
                       int_to_hex, push_script, b58_address_to_hash160,
                       opcodes, add_number_to_script, base_decode, is_segwit_script_type)
-from .crypto import sha256d
+from .crypto import sha256, sha256d
 from .logging import get_logger
 
 if TYPE_CHECKING:
@@ -101,11 +102,10 @@ class TxOutput:
                    value=value)
 
     def serialize_to_network(self) -> bytes:
-        buf = int.to_bytes(self.value, 8, byteorder="little", signed=False)
         script = self.scriptpubkey
-        buf += bfh(var_int(len(script.hex()) // 2))
-        buf += script
-        return buf
+        return b''.join((int.to_bytes(self.value, 8, byteorder="little", signed=False),
+                         bfh(var_int(len(script))),
+                         script))
 
     @classmethod
     def from_network_bytes(cls, raw: bytes) -> 'TxOutput':
@@ -160,9 +160,9 @@ class TxOutput:
 
 
 class BIP143SharedTxDigestFields(NamedTuple):
-    hashPrevouts: str
-    hashSequence: str
-    hashOutputs: str
+    hashPrevouts: bytes
+    hashSequence: bytes
+    hashOutputs: bytes
 
 
 class TxOutpoint(NamedTuple):
@@ -182,7 +182,7 @@ class TxOutpoint(NamedTuple):
         return [self.txid.hex(), self.out_idx]
 
     def serialize_to_network(self) -> bytes:
-        return self.txid[::-1] + bfh(int_to_hex(self.out_idx, 4))
+        return self.txid[::-1] + self.out_idx.to_bytes(4, byteorder="little", signed=False)
 
     def is_coinbase(self) -> bool:
         return self.txid == bytes(32)
@@ -240,23 +240,48 @@ class TxInput:
         return list(vds.read_bytes(vds.read_compact_size()) for i in range(n))
 
 
+_STRUCT_SIZES = {fmt: struct.calcsize(fmt) for fmt in ('<h', '<H', '<i', '<I', '<q', '<Q')}
+
+
 class BCDataStream(object):
-    """Workalike python implementation of Bitcoin's CDataStream class."""
+    """Workalike python implementation of Bitcoin's CDataStream class.
+
+    Reads go through a memoryview of the buffer, so that reading a field
+    copies it only once. An immutable bytes object written into an empty
+    stream is used as the buffer without copying it; it is turned into a
+    bytearray on the next write, which then grows in place.
+    """
 
     def __init__(self):
-        self.input = None  # type: Optional[bytearray]
+        self.input = None  # type: Optional[Union[bytes, bytearray]]
         self.read_cursor = 0
+        self._view = None  # type: Optional[memoryview]
 
     def clear(self):
+        self._release_view()
         self.input = None
         self.read_cursor = 0
 
-    def write(self, _bytes: Union[bytes, bytearray]):  # Initialize with string of _bytes
-        assert isinstance(_bytes, (bytes, bytearray))
+    def _release_view(self):
+        # a bytearray cannot be resized while a memoryview of it exists
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+    def _get_view(self) -> memoryview:
+        if self._view is None:
+            self._view = memoryview(self.input)
+        return self._view
+
+    def write(self, _bytes: Union[bytes, bytearray, memoryview]):  # Initialize with string of _bytes
+        assert isinstance(_bytes, (bytes, bytearray, memoryview))
         if self.input is None:
-            self.input = bytearray(_bytes)
-        else:
-            self.input += bytearray(_bytes)
+            self.input = _bytes if isinstance(_bytes, bytes) else bytearray(_bytes)
+            return
+        self._release_view()
+        if not isinstance(self.input, bytearray):
+            self.input = bytearray(self.input)
+        self.input += _bytes
 
     def read_string(self, encoding='ascii'):
         # Strings are encoded depending on length:
@@ -283,16 +308,28 @@ class BCDataStream(object):
         if self.input is None:
             raise SerializationError("call write(bytes) before trying to deserialize")
         assert length >= 0
-        input_len = len(self.input)
         read_begin = self.read_cursor
         read_end = read_begin + length
-        if 0 <= read_begin <= read_end <= input_len:
-            result = self.input[read_begin:read_end]  # type: bytearray
-            self.read_cursor += length
-            return bytes(result)
+        if 0 <= read_begin <= read_end <= len(self.input):
+            self.read_cursor = read_end
+            return bytes(self._get_view()[read_begin:read_end])
         else:
             raise SerializationError('attempt to read past end of buffer')
 
+    def skip_bytes(self, length: int) -> None:
+        if self.input is None:
+            raise SerializationError("call write(bytes) before trying to deserialize")
+        assert length >= 0
+        read_end = self.read_cursor + length
+        if read_end > len(self.input):
+            raise SerializationError('attempt to read past end of buffer')
+        self.read_cursor = read_end
+
+    def get_bytes(self, start: int, end: int) -> bytes:
+        """Returns already read bytes from the buffer, without moving the cursor."""
+        assert 0 <= start <= end <= self.read_cursor
+        return bytes(self._get_view()[start:end])
+
     def write_bytes(self, _bytes: Union[bytes, bytearray], length: int):
         assert len(_bytes) == length, len(_bytes)
         self.write(_bytes)
@@ -352,7 +389,7 @@ class BCDataStream(object):
     def _read_num(self, format):
         try:
             (i,) = struct.unpack_from(format, self.input, self.read_cursor)
-            self.read_cursor += struct.calcsize(format)
+            self.read_cursor += _STRUCT_SIZES[format]
         except Exception as e:
             raise SerializationError(e) from e
         return i
@@ -362,24 +399,31 @@ class BCDataStream(object):
         self.write(s)
 
 
+# plain ints, comparing against the IntEnum members is slower
+_OP_PUSHDATA1 = int(opcodes.OP_PUSHDATA1)
+_OP_PUSHDATA2 = int(opcodes.OP_PUSHDATA2)
+_OP_PUSHDATA4 = int(opcodes.OP_PUSHDATA4)
+
+
 def script_GetOp(_bytes : bytes):
     i = 0
-    while i < len(_bytes):
+    n = len(_bytes)
+    while i < n:
         vch = None
         opcode = _bytes[i]
         i += 1
 
-        if opcode <= opcodes.OP_PUSHDATA4:
+        if opcode <= _OP_PUSHDATA4:
             nSize = opcode
-            if opcode == opcodes.OP_PUSHDATA1:
+            if opcode == _OP_PUSHDATA1:
                 try: nSize = _bytes[i]
                 except IndexError: raise MalformedBitcoinScript()
                 i += 1
-            elif opcode == opcodes.OP_PUSHDATA2:
+            elif opcode == _OP_PUSHDATA2:
                 try: (nSize,) = struct.unpack_from('<H', _bytes, i)
                 except struct.error: raise MalformedBitcoinScript()
                 i += 2
-            elif opcode == opcodes.OP_PUSHDATA4:
+            elif opcode == _OP_PUSHDATA4:
                 try: (nSize,) = struct.unpack_from('<I', _bytes, i)
                 except struct.error: raise MalformedBitcoinScript()
                 i += 4
@@ -488,9 +532,13 @@ def construct_witness(items: Sequence[Union[str, int, bytes]]) -> str:
 
 
 def parse_witness(vds: BCDataStream, txin: TxInput) -> None:
+    # The serialized witness is already in the form construct_witness
+    # would produce, so take it from the buffer as is.
+    start = vds.read_cursor
     n = vds.read_compact_size()
-    witness_elements = list(vds.read_bytes(vds.read_compact_size()) for i in range(n))
-    txin.witness = bfh(construct_witness(witness_elements))
+    for i in range(n):
+        vds.skip_bytes(vds.read_compact_size())
+    txin.witness = vds.get_bytes(start, vds.read_cursor)
 
 
 def parse_output(vds: BCDataStream) -> TxOutput:
@@ -855,9 +903,9 @@ class Transaction:
     def _calc_bip143_shared_txdigest_fields(self) -> BIP143SharedTxDigestFields:
         inputs = self.inputs()
         outputs = self.outputs()
-        hashPrevouts = bh2u(sha256d(b''.join(txin.prevout.serialize_to_network() for txin in inputs)))
-        hashSequence = bh2u(sha256d(bfh(''.join(int_to_hex(txin.nsequence, 4) for txin in inputs))))
-        hashOutputs = bh2u(sha256d(bfh(''.join(o.serialize_to_network().hex() for o in outputs))))
+        hashPrevouts = sha256d(b''.join(txin.prevout.serialize_to_network() for txin in inputs))
+        hashSequence = sha256d(b''.join(struct.pack('<I', txin.nsequence) for txin in inputs))
+        hashOutputs = sha256d(b''.join(o.serialize_to_network() for o in outputs))
         return BIP143SharedTxDigestFields(hashPrevouts=hashPrevouts,
                                           hashSequence=hashSequence,
                                           hashOutputs=hashOutputs)
@@ -896,7 +944,7 @@ class Transaction:
             return ''
         txins = var_int(len(inputs)) + ''.join(self.serialize_input(txin, create_script_sig(txin))
                                                for txin in inputs)
-        txouts = var_int(len(outputs)) + ''.join(o.serialize_to_network().hex() for o in outputs)
+        txouts = var_int(len(outputs)) + b''.join(o.serialize_to_network() for o in outputs).hex()
 
         use_segwit_ser_for_estimate_size = estimate_size and self.is_segwit(guess_for_address=True)
         use_segwit_ser_for_actual_use = not estimate_size and self.is_segwit()
@@ -1769,6 +1817,106 @@ class PartialTxOutput(TxOutput, PSBTSection):
         self._unknown.update(other_txout._unknown)
 
 
+class SighashCache:
+    """Builds the signature hash preimages of the inputs of a transaction,
+    as bytes, computing the parts they share only once.
+
+    For segwit inputs (BIP143), these are the hashes of the prevouts,
+    sequences and outputs. Legacy preimages contain all inputs, with only
+    the signed one having a script, so the inputs are serialized once and
+    the sha256 state after the inputs preceding each one is reused.
+
+    Only valid as long as the transaction is not modified.
+    """
+
+    def __init__(self, tx: 'PartialTransaction', *,
+                 bip143_shared_txdigest_fields: BIP143SharedTxDigestFields = None):
+        self.tx = tx
+        self.inputs = tx.inputs()
+        self.version = bfh(int_to_hex(tx.version, 4))
+        self.locktime = bfh(int_to_hex(tx.locktime, 4))
+        self._bip143_fields = bip143_shared_txdigest_fields
+        self._legacy_inputs = None  # type: Optional[bytes]  # inputs without scripts
+        self._legacy_offsets = None  # type: Optional[List[int]]
+        self._legacy_outputs = None  # type: Optional[bytes]
+        self._legacy_midstates = []  # sha256 states after the preimage prefix up to input i
+
+    def bip143_fields(self) -> BIP143SharedTxDigestFields:
+        if self._bip143_fields is None:
+            self._bip143_fields = self.tx._calc_bip143_shared_txdigest_fields()
+        return self._bip143_fields
+
+    def _init_legacy(self) -> None:
+        if self._legacy_inputs is not None:
+            return
+        # same as serialize_input(txin, ''), without going through hex
+        inputs = [txin.prevout.serialize_to_network() + b'\x00' + struct.pack('<I', txin.nsequence)
+                  for txin in self.inputs]
+        offsets = [0]
+        for ser in inputs:
+            offsets.append(offsets[-1] + len(ser))
+        outputs = self.tx.outputs()
+        self._legacy_inputs = b''.join(inputs)
+        self._legacy_offsets = offsets
+        self._legacy_outputs = bfh(var_int(len(outputs))) + b''.join(o.serialize_to_network() for o in outputs)
+        self._legacy_midstates = [hashlib.sha256(self.version + bfh(var_int(len(inputs))))]
+
+    def _legacy_midstate(self, txin_index: int):
+        states = self._legacy_midstates
+        view = memoryview(self._legacy_inputs)
+        offsets = self._legacy_offsets
+        for i in range(len(states), txin_index + 1):
+            state = states[-1].copy()
+            state.update(view[offsets[i - 1]:offsets[i]])
+            states.append(state)
+        return states[txin_index].copy()
+
+    def _get_nhashtype(self, txin: 'PartialTxInput') -> bytes:
+        sighash = txin.sighash if txin.sighash is not None else SIGHASH_ALL
+        if sighash != SIGHASH_ALL:
+            raise Exception("only SIGHASH_ALL signing is supported!")
+        return struct.pack('<I', sighash)
+
+    def _get_segwit_preimage(self, txin_index: int) -> bytes:
+        txin = self.inputs[txin_index]
+        nHashType = self._get_nhashtype(txin)
+        preimage_script = bfh(self.tx.get_preimage_script(txin))
+        fields = self.bip143_fields()
+        return b''.join((self.version, fields.hashPrevouts, fields.hashSequence,
+                         txin.prevout.serialize_to_network(),
+                         bfh(var_int(len(preimage_script))), preimage_script,
+                         struct.pack('<q', txin.value_sats()), struct.pack('<I', txin.nsequence),
+                         fields.hashOutputs, self.locktime, nHashType))
+
+    def _get_legacy_parts(self, txin_index: int) -> Tuple[bytes, memoryview, bytes]:
+        """Returns the serialization of the signed input, the inputs after
+        it, and the end of the preimage."""
+        txin = self.inputs[txin_index]
+        nHashType = self._get_nhashtype(txin)
+        self._init_legacy()
+        txin_ser = bfh(self.tx.serialize_input(txin, self.tx.get_preimage_script(txin)))
+        after = memoryview(self._legacy_inputs)[self._legacy_offsets[txin_index + 1]:]
+        return txin_ser, after, self._legacy_outputs + self.locktime + nHashType
+
+    def preimage(self, txin_index: int) -> bytes:
+        if self.tx.is_segwit_input(self.inputs[txin_index]):
+            return self._get_segwit_preimage(txin_index)
+        txin_ser, after, end = self._get_legacy_parts(txin_index)
+        before = self._legacy_inputs[:self._legacy_offsets[txin_index]]
+        return b''.join((self.version, bfh(var_int(len(self.inputs))), before, txin_ser, after, end))
+
+    def sighash(self, txin_index: int) -> bytes:
+        """Returns sha256d of the preimage of the given input."""
+        if self.tx.is_segwit_input(self.inputs[txin_index]):
+            return sha256d(self._get_segwit_preimage(txin_index))
+        txin_ser, after, end = self._get_legacy_parts(txin_index)
+        state = self._legacy_midstate(txin_index)
+        state.update(txin_ser)
+        state.update(after)
+        state.update(end)
+        return sha256(state.digest())
+
+
 class PartialTransaction(Transaction):
 
     def __init__(self, raw_unsigned_tx):
@@ -2016,58 +2164,46 @@ class PartialTransaction(Transaction):
             return None
 
     def serialize_preimage(self, txin_index: int, *,
-                           bip143_shared_txdigest_fields: BIP143SharedTxDigestFields = None) -> str:
-        nVersion = int_to_hex(self.version, 4)
-        nLocktime = int_to_hex(self.locktime, 4)
-        inputs = self.inputs()
-        outputs = self.outputs()
-        txin = inputs[txin_index]
-        sighash = txin.sighash if txin.sighash is not None else SIGHASH_ALL
-        if sighash != SIGHASH_ALL:
-            raise Exception("only SIGHASH_ALL signing is supported!")
-        nHashType = int_to_hex(sighash, 4)
-        preimage_script = self.get_preimage_script(txin)
-        if self.is_segwit_input(txin):
-            if bip143_shared_txdigest_fields is None:
-                bip143_shared_txdigest_fields = self._calc_bip143_shared_txdigest_fields()
-            hashPrevouts = bip143_shared_txdigest_fields.hashPrevouts
-            hashSequence = bip143_shared_txdigest_fields.hashSequence
-            hashOutputs = bip143_shared_txdigest_fields.hashOutputs
-            outpoint = txin.prevout.serialize_to_network().hex()
-            scriptCode = var_int(len(preimage_script) // 2) + preimage_script
-            amount = int_to_hex(txin.value_sats(), 8)
-            nSequence = int_to_hex(txin.nsequence, 4)
-            preimage = nVersion + hashPrevouts + hashSequence + outpoint + scriptCode + amount + nSequence + hashOutputs + nLocktime + nHashType
-        else:
-            txins = var_int(len(inputs)) + ''.join(self.serialize_input(txin, preimage_script if txin_index==k else '')
-                                                   for k, txin in enumerate(inputs))
-            txouts = var_int(len(outputs)) + ''.join(o.serialize_to_network().hex() for o in outputs)
-            preimage = nVersion + txins + txouts + nLocktime + nHashType
-        return preimage
+                           bip143_shared_txdigest_fields: BIP143SharedTxDigestFields = None,
+                           sighash_cache: SighashCache = None) -> str:
+        if sighash_cache is None:
+            sighash_cache = SighashCache(self, bip143_shared_txdigest_fields=bip143_shared_txdigest_fields)
+        return bh2u(sighash_cache.preimage(txin_index))
 
     def sign(self, keypairs) -> None:
         # keypairs:  pubkey_hex -> (secret_bytes, is_compressed)
-        bip143_shared_txdigest_fields = self._calc_bip143_shared_txdigest_fields()
+        # First compute the hashes to sign, then create all signatures at once
+        # (on several threads for large txs), then add them in input order.
+        sighash_cache = SighashCache(self)
+        jobs = []  # type: List[Tuple[int, str]]  # (txin_index, pubkey)
+        pre_hashes = {}  # type: Dict[int, bytes]
         for i, txin in enumerate(self.inputs()):
-            pubkeys = [pk.hex() for pk in txin.pubkeys]
-            for pubkey in pubkeys:
-                if txin.is_complete():
-                    break
+            if txin.is_complete():
+                continue
+            for pubkey in [pk.hex() for pk in txin.pubkeys]:
                 if pubkey not in keypairs:
                     continue
-                _logger.info(f"adding signature for {pubkey}")
-                sec, compressed = keypairs[pubkey]
-                sig = self.sign_txin(i, sec, bip143_shared_txdigest_fields=bip143_shared_txdigest_fields)
-                self.add_signature_to_txin(txin_idx=i, signing_pubkey=pubkey, sig=sig)
+                if i not in pre_hashes:
+                    txin.validate_data(for_signing=True)
+                    pre_hashes[i] = sighash_cache.sighash(i)
+                jobs.append((i, pubkey))
+        sigs = ecc.sign_transaction_hashes([(keypairs[pubkey][0], pre_hashes[i]) for i, pubkey in jobs])
+        for (i, pubkey), sig in zip(jobs, sigs):
+            if self.inputs()[i].is_complete():
+                continue  # e.g. multisig, with more of our keys than needed
+            _logger.info(f"adding signature for {pubkey}")
+            self.add_signature_to_txin(txin_idx=i, signing_pubkey=pubkey, sig=bh2u(sig) + '01')  # SIGHASH_ALL
 
         _logger.debug(f"is_complete {self.is_complete()}")
         self.invalidate_ser_cache()
 
-    def sign_txin(self, txin_index, privkey_bytes, *, bip143_shared_txdigest_fields=None) -> str:
+    def sign_txin(self, txin_index, privkey_bytes, *, bip143_shared_txdigest_fields=None,
+                  sighash_cache: SighashCache = None) -> str:
         txin = self.inputs()[txin_index]
         txin.validate_data(for_signing=True)
-        pre_hash = sha256d(bfh(self.serialize_preimage(txin_index,
-                                                       bip143_shared_txdigest_fields=bip143_shared_txdigest_fields)))
+        if sighash_cache is None:
+            sighash_cache = SighashCache(self, bip143_shared_txdigest_fields=bip143_shared_txdigest_fields)
+        pre_hash = sighash_cache.sighash(txin_index)
         privkey = ecc.ECPrivkey(privkey_bytes)
         sig = privkey.sign_transaction(pre_hash)
         sig = bh2u(sig) + '01'  # SIGHASH_ALL
@@ -2119,12 +2255,13 @@ class PartialTransaction(Transaction):
             return
         if len(self.inputs()) != len(signatures):
             raise Exception('expected {} signatures; got {}'.format(len(self.inputs()), len(signatures)))
+        sighash_cache = SighashCache(self)
         for i, txin in enumerate(self.inputs()):
             pubkeys = [pk.hex() for pk in txin.pubkeys]
             sig = signatures[i]
             if bfh(sig) in list(txin.part_sigs.values()):
                 continue
-            pre_hash = sha256d(bfh(self.serialize_preimage(i)))
+            pre_hash = sighash_cache.sighash(i)
             sig_string = ecc.sig_string_from_der_sig(bfh(sig[:-2]))
             for recid in range(4):
                 try:
@@ -1232,7 +1232,9 @@ class TxMinedInfo(NamedTuple):
     header_hash: Optional[str] = None  # hash of block that mined tx
 
 
-def make_aiohttp_session(proxy: Optional[dict], headers=None, timeout=None):
+def make_aiohttp_session(proxy: Optional[dict], headers=None, timeout=None, *,
+                         limit: int = 100, limit_per_host: int = 0, keepalive_timeout: float = 15,
+                         trace_configs: Sequence[aiohttp.TraceConfig] = None):
     if headers is None:
         headers = {'User-Agent': 'Electrum'}
     if timeout is None:
@@ -1252,11 +1254,80 @@ def make_aiohttp_session(proxy: Optional[dict], headers=None, timeout=None):
             password=proxy.get('password', None),
             rdns=True,
             ssl=ssl_context,
+            limit=limit,
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
         )
     else:
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
+        connector = aiohttp.TCPConnector(ssl=ssl_context, limit=limit, limit_per_host=limit_per_host,
+                                         keepalive_timeout=keepalive_timeout)
 
-    return aiohttp.ClientSession(headers=headers, timeout=timeout, connector=connector)
+    return aiohttp.ClientSession(headers=headers, timeout=timeout, connector=connector,
+                                 trace_configs=trace_configs)
+
+
+class HttpSessionPool(Logger):
+    """Long-lived aiohttp sessions, one per proxy config, so that
+    connections are kept alive and reused across requests.
+
+    The sessions are bound to the event loop they are created on, and
+    are owned by the pool: callers must not close them.
+    """
+
+    def __init__(self, *, limit: int = 100, limit_per_host: int = 8, keepalive_timeout: float = 30):
+        Logger.__init__(self)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._sessions = {}  # type: Dict[Optional[Tuple], aiohttp.ClientSession]
+        # metrics
+        self.num_new_connections = 0
+        self.num_reused_connections = 0
+        self._trace_config = aiohttp.TraceConfig()
+        self._trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        self._trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+
+    async def _on_connection_create_end(self, session, ctx, params):
+        self.num_new_connections += 1
+
+    async def _on_connection_reuseconn(self, session, ctx, params):
+        self.num_reused_connections += 1
+
+    @staticmethod
+    def _proxy_key(proxy: Optional[dict]) -> Optional[Tuple]:
+        return tuple(sorted(proxy.items())) if proxy else None
+
+    def get_session(self, proxy: Optional[dict]) -> aiohttp.ClientSession:
+        key = self._proxy_key(proxy)
+        session = self._sessions.get(key)
+        if session is None or session.closed:
+            session = make_aiohttp_session(proxy, limit=self.limit, limit_per_host=self.limit_per_host,
+                                           keepalive_timeout=self.keepalive_timeout,
+                                           trace_configs=[self._trace_config])
+            self._sessions[key] = session
+        return session
+
+    async def close_other_sessions(self, proxy: Optional[dict]) -> None:
+        """Closes the sessions of other proxy configs than the given one."""
+        key = self._proxy_key(proxy)
+        for k, session in list(self._sessions.items()):
+            if k != key:
+                del self._sessions[k]
+                await session.close()
+
+    async def close(self) -> None:
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            await session.close()
+
+    def get_stats(self) -> dict:
+        num_connections = self.num_new_connections + self.num_reused_connections
+        return {
+            'new_connections': self.num_new_connections,
+            'reused_connections': self.num_reused_connections,
+            'reuse_ratio': self.num_reused_connections / num_connections if num_connections else 0.0,
+        }
 
 
 class SilentTaskGroup(TaskGroup):
@@ -1410,6 +1481,46 @@ class OrderedDictWithIndex(OrderedDict):
         return ret
 
 
+class LRUCache:
+    """A mapping that holds at most maxsize items,
+    evicting the least recently used ones. Thread-safe.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
 def multisig_type(wallet_type):
     '''If wallet_type is mofn multi-sig, return [m, n],
     otherwise return None.'''
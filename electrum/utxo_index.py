@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# Electrum - lightweight Bitcoin client
+# Copyright (C) 2020 The Electrum Developers
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from collections import defaultdict
+from typing import Dict, Iterable, NamedTuple, Set
+
+
+class Coin(NamedTuple):
+    address: str
+    value: int
+    is_coinbase: bool
+    height: int  # height of the funding tx, see AddressSynchronizer.get_tx_height
+
+
+class UtxoIndex:
+    """Unspent outputs of the wallet, keyed by outpoint ('txid:n'),
+    with secondary indexes by address, by funding txid and by
+    confirmation status.
+
+    AddressSynchronizer updates it in add_transaction/remove_transaction,
+    and when the height of a funding tx changes.
+    Not thread-safe, the caller holds transaction_lock.
+    """
+
+    def __init__(self):
+        self._coins = {}                       # type: Dict[str, Coin]
+        self._by_address = defaultdict(set)    # type: Dict[str, Set[str]]
+        self._by_txid = defaultdict(set)       # type: Dict[str, Set[str]]
+        self._confirmed = set()                # type: Set[str]
+        self._unconfirmed = set()              # type: Set[str]  # includes local and future txs
+
+    def clear(self) -> None:
+        self._coins.clear()
+        self._by_address.clear()
+        self._by_txid.clear()
+        self._confirmed.clear()
+        self._unconfirmed.clear()
+
+    def __len__(self):
+        return len(self._coins)
+
+    def __contains__(self, prevout_str):
+        return prevout_str in self._coins
+
+    def get(self, prevout_str: str) -> Coin:
+        return self._coins.get(prevout_str)
+
+    def add(self, prevout_str: str, coin: Coin) -> None:
+        if prevout_str in self._coins:
+            self.remove(prevout_str)
+        self._coins[prevout_str] = coin
+        self._by_address[coin.address].add(prevout_str)
+        self._by_txid[prevout_str.split(':')[0]].add(prevout_str)
+        (self._confirmed if coin.height > 0 else self._unconfirmed).add(prevout_str)
+
+    def remove(self, prevout_str: str) -> None:
+        coin = self._coins.pop(prevout_str, None)
+        if coin is None:
+            return
+        self._discard(self._by_address, coin.address, prevout_str)
+        self._discard(self._by_txid, prevout_str.split(':')[0], prevout_str)
+        self._confirmed.discard(prevout_str)
+        self._unconfirmed.discard(prevout_str)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, prevout_str: str) -> None:
+        s = index.get(key)
+        if s is None:
+            return
+        s.discard(prevout_str)
+        if not s:
+            del index[key]
+
+    def remove_outputs_of_tx(self, txid: str) -> None:
+        for prevout_str in list(self._by_txid.get(txid, ())):
+            self.remove(prevout_str)
+
+    def set_tx_height(self, txid: str, height: int) -> None:
+        for prevout_str in list(self._by_txid.get(txid, ())):
+            coin = self._coins[prevout_str]
+            if coin.height != height:
+                self.add(prevout_str, coin._replace(height=height))
+
+    def by_address(self, address: str) -> Dict[str, Coin]:
+        return {k: self._coins[k] for k in self._by_address.get(address, ())}
+
+    def items(self, *, confirmed_only: bool = False) -> Iterable[tuple]:
+        if confirmed_only:
+            return [(k, self._coins[k]) for k in self._confirmed]
+        return list(self._coins.items())
@@ -22,11 +22,13 @@
 # SOFTWARE.
 
 import asyncio
-from typing import Sequence, Optional, TYPE_CHECKING
+from collections import defaultdict
+from typing import Sequence, Optional, Dict, List, Tuple, TYPE_CHECKING
 
 import aiorpcx
 
-from .util import bh2u, TxMinedInfo, NetworkJobOnDefaultServer
+from .util import (bh2u, TxMinedInfo, NetworkJobOnDefaultServer, register_callback,
+                   unregister_callback)
 from .crypto import sha256d
 from .bitcoin import hash_decode, hash_encode
 from .transaction import Transaction
@@ -40,6 +42,10 @@ if TYPE_CHECKING:
     from .address_synchronizer import AddressSynchronizer
 
 
+# number of merkle proofs being requested from the server at the same time
+MAX_CONCURRENT_MERKLE_REQUESTS = 10
+
+
 class MerkleVerificationFailure(Exception): pass
 class MissingBlockHeader(MerkleVerificationFailure): pass
 class MerkleRootMismatch(MerkleVerificationFailure): pass
@@ -52,30 +58,52 @@ class SPV(NetworkJobOnDefaultServer):
     def __init__(self, network: 'Network', wallet: 'AddressSynchronizer'):
         self.wallet = wallet
         NetworkJobOnDefaultServer.__init__(self, network)
+        register_callback(self._on_blockchain_updated, ['blockchain_updated'])
 
     def _reset(self):
         super()._reset()
         self.merkle_roots = {}  # txid -> merkle root (once it has been verified)
         self.requested_merkle = set()  # txid set of pending requests
+        self._proof_requests = asyncio.Queue()  # of (txid, height), each of them in requested_merkle
+        self._headers = {}  # type: Dict[int, Tuple[str, dict]]  # height -> (hash, header)
+        self._wakeup = asyncio.Event()
 
     async def _start_tasks(self):
         async with self.taskgroup as group:
             await group.spawn(self.main)
+            for i in range(MAX_CONCURRENT_MERKLE_REQUESTS):
+                await group.spawn(self._process_proof_requests)
+
+    async def stop(self):
+        unregister_callback(self._on_blockchain_updated)
+        await super().stop()
 
     def diagnostic_name(self):
         return self.wallet.diagnostic_name()
 
+    def wake_up(self) -> None:
+        """Called when there are new unverified transactions. Thread-safe."""
+        self.network.asyncio_loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _on_blockchain_updated(self, event):
+        # new headers, or a reorg
+        self._wakeup.set()
+
     async def main(self):
         self.blockchain = self.network.blockchain()
         while True:
+            self._wakeup.clear()
+            if not self.requested_merkle:
+                self._headers.clear()
             await self._maybe_undo_verifications()
             await self._request_proofs()
-            await asyncio.sleep(0.1)
+            await self._wakeup.wait()
 
     async def _request_proofs(self):
         local_height = self.blockchain.height()
         unverified = self.wallet.get_unverified_txs()
 
+        txs_by_height = defaultdict(list)  # type: Dict[int, List[str]]
         for tx_hash, tx_height in unverified.items():
             # do not request merkle branch if we already requested it
             if tx_hash in self.requested_merkle or tx_hash in self.merkle_roots:
@@ -83,16 +111,47 @@ class SPV(NetworkJobOnDefaultServer):
             # or before headers are available
             if tx_height <= 0 or tx_height > local_height:
                 continue
+            txs_by_height[tx_height].append(tx_hash)
+
+        for tx_height, tx_hashes in sorted(txs_by_height.items()):
             # if it's in the checkpoint region, we still might not have the header
-            header = self.blockchain.read_header(tx_height)
+            header = self._get_header(tx_height)
             if header is None:
                 if tx_height < constants.net.max_checkpoint():
-                    await self.taskgroup.spawn(self.network.request_chunk(tx_height, None, can_return_early=True))
+                    await self.taskgroup.spawn(self._request_chunk(tx_height))
                 continue
             # request now
-            self.logger.info(f'requested merkle {tx_hash}')
-            self.requested_merkle.add(tx_hash)
-            await self.taskgroup.spawn(self._request_and_verify_single_proof, tx_hash, tx_height)
+            for tx_hash in tx_hashes:
+                self.logger.info(f'requested merkle {tx_hash}')
+                self.requested_merkle.add(tx_hash)
+                self._proof_requests.put_nowait((tx_hash, tx_height))
+
+    async def _request_chunk(self, height: int) -> None:
+        if await self.network.request_chunk(height, None, can_return_early=True) is None:
+            # already being requested
+            await asyncio.sleep(1)
+        self._wakeup.set()
+
+    async def _process_proof_requests(self):
+        while True:
+            tx_hash, tx_height = await self._proof_requests.get()
+            # the request might have been cancelled, e.g. by a reorg
+            if tx_hash not in self.requested_merkle:
+                continue
+            await self._request_and_verify_single_proof(tx_hash, tx_height)
+
+    def _get_header(self, height: int) -> Optional[dict]:
+        """Returns the header at height of our chain, reading it only once
+        for all the transactions of the block, as long as it is in our chain.
+        """
+        blockchain = self.network.blockchain()
+        cached = self._headers.get(height)
+        if cached and blockchain.check_hash(height, cached[0]):
+            return cached[1]
+        header = blockchain.read_header(height)
+        if header is not None:
+            self._headers[height] = hash_header(header), header
+        return header
 
     async def _request_and_verify_single_proof(self, tx_hash, tx_height):
         try:
@@ -114,7 +173,7 @@ class SPV(NetworkJobOnDefaultServer):
         merkle_branch = merkle.get('merkle')
         # we need to wait if header sync/reorg is still ongoing, hence lock:
         async with self.network.bhi_lock:
-            header = self.network.blockchain().read_header(tx_height)
+            header = self._get_header(tx_height)
         try:
             verify_tx_is_in_block(tx_hash, merkle_branch, pos, header, tx_height)
         except MerkleVerificationFailure as e:
@@ -127,7 +186,7 @@ class SPV(NetworkJobOnDefaultServer):
         self.merkle_roots[tx_hash] = header.get('merkle_root')
         self.requested_merkle.discard(tx_hash)
         self.logger.info(f"verified {tx_hash}")
-        header_hash = hash_header(header)
+        header_hash = self._headers[tx_height][0]
         tx_info = TxMinedInfo(height=tx_height,
                               timestamp=header.get('timestamp'),
                               txpos=pos,
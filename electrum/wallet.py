@@ -268,6 +268,10 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
         self.keystore = None  # type: Optional[KeyStore]  # will be set by load_keystore
         self._chain_code = None
         self._identity = None
+        if db.get('db_engine') == 'sqlite':
+            if not storage:
+                raise Exception("wallet uses the sqlite engine but has no storage")
+            db.attach_sql_db(self._get_sql_db_path())
         AddressSynchronizer.__init__(self, db)
 
         # saved fields
@@ -433,6 +437,8 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
                 self.lnbackups.stop()
                 self.lnbackups = None
         self.save_db()
+        self.db.wait_for_consolidation()
+        self.db.close_sql_db()
 
     def set_up_to_date(self, b):
         super().set_up_to_date(b)
@@ -442,6 +448,21 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
         super().clear_history()
         self.save_db()
 
+    def _get_sql_db_path(self) -> str:
+        return self.storage.path + '.sqlite'
+
+    def convert_db_to_sqlite(self) -> None:
+        """Move the wallet history to a sqlite file next to the wallet file.
+        Note: the sqlite file is not encrypted."""
+        if self.db.uses_sql_engine():
+            return
+        if not self.storage:
+            raise Exception("cannot convert a wallet without storage")
+        if self.storage.is_encrypted():
+            raise UserFacingException(_("Cannot convert an encrypted wallet to sqlite."))
+        self.db.attach_sql_db(self._get_sql_db_path())
+        self.save_db()
+
     def start_network(self, network):
         AddressSynchronizer.start_network(self, network)
         if network:
@@ -2042,6 +2063,8 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
             raise InvalidPassword()
         self.check_password(old_pw, str_pw=str_pw)
         if self.storage and str_pw is not None:
+            if encrypt_storage and str_pw and self.db.uses_sql_engine():
+                raise UserFacingException(_("Cannot encrypt a wallet that uses the sqlite engine."))
             if encrypt_storage:
                 enc_version = self.get_available_storage_encryption_version()
             else:
@@ -2475,10 +2498,14 @@ class Imported_Wallet(Simple_Wallet):
                 else:
                     for tx_hash, height in details:
                         transactions_new.add(tx_hash)
+            transactions_to_update = transactions_to_remove & transactions_new
             transactions_to_remove -= transactions_new
             self.db.remove_addr_history(address)
             for tx_hash in transactions_to_remove:
                 self.remove_transaction(tx_hash)
+            # the effect of txs shared with other addresses on the wallet changed
+            for tx_hash in transactions_to_update:
+                self._update_tx_indexes(tx_hash, delta_changed=True)
         self.set_label(address, None)
         self.remove_payment_request(address)
         self.set_frozen_state_of_addresses([address], False)
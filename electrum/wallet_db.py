@@ -32,14 +32,15 @@ from typing import Dict, Optional, List, Tuple, Set, Iterable, NamedTuple, Seque
 import binascii
 
 from . import util, bitcoin
-from .util import profiler, WalletFileException, multisig_type, TxMinedInfo, bfh
+from .util import profiler, WalletFileException, multisig_type, TxMinedInfo, bfh, LRUCache
 from .invoices import PR_TYPE_ONCHAIN, Invoice
 from .keystore import bip44_derivation
 from .transaction import Transaction, TxOutpoint, tx_from_any, PartialTransaction, PartialTxOutput
 from .logging import Logger
 from .lnutil import LOCAL, REMOTE, FeeUpdate, UpdateAddHtlc, LocalConfig, RemoteConfig, Keypair, OnlyPubkeyKeypair, RevocationStore, ChannelBackupStorage
 from .lnutil import ChannelConstraints, Outpoint, ShachainElement
-from .json_db import StoredDict, JsonDB, locked, modifier
+from .json_db import StoredDict, JsonDB, locked, modifier, split_journal
+from .wallet_sql_db import WalletSqlDB, SQL_TABLES
 from .plugin import run_hook, plugin_loaders
 from .paymentrequest import PaymentRequest
 from .submarine_swaps import SwapData
@@ -55,6 +56,8 @@ NEW_SEED_VERSION = 11       # electrum versions >= 2.0
 FINAL_SEED_VERSION = 32     # electrum >= 2.7 will set this to prevent
                             # old versions from overwriting new format
 
+TX_CACHE_SIZE = 1000        # number of deserialized transactions kept in memory
+
 
 class TxFeesValue(NamedTuple):
     fee: Optional[int] = None
@@ -62,12 +65,26 @@ class TxFeesValue(NamedTuple):
     num_inputs: Optional[int] = None
 
 
+def sql_engine(func):
+    """Forward the call to the sqlite engine, if the wallet uses one.
+    Must be the innermost decorator, see WalletDB.attach_sql_db."""
+    name = func.__name__
+    def wrapper(self, *args, **kwargs):
+        if self._sql_db is not None:
+            return getattr(self._sql_db, name)(*args, **kwargs)
+        return func(self, *args, **kwargs)
+    return wrapper
+
+
 class WalletDB(JsonDB):
 
     def __init__(self, raw, *, manual_upgrades: bool):
         JsonDB.__init__(self, {})
         self._manual_upgrades = manual_upgrades
         self._called_after_upgrade_tasks = False
+        self._sql_db = None  # type: Optional[WalletSqlDB]
+        # txid -> (raw_tx, tx)
+        self._tx_cache = LRUCache(TX_CACHE_SIZE)  # type: LRUCache
         if raw:  # loading existing db
             self.load_data(raw)
             self.load_plugins()
@@ -76,8 +93,13 @@ class WalletDB(JsonDB):
             self._after_upgrade_tasks()
 
     def load_data(self, s):
+        base, journal = split_journal(s)
         try:
-            self.data = json.loads(s)
+            self.data = json.loads(base)
+            self._needs_full_write = False
+            self.apply_journal(journal)
+        except WalletFileException:
+            raise
         except:
             try:
                 d = ast.literal_eval(s)
@@ -773,35 +795,39 @@ class WalletDB(JsonDB):
                 msg += "\nPlease open this file with Electrum 1.9.8, and move your coins to a new wallet."
         raise WalletFileException(msg)
 
-    @locked
+    # note: the getters below do not take self.lock, see StoredDict.
+    #       They only use atomic dict operations, or iterate over a copy.
+
+    @sql_engine
     def get_txi_addresses(self, tx_hash: str) -> List[str]:
         """Returns list of is_mine addresses that appear as inputs in tx."""
         assert isinstance(tx_hash, str)
         return list(self.txi.get(tx_hash, {}).keys())
 
-    @locked
+    @sql_engine
     def get_txo_addresses(self, tx_hash: str) -> List[str]:
         """Returns list of is_mine addresses that appear as outputs in tx."""
         assert isinstance(tx_hash, str)
         return list(self.txo.get(tx_hash, {}).keys())
 
-    @locked
+    @sql_engine
     def get_txi_addr(self, tx_hash: str, address: str) -> Iterable[Tuple[str, int]]:
         """Returns an iterable of (prev_outpoint, value)."""
         assert isinstance(tx_hash, str)
         assert isinstance(address, str)
         d = self.txi.get(tx_hash, {}).get(address, {})
-        return list(d.items())
+        return list(d.copy().items())
 
-    @locked
+    @sql_engine
     def get_txo_addr(self, tx_hash: str, address: str) -> Iterable[Tuple[int, int, bool]]:
         """Returns an iterable of (output_index, value, is_coinbase)."""
         assert isinstance(tx_hash, str)
         assert isinstance(address, str)
         d = self.txo.get(tx_hash, {}).get(address, {})
-        return [(int(n), v, cb) for (n, (v, cb)) in d.items()]
+        return [(int(n), v, cb) for (n, (v, cb)) in d.copy().items()]
 
     @modifier
+    @sql_engine
     def add_txi_addr(self, tx_hash: str, addr: str, ser: str, v: int) -> None:
         assert isinstance(tx_hash, str)
         assert isinstance(addr, str)
@@ -815,6 +841,7 @@ class WalletDB(JsonDB):
         d[addr][ser] = v
 
     @modifier
+    @sql_engine
     def add_txo_addr(self, tx_hash: str, addr: str, n: Union[int, str], v: int, is_coinbase: bool) -> None:
         n = str(n)
         assert isinstance(tx_hash, str)
@@ -830,42 +857,48 @@ class WalletDB(JsonDB):
         d[addr][n] = (v, is_coinbase)
 
     @locked
+    @sql_engine
     def list_txi(self) -> Sequence[str]:
         return list(self.txi.keys())
 
     @locked
+    @sql_engine
     def list_txo(self) -> Sequence[str]:
         return list(self.txo.keys())
 
     @modifier
+    @sql_engine
     def remove_txi(self, tx_hash: str) -> None:
         assert isinstance(tx_hash, str)
         self.txi.pop(tx_hash, None)
 
     @modifier
+    @sql_engine
     def remove_txo(self, tx_hash: str) -> None:
         assert isinstance(tx_hash, str)
         self.txo.pop(tx_hash, None)
 
     @locked
+    @sql_engine
     def list_spent_outpoints(self) -> Sequence[Tuple[str, str]]:
         return [(h, n)
                 for h in self.spent_outpoints.keys()
                 for n in self.get_spent_outpoints(h)
         ]
 
-    @locked
+    @sql_engine
     def get_spent_outpoints(self, prevout_hash: str) -> Sequence[str]:
         assert isinstance(prevout_hash, str)
         return list(self.spent_outpoints.get(prevout_hash, {}).keys())
 
-    @locked
+    @sql_engine
     def get_spent_outpoint(self, prevout_hash: str, prevout_n: Union[int, str]) -> Optional[str]:
         assert isinstance(prevout_hash, str)
         prevout_n = str(prevout_n)
         return self.spent_outpoints.get(prevout_hash, {}).get(prevout_n)
 
     @modifier
+    @sql_engine
     def remove_spent_outpoint(self, prevout_hash: str, prevout_n: Union[int, str]) -> None:
         assert isinstance(prevout_hash, str)
         prevout_n = str(prevout_n)
@@ -874,6 +907,7 @@ class WalletDB(JsonDB):
             self.spent_outpoints.pop(prevout_hash)
 
     @modifier
+    @sql_engine
     def set_spent_outpoint(self, prevout_hash: str, prevout_n: Union[int, str], tx_hash: str) -> None:
         assert isinstance(prevout_hash, str)
         assert isinstance(tx_hash, str)
@@ -883,27 +917,37 @@ class WalletDB(JsonDB):
         self.spent_outpoints[prevout_hash][prevout_n] = tx_hash
 
     @modifier
+    @sql_engine
     def add_prevout_by_scripthash(self, scripthash: str, *, prevout: TxOutpoint, value: int) -> None:
         assert isinstance(scripthash, str)
         assert isinstance(prevout, TxOutpoint)
         assert isinstance(value, int)
-        if scripthash not in self._prevouts_by_scripthash:
-            self._prevouts_by_scripthash[scripthash] = set()
-        self._prevouts_by_scripthash[scripthash].add((prevout.to_str(), value))
+        prevouts = self._prevouts_by_scripthash.get(scripthash)
+        if prevouts is None:
+            self._prevouts_by_scripthash[scripthash] = {(prevout.to_str(), value)}
+        else:
+            # note: sets are updated in-place, the change must be journaled by hand
+            prevouts.add((prevout.to_str(), value))
+            self.add_pending_change(['prevouts_by_scripthash', scripthash])
 
     @modifier
+    @sql_engine
     def remove_prevout_by_scripthash(self, scripthash: str, *, prevout: TxOutpoint, value: int) -> None:
         assert isinstance(scripthash, str)
         assert isinstance(prevout, TxOutpoint)
         assert isinstance(value, int)
-        self._prevouts_by_scripthash[scripthash].discard((prevout.to_str(), value))
-        if not self._prevouts_by_scripthash[scripthash]:
+        prevouts = self._prevouts_by_scripthash[scripthash]
+        prevouts.discard((prevout.to_str(), value))
+        if prevouts:
+            self.add_pending_change(['prevouts_by_scripthash', scripthash])
+        else:
             self._prevouts_by_scripthash.pop(scripthash)
 
-    @locked
+    @sql_engine
     def get_prevouts_by_scripthash(self, scripthash: str) -> Set[Tuple[TxOutpoint, int]]:
         assert isinstance(scripthash, str)
-        prevouts_and_values = self._prevouts_by_scripthash.get(scripthash, set())
+        # copied at once, as the set is updated in-place by writers
+        prevouts_and_values = self._prevouts_by_scripthash.get(scripthash, set()).copy()
         return {(TxOutpoint.from_str(prevout), value) for prevout, value in prevouts_and_values}
 
     @modifier
@@ -915,61 +959,88 @@ class WalletDB(JsonDB):
             raise Exception("trying to add tx to db without txid")
         if tx_hash != tx.txid():
             raise Exception(f"trying to add tx to db with inconsistent txid: {tx_hash} != {tx.txid()}")
+        if self._sql_db is not None:
+            return self._sql_db.add_transaction(tx_hash, tx)
         # don't allow overwriting complete tx with partial tx
-        tx_we_already_have = self.transactions.get(tx_hash, None)
+        tx_we_already_have = self.get_transaction(tx_hash)
         if tx_we_already_have is None or isinstance(tx_we_already_have, PartialTransaction):
-            self.transactions[tx_hash] = tx
+            raw = tx.serialize()
+            self.transactions[tx_hash] = raw
+            self._tx_cache[tx_hash] = (raw, tx)
 
     @modifier
+    @sql_engine
     def remove_transaction(self, tx_hash: str) -> Optional[Transaction]:
         assert isinstance(tx_hash, str)
-        return self.transactions.pop(tx_hash, None)
+        tx = self.get_transaction(tx_hash)
+        self.transactions.pop(tx_hash, None)
+        self._tx_cache.pop(tx_hash)
+        return tx
 
-    @locked
+    @sql_engine
     def get_transaction(self, tx_hash: Optional[str]) -> Optional[Transaction]:
         if tx_hash is None:
             return None
         assert isinstance(tx_hash, str)
-        return self.transactions.get(tx_hash)
+        raw = self.transactions.get(tx_hash)
+        if raw is None:
+            return None
+        # raw txs are only deserialized when requested, and a bounded number
+        # of them is kept. The raw string is cached too, so that a concurrent
+        # reader cannot leave a stale entry behind after add_transaction.
+        cached = self._tx_cache.get(tx_hash)
+        if cached is not None and cached[0] == raw:
+            return cached[1]
+        # note: for performance, "deserialize=False" so that we will deserialize these on-demand
+        tx = tx_from_any(raw, deserialize=False)
+        self._tx_cache[tx_hash] = (raw, tx)
+        return tx
 
     @locked
+    @sql_engine
     def list_transactions(self) -> Sequence[str]:
         return list(self.transactions.keys())
 
     @locked
+    @sql_engine
     def get_history(self) -> Sequence[str]:
         return list(self.history.keys())
 
+    @sql_engine
     def is_addr_in_history(self, addr: str) -> bool:
         # does not mean history is non-empty!
         assert isinstance(addr, str)
         return addr in self.history
 
-    @locked
+    @sql_engine
     def get_addr_history(self, addr: str) -> Sequence[Tuple[str, int]]:
         assert isinstance(addr, str)
         return self.history.get(addr, [])
 
     @modifier
+    @sql_engine
     def set_addr_history(self, addr: str, hist) -> None:
         assert isinstance(addr, str)
         self.history[addr] = hist
 
     @modifier
+    @sql_engine
     def remove_addr_history(self, addr: str) -> None:
         assert isinstance(addr, str)
         self.history.pop(addr, None)
 
     @locked
+    @sql_engine
     def list_verified_tx(self) -> Sequence[str]:
         return list(self.verified_tx.keys())
 
-    @locked
+    @sql_engine
     def get_verified_tx(self, txid: str) -> Optional[TxMinedInfo]:
         assert isinstance(txid, str)
-        if txid not in self.verified_tx:
+        v = self.verified_tx.get(txid)
+        if v is None:
             return None
-        height, timestamp, txpos, header_hash = self.verified_tx[txid]
+        height, timestamp, txpos, header_hash = v
         return TxMinedInfo(height=height,
                            conf=None,
                            timestamp=timestamp,
@@ -977,16 +1048,19 @@ class WalletDB(JsonDB):
                            header_hash=header_hash)
 
     @modifier
+    @sql_engine
     def add_verified_tx(self, txid: str, info: TxMinedInfo):
         assert isinstance(txid, str)
         assert isinstance(info, TxMinedInfo)
         self.verified_tx[txid] = (info.height, info.timestamp, info.txpos, info.header_hash)
 
     @modifier
+    @sql_engine
     def remove_verified_tx(self, txid: str):
         assert isinstance(txid, str)
         self.verified_tx.pop(txid, None)
 
+    @sql_engine
     def is_in_verified_tx(self, txid: str) -> bool:
         assert isinstance(txid, str)
         return txid in self.verified_tx
@@ -1012,7 +1086,6 @@ class WalletDB(JsonDB):
             self.tx_fees[txid] = TxFeesValue()
         self.tx_fees[txid] = self.tx_fees[txid]._replace(fee=fee_sat, is_calculated_by_us=True)
 
-    @locked
     def get_tx_fee(self, txid: str, *, trust_server: bool = False) -> Optional[int]:
         assert isinstance(txid, str)
         """Returns tx_fee."""
@@ -1031,7 +1104,6 @@ class WalletDB(JsonDB):
             self.tx_fees[txid] = TxFeesValue()
         self.tx_fees[txid] = self.tx_fees[txid]._replace(num_inputs=num_inputs)
 
-    @locked
     def get_num_all_inputs_of_tx(self, txid: str) -> Optional[int]:
         assert isinstance(txid, str)
         tx_fees_value = self.tx_fees.get(txid)
@@ -1039,17 +1111,36 @@ class WalletDB(JsonDB):
             return None
         return tx_fees_value.num_inputs
 
-    @locked
+    @sql_engine
     def get_num_ismine_inputs_of_tx(self, txid: str) -> int:
         assert isinstance(txid, str)
         txins = self.txi.get(txid, {})
-        return sum([len(tupls) for addr, tupls in txins.items()])
+        return sum([len(tupls) for addr, tupls in txins.copy().items()])
 
     @modifier
     def remove_tx_fee(self, txid: str) -> None:
         assert isinstance(txid, str)
         self.tx_fees.pop(txid, None)
 
+    @modifier
+    def set_tx_delta(self, txid: str, delta: int) -> None:
+        assert isinstance(txid, str)
+        assert isinstance(delta, int)
+        self.tx_deltas[txid] = delta
+
+    @modifier
+    def remove_tx_delta(self, txid: str) -> None:
+        assert isinstance(txid, str)
+        self.tx_deltas.pop(txid, None)
+
+    def get_tx_delta(self, txid: str) -> Optional[int]:
+        assert isinstance(txid, str)
+        return self.tx_deltas.get(txid)
+
+    @locked
+    def get_tx_deltas(self) -> Dict[str, int]:
+        return dict(self.tx_deltas)
+
     @locked
     def get_dict(self, name):
         # Warning: interacts un-intuitively with 'put': certain parts
@@ -1090,7 +1181,6 @@ class WalletDB(JsonDB):
         self._addr_to_addr_index[addr] = (0, index)
         self.receiving_addresses.append(addr)
 
-    @locked
     def get_address_index(self, address: str) -> Optional[Sequence[int]]:
         assert isinstance(address, str)
         return self._addr_to_addr_index.get(address)
@@ -1152,13 +1242,19 @@ class WalletDB(JsonDB):
         self.txi = self.get_dict('txi')                          # type: Dict[str, Dict[str, Dict[str, int]]]
         # txid -> address -> output_index -> (value, is_coinbase)
         self.txo = self.get_dict('txo')                          # type: Dict[str, Dict[str, Dict[str, Tuple[int, bool]]]]
-        self.transactions = self.get_dict('transactions')        # type: Dict[str, Transaction]
+        self.transactions = self.get_dict('transactions')        # type: Dict[str, str]
         self.spent_outpoints = self.get_dict('spent_outpoints')  # txid -> output_index -> next_txid
         self.history = self.get_dict('addr_history')             # address -> list of (txid, height)
         self.verified_tx = self.get_dict('verified_tx3')         # txid -> (height, timestamp, txpos, header_hash)
         self.tx_fees = self.get_dict('tx_fees')                  # type: Dict[str, TxFeesValue]
+        self.tx_deltas = self.get_dict('tx_deltas')              # txid -> effect of tx on wallet balance
         # scripthash -> set of (outpoint, value)
         self._prevouts_by_scripthash = self.get_dict('prevouts_by_scripthash')  # type: Dict[str, Set[Tuple[str, int]]]
+        # the cleanup below scans the whole db, it only needs to run
+        # once after the db was written by another version
+        self._removed_unreferenced_txs = self.get('tx_cleanup_version') != FINAL_SEED_VERSION
+        if not self._removed_unreferenced_txs:
+            return
         # remove unreferenced tx
         for tx_hash in list(self.transactions.keys()):
             if not self.get_txi_addresses(tx_hash) and not self.get_txo_addresses(tx_hash):
@@ -1171,9 +1267,12 @@ class WalletDB(JsonDB):
                 if spending_txid not in self.transactions:
                     self.logger.info("removing unreferenced spent outpoint")
                     d.pop(prevout_n)
+        self.put('tx_cleanup_version', FINAL_SEED_VERSION)
 
     @modifier
     def clear_history(self):
+        if self._sql_db is not None:
+            self._sql_db.clear_history()
         self.txi.clear()
         self.txo.clear()
         self.spent_outpoints.clear()
@@ -1181,12 +1280,11 @@ class WalletDB(JsonDB):
         self.history.clear()
         self.verified_tx.clear()
         self.tx_fees.clear()
+        self.tx_deltas.clear()
         self._prevouts_by_scripthash.clear()
+        self._tx_cache.clear()
 
     def _convert_dict(self, path, key, v):
-        if key == 'transactions':
-            # note: for performance, "deserialize=False" so that we will deserialize these on-demand
-            v = dict((k, tx_from_any(x, deserialize=False)) for k, x in v.items())
         if key == 'invoices':
             v = dict((k, Invoice.from_json(x)) for k, x in v.items())
         if key == 'payment_requests':
@@ -1230,9 +1328,46 @@ class WalletDB(JsonDB):
         #     return
         if not self.modified():
             return
-        storage.write(self.dump())
+        if self._sql_db is not None:
+            self._sql_db.commit()
+        self.write_journal_or_dump(storage)
         self.set_modified(False)
 
+    def uses_sql_engine(self) -> bool:
+        return self._sql_db is not None
+
+    @modifier
+    def attach_sql_db(self, path: str) -> None:
+        """Move the transaction tables to the sqlite file at path.
+        Tables still present in the json data are imported first, so this
+        both converts a wallet and opens an already converted one.
+        Called from Abstract_Wallet.__init__, after upgrades."""
+        assert self._sql_db is None
+        sql_db = WalletSqlDB(path, self.lock, self._tx_cache)
+        if any(self.data.get(name) for name in SQL_TABLES):
+            self.logger.info(f"importing wallet history into {path}")
+            sql_db.import_tables(self.data)
+        if self._removed_unreferenced_txs:
+            sql_db.remove_unreferenced()
+        sql_db.commit()
+        self._sql_db = sql_db
+        for name in SQL_TABLES:
+            self.data.pop(name, None)
+        # drop the references set in _load_transactions, so that the
+        # history is not kept in memory twice and cannot be read stale
+        self.txi = {}
+        self.txo = {}
+        self.transactions = {}
+        self.spent_outpoints = {}
+        self.history = {}
+        self.verified_tx = {}
+        self._prevouts_by_scripthash = {}
+        self.put('db_engine', 'sqlite')
+
+    def close_sql_db(self) -> None:
+        if self._sql_db is not None:
+            self._sql_db.close()
+
     def is_ready_to_be_used_by_wallet(self):
         return not self.requires_upgrade() and self._called_after_upgrade_tasks
 
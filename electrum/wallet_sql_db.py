@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+#
+# Electrum - lightweight Bitcoin client
+# Copyright (C) 2020 The Electrum Developers
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import sqlite3
+import threading
+from typing import Dict, Optional, List, Tuple, Set, Iterable, Sequence, Union
+
+from .util import TxMinedInfo, LRUCache
+from .transaction import Transaction, TxOutpoint, tx_from_any, PartialTransaction
+from .logging import Logger
+
+
+# names of the WalletDB json dicts that live in sqlite with this engine
+SQL_TABLES = ('txi', 'txo', 'transactions', 'spent_outpoints', 'addr_history',
+              'verified_tx3', 'prevouts_by_scripthash')
+
+create_txi = """
+CREATE TABLE IF NOT EXISTS txi (
+txid VARCHAR(64) NOT NULL,
+address VARCHAR NOT NULL,
+prevout VARCHAR NOT NULL,
+value INTEGER NOT NULL,
+PRIMARY KEY(txid, address, prevout)
+)"""
+
+create_txo = """
+CREATE TABLE IF NOT EXISTS txo (
+txid VARCHAR(64) NOT NULL,
+address VARCHAR NOT NULL,
+n INTEGER NOT NULL,
+value INTEGER NOT NULL,
+is_coinbase BOOLEAN NOT NULL,
+PRIMARY KEY(txid, address, n)
+)"""
+
+create_transactions = """
+CREATE TABLE IF NOT EXISTS transactions (
+txid VARCHAR(64) NOT NULL,
+raw VARCHAR NOT NULL,
+PRIMARY KEY(txid)
+)"""
+
+create_spent_outpoints = """
+CREATE TABLE IF NOT EXISTS spent_outpoints (
+prevout_hash VARCHAR(64) NOT NULL,
+prevout_n VARCHAR NOT NULL,
+spending_txid VARCHAR(64) NOT NULL,
+PRIMARY KEY(prevout_hash, prevout_n)
+)"""
+
+create_addr_history = """
+CREATE TABLE IF NOT EXISTS addr_history (
+address VARCHAR NOT NULL,
+history VARCHAR NOT NULL,
+PRIMARY KEY(address)
+)"""
+
+create_verified_tx = """
+CREATE TABLE IF NOT EXISTS verified_tx (
+txid VARCHAR(64) NOT NULL,
+height INTEGER NOT NULL,
+timestamp INTEGER,
+txpos INTEGER,
+header_hash VARCHAR(64),
+PRIMARY KEY(txid)
+)"""
+
+create_prevouts_by_scripthash = """
+CREATE TABLE IF NOT EXISTS prevouts_by_scripthash (
+scripthash VARCHAR(64) NOT NULL,
+prevout VARCHAR NOT NULL,
+value INTEGER NOT NULL,
+PRIMARY KEY(scripthash, prevout, value)
+)"""
+
+create_indexes = [
+    "CREATE INDEX IF NOT EXISTS txi_address ON txi (address)",
+    "CREATE INDEX IF NOT EXISTS txo_address ON txo (address)",
+    "CREATE INDEX IF NOT EXISTS spent_outpoints_spending_txid ON spent_outpoints (spending_txid)",
+    "CREATE INDEX IF NOT EXISTS prevouts_by_scripthash_prevout ON prevouts_by_scripthash (prevout)",
+]
+
+
+class WalletSqlDB(Logger):
+    """SQLite engine for the transaction tables of a WalletDB.
+
+    The methods have the same names and signatures as the WalletDB
+    methods they replace, see WalletDB.attach_sql_db. Unlike SqlDB,
+    calls are synchronous: WalletDB is used from several threads without
+    an event loop, so the connection is shared and serialized on the
+    WalletDB lock. Changes are committed when the wallet file is written.
+
+    Note: the _convert_version_* upgrades run on the json dicts, before
+    they are imported here; a future upgrade touching these tables also
+    needs an sql counterpart.
+    """
+
+    def __init__(self, path: str, lock: threading.RLock, tx_cache: LRUCache):
+        Logger.__init__(self)
+        self.path = path
+        self.lock = lock
+        self._tx_cache = tx_cache  # shared with WalletDB, txid -> (raw_tx, tx)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.create_database()
+
+    def create_database(self):
+        c = self.conn.cursor()
+        for create in (create_txi, create_txo, create_transactions, create_spent_outpoints,
+                       create_addr_history, create_verified_tx, create_prevouts_by_scripthash):
+            c.execute(create)
+        for create in create_indexes:
+            c.execute(create)
+        self.conn.commit()
+
+    def _execute(self, query: str, args: tuple = ()) -> list:
+        with self.lock:
+            c = self.conn.cursor()
+            c.execute(query, args)
+            return c.fetchall()
+
+    def commit(self) -> None:
+        with self.lock:
+            self.conn.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def import_tables(self, data: dict) -> None:
+        """Migrate the tables from WalletDB json data (after upgrades)."""
+        with self.lock:
+            c = self.conn.cursor()
+            # start from scratch, in case an earlier migration was interrupted
+            for table in ('txi', 'txo', 'transactions', 'spent_outpoints',
+                          'addr_history', 'verified_tx', 'prevouts_by_scripthash'):
+                c.execute(f"DELETE FROM {table}")
+            c.executemany(
+                "INSERT INTO txi (txid, address, prevout, value) VALUES (?,?,?,?)",
+                ((txid, addr, ser, v)
+                 for txid, d in data.get('txi', {}).items()
+                 for addr, d2 in d.items()
+                 for ser, v in d2.items()))
+            c.executemany(
+                "INSERT INTO txo (txid, address, n, value, is_coinbase) VALUES (?,?,?,?,?)",
+                ((txid, addr, int(n), v, bool(cb))
+                 for txid, d in data.get('txo', {}).items()
+                 for addr, d2 in d.items()
+                 for n, (v, cb) in d2.items()))
+            c.executemany(
+                "INSERT INTO transactions (txid, raw) VALUES (?,?)",
+                data.get('transactions', {}).items())
+            c.executemany(
+                "INSERT INTO spent_outpoints (prevout_hash, prevout_n, spending_txid) VALUES (?,?,?)",
+                ((h, n, txid)
+                 for h, d in data.get('spent_outpoints', {}).items()
+                 for n, txid in d.items()))
+            c.executemany(
+                "INSERT INTO addr_history (address, history) VALUES (?,?)",
+                ((addr, json.dumps(hist))
+                 for addr, hist in data.get('addr_history', {}).items()))
+            c.executemany(
+                "INSERT INTO verified_tx (txid, height, timestamp, txpos, header_hash) VALUES (?,?,?,?,?)",
+                ((txid, *v) for txid, v in data.get('verified_tx3', {}).items()))
+            c.executemany(
+                "INSERT OR IGNORE INTO prevouts_by_scripthash (scripthash, prevout, value) VALUES (?,?,?)",
+                ((sh, prevout, value)
+                 for sh, s in data.get('prevouts_by_scripthash', {}).items()
+                 for prevout, value in s))
+            self.conn.commit()
+
+    def get_txi_addresses(self, tx_hash: str) -> List[str]:
+        r = self._execute("SELECT DISTINCT address FROM txi WHERE txid=?", (tx_hash,))
+        return [x[0] for x in r]
+
+    def get_txo_addresses(self, tx_hash: str) -> List[str]:
+        r = self._execute("SELECT DISTINCT address FROM txo WHERE txid=?", (tx_hash,))
+        return [x[0] for x in r]
+
+    def get_txi_addr(self, tx_hash: str, address: str) -> Iterable[Tuple[str, int]]:
+        return self._execute("SELECT prevout, value FROM txi WHERE txid=? AND address=?", (tx_hash, address))
+
+    def get_txo_addr(self, tx_hash: str, address: str) -> Iterable[Tuple[int, int, bool]]:
+        r = self._execute("SELECT n, value, is_coinbase FROM txo WHERE txid=? AND address=?", (tx_hash, address))
+        return [(n, v, bool(cb)) for n, v, cb in r]
+
+    def add_txi_addr(self, tx_hash: str, addr: str, ser: str, v: int) -> None:
+        self._execute("INSERT OR REPLACE INTO txi (txid, address, prevout, value) VALUES (?,?,?,?)",
+                      (tx_hash, addr, ser, v))
+
+    def add_txo_addr(self, tx_hash: str, addr: str, n: Union[int, str], v: int, is_coinbase: bool) -> None:
+        self._execute("INSERT OR REPLACE INTO txo (txid, address, n, value, is_coinbase) VALUES (?,?,?,?,?)",
+                      (tx_hash, addr, int(n), v, is_coinbase))
+
+    def list_txi(self) -> Sequence[str]:
+        return [x[0] for x in self._execute("SELECT DISTINCT txid FROM txi")]
+
+    def list_txo(self) -> Sequence[str]:
+        return [x[0] for x in self._execute("SELECT DISTINCT txid FROM txo")]
+
+    def remove_txi(self, tx_hash: str) -> None:
+        self._execute("DELETE FROM txi WHERE txid=?", (tx_hash,))
+
+    def remove_txo(self, tx_hash: str) -> None:
+        self._execute("DELETE FROM txo WHERE txid=?", (tx_hash,))
+
+    def list_spent_outpoints(self) -> Sequence[Tuple[str, str]]:
+        return self._execute("SELECT prevout_hash, prevout_n FROM spent_outpoints")
+
+    def get_spent_outpoints(self, prevout_hash: str) -> Sequence[str]:
+        r = self._execute("SELECT prevout_n FROM spent_outpoints WHERE prevout_hash=?", (prevout_hash,))
+        return [x[0] for x in r]
+
+    def get_spent_outpoint(self, prevout_hash: str, prevout_n: Union[int, str]) -> Optional[str]:
+        r = self._execute("SELECT spending_txid FROM spent_outpoints WHERE prevout_hash=? AND prevout_n=?",
+                          (prevout_hash, str(prevout_n)))
+        return r[0][0] if r else None
+
+    def remove_spent_outpoint(self, prevout_hash: str, prevout_n: Union[int, str]) -> None:
+        self._execute("DELETE FROM spent_outpoints WHERE prevout_hash=? AND prevout_n=?",
+                      (prevout_hash, str(prevout_n)))
+
+    def set_spent_outpoint(self, prevout_hash: str, prevout_n: Union[int, str], tx_hash: str) -> None:
+        self._execute("INSERT OR REPLACE INTO spent_outpoints (prevout_hash, prevout_n, spending_txid) VALUES (?,?,?)",
+                      (prevout_hash, str(prevout_n), tx_hash))
+
+    def add_prevout_by_scripthash(self, scripthash: str, *, prevout: TxOutpoint, value: int) -> None:
+        self._execute("INSERT OR IGNORE INTO prevouts_by_scripthash (scripthash, prevout, value) VALUES (?,?,?)",
+                      (scripthash, prevout.to_str(), value))
+
+    def remove_prevout_by_scripthash(self, scripthash: str, *, prevout: TxOutpoint, value: int) -> None:
+        self._execute("DELETE FROM prevouts_by_scripthash WHERE scripthash=? AND prevout=? AND value=?",
+                      (scripthash, prevout.to_str(), value))
+
+    def get_prevouts_by_scripthash(self, scripthash: str) -> Set[Tuple[TxOutpoint, int]]:
+        r = self._execute("SELECT prevout, value FROM prevouts_by_scripthash WHERE scripthash=?", (scripthash,))
+        return {(TxOutpoint.from_str(prevout), value) for prevout, value in r}
+
+    def add_transaction(self, tx_hash: str, tx: Transaction) -> None:
+        # don't allow overwriting complete tx with partial tx
+        with self.lock:
+            tx_we_already_have = self.get_transaction(tx_hash)
+            if tx_we_already_have is None or isinstance(tx_we_already_have, PartialTransaction):
+                raw = tx.serialize()
+                self._execute("INSERT OR REPLACE INTO transactions (txid, raw) VALUES (?,?)", (tx_hash, raw))
+                self._tx_cache[tx_hash] = (raw, tx)
+
+    def remove_transaction(self, tx_hash: str) -> Optional[Transaction]:
+        with self.lock:
+            tx = self.get_transaction(tx_hash)
+            self._execute("DELETE FROM transactions WHERE txid=?", (tx_hash,))
+            self._tx_cache.pop(tx_hash)
+            return tx
+
+    def get_transaction(self, tx_hash: Optional[str]) -> Optional[Transaction]:
+        if tx_hash is None:
+            return None
+        r = self._execute("SELECT raw FROM transactions WHERE txid=?", (tx_hash,))
+        if not r:
+            return None
+        raw = r[0][0]
+        cached = self._tx_cache.get(tx_hash)
+        if cached is not None and cached[0] == raw:
+            return cached[1]
+        tx = tx_from_any(raw, deserialize=False)
+        self._tx_cache[tx_hash] = (raw, tx)
+        return tx
+
+    def list_transactions(self) -> Sequence[str]:
+        return [x[0] for x in self._execute("SELECT txid FROM transactions")]
+
+    def get_history(self) -> Sequence[str]:
+        return [x[0] for x in self._execute("SELECT address FROM addr_history")]
+
+    def is_addr_in_history(self, addr: str) -> bool:
+        return bool(self._execute("SELECT 1 FROM addr_history WHERE address=?", (addr,)))
+
+    def get_addr_history(self, addr: str) -> Sequence[Tuple[str, int]]:
+        r = self._execute("SELECT history FROM addr_history WHERE address=?", (addr,))
+        return json.loads(r[0][0]) if r else []
+
+    def set_addr_history(self, addr: str, hist) -> None:
+        self._execute("INSERT OR REPLACE INTO addr_history (address, history) VALUES (?,?)",
+                      (addr, json.dumps(hist)))
+
+    def remove_addr_history(self, addr: str) -> None:
+        self._execute("DELETE FROM addr_history WHERE address=?", (addr,))
+
+    def list_verified_tx(self) -> Sequence[str]:
+        return [x[0] for x in self._execute("SELECT txid FROM verified_tx")]
+
+    def get_verified_tx(self, txid: str) -> Optional[TxMinedInfo]:
+        r = self._execute("SELECT height, timestamp, txpos, header_hash FROM verified_tx WHERE txid=?", (txid,))
+        if not r:
+            return None
+        height, timestamp, txpos, header_hash = r[0]
+        return TxMinedInfo(height=height,
+                           conf=None,
+                           timestamp=timestamp,
+                           txpos=txpos,
+                           header_hash=header_hash)
+
+    def add_verified_tx(self, txid: str, info: TxMinedInfo):
+        self._execute("INSERT OR REPLACE INTO verified_tx (txid, height, timestamp, txpos, header_hash) VALUES (?,?,?,?,?)",
+                      (txid, info.height, info.timestamp, info.txpos, info.header_hash))
+
+    def remove_verified_tx(self, txid: str):
+        self._execute("DELETE FROM verified_tx WHERE txid=?", (txid,))
+
+    def is_in_verified_tx(self, txid: str) -> bool:
+        return bool(self._execute("SELECT 1 FROM verified_tx WHERE txid=?", (txid,)))
+
+    def get_num_ismine_inputs_of_tx(self, txid: str) -> int:
+        return self._execute("SELECT count(*) FROM txi WHERE txid=?", (txid,))[0][0]
+
+    def remove_unreferenced(self) -> None:
+        """Same cleanup as WalletDB._load_transactions, done in sql."""
+        self._execute("DELETE FROM transactions WHERE txid NOT IN "
+                      "(SELECT txid FROM txi UNION SELECT txid FROM txo)")
+        self._execute("DELETE FROM spent_outpoints WHERE spending_txid NOT IN "
+                      "(SELECT txid FROM transactions)")
+
+    def clear_history(self) -> None:
+        self._tx_cache.clear()
+        with self.lock:
+            for table in ('txi', 'txo', 'transactions', 'spent_outpoints',
+                          'addr_history', 'verified_tx', 'prevouts_by_scripthash'):
+                self._execute(f"DELETE FROM {table}")
@@ -0,0 +1,61 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Coroutine, List, Optional
+
+_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="aio-worker")
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the event loop shared by the async clients, running in a daemon thread
+    """
+    global _loop, _loop_thread
+
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="aio-loop", daemon=True)
+            _loop_thread.start()
+
+        return _loop
+
+
+def run_sync(coro: Coroutine, timeout: float = None) -> Any:
+    """
+    Run a coroutine on the shared event loop and wait for its result, for sync callers
+    """
+    loop = get_event_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_sync must not be called from the shared event loop")
+
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+
+async def run_in_thread(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run a blocking function in a worker thread
+    """
+    return await asyncio.get_event_loop().run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def gather(awaitables: List[Awaitable], max_concurrency: int = None) -> List[Any]:
+    """
+    Await all in parallel, with at most max_concurrency of them running at once.
+    Results are in order, an exception raised by one takes its place in the results.
+    """
+    if max_concurrency:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _bounded(aw):
+            async with semaphore:
+                return await aw
+
+        awaitables = [_bounded(i) for i in awaitables]
+
+    return list(await asyncio.gather(*awaitables, return_exceptions=True))
@@ -0,0 +1,58 @@
+from typing import Any, List, Tuple, Union
+
+from electrum_gui.common.basic.request.async_restful import AsyncRestfulRequest
+from electrum_gui.common.basic.request.exceptions import JsonRPCException, RequestException
+from electrum_gui.common.basic.request.interfaces import AsyncJsonRPCInterface
+from electrum_gui.common.basic.request.json_rpc import JsonRPCRequest
+
+
+class AsyncJsonRPCRequest(AsyncJsonRPCInterface):
+    def __init__(
+        self,
+        url: str,
+        timeout: int = 30,  # in seconds
+        debug_mode: bool = False,
+        headers: dict = None,
+    ):
+        self.inner = AsyncRestfulRequest(
+            base_url=url,
+            timeout=timeout,
+            response_jsonlize=True,
+            debug_mode=debug_mode,
+            headers=headers,
+        )
+
+    async def call(
+        self,
+        method: str,
+        params: Union[list, dict] = None,
+        headers: dict = None,
+        timeout: int = None,
+        path: str = "",
+        **kwargs,
+    ) -> Any:
+        payload = JsonRPCRequest.normalize_params(method, params)
+        try:
+            resp = await self.inner.post(path, json=payload, timeout=timeout, headers=headers, **kwargs)
+        except RequestException:
+            raise JsonRPCException("Json RPC call failed.")
+        return JsonRPCRequest.parse_response(resp)
+
+    async def batch_call(
+        self,
+        calls: List[Tuple[str, Union[list, dict]]],
+        ignore_errors: bool = False,
+        headers: dict = None,
+        timeout: int = None,
+        path: str = "",
+        **kwargs,
+    ) -> List[Any]:
+        payload = [
+            JsonRPCRequest.normalize_params(method, params, order_id=order_id)
+            for order_id, (method, params) in enumerate(calls)
+        ]
+        try:
+            resp = await self.inner.post(path, json=payload, timeout=timeout, headers=headers, **kwargs)
+        except RequestException:
+            raise JsonRPCException("Json RPC call failed.")
+        return JsonRPCRequest.parse_batch_response(resp, len(calls), ignore_errors=ignore_errors)
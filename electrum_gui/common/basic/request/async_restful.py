@@ -0,0 +1,193 @@
+import asyncio
+import json as json_lib
+import random
+import time
+from typing import Any, Dict, Tuple
+from urllib.parse import urljoin
+
+import aiohttp
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from electrum_gui.common.basic.request import exceptions, stats
+from electrum_gui.common.basic.request.enums import Method
+from electrum_gui.common.basic.request.interfaces import AsyncRestfulInterface
+
+
+class AsyncRestfulRequest(AsyncRestfulInterface):
+    """
+    aiohttp counterpart of RestfulRequest, with the same pooling, retry policy and statistics
+    """
+
+    __DEFAULT_HEADER__ = {"User-Agent": "Electrum"}
+    __IDEMPOTENT_METHODS__ = frozenset(["GET", "HEAD", "OPTIONS"])
+    __RETRY_STATUS_CODES__ = frozenset([429, 500, 502, 503, 504])
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: int = 30,  # in seconds
+        response_jsonlize: bool = True,
+        debug_mode: bool = False,
+        connect_timeout: float = None,  # in seconds, defaults to timeout
+        pool_maxsize: int = 10,  # connections kept alive per host
+        max_retries: int = 2,
+        backoff_factor: float = 0.3,  # in seconds
+        headers: dict = None,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.response_jsonlize = response_jsonlize
+        self.debug_mode = debug_mode
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.headers = dict(self.__DEFAULT_HEADER__, **(headers or {}))
+        self._sessions: Dict[asyncio.AbstractEventLoop, Tuple[aiohttp.ClientSession, asyncio.Task]] = {}
+
+    def __str__(self):
+        return (
+            f"base_url: {self.base_url}, "
+            f"timeout: {self.timeout}, "
+            f"response_jsonlize: {self.response_jsonlize}, "
+            f"debug_mode: {self.debug_mode}"
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # aiohttp sessions are bound to the event loop they are created on
+        loop = asyncio.get_event_loop()
+        session, _ = self._sessions.get(loop, (None, None))
+
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.pool_maxsize)
+            session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+            self._sessions[loop] = (session, loop.create_task(self._close_on_shutdown(loop, session)))
+
+        return session
+
+    async def _close_on_shutdown(self, loop: asyncio.AbstractEventLoop, session: aiohttp.ClientSession):
+        # pending tasks are cancelled when the loop shuts down, see asyncio.run
+        try:
+            await loop.create_future()
+        finally:
+            if self._sessions.get(loop, (None, None))[0] is session:
+                self._sessions.pop(loop)
+            await session.close()
+
+    async def close(self):
+        current_loop = asyncio.get_event_loop()
+        sessions, self._sessions = self._sessions, {}
+        for loop, (session, closer) in sessions.items():
+            if loop is current_loop:
+                closer.cancel()
+                await session.close()
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(closer.cancel)
+
+    def _get_backoff_time(self, retry_count: int) -> float:
+        return random.uniform(0, self.backoff_factor * (2 ** retry_count))
+
+    async def request(
+        self,
+        method: Method,
+        path: str,
+        params: Any = None,
+        data: Any = None,
+        json: Any = None,
+        headers: dict = None,
+        timeout: int = None,
+        **kwargs,
+    ) -> Any:
+        url = urljoin(self.base_url, path)
+        method = method.as_str()
+        timeout = aiohttp.ClientTimeout(total=timeout or self.timeout, connect=self.connect_timeout)
+        endpoint = f"{method} {self.base_url}"
+        args_str = (
+            f"url: {url}, "
+            f"method: {method}, "
+            f"params: {params}, "
+            f"data: {data}, "
+            f"json: {json}, "
+            f"headers: {headers}, "
+            f"timeout: {timeout.total}, "
+            f"others: {kwargs}, "
+            f"restful_instance: <{self}>"
+        )
+        is_idempotent = method in self.__IDEMPOTENT_METHODS__
+
+        start_time = time.monotonic()
+        retry_count = 0
+        while True:
+            try:
+                self.print_if_debug(f"Start requesting. {args_str}")
+
+                async with self.session.request(
+                    method,
+                    url,
+                    params=params,
+                    data=data,
+                    json=json,
+                    headers=headers,
+                    timeout=timeout,
+                    **kwargs,
+                ) as response:
+                    content = await response.read()
+                    text = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # nothing was sent if the connection could not be made, so that is retried whatever the method,
+                # other errors may happen after the server got the request, so only idempotent requests are retried
+                is_retryable = is_idempotent or isinstance(e, aiohttp.ClientConnectorError)
+                if is_retryable and retry_count < self.max_retries:
+                    await asyncio.sleep(self._get_backoff_time(retry_count))
+                    retry_count += 1
+                    continue
+
+                stats.record(endpoint, time.monotonic() - start_time, is_error=True)
+                self.print_if_debug(f"Error in sending a request. {args_str}, exception: {e}")
+                raise exceptions.RequestException()
+
+            if is_idempotent and response.status in self.__RETRY_STATUS_CODES__ and retry_count < self.max_retries:
+                await asyncio.sleep(self._get_backoff_time(retry_count))
+                retry_count += 1
+                continue
+
+            break
+
+        is_ok = response.status < 400
+        stats.record(endpoint, time.monotonic() - start_time, is_error=not is_ok)
+        if not is_ok:
+            message = (
+                f"Something wrong in response. {args_str}, "
+                f"status_code: {response.status}, "
+                f"response_text: {text}"
+            )
+            self.print_if_debug(message)
+            raise exceptions.ResponseException(message, response=self._as_requests_response(response, content))
+
+        if not self.response_jsonlize:
+            return text
+
+        try:
+            return json_lib.loads(text)
+        except ValueError as e:
+            message = f"Error in parse response to json. {args_str}, " f"response_text: {text}, exception: {e}"
+            self.print_if_debug(message)
+            raise exceptions.ResponseException(message, response=self._as_requests_response(response, content))
+
+    @staticmethod
+    def _as_requests_response(response: aiohttp.ClientResponse, content: bytes) -> requests.Response:
+        # ResponseException holds a requests.Response, callers read its text and json
+        resp = requests.Response()
+        resp.status_code = response.status
+        resp.reason = response.reason
+        resp.url = str(response.url)
+        resp.headers = CaseInsensitiveDict(response.headers)
+        resp.encoding = response.get_encoding()
+        resp._content = content
+        return resp
+
+    def print_if_debug(self, message: str):
+        if self.debug_mode and message:
+            print(message)
@@ -104,3 +104,70 @@ class JsonRPCInterface(ABC):
         :param path: target path, optional
         :return: Response object or list of results
         """
+
+
+class AsyncRestfulInterface(ABC):
+    async def get(self, path: str, params: Any = None, headers: dict = None, timeout: int = None, **kwargs) -> Any:
+        """
+        GET a request, see RestfulInterface.get
+        """
+        return await self.request(
+            method=Method.GET, path=path, params=params, headers=headers, timeout=timeout, **kwargs
+        )
+
+    async def post(
+        self, path: str, data: Any = None, json: Any = None, headers: dict = None, timeout: int = None, **kwargs
+    ) -> Any:
+        """
+        POST a request, see RestfulInterface.post
+        """
+        return await self.request(
+            method=Method.POST, path=path, data=data, json=json, headers=headers, timeout=timeout, **kwargs
+        )
+
+    @abstractmethod
+    async def request(
+        self,
+        method: Method,
+        path: str,
+        params: Any = None,
+        data: Any = None,
+        json: Any = None,
+        headers: dict = None,
+        timeout: int = None,
+        **kwargs
+    ) -> Any:
+        """
+        Send a request, see RestfulInterface.request
+        :return: json object or the response body in str
+        """
+
+
+class AsyncJsonRPCInterface(ABC):
+    @abstractmethod
+    async def call(
+        self,
+        method: str,
+        params: Union[list, dict] = None,
+        headers: dict = None,
+        timeout: int = None,
+        path: str = "",
+        **kwargs
+    ) -> Any:
+        """
+        Call to server, see JsonRPCInterface.call
+        """
+
+    @abstractmethod
+    async def batch_call(
+        self,
+        calls: List[Tuple[str, Union[list, dict]]],
+        ignore_errors: bool = False,
+        headers: dict = None,
+        timeout: int = None,
+        path: str = "",
+        **kwargs
+    ) -> List[Any]:
+        """
+        Batch call to server, see JsonRPCInterface.batch_call
+        """
@@ -55,17 +55,24 @@ class JsonRPCRequest(JsonRPCInterface):
             resp = self.inner.post(path, json=payload, timeout=timeout, headers=headers, **kwargs)
         except RequestException:
             raise JsonRPCException("Json RPC call failed.")
+        return self.parse_batch_response(resp, len(calls), ignore_errors=ignore_errors)
 
-        if not isinstance(resp, list):
-            raise JsonRPCException(f"Responses of batch call should be a list, but got <{resp}>", json_response=resp)
-        elif len(resp) != len(calls):
-            raise JsonRPCException(f"Batch with {len(calls)} calls, but got {len(resp)} responses", json_response=resp)
+    @classmethod
+    def parse_batch_response(cls, response: Any, calls_count: int, ignore_errors: bool = False) -> List[Any]:
+        if not isinstance(response, list):
+            raise JsonRPCException(
+                f"Responses of batch call should be a list, but got <{response}>", json_response=response
+            )
+        elif len(response) != calls_count:
+            raise JsonRPCException(
+                f"Batch with {calls_count} calls, but got {len(response)} responses", json_response=response
+            )
         else:
-            resp = sorted(resp, key=lambda i: int(i.get("id", 0)))
+            response = sorted(response, key=lambda i: int(i.get("id", 0)))
             results = []
-            for single_resp in resp:
+            for single_resp in response:
                 try:
-                    results.append(self.parse_response(single_resp))
+                    results.append(cls.parse_response(single_resp))
                 except JsonRPCException as e:
                     if ignore_errors:
                         results.append(None)
@@ -1,15 +1,27 @@
+import random
+import time
 from typing import Any, Callable, Union
 from urllib.parse import urljoin
 
 from requests import RequestException, Response, Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from electrum_gui.common.basic.request import exceptions
+from electrum_gui.common.basic.request import exceptions, stats
 from electrum_gui.common.basic.request.enums import Method
 from electrum_gui.common.basic.request.interfaces import RestfulInterface
 
 
+class JitteredRetry(Retry):
+    def get_backoff_time(self) -> float:
+        # "full jitter", so that requests failing together do not retry together
+        return random.uniform(0, super(JitteredRetry, self).get_backoff_time())
+
+
 class RestfulRequest(RestfulInterface):
     __DEFAULT_HEADER__ = {"User-Agent": "Electrum"}
+    __IDEMPOTENT_METHODS__ = frozenset(["GET", "HEAD", "OPTIONS"])
+    __RETRY_STATUS_CODES__ = frozenset([429, 500, 502, 503, 504])
 
     def __init__(
         self,
@@ -18,20 +30,41 @@ class RestfulRequest(RestfulInterface):
         response_jsonlize: bool = True,
         debug_mode: bool = False,
         session_initializer: Callable[[Session], None] = None,
+        connect_timeout: float = None,  # in seconds, defaults to timeout
+        pool_maxsize: int = 10,  # connections kept alive per host
+        max_retries: int = 2,
+        backoff_factor: float = 0.3,  # in seconds
     ):
         self.base_url = base_url
         self.timeout = timeout
+        self.connect_timeout = connect_timeout
         self.response_jsonlize = response_jsonlize
         self.debug_mode = debug_mode
-        self.session = self._new_session()
+        self.session = self._new_session(pool_maxsize, max_retries, backoff_factor)
 
         if session_initializer:
             session_initializer(self.session)
 
     @classmethod
-    def _new_session(cls):
+    def _new_session(cls, pool_maxsize: int = 10, max_retries: int = 2, backoff_factor: float = 0.3):
         session = Session()
         session.headers.update(cls.__DEFAULT_HEADER__)
+
+        # Connection errors are retried for any method, as nothing was sent yet,
+        # while read errors and error responses are only retried for idempotent methods.
+        retry = JitteredRetry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=cls.__RETRY_STATUS_CODES__,
+            allowed_methods=cls.__IDEMPOTENT_METHODS__,
+            raise_on_status=False,  # return the last response, handled as any error response
+            respect_retry_after_header=False,  # keep the delay bounded
+        )
+        # The pool does not block when full, as requests gives no way to bound that wait:
+        # extra connections are opened for bursts of requests and discarded afterwards.
+        adapter = HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
         return session
 
     def __str__(self):
@@ -56,6 +89,9 @@ class RestfulRequest(RestfulInterface):
         url = urljoin(self.base_url, path)
         method = method.as_str()
         timeout = timeout or self.timeout
+        if self.connect_timeout:
+            timeout = (self.connect_timeout, timeout)
+        endpoint = f"{method} {self.base_url}"
         args_str = (
             f"url: {url}, "
             f"method: {method}, "
@@ -68,6 +104,7 @@ class RestfulRequest(RestfulInterface):
             f"restful_instance: <{self}>"
         )
 
+        start_time = time.monotonic()
         try:
             self.print_if_debug(f"Start requesting. {args_str}")
 
@@ -82,9 +119,11 @@ class RestfulRequest(RestfulInterface):
                 **kwargs,
             )
         except RequestException as e:
+            stats.record(endpoint, time.monotonic() - start_time, is_error=True)
             self.print_if_debug(f"Error in sending a request. {args_str}, exception: {e}")
             raise exceptions.RequestException()
 
+        stats.record(endpoint, time.monotonic() - start_time, is_error=not response.ok)
         if not response.ok:
             message = (
                 f"Something wrong in response. {args_str}, "
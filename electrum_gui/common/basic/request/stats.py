@@ -0,0 +1,47 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict
+
+from electrum_gui.common.basic.dataclass.dataclass import DataClassMixin
+
+
+@dataclass
+class EndpointStats(DataClassMixin):
+    requests: int = 0
+    errors: int = 0  # failed requests and error responses, after retries
+    total_latency: float = 0  # in seconds, retries included
+    max_latency: float = 0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.requests if self.requests else 0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0
+
+
+_LOCK = threading.Lock()
+_STATS: Dict[str, EndpointStats] = {}
+
+
+def record(endpoint: str, latency: float, is_error: bool):
+    with _LOCK:
+        stats = _STATS.get(endpoint)
+        if stats is None:
+            stats = _STATS[endpoint] = EndpointStats()
+
+        stats.requests += 1
+        stats.errors += int(is_error)
+        stats.total_latency += latency
+        stats.max_latency = max(stats.max_latency, latency)
+
+
+def get_stats() -> Dict[str, EndpointStats]:
+    with _LOCK:
+        return {endpoint: stats.clone() for endpoint, stats in _STATS.items()}
+
+
+def reset():
+    with _LOCK:
+        _STATS.clear()
@@ -32,14 +32,13 @@ def _extract_price_from_resp(resp: str) -> int:
 
 
 def _obtain_prices_from_dex(
+    client: geth_client.Geth,
     chain: coin_data.ChainInfo,
     router_address: str,
     base_divisor: int,
     coins: List[Tuple[coin_data.CoinInfo, int]],
     call_data: List[str],
 ) -> Iterable[data.YieldedPrice]:
-    client = provider_manager.get_client_by_chain(chain.chain_code, instance_required=geth_client.Geth)
-
     resp_iterator = iter(client.call_contract(router_address, call_data))
     for coin, paths_count in coins:
         price = (
@@ -57,8 +56,18 @@ def _obtain_prices_from_dex(
     yield from tuple()
 
 
+def _yield_prices(prices: List[data.YieldedPrice], dex_requests: List[tuple]) -> Iterable[data.YieldedPrice]:
+    yield from prices
+    for dex_request in dex_requests:
+        yield from _obtain_prices_from_dex(*dex_request)
+
+
 class Uniswap(interfaces.PriceChannelInterface):
     def pricing(self, coins: Iterable[coin_data.CoinInfo]) -> Iterable[data.YieldedPrice]:
+        # Chains and clients are resolved eagerly, only the contract calls are left to the returned iterable
+        prices = []
+        dex_requests = []
+
         coins = sorted(coins, key=operator.attrgetter("chain_code"))
         for chain_code, coins_on_chain in itertools.groupby(coins, operator.attrgetter("chain_code")):
             chain = coin_manager.get_chain_info(chain_code)
@@ -81,11 +90,14 @@ class Uniswap(interfaces.PriceChannelInterface):
             total_paths_count = 0
             coins_in_one_request = []
             data_in_one_request = []
+            batches = []
             for coin in coins_on_chain:
                 if coin.token_address is None:  # Not a token
                     continue
                 elif coin.token_address == base_token_address:  # It's a base token, i.e., a WETH/WBNB/WHT...
-                    yield data.YieldedPrice(coin_code=coin.code, unit=base_coin.code, price=decimal.Decimal("1"))
+                    prices.append(
+                        data.YieldedPrice(coin_code=coin.code, unit=base_coin.code, price=decimal.Decimal("1"))
+                    )
                     continue
                 elif coin.token_address in media_token_addresses:  # A media token
                     paths = paths_for_media_tokens
@@ -98,16 +110,19 @@ class Uniswap(interfaces.PriceChannelInterface):
 
                 total_paths_count += paths_count_of_this_coin
                 if total_paths_count >= BATCH_SIZE:
-                    yield from _obtain_prices_from_dex(
-                        chain, router_address, base_divisor, coins_in_one_request, data_in_one_request
-                    )
+                    batches.append((coins_in_one_request, data_in_one_request))
                     total_paths_count = 0
                     coins_in_one_request = []
                     data_in_one_request = []
 
             if data_in_one_request:
-                yield from _obtain_prices_from_dex(
-                    chain, router_address, base_divisor, coins_in_one_request, data_in_one_request
+                batches.append((coins_in_one_request, data_in_one_request))
+
+            if batches:
+                client = provider_manager.get_client_by_chain(chain.chain_code, instance_required=geth_client.Geth)
+                dex_requests.extend(
+                    (client, chain, router_address, base_divisor, coins_in_one_request, data_in_one_request)
+                    for coins_in_one_request, data_in_one_request in batches
                 )
-            else:
-                yield from tuple()
+
+        return _yield_prices(prices, dex_requests)
@@ -8,4 +8,7 @@ from electrum_gui.common.price.data import YieldedPrice
 class PriceChannelInterface(ABC):
     @abstractmethod
     def pricing(self, coins: Iterable[CoinInfo]) -> Iterable[YieldedPrice]:
-        pass
+        """
+        Called on the calling thread, the returned iterable may then be consumed from a worker thread,
+        so loading chain info, selecting clients or querying the database should be done beforehand
+        """
@@ -3,6 +3,7 @@ import logging
 from decimal import Decimal
 from typing import Callable, Dict, Iterable, List, Sequence, Set, Tuple
 
+from electrum_gui.common.basic.functional import aio
 from electrum_gui.common.basic.functional.timing import timing_logger
 from electrum_gui.common.basic.functional.wraps import cache_it
 from electrum_gui.common.basic.ticker.utils import on_interval
@@ -31,11 +32,23 @@ def pricing(coin_codes: List[str] = None):
     if not coins:
         return
 
+    # Channels are created and prepared on the calling thread, as preparing may load chain info and
+    # select provider clients. Only the returned iterables are consumed concurrently, in worker threads.
+    channels = []
     for channel_type, channel_creator in _registry.items():
         try:
-            channel = channel_creator()
+            channels.append((channel_type, channel_creator().pricing(coins)))
+        except Exception as e:
+            logger.exception(f"Error in preparing channel. channel_type: {channel_type}, error: {e}")
+
+    results = aio.run_sync(aio.gather([aio.run_in_thread(list, prices) for _, prices in channels]))
+
+    for (channel_type, _), prices in zip(channels, results):
+        try:
+            if isinstance(prices, Exception):
+                raise prices
 
-            for price in channel.pricing(coins):
+            for price in prices:
                 daos.create_or_update(
                     coin_code=price.coin_code,
                     unit=price.unit,
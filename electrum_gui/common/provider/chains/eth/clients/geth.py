@@ -5,6 +5,7 @@ from typing import Any, List, Optional, Union
 import eth_utils
 
 from electrum_gui.common.basic.functional.require import require
+from electrum_gui.common.basic.request.async_json_rpc import AsyncJsonRPCRequest
 from electrum_gui.common.basic.request.exceptions import JsonRPCException
 from electrum_gui.common.basic.request.json_rpc import JsonRPCRequest
 from electrum_gui.common.provider.chains.eth.clients import utils
@@ -23,7 +24,12 @@ from electrum_gui.common.provider.data import (
     TxBroadcastReceiptCode,
 )
 from electrum_gui.common.provider.exceptions import FailedToGetGasPrices, TransactionNotFound
-from electrum_gui.common.provider.interfaces import BatchGetAddressMixin, ClientInterface
+from electrum_gui.common.provider.interfaces import (
+    AsyncClientInterface,
+    AsyncClientMixin,
+    BatchGetAddressMixin,
+    ClientInterface,
+)
 
 _hex2int = functools.partial(int, base=16)
 
@@ -36,25 +42,97 @@ def _extract_eth_call_str_result(data: bytes) -> str:
     return str_result
 
 
+def _parse_client_info(the_latest_block: dict) -> ClientInfo:
+    return ClientInfo(
+        "geth",
+        best_block_number=_hex2int(the_latest_block["number"]),
+        is_ready=time.time() - _hex2int(the_latest_block["timestamp"]) < 120,
+    )
+
+
+def _parse_address(address: str, balance_str: str, nonce_str: str) -> Address:
+    balance = _hex2int(balance_str)
+    nonce = _hex2int(nonce_str)
+    return Address(address=address, balance=balance, nonce=nonce, existing=(bool(balance) or bool(nonce)))
+
+
+def _call_balance_of(address: str, token_address: str) -> dict:
+    # method_selector(balance_of) + byte32_pad(address)
+    return {"to": token_address, "data": "0x70a08231000000000000000000000000" + address[2:]}
+
+
+def _parse_token_balance(resp: str) -> int:
+    try:
+        return _hex2int(resp[:66])
+    except ValueError:
+        return 0
+
+
+def _parse_transaction(txid: str, tx: Optional[dict], receipt: Optional[dict]) -> Transaction:
+    if not tx:
+        raise TransactionNotFound(txid)
+    else:
+        require(txid == tx.get("hash"))
+
+    if receipt:
+        block_header = BlockHeader(
+            block_hash=receipt.get("blockHash", ""),
+            block_number=_hex2int(receipt.get("blockNumber", "0x0")),
+            block_time=0,
+        )
+        status = (
+            TransactionStatus.CONFIRM_SUCCESS if receipt.get("status") == "0x1" else TransactionStatus.CONFIRM_REVERTED
+        )
+        gas_used = _hex2int(receipt.get("gasUsed", "0x0"))
+    else:
+        block_header = None
+        status = TransactionStatus.PENDING
+        gas_used = None
+
+    gas_limit = _hex2int(tx.get("gas", "0x0"))
+    fee = TransactionFee(
+        limit=gas_limit,
+        used=gas_used or gas_limit,
+        price_per_unit=_hex2int(tx.get("gasPrice", "0x0")),
+    )
+    sender = tx.get("from", "").lower()
+    receiver = tx.get("to", "").lower()
+    value = _hex2int(tx.get("value", "0x0"))
+
+    return Transaction(
+        txid=txid,
+        inputs=[TransactionInput(address=sender, value=value)],
+        outputs=[TransactionOutput(address=receiver, value=value)],
+        status=status,
+        block_header=block_header,
+        fee=fee,
+        nonce=_hex2int(tx["nonce"]),
+    )
+
+
 class InvalidContractAddress(ValueError):
     # TODO: organize exceptions better
     def __init__(self, address):
         super(InvalidContractAddress, self).__init__(f"Invalid contract address {address}.")
 
 
-class Geth(ClientInterface, BatchGetAddressMixin):
+class Geth(ClientInterface, BatchGetAddressMixin, AsyncClientMixin):
     __LAST_BLOCK__ = "latest"
 
     def __init__(self, url: str):
+        self.url = url
         self.rpc = JsonRPCRequest(url)
+        self._async_client = None
+
+    @property
+    def async_client(self) -> "AsyncGeth":
+        if self._async_client is None:
+            self._async_client = AsyncGeth(self.url)
+        return self._async_client
 
     def get_info(self) -> ClientInfo:
         the_latest_block = self.rpc.call("eth_getBlockByNumber", params=["latest", False])
-        return ClientInfo(
-            "geth",
-            best_block_number=_hex2int(the_latest_block["number"]),
-            is_ready=time.time() - _hex2int(the_latest_block["timestamp"]) < 120,
-        )
+        return _parse_client_info(the_latest_block)
 
     def get_address(self, address: str) -> Address:
         _balance, _nonce = self.rpc.batch_call(
@@ -63,9 +141,7 @@ class Geth(ClientInterface, BatchGetAddressMixin):
                 ("eth_getTransactionCount", [address, self.__LAST_BLOCK__]),
             ]
         )  # Maybe __LAST_BLOCK__ refers to a different blocks in some case
-        balance = _hex2int(_balance)
-        nonce = _hex2int(_nonce)
-        return Address(address=address, balance=balance, nonce=nonce, existing=(bool(balance) or bool(nonce)))
+        return _parse_address(address, _balance, _nonce)
 
     def batch_get_address(self, addresses: List[str]) -> List[Address]:
         _call_body = []
@@ -79,29 +155,18 @@ class Geth(ClientInterface, BatchGetAddressMixin):
             )
         result = self.rpc.batch_call(_call_body, timeout=10)
 
-        _resp_body = []
         result_iterator = iter(result)
-        for _address, _balance_str, _nonce_str in zip(addresses, result_iterator, result_iterator):
-            _balance = _hex2int(_balance_str)
-            _nonce = _hex2int(_nonce_str)
-            _resp_body.append(
-                Address(address=_address, balance=_balance, nonce=_nonce, existing=(bool(_balance) or bool(_nonce)))
-            )
-        return _resp_body
+        return [
+            _parse_address(_address, _balance_str, _nonce_str)
+            for _address, _balance_str, _nonce_str in zip(addresses, result_iterator, result_iterator)
+        ]
 
     def get_balance(self, address: str, token_address: Optional[str] = None) -> int:
         if token_address is None:
             return super(Geth, self).get_balance(address)
         else:
-            call_balance_of = (
-                "0x70a08231000000000000000000000000" + address[2:]
-            )  # method_selector(balance_of) + byte32_pad(address)
-            resp = self.eth_call({"to": token_address, "data": call_balance_of})
-
-            try:
-                return _hex2int(resp[:66])
-            except ValueError:
-                return 0
+            resp = self.eth_call(_call_balance_of(address, token_address))
+            return _parse_token_balance(resp)
 
     def eth_call(self, call_data: dict) -> Any:
         return self.rpc.call("eth_call", [call_data, self.__LAST_BLOCK__])
@@ -113,47 +178,7 @@ class Geth(ClientInterface, BatchGetAddressMixin):
                 ("eth_getTransactionReceipt", [txid]),
             ]
         )
-        if not tx:
-            raise TransactionNotFound(txid)
-        else:
-            require(txid == tx.get("hash"))
-
-        if receipt:
-            block_header = BlockHeader(
-                block_hash=receipt.get("blockHash", ""),
-                block_number=_hex2int(receipt.get("blockNumber", "0x0")),
-                block_time=0,
-            )
-            status = (
-                TransactionStatus.CONFIRM_SUCCESS
-                if receipt.get("status") == "0x1"
-                else TransactionStatus.CONFIRM_REVERTED
-            )
-            gas_used = _hex2int(receipt.get("gasUsed", "0x0"))
-        else:
-            block_header = None
-            status = TransactionStatus.PENDING
-            gas_used = None
-
-        gas_limit = _hex2int(tx.get("gas", "0x0"))
-        fee = TransactionFee(
-            limit=gas_limit,
-            used=gas_used or gas_limit,
-            price_per_unit=_hex2int(tx.get("gasPrice", "0x0")),
-        )
-        sender = tx.get("from", "").lower()
-        receiver = tx.get("to", "").lower()
-        value = _hex2int(tx.get("value", "0x0"))
-
-        return Transaction(
-            txid=txid,
-            inputs=[TransactionInput(address=sender, value=value)],
-            outputs=[TransactionOutput(address=receiver, value=value)],
-            status=status,
-            block_header=block_header,
-            fee=fee,
-            nonce=_hex2int(tx["nonce"]),
-        )
+        return _parse_transaction(txid, tx, receipt)
 
     def broadcast_transaction(self, raw_tx: str) -> TxBroadcastReceipt:
         try:
@@ -235,3 +260,39 @@ class Geth(ClientInterface, BatchGetAddressMixin):
             )
         else:
             return self.eth_call({"to": contract_address, "data": data})
+
+
+class AsyncGeth(AsyncClientInterface):
+    __LAST_BLOCK__ = "latest"
+
+    def __init__(self, url: str):
+        self.rpc = AsyncJsonRPCRequest(url)
+
+    async def get_info(self) -> ClientInfo:
+        the_latest_block = await self.rpc.call("eth_getBlockByNumber", params=["latest", False])
+        return _parse_client_info(the_latest_block)
+
+    async def get_address(self, address: str) -> Address:
+        _balance, _nonce = await self.rpc.batch_call(
+            [
+                ("eth_getBalance", [address, self.__LAST_BLOCK__]),
+                ("eth_getTransactionCount", [address, self.__LAST_BLOCK__]),
+            ]
+        )
+        return _parse_address(address, _balance, _nonce)
+
+    async def get_balance(self, address: str, token_address: Optional[str] = None) -> int:
+        if token_address is None:
+            return await super(AsyncGeth, self).get_balance(address)
+        else:
+            resp = await self.rpc.call("eth_call", [_call_balance_of(address, token_address), self.__LAST_BLOCK__])
+            return _parse_token_balance(resp)
+
+    async def get_transaction_by_txid(self, txid: str) -> Transaction:
+        tx, receipt = await self.rpc.batch_call(
+            [
+                ("eth_getTransactionByHash", [txid]),
+                ("eth_getTransactionReceipt", [txid]),
+            ]
+        )
+        return _parse_transaction(txid, tx, receipt)
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from typing import Callable, Dict, List, Optional, Tuple
 
+from electrum_gui.common.basic.functional import aio
 from electrum_gui.common.coin.data import ChainInfo, CoinInfo
 from electrum_gui.common.provider.data import (
     UTXO,
@@ -149,6 +150,97 @@ class SearchUTXOMixin(ABC):
         """
 
 
+class AsyncClientInterface(ABC):
+    """
+    Asyncio counterpart of the reading part of ClientInterface
+    """
+
+    @abstractmethod
+    async def get_info(self) -> ClientInfo:
+        """
+        Get information of client
+        :return: ClientInfo
+        """
+
+    @abstractmethod
+    async def get_address(self, address: str) -> Address:
+        """
+        Get address information by address str
+        :param address: address
+        :return: Address
+        """
+
+    async def get_balance(self, address: str, token_address: Optional[str] = None) -> int:
+        """
+        get address balance
+        :param token_address:
+        :param address: address
+        :return: balance
+        """
+        return (await self.get_address(address)).balance
+
+    @abstractmethod
+    async def get_transaction_by_txid(self, txid: str) -> Transaction:
+        """
+        Get transaction by txid
+        :param txid: transaction hash
+        :return: Transaction
+        :raise: raise TransactionNotFound if target tx not found
+        """
+
+    async def get_transaction_status(self, txid: str) -> TransactionStatus:
+        """
+        Get transaction status by txid
+        :param txid: transaction hash
+        :return: TransactionStatus
+        """
+        try:
+            return (await self.get_transaction_by_txid(txid)).status
+        except TransactionNotFound:
+            return TransactionStatus.UNKNOWN
+
+
+class AsyncClientMixin(ABC):
+    @property
+    @abstractmethod
+    def async_client(self) -> AsyncClientInterface:
+        """
+        The native asyncio client talking to the same server
+        :return: AsyncClientInterface
+        """
+
+
+class ThreadedAsyncClient(AsyncClientInterface):
+    """
+    Runs the calls of a sync client in worker threads, for clients without a native asyncio counterpart
+    """
+
+    def __init__(self, client: ClientInterface):
+        self.client = client
+
+    async def get_info(self) -> ClientInfo:
+        return await aio.run_in_thread(self.client.get_info)
+
+    async def get_address(self, address: str) -> Address:
+        return await aio.run_in_thread(self.client.get_address, address)
+
+    async def get_balance(self, address: str, token_address: Optional[str] = None) -> int:
+        return await aio.run_in_thread(self.client.get_balance, address, token_address=token_address)
+
+    async def get_transaction_by_txid(self, txid: str) -> Transaction:
+        return await aio.run_in_thread(self.client.get_transaction_by_txid, txid)
+
+    async def get_transaction_status(self, txid: str) -> TransactionStatus:
+        return await aio.run_in_thread(self.client.get_transaction_status, txid)
+
+
+def as_async_client(client: ClientInterface) -> AsyncClientInterface:
+    if isinstance(client, AsyncClientMixin):
+        return client.async_client
+    else:
+        return ThreadedAsyncClient(client)
+
+
 class ProviderInterface(ABC):
     def __init__(
         self,
@@ -164,6 +256,10 @@ class ProviderInterface(ABC):
     def client(self):
         return self.client_selector()
 
+    @property
+    def async_client(self) -> AsyncClientInterface:
+        return as_async_client(self.client)
+
     @abstractmethod
     def verify_address(self, address: str) -> AddressValidation:
         """
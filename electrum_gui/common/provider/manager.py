@@ -1,10 +1,13 @@
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import requests
 
+from electrum_gui.common.basic.functional import aio
 from electrum_gui.common.provider import data, exceptions, interfaces, loader
 from electrum_gui.common.secret import interfaces as secret_interfaces
 
+MAX_CONCURRENT_REQUESTS = 16
+
 
 def get_best_block_number(chain_code: str) -> int:
     return loader.get_client_by_chain(chain_code).get_info().best_block_number
@@ -29,10 +32,68 @@ def get_balance(chain_code: str, address: str, token_address: Optional[str] = No
     return loader.get_client_by_chain(chain_code).get_balance(address, token_address=token_address)
 
 
+def batch_get_balance(
+    balance_requests: List[Tuple[str, str, Optional[str]]], max_concurrency: int = MAX_CONCURRENT_REQUESTS
+) -> List[Union[int, Exception]]:
+    """
+    Get the balances of many (chain_code, address, token_address) concurrently
+    :return: balance of each request, in the same order, or the exception raised by the request
+    """
+    clients = _get_async_clients({i[0] for i in balance_requests})
+    return aio.run_sync(
+        aio.gather(
+            [
+                _call_async_client(clients[chain_code], "get_balance", address, token_address=token_address)
+                for chain_code, address, token_address in balance_requests
+            ],
+            max_concurrency=max_concurrency,
+        )
+    )
+
+
 def get_transaction_by_txid(chain_code: str, txid: str) -> data.Transaction:
     return loader.get_client_by_chain(chain_code).get_transaction_by_txid(txid)
 
 
+def batch_get_transaction_by_txid(
+    txids_of_chain: List[Tuple[str, str]], max_concurrency: int = MAX_CONCURRENT_REQUESTS
+) -> List[Union[data.Transaction, Exception]]:
+    """
+    Get the transactions of many (chain_code, txid) concurrently
+    :return: transaction of each request, in the same order, or the exception raised by the request
+    """
+    clients = _get_async_clients({i[0] for i in txids_of_chain})
+    return aio.run_sync(
+        aio.gather(
+            [
+                _call_async_client(clients[chain_code], "get_transaction_by_txid", txid)
+                for chain_code, txid in txids_of_chain
+            ],
+            max_concurrency=max_concurrency,
+        )
+    )
+
+
+def _get_async_clients(chain_codes: set) -> Dict[str, Union[interfaces.AsyncClientInterface, Exception]]:
+    # Clients are selected beforehand, on the calling thread, as selecting
+    # may load chain info and check whether the clients are ready.
+    clients = {}
+    for chain_code in chain_codes:
+        try:
+            clients[chain_code] = get_async_client_by_chain(chain_code)
+        except Exception as e:
+            clients[chain_code] = e
+    return clients
+
+
+async def _call_async_client(
+    client: Union[interfaces.AsyncClientInterface, Exception], method: str, *args, **kwargs
+) -> Any:
+    if isinstance(client, Exception):
+        raise client
+    return await getattr(client, method)(*args, **kwargs)
+
+
 def get_transaction_status(chain_code: str, txid: str) -> data.TransactionStatus:
     return loader.get_client_by_chain(chain_code).get_transaction_status(txid)
 
@@ -125,5 +186,9 @@ def get_client_by_chain(chain_code: str, instance_required: Any = None) -> inter
     return loader.get_client_by_chain(chain_code, instance_required=instance_required)
 
 
+def get_async_client_by_chain(chain_code: str, instance_required: Any = None) -> interfaces.AsyncClientInterface:
+    return interfaces.as_async_client(loader.get_client_by_chain(chain_code, instance_required=instance_required))
+
+
 def get_provider_by_chain(chain_code: str) -> interfaces.ProviderInterface:
     return loader.get_provider_by_chain(chain_code)
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+from unittest import TestCase
+
+from electrum_gui.common.basic.functional import aio
+
+
+class TestAio(TestCase):
+    def test_gather(self):
+        in_flight = 0
+        max_in_flight = 0
+
+        async def _work(i):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            if i == 3:
+                raise ValueError(i)
+            return i * 2
+
+        results = aio.run_sync(aio.gather([_work(i) for i in range(10)], max_concurrency=4))
+        self.assertEqual([0, 2, 4], results[:3])
+        self.assertIsInstance(results[3], ValueError)
+        self.assertEqual([8, 10, 12, 14, 16, 18], results[4:])
+        self.assertEqual(4, max_in_flight)
+
+    def test_run_in_thread(self):
+        worker_thread = aio.run_sync(aio.run_in_thread(threading.current_thread))
+        self.assertIsNot(threading.current_thread(), worker_thread)
+        self.assertTrue(worker_thread.name.startswith("aio-worker"))
+
+    def test_run_sync_from_the_loop(self):
+        async def _nested():
+            aio.run_sync(asyncio.sleep(0))
+
+        with self.assertRaisesRegex(RuntimeError, "must not be called from the shared event loop"):
+            aio.run_sync(_nested())
@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+from electrum_gui.common.basic.functional import aio
+from electrum_gui.common.basic.request import async_json_rpc, exceptions
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(0.1)
+
+        def _result(call):
+            if call["method"] == "fail":
+                return {"jsonrpc": "2.0", "id": call["id"], "error": {"code": -1, "message": "failed"}}
+            return {"jsonrpc": "2.0", "id": call["id"], "result": call["params"][0] * 2}
+
+        if isinstance(payload, list):
+            body = [_result(i) for i in reversed(payload)]
+        else:
+            body = _result(payload)
+        body = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAsyncJsonRPCRequest(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.ins = async_json_rpc.AsyncJsonRPCRequest(f"http://127.0.0.1:{self.server.server_address[1]}")
+
+    def tearDown(self):
+        aio.run_sync(self.ins.inner.close())
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_concurrent_calls(self):
+        start_time = time.monotonic()
+        results = aio.run_sync(aio.gather([self.ins.call("double", [i]) for i in range(10)]))
+        time_used = time.monotonic() - start_time
+
+        self.assertEqual([i * 2 for i in range(10)], results)
+        self.assertLess(time_used, 0.5)  # 10 calls of 0.1s each, in parallel
+
+    def test_batch_call(self):
+        calls = [("double", [1]), ("double", [2]), ("double", [3])]
+        self.assertEqual([2, 4, 6], aio.run_sync(self.ins.batch_call(calls)))
+        self.assertEqual(
+            [2, None], aio.run_sync(self.ins.batch_call([("double", [1]), ("fail", [2])], ignore_errors=True))
+        )
+
+    def test_error(self):
+        with self.assertRaisesRegex(exceptions.JsonRPCException, "failed"):
+            aio.run_sync(self.ins.call("fail", [1]))
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+import aiohttp
+
+from electrum_gui.common.basic.functional import aio
+from electrum_gui.common.basic.request import async_restful, exceptions
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/api/ping":
+            status, body = 200, b"pong"
+        else:
+            status, body = 404, json.dumps({"error": "not found"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAsyncRestfulRequest(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.ins = async_restful.AsyncRestfulRequest(f"http://127.0.0.1:{self.server.server_address[1]}", max_retries=2)
+
+    def tearDown(self):
+        aio.run_sync(self.ins.close())
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_response_exception(self):
+        with self.subTest("Error status"):
+            with self.assertRaises(exceptions.ResponseException) as cm:
+                aio.run_sync(self.ins.get("/api/missing"))
+            self.assertEqual(404, cm.exception.response.status_code)
+            self.assertIn("not found", cm.exception.response.text)
+            self.assertEqual({"error": "not found"}, cm.exception.response.json())
+
+        with self.subTest("Bad json"):
+            with self.assertRaisesRegex(exceptions.ResponseException, "response_text: pong") as cm:
+                aio.run_sync(self.ins.get("/api/ping"))
+            self.assertEqual(200, cm.exception.response.status_code)
+            self.assertEqual("pong", cm.exception.response.text)
+
+    def test_session_closed_on_loop_shutdown(self):
+        self.ins.response_jsonlize = False
+
+        async def _ping():
+            return await self.ins.get("/api/ping"), self.ins.session
+
+        text, session = asyncio.run(_ping())
+        self.assertEqual("pong", text)
+        self.assertTrue(session.closed)
+        self.assertEqual({}, self.ins._sessions)
+
+    @patch.object(async_restful.AsyncRestfulRequest, "_get_backoff_time", Mock(return_value=0))
+    @patch.object(aiohttp.ClientSession, "request")
+    def test_retry(self, fake_request):
+        with self.subTest("Connection errors are retried whatever the method"):
+            fake_request.side_effect = aiohttp.ClientConnectorError(Mock(), OSError("Connection refused"))
+            with self.assertRaises(exceptions.RequestException):
+                aio.run_sync(self.ins.post("/api/send", json={"a": 1}))
+            self.assertEqual(3, fake_request.call_count)
+            fake_request.reset_mock()
+
+        with self.subTest("Other errors are retried only for idempotent methods"):
+            fake_request.side_effect = aiohttp.ServerDisconnectedError()
+            with self.assertRaises(exceptions.RequestException):
+                aio.run_sync(self.ins.post("/api/send", json={"a": 1}))
+            self.assertEqual(1, fake_request.call_count)
+            fake_request.reset_mock()
+
+            with self.assertRaises(exceptions.RequestException):
+                aio.run_sync(self.ins.get("/api/ping"))
+            self.assertEqual(3, fake_request.call_count)
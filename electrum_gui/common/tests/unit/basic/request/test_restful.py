@@ -1,7 +1,9 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
-from electrum_gui.common.basic.request import enums, exceptions, restful
+from electrum_gui.common.basic.request import enums, exceptions, restful, stats
 
 
 class TestRestfulRequest(TestCase):
@@ -91,3 +93,94 @@ class TestRestfulRequest(TestCase):
                 timeout=30,
             )
             fake_session.request.reset_mock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def _reply(self):
+        self.server.requests.append((self.command, self.path, self.client_address))
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            status, body = 503, b"busy"
+        else:
+            status, body = 200, b'{"result": "pong"}'
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRestfulRequestTransport(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.requests = []
+        self.server.failures = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        stats.reset()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        stats.reset()
+
+    def test_connections_are_reused(self):
+        ins = restful.RestfulRequest(self.base_url)
+        for _ in range(5):
+            self.assertEqual({"result": "pong"}, ins.get("/api/ping"))
+
+        self.assertEqual(5, len(self.server.requests))
+        self.assertEqual(1, len({client_address for _, _, client_address in self.server.requests}))
+
+    def test_full_pool_does_not_block(self):
+        ins = restful.RestfulRequest(self.base_url, pool_maxsize=1)
+        self.assertFalse(ins.session.get_adapter(self.base_url)._pool_block)
+
+        # A response left unread keeps its connection out of the pool
+        pending = ins.session.get(f"{self.base_url}/api/ping", stream=True)
+        self.assertEqual({"result": "pong"}, ins.get("/api/ping"))
+        pending.close()
+
+    def test_retry_idempotent_requests(self):
+        ins = restful.RestfulRequest(self.base_url, max_retries=2, backoff_factor=0.01)
+
+        with self.subTest("GET is retried"):
+            self.server.failures = 2
+            self.assertEqual({"result": "pong"}, ins.get("/api/ping"))
+            self.assertEqual(3, len(self.server.requests))
+
+        with self.subTest("GET gives up after max_retries"):
+            self.server.requests.clear()
+            self.server.failures = 3
+            with self.assertRaisesRegex(exceptions.ResponseException, "status_code: 503"):
+                ins.get("/api/ping")
+            self.assertEqual(3, len(self.server.requests))
+
+        with self.subTest("POST is not retried"):
+            self.server.requests.clear()
+            self.server.failures = 1
+            with self.assertRaisesRegex(exceptions.ResponseException, "status_code: 503"):
+                ins.post("/api/ping", json={})
+            self.assertEqual(1, len(self.server.requests))
+
+        endpoint_stats = stats.get_stats()
+        self.assertEqual({f"GET {self.base_url}", f"POST {self.base_url}"}, set(endpoint_stats))
+        get_stats, post_stats = endpoint_stats[f"GET {self.base_url}"], endpoint_stats[f"POST {self.base_url}"]
+        self.assertEqual((2, 1, 0.5), (get_stats.requests, get_stats.errors, get_stats.error_rate))
+        self.assertEqual((1, 1), (post_stats.requests, post_stats.errors))
+
+    def test_connection_error(self):
+        self.server.shutdown()
+        self.server.server_close()
+        ins = restful.RestfulRequest(self.base_url, max_retries=1, backoff_factor=0)
+
+        with self.assertRaises(exceptions.RequestException):
+            ins.get("/api/ping")
+
+        self.assertEqual(1, stats.get_stats()[f"GET {self.base_url}"].errors)
@@ -1,4 +1,5 @@
 import decimal
+import threading
 from unittest import TestCase
 from unittest.mock import Mock, call, patch
 
@@ -53,6 +54,38 @@ class TestPriceManager(TestCase):
             fake_coin_manager.get_all_coins.assert_not_called()
             fake_daos.create_or_update.assert_not_called()
 
+    @patch("electrum_gui.common.price.manager._registry")
+    @patch("electrum_gui.common.price.manager.coin_manager")
+    @patch("electrum_gui.common.price.manager.daos")
+    def test_pricing_prepares_channels_on_calling_thread(self, fake_daos, fake_coin_manager, fake_registry):
+        fake_coin_manager.get_all_coins.return_value = [Mock(code="btc")]
+        threads = []
+
+        def _yield_prices():
+            threads.append(("consuming", threading.current_thread()))
+            yield data.YieldedPrice("btc", 123456, "usd")
+
+        def _create_channel():
+            threads.append(("creating", threading.current_thread()))
+            return Mock(pricing=Mock(side_effect=lambda coins: _yield_prices()))
+
+        def _create_broken_channel():
+            raise Exception("broken")
+
+        fake_registry.items.return_value = [
+            (data.Channel.CGK, _create_channel),
+            (data.Channel.UNISWAP, _create_broken_channel),
+        ]
+
+        manager.pricing()
+
+        self.assertEqual(["creating", "consuming"], [i for i, _ in threads])
+        self.assertIs(threading.current_thread(), threads[0][1])
+        self.assertIsNot(threading.current_thread(), threads[1][1])
+        fake_daos.create_or_update.assert_called_once_with(
+            coin_code="btc", unit="usd", channel=data.Channel.CGK, price=123456
+        )
+
     @patch("electrum_gui.common.price.manager.coin_manager")
     def test_get_last_price(self, fake_coin_manager):
         # create fake pricing table
@@ -79,7 +79,7 @@ class TestTransactionManager(TestCase):
             models.TxAction.id == tx_bsc.id
         ).execute()
 
-        fake_provider_manager.get_transaction_by_txid.side_effect = lambda i, j: {
+        fake_transactions = {
             "eth": provider_data.Transaction(
                 txid="txid_a",
                 status=provider_data.TransactionStatus.CONFIRM_SUCCESS,
@@ -98,7 +98,10 @@ class TestTransactionManager(TestCase):
                 fee=provider_data.TransactionFee(limit=1000, used=1000, price_per_unit=20),
                 block_header=provider_data.BlockHeader(block_hash="block_c", block_number=1010, block_time=1600000001),
             ),
-        }.get(i)
+        }
+        fake_provider_manager.batch_get_transaction_by_txid.side_effect = lambda txids_of_chain: [
+            fake_transactions.get(i) for i, j in txids_of_chain
+        ]
 
         manager.update_pending_actions()
 
@@ -165,8 +168,8 @@ class TestTransactionManager(TestCase):
                 for i in txns
             ],
         )
-        fake_provider_manager.get_transaction_by_txid.assert_has_calls(
-            [call('bsc', 'txid_b'), call('eth', 'txid_a'), call('heco', 'txid_c')]
+        fake_provider_manager.batch_get_transaction_by_txid.assert_called_once_with(
+            [('bsc', 'txid_b'), ('eth', 'txid_a'), ('heco', 'txid_c')]
         )
 
     def test_unique_indexes_of_tx_action(self):
@@ -682,15 +682,14 @@ class TestWalletManager(TestCase):
             Mock(code="eth_usdt", token_address="contract_a"),
             Mock(code="eth_cc", token_address="contract_b"),
         ]
-        fake_provider_manager.get_balance.side_effect = lambda chain_code, address, token_address: {
-            "contract_a": 11,
-            "contract_b": 12,
-        }.get(token_address)
+        fake_provider_manager.batch_get_balance.side_effect = lambda balance_requests: [
+            {"contract_a": 11, "contract_b": 12}.get(token_address) for _, _, token_address in balance_requests
+        ]
 
         with self.subTest("Refresh nothing"):
             self.assertEqual([asset_a, asset_b], wallet_manager.refresh_assets([asset_a, asset_b]))
             fake_coin_manager.query_coins_by_codes.assert_not_called()
-            fake_provider_manager.get_balance.assert_not_called()
+            fake_provider_manager.batch_get_balance.assert_not_called()
 
         with self.subTest("Refresh asset_b"):
             wallet_models.AssetModel.update(
@@ -701,19 +700,19 @@ class TestWalletManager(TestCase):
             asset_a, asset_b = wallet_manager.refresh_assets([asset_a, asset_b])
             self.assertEqual(12, asset_b.balance)
             fake_coin_manager.query_coins_by_codes.assert_called_once_with(["eth_cc"])
-            fake_provider_manager.get_balance.assert_called_once_with("eth", "fake_address", "contract_b")
+            fake_provider_manager.batch_get_balance.assert_called_once_with([("eth", "fake_address", "contract_b")])
             fake_coin_manager.query_coins_by_codes.reset_mock()
-            fake_provider_manager.get_balance.reset_mock()
+            fake_provider_manager.batch_get_balance.reset_mock()
 
         with self.subTest("Refresh all"):
             asset_a, asset_b = wallet_manager.refresh_assets([asset_a, asset_b], force_update=True)
             self.assertEqual(11, asset_a.balance)
             self.assertEqual(12, asset_b.balance)
             fake_coin_manager.query_coins_by_codes.assert_called_once_with(["eth_usdt", "eth_cc"])
-            fake_provider_manager.get_balance.assert_has_calls(
+            fake_provider_manager.batch_get_balance.assert_called_once_with(
                 [
-                    call("eth", "fake_address", "contract_a"),
-                    call("eth", "fake_address", "contract_b"),
+                    ("eth", "fake_address", "contract_a"),
+                    ("eth", "fake_address", "contract_b"),
                 ]
             )
 
@@ -1,5 +1,4 @@
 import datetime
-import itertools
 import logging
 import time
 from decimal import Decimal
@@ -102,14 +101,14 @@ def update_pending_actions(chain_code: Optional[str] = None, address: Optional[s
 
 
 def _query_transactions_of_chain(txids_of_chain: Iterable[Tuple[str, str]]) -> Iterable[Tuple[str, Transaction]]:
-    txids_of_chain = sorted(txids_of_chain, key=lambda i: i[0])  # in order to use itertools.groupby
-
-    for chain_code, group in itertools.groupby(txids_of_chain, key=lambda i: i[0]):
-        for (_, txid) in group:
-            try:
-                yield chain_code, provider_manager.get_transaction_by_txid(chain_code, txid)
-            except Exception as e:
-                logger.exception(f"Error in getting transaction by txid. chain_code: {chain_code}, txid: {txid}", e)
+    txids_of_chain = sorted(txids_of_chain, key=lambda i: i[0])
+    transactions = provider_manager.batch_get_transaction_by_txid(txids_of_chain) if txids_of_chain else []
+
+    for (chain_code, txid), tx in zip(txids_of_chain, transactions):
+        if isinstance(tx, Exception):
+            logger.error(f"Error in getting transaction by txid. chain_code: {chain_code}, txid: {txid}", exc_info=tx)
+        else:
+            yield chain_code, tx
 
 
 def _search_txs_by_address(
@@ -736,22 +736,34 @@ def refresh_assets(
     coins = coin_manager.query_coins_by_codes([i.coin_code for i in need_update_assets])
     coins_lookup = {i.code: i for i in coins}
 
-    updated_assets = []
+    requested_assets = []
+    balance_requests = []
     need_update_assets = sorted(need_update_assets, key=lambda i: (i.chain_code, i.account_id))
-    for chain_code, group in groupby(need_update_assets, key=lambda i: i.chain_code):
-        for account_id, sub_group in groupby(group, key=lambda i: i.account_id):
-            for asset in sub_group:  # todo batch
-                try:
-                    account = accounts_lookup[account_id]
-                    coin = coins_lookup[asset.coin_code]
-                    balance = provider_manager.get_balance(chain_code, account.address, coin.token_address)
-                    asset.balance = Decimal(balance)
-                    updated_assets.append(asset)
-                except Exception as e:
-                    logger.exception(
-                        f"Error in get balance by asset. chain_code: {chain_code}, coin_code: {asset.coin_code}, "
-                        f"account_id: {account_id}, error: {e}"
-                    )
+    for asset in need_update_assets:
+        try:
+            account = accounts_lookup[asset.account_id]
+            coin = coins_lookup[asset.coin_code]
+            balance_requests.append((asset.chain_code, account.address, coin.token_address))
+            requested_assets.append(asset)
+        except Exception as e:
+            logger.exception(
+                f"Error in get balance by asset. chain_code: {asset.chain_code}, coin_code: {asset.coin_code}, "
+                f"account_id: {asset.account_id}, error: {e}"
+            )
+
+    updated_assets = []
+    balances = provider_manager.batch_get_balance(balance_requests) if balance_requests else []
+    for asset, balance in zip(requested_assets, balances):
+        if isinstance(balance, Exception):
+            logger.error(
+                f"Error in get balance by asset. chain_code: {asset.chain_code}, coin_code: {asset.coin_code}, "
+                f"account_id: {asset.account_id}, error: {balance}",
+                exc_info=balance,
+            )
+            continue
+
+        asset.balance = Decimal(balance)
+        updated_assets.append(asset)
 
     with db.atomic():
         daos.asset.bulk_update_balance(updated_assets)